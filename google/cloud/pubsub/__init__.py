@@ -18,6 +18,7 @@
 from __future__ import absolute_import
 
 from google.cloud.pubsub_v1 import PublisherClient
+from google.cloud.pubsub_v1 import PublisherAsyncClient
 from google.cloud.pubsub_v1 import SubscriberClient
 from google.cloud.pubsub_v1 import SchemaServiceClient
 from google.cloud.pubsub_v1 import types
@@ -26,6 +27,7 @@ from google.cloud.pubsub_v1 import types
 __all__ = (
     "types",
     "PublisherClient",
+    "PublisherAsyncClient",
     "SubscriberClient",
     "SchemaServiceClient",
 )
@@ -0,0 +1,284 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import threading
+
+import grpc
+
+
+# The metadata key of the affinity key of an RPC, see ChannelPool. The entry
+# is removed from the metadata before the RPC is sent.
+AFFINITY_METADATA_KEY = "x-pubsub-channel-affinity"
+
+# The channel option that gives each channel a connection of its own. Without
+# it, channels to the same target with the same options share a connection.
+_LOCAL_SUBCHANNEL_POOL_OPTION = ("grpc.use_local_subchannel_pool", 1)
+
+# The options the GAPIC transports create their channel with.
+_CHANNEL_OPTIONS = [
+    ("grpc.max_send_message_length", -1),
+    ("grpc.max_receive_message_length", -1),
+    ("grpc.keepalive_time_ms", 30000),
+]
+
+
+def affinity_metadata(key):
+    """Return the metadata pinning the RPCs to a channel of a pool.
+
+    Args:
+        key (str): The affinity key. The RPCs with the same key are sent
+            over the same channel. A key of decimal digits maps to the channel
+            with its value as the index (modulo the pool size), which allows
+            assigning consecutive keys to the channels in turn.
+
+    Returns:
+        Tuple[Tuple[str, str]]: The metadata.
+    """
+    return ((AFFINITY_METADATA_KEY, key),)
+
+
+def create_transport(transport_class, transport, pool_size, client_info=None):
+    """Create a transport sending its RPCs over a pool of channels.
+
+    The channels connect to the same host with the same credentials as the
+    channel of the given transport, which is closed.
+
+    Args:
+        transport_class (type): The class of the GAPIC gRPC transport.
+        transport (grpc.Transport): The transport created by the GAPIC
+            client, from the options given to the client.
+        pool_size (int): The number of channels.
+        client_info (Optional[google.api_core.gapic_v1.client_info.ClientInfo]):
+            The client info given to the client, if any.
+
+    Returns:
+        grpc.Transport: A new transport, whose channel is a
+        :class:`ChannelPool`.
+    """
+    options = _CHANNEL_OPTIONS + [_LOCAL_SUBCHANNEL_POOL_OPTION]
+    channels = [
+        transport_class.create_channel(
+            transport._host,
+            credentials=transport._credentials,
+            scopes=transport._scopes,
+            ssl_credentials=transport._ssl_channel_credentials,
+            options=options,
+        )
+        for _ in range(pool_size)
+    ]
+    transport.grpc_channel.close()
+
+    transport_kwargs = {}
+    if client_info is not None:
+        transport_kwargs["client_info"] = client_info
+    return transport_class(
+        host=transport._host, channel=ChannelPool(channels), **transport_kwargs
+    )
+
+
+class ChannelPool(grpc.Channel):
+    """A channel sending the RPCs over a pool of channels.
+
+    Each RPC is sent over the channel with the fewest RPCs in progress, the
+    channels taking turns if several of them are equally loaded. An RPC whose
+    metadata contains an affinity key (see :func:`affinity_metadata`) is sent
+    over the channel the key maps to instead, thus all of the RPCs with the
+    same key use the same channel. A stream counts as in progress until it is
+    closed.
+
+    Args:
+        channels (Sequence[grpc.Channel]): The channels.
+    """
+
+    def __init__(self, channels):
+        self._channels = tuple(channels)
+        self._lock = threading.Lock()
+        # The number of RPCs in progress on each channel.
+        self._in_progress = [0] * len(self._channels)
+        # The channel to try first for the next RPC.
+        self._next = 0
+
+    @property
+    def channels(self):
+        """Sequence[grpc.Channel]: The channels of the pool."""
+        return self._channels
+
+    def _acquire(self, metadata):
+        """Pick the channel for an RPC, and count the RPC as in progress.
+
+        Args:
+            metadata (Optional[Sequence[Tuple[str, str]]]): The metadata of the
+                RPC.
+
+        Returns:
+            Tuple[int, Optional[Sequence[Tuple[str, str]]]]: The index of the
+            channel, and the metadata without the affinity key.
+        """
+        channel_count = len(self._channels)
+        index = None
+
+        if metadata:
+            for entry in metadata:
+                if entry[0] == AFFINITY_METADATA_KEY:
+                    key = entry[1]
+                    index = (int(key) if key.isdigit() else hash(key)) % channel_count
+                    metadata = [
+                        other for other in metadata if other[0] != AFFINITY_METADATA_KEY
+                    ]
+                    break
+
+        with self._lock:
+            if index is None:
+                in_progress = self._in_progress
+                index = start = self._next
+                for offset in range(1, channel_count):
+                    candidate = (start + offset) % channel_count
+                    if in_progress[candidate] < in_progress[index]:
+                        index = candidate
+                self._next = (index + 1) % channel_count
+            self._in_progress[index] += 1
+
+        return index, metadata
+
+    def _release(self, index):
+        """Count an RPC as no longer in progress.
+
+        Args:
+            index (int): The index of the RPC's channel.
+        """
+        with self._lock:
+            self._in_progress[index] -= 1
+
+    def unary_unary(self, method, *args, **kwargs):
+        stubs = [
+            channel.unary_unary(method, *args, **kwargs) for channel in self._channels
+        ]
+        return _UnaryUnaryMultiCallable(self, stubs)
+
+    def unary_stream(self, method, *args, **kwargs):
+        stubs = [
+            channel.unary_stream(method, *args, **kwargs) for channel in self._channels
+        ]
+        return _UnaryStreamMultiCallable(self, stubs)
+
+    def stream_unary(self, method, *args, **kwargs):
+        stubs = [
+            channel.stream_unary(method, *args, **kwargs) for channel in self._channels
+        ]
+        return _StreamUnaryMultiCallable(self, stubs)
+
+    def stream_stream(self, method, *args, **kwargs):
+        stubs = [
+            channel.stream_stream(method, *args, **kwargs) for channel in self._channels
+        ]
+        return _StreamStreamMultiCallable(self, stubs)
+
+    def subscribe(self, callback, try_to_connect=False):
+        """Subscribe to the connectivity of the first channel of the pool."""
+        self._channels[0].subscribe(callback, try_to_connect=try_to_connect)
+
+    def unsubscribe(self, callback):
+        """Unsubscribe from the connectivity of the first channel of the pool."""
+        self._channels[0].unsubscribe(callback)
+
+    def close(self):
+        """Close all of the channels of the pool."""
+        for channel in self._channels:
+            channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+class _MultiCallableMixin(object):
+    """Sends the RPCs of a method over the channels of a pool.
+
+    Args:
+        pool (ChannelPool): The pool.
+        stubs (Sequence[grpc.MultiCallable]): The method's callable of each
+            channel of the pool.
+    """
+
+    def __init__(self, pool, stubs):
+        self._pool = pool
+        self._stubs = stubs
+
+    def _blocking(self, method_name, request, kwargs):
+        """Invoke a blocking call, which is in progress until it returns."""
+        index, kwargs["metadata"] = self._pool._acquire(kwargs.get("metadata"))
+        try:
+            return getattr(self._stubs[index], method_name)(request, **kwargs)
+        finally:
+            self._pool._release(index)
+
+    def _non_blocking(self, method_name, request, kwargs):
+        """Invoke a call returning a future or a stream, which is in progress
+        until the call terminates."""
+        index, kwargs["metadata"] = self._pool._acquire(kwargs.get("metadata"))
+        try:
+            call = getattr(self._stubs[index], method_name)(request, **kwargs)
+        except Exception:
+            self._pool._release(index)
+            raise
+
+        released = []
+
+        def release(*args):
+            # Release only once, even if the callback fires twice.
+            if not released:
+                released.append(True)
+                self._pool._release(index)
+
+        if not call.add_callback(release):
+            # The call has already terminated.
+            release()
+        return call
+
+
+class _UnaryUnaryMultiCallable(_MultiCallableMixin, grpc.UnaryUnaryMultiCallable):
+    def __call__(self, request, **kwargs):
+        return self._blocking("__call__", request, kwargs)
+
+    def with_call(self, request, **kwargs):
+        return self._blocking("with_call", request, kwargs)
+
+    def future(self, request, **kwargs):
+        return self._non_blocking("future", request, kwargs)
+
+
+class _UnaryStreamMultiCallable(_MultiCallableMixin, grpc.UnaryStreamMultiCallable):
+    def __call__(self, request, **kwargs):
+        return self._non_blocking("__call__", request, kwargs)
+
+
+class _StreamUnaryMultiCallable(_MultiCallableMixin, grpc.StreamUnaryMultiCallable):
+    def __call__(self, request_iterator, **kwargs):
+        return self._blocking("__call__", request_iterator, kwargs)
+
+    def with_call(self, request_iterator, **kwargs):
+        return self._blocking("with_call", request_iterator, kwargs)
+
+    def future(self, request_iterator, **kwargs):
+        return self._non_blocking("future", request_iterator, kwargs)
+
+
+class _StreamStreamMultiCallable(_MultiCallableMixin, grpc.StreamStreamMultiCallable):
+    def __call__(self, request_iterator, **kwargs):
+        return self._non_blocking("__call__", request_iterator, kwargs)
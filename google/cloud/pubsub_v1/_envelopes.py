@@ -0,0 +1,87 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The format of the envelope messages packing several records.
+
+The data of an envelope is a serialized ``PublishRequest`` whose ``messages``
+are the records, i.e. each record is a length-delimited ``PubsubMessage``
+with its own data and attributes. The other fields of the request are unset.
+An envelope is marked with the :data:`ENVELOPE_ATTRIBUTE` attribute, whose
+value is the version of the format.
+"""
+
+from __future__ import absolute_import
+
+from google.protobuf import message as protobuf_message
+
+from google.cloud.pubsub_v1 import _wire
+from google.pubsub_v1 import types as gapic_types
+
+
+# The message attribute marking an envelope, see the module docstring.
+ENVELOPE_ATTRIBUTE = "pubsub_envelope"
+
+# The version of the envelope format, the value of the marker attribute.
+FORMAT_VERSION = "1"
+
+_raw_proto_publish_request = gapic_types.PublishRequest.pb()
+
+
+def framed_size(record_size):
+    """Return the number of bytes a record takes up in the envelope data.
+
+    Args:
+        record_size (int): The size of the serialized record.
+
+    Returns:
+        int: The size of the record, including its field tag and length.
+    """
+    return _wire.framed_message_size(record_size)
+
+
+def encode(records):
+    """Encode records into the data of an envelope.
+
+    Args:
+        records (Sequence[~.pubsub_v1.types.PubsubMessage.pb]): The raw
+            protobuf records.
+
+    Returns:
+        bytes: The envelope data.
+    """
+    return _raw_proto_publish_request(messages=records).SerializeToString()
+
+
+def decode(attributes, data):
+    """Decode the records packed into an envelope.
+
+    Args:
+        attributes (Mapping[str, str]): The attributes of the envelope.
+        data (bytes): The (decompressed) data of the envelope.
+
+    Returns:
+        Sequence[~.pubsub_v1.types.PubsubMessage.pb]: The raw protobuf
+        records.
+
+    Raises:
+        ValueError: If the envelope has an unknown format version, or its data
+            is malformed.
+    """
+    version = attributes.get(ENVELOPE_ATTRIBUTE)
+    if version != FORMAT_VERSION:
+        raise ValueError("Unknown envelope format version: {!r}.".format(version))
+    try:
+        return _raw_proto_publish_request.FromString(data).messages
+    except protobuf_message.DecodeError as exc:
+        raise ValueError("Malformed envelope data: {}".format(exc))
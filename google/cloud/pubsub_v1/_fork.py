@@ -0,0 +1,79 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import logging
+import os
+import threading
+import weakref
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# The clients of the process, rebuilt in the child process after a fork.
+_clients = weakref.WeakSet()
+_clients_lock = threading.Lock()
+
+
+def register(client):
+    """Rebuild a client in the child process after each fork.
+
+    Args:
+        client (Union[~.pubsub_v1.publisher.client.Client, \
+            ~.pubsub_v1.subscriber.client.Client]): The client, whose
+            ``_after_fork()`` method is invoked in the child process. The
+            client is not kept alive by the registration.
+    """
+    with _clients_lock:
+        _clients.add(client)
+
+
+def can_create_transport(client_kwargs):
+    """Return whether the transport of a client can be created again.
+
+    A transport instance passed to the client, e.g. one built around a custom
+    gRPC channel, cannot be created again in the child process, only the
+    transports created by the client from its arguments can.
+
+    Args:
+        client_kwargs (Mapping[str, Any]): The keyword arguments of the
+            underlying GAPIC client.
+
+    Returns:
+        bool: Whether the client creates the transport itself.
+    """
+    transport = client_kwargs.get("transport")
+    return transport is None or isinstance(transport, str)
+
+
+def _after_fork_in_child():
+    """Rebuild the registered clients in the child process.
+
+    Only the forking thread exists in the child, thus the lock might have been
+    held by another thread of the parent at the time of the fork.
+    """
+    global _clients_lock
+    _clients_lock = threading.Lock()
+
+    for client in list(_clients):
+        try:
+            client._after_fork()
+        except Exception:
+            _LOGGER.exception("Failed to rebuild a client after a fork.")
+
+
+# Not available on Windows, where the processes are spawned instead.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,138 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+from google.api_core import gapic_v1
+from google.cloud.pubsub_v1 import _channel_pool
+
+
+class RawUnaryRpc(object):
+    """A unary RPC taking and returning raw protobuf messages.
+
+    The generated GAPIC clients wrap every request and response into proto-plus
+    messages, and build the request metadata on every call. This RPC calls the
+    gRPC stub with raw protobuf requests (or already serialized ones) instead,
+    and caches the metadata of each resource the requests are routed by.
+
+    The default retry and timeout settings, as well as the metadata, are the
+    same as with the corresponding method of the GAPIC client.
+
+    Args:
+        transport (grpc.Transport): The gRPC transport of the GAPIC client.
+        method_name (str): The name of the transport's method, e.g.
+            ``"acknowledge"``.
+        path (str): The full path of the RPC, e.g.
+            ``"/google.pubsub.v1.Subscriber/Acknowledge"``.
+        request_serializer (Optional[Callable[[Any], bytes]]): Serializes the
+            requests. If :data:`None`, the requests must be bytes.
+        response_deserializer (Callable[[bytes], Any]): Deserializes the
+            responses.
+        routing_field (str): The name of the request field the requests are
+            routed by, e.g. ``"subscription"``.
+    """
+
+    def __init__(
+        self,
+        transport,
+        method_name,
+        path,
+        request_serializer,
+        response_deserializer,
+        routing_field,
+    ):
+        self._transport = transport
+        self._method_name = method_name
+        self._path = path
+        self._request_serializer = request_serializer
+        self._response_deserializer = response_deserializer
+        self._routing_field = routing_field
+
+        # Created lazily, when the first request is sent.
+        self._rpc = None
+        self._base_metadata = None
+        # routing value => metadata
+        self._metadata = {}
+        # routing value => metadata pinning the requests to a pooled channel
+        self._pinned_metadata = {}
+
+    def __call__(
+        self,
+        request,
+        routing_value,
+        retry=gapic_v1.method.DEFAULT,
+        pinned=False,
+        compression=None,
+    ):
+        """Send a request.
+
+        Args:
+            request (Any): The raw protobuf request, or the serialized request
+                if there is no request serializer.
+            routing_value (str): The value of the request's routing field,
+                sent in the routing header.
+            retry (Optional[google.api_core.retry.Retry]): Designation of what
+                errors, if any, should be retried.
+            pinned (bool): Whether to send all of the requests with the same
+                routing value over the same channel, if the transport has a
+                pool of channels.
+            compression (Optional[grpc.Compression]): The compression of the
+                request, if any.
+
+        Returns:
+            Any: The deserialized response.
+        """
+        if self._rpc is None:
+            self._create_rpc()
+
+        cache = self._pinned_metadata if pinned else self._metadata
+        metadata = cache.get(routing_value)
+        if metadata is None:
+            metadata = cache.setdefault(
+                routing_value, self._create_metadata(routing_value, pinned)
+            )
+
+        if compression is None:
+            return self._rpc(request, retry=retry, metadata=metadata)
+        return self._rpc(
+            request, retry=retry, metadata=metadata, compression=compression
+        )
+
+    def _create_metadata(self, routing_value, pinned):
+        routing_header = gapic_v1.routing_header.to_grpc_metadata(
+            ((self._routing_field, routing_value),)
+        )
+        metadata = self._base_metadata + (routing_header,)
+        if pinned and isinstance(
+            self._transport.grpc_channel, _channel_pool.ChannelPool
+        ):
+            metadata += _channel_pool.affinity_metadata(routing_value)
+        return metadata
+
+    def _create_rpc(self):
+        transport = self._transport
+        gapic_rpc = transport._wrapped_methods[getattr(transport, self._method_name)]
+
+        stub = transport.grpc_channel.unary_unary(
+            self._path,
+            request_serializer=self._request_serializer,
+            response_deserializer=self._response_deserializer,
+        )
+        self._base_metadata = tuple(gapic_rpc._metadata or ())
+        self._rpc = gapic_v1.method.wrap_method(
+            stub,
+            default_retry=gapic_rpc._retry,
+            default_timeout=gapic_rpc._timeout,
+            client_info=None,
+        )
@@ -0,0 +1,54 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Helpers for writing serialized ``PublishRequest`` messages directly."""
+
+from __future__ import absolute_import
+
+
+# The key of the repeated ``messages`` field (number 2) of a PublishRequest on
+# the wire, i.e. the field number combined with the length-delimited wire type.
+MESSAGES_FIELD_KEY = b"\x12"
+
+
+def encode_varint(value):
+    """Encode a non-negative integer as a protobuf base 128 varint.
+
+    Args:
+        value (int): The integer to encode.
+
+    Returns:
+        bytes: The encoded integer.
+    """
+    encoded = bytearray()
+    bits = value & 0x7F
+    value >>= 7
+    while value:
+        encoded.append(0x80 | bits)
+        bits = value & 0x7F
+        value >>= 7
+    encoded.append(bits)
+    return bytes(encoded)
+
+
+def framed_message_size(message_size):
+    """Return the number of bytes a message takes up in a ``PublishRequest``.
+
+    Args:
+        message_size (int): The size of the serialized message.
+
+    Returns:
+        int: The size of the message, including its field key and length.
+    """
+    return len(MESSAGES_FIELD_KEY) + len(encode_varint(message_size)) + message_size
@@ -0,0 +1,110 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Codecs compressing the data of the published messages.
+
+A publisher client with payload compression enabled (see
+:class:`~.pubsub_v1.types.PayloadCompressionSettings`) compresses the data of
+large messages, and marks each compressed message with the
+:data:`ENCODING_ATTRIBUTE` attribute holding the name of the codec. A
+subscriber client decompresses the data of a marked message when it is first
+accessed. The codec must thus be registered under the same name in the
+publishing and the subscribing processes.
+
+The ``zlib`` and ``lzma`` codecs are always available, and the ``zstd`` codec
+is available if the ``zstandard`` package is installed.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import lzma
+import threading
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # pragma: NO COVER
+    zstandard = None
+
+
+# The message attribute holding the name of the codec that compressed the
+# message's data.
+ENCODING_ATTRIBUTE = "pubsub_payload_encoding"
+
+Codec = collections.namedtuple("Codec", ["name", "compress", "decompress"])
+Codec.__doc__ = "A codec compressing the data of messages."
+Codec.name.__doc__ = (
+    "The name of the codec, stored in the attributes of the compressed messages."
+)
+Codec.compress.__doc__ = "A callable compressing the given bytes."
+Codec.decompress.__doc__ = "A callable decompressing the given bytes."
+
+_codecs_lock = threading.Lock()
+# name => Codec
+_codecs = {}
+
+
+def register_codec(codec):
+    """Register a codec, replacing any codec with the same name.
+
+    Args:
+        codec (Codec): The codec.
+    """
+    with _codecs_lock:
+        _codecs[codec.name] = codec
+
+
+def get_codec(name):
+    """Return a registered codec.
+
+    Args:
+        name (str): The name of the codec.
+
+    Returns:
+        Codec: The codec.
+
+    Raises:
+        ValueError: If no codec is registered with the name.
+    """
+    codec = _codecs.get(name)
+    if codec is None:
+        raise ValueError("Unknown payload codec: {!r}.".format(name))
+    return codec
+
+
+def _create_zstd_codec():
+    # The compressors and decompressors are not thread-safe, each thread uses
+    # its own.
+    local = threading.local()
+
+    def compress(data):
+        compressor = getattr(local, "compressor", None)
+        if compressor is None:
+            compressor = local.compressor = zstandard.ZstdCompressor()
+        return compressor.compress(data)
+
+    def decompress(data):
+        decompressor = getattr(local, "decompressor", None)
+        if decompressor is None:
+            decompressor = local.decompressor = zstandard.ZstdDecompressor()
+        return decompressor.decompress(data)
+
+    return Codec("zstd", compress, decompress)
+
+
+register_codec(Codec("zlib", zlib.compress, zlib.decompress))
+register_codec(Codec("lzma", lzma.compress, lzma.decompress))
+if zstandard is not None:  # pragma: NO COVER
+    register_codec(_create_zstd_codec())
@@ -0,0 +1,151 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import time
+
+
+# The weight of a new sample in the moving averages of the statistics.
+_SMOOTHING_FACTOR = 0.2
+
+
+class _TopicStats(object):
+    """The traffic statistics of a single topic."""
+
+    __slots__ = ("arrival_interval", "last_arrival", "publish_latency")
+
+    def __init__(self):
+        # The moving average of the number of seconds between two messages.
+        self.arrival_interval = None
+        self.last_arrival = None
+        # The moving average of the number of seconds a publish request takes.
+        self.publish_latency = None
+
+
+class AdaptiveBatchSizer(object):
+    """Adjusts the batch settings of each topic to its observed traffic.
+
+    The sizer keeps a moving average of the message arrival rate and of the
+    ``Publish`` RPC latency of each topic. A batch should hold the messages
+    arriving while a publish request is in flight: sending smaller batches
+    would not publish the messages any sooner, because the requests would
+    queue up, and waiting for more messages would only add latency. If fewer
+    than two messages arrive during a request, batching does not save any
+    requests, and the messages are sent right away.
+
+    The resulting ``max_messages`` and ``max_latency`` are bounded from below
+    by the adaptive batch settings, and from above by the client's batch
+    settings. Until both the arrival rate and the RPC latency of a topic have
+    been measured, the client's batch settings are used.
+
+    The statistics are updated without locking. Concurrent updates might
+    occasionally lose a sample, which is harmless for the estimates.
+
+    Args:
+        batch_settings (~.pubsub_v1.types.BatchSettings): The upper bounds of
+            the settings.
+        adaptive_settings (~.pubsub_v1.types.AdaptiveBatchSettings): The lower
+            bounds of the settings.
+    """
+
+    def __init__(self, batch_settings, adaptive_settings):
+        self._batch_settings = batch_settings
+        self._adaptive_settings = adaptive_settings
+        # topic => _TopicStats
+        self._topics = {}
+
+    def _get_stats(self, topic):
+        stats = self._topics.get(topic)
+        if stats is None:
+            stats = self._topics.setdefault(topic, _TopicStats())
+        return stats
+
+    def record_arrivals(self, topic, count=1):
+        """Record that new messages are being published to a topic.
+
+        Args:
+            topic (str): The topic.
+            count (int): The number of messages.
+        """
+        now = time.monotonic()
+        stats = self._get_stats(topic)
+
+        last_arrival = stats.last_arrival
+        stats.last_arrival = now
+        if last_arrival is None:
+            return
+
+        interval = (now - last_arrival) / count
+        if stats.arrival_interval is None:
+            stats.arrival_interval = interval
+        else:
+            stats.arrival_interval += _SMOOTHING_FACTOR * (
+                interval - stats.arrival_interval
+            )
+
+    def record_publish_latency(self, topic, latency):
+        """Record the duration of a successful publish request.
+
+        Args:
+            topic (str): The topic the messages were published to.
+            latency (float): The duration of the request, in seconds.
+        """
+        stats = self._get_stats(topic)
+        if stats.publish_latency is None:
+            stats.publish_latency = latency
+        else:
+            stats.publish_latency += _SMOOTHING_FACTOR * (
+                latency - stats.publish_latency
+            )
+
+    def get_settings(self, topic, batch_settings=None):
+        """Return the batch settings to use for the next batch of a topic.
+
+        Args:
+            topic (str): The topic.
+            batch_settings (Optional[~.pubsub_v1.types.BatchSettings]): The
+                upper bounds of the topic's settings, if they differ from the
+                sizer's.
+
+        Returns:
+            ~.pubsub_v1.types.BatchSettings: The batch settings.
+        """
+        bounds = batch_settings or self._batch_settings
+        stats = self._topics.get(topic)
+        if (
+            stats is None
+            or stats.arrival_interval is None
+            or stats.publish_latency is None
+        ):
+            return bounds
+
+        # A long pause since the last message means that the traffic has
+        # calmed down, even if the moving average does not reflect it yet.
+        interval = max(stats.arrival_interval, time.monotonic() - stats.last_arrival)
+
+        # The number of messages arriving while a publish request is in flight.
+        if interval > stats.publish_latency / bounds.max_messages:
+            expected_messages = round(stats.publish_latency / interval)
+        else:
+            expected_messages = bounds.max_messages
+
+        max_messages = max(self._adaptive_settings.min_messages, expected_messages)
+        # The time it takes for the rest of the batch to arrive after its first
+        # message.
+        max_latency = max(
+            self._adaptive_settings.min_latency,
+            min(bounds.max_latency, (max_messages - 1) * interval),
+        )
+        return bounds._replace(max_messages=max_messages, max_latency=max_latency)
@@ -0,0 +1,321 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import logging
+import threading
+import time
+
+import google.api_core.exceptions
+from google.api_core import gapic_v1
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher._batch import base
+from google.pubsub_v1 import types as gapic_types
+
+
+_LOGGER = logging.getLogger(__name__)
+
+_raw_proto_pubbsub_message = gapic_types.PubsubMessage.pb()
+
+
+class Batch(base.RequestSizeMixin, base.Batch):
+    """A batch of messages published on an asyncio event loop.
+
+    The asyncio counterpart of :class:`~.pubsub_v1.publisher._batch.thread.Batch`,
+    used by :class:`~.pubsub_v1.publisher.AsyncClient`. The messages are
+    accumulated the same way, but the futures returned by :meth:`publish` are
+    :class:`asyncio.Future` instances, and the commit runs as a task on the
+    event loop instead of on a commit thread.
+
+    All methods must be called from the event loop's thread, which makes the
+    batch state safe to access without locking.
+
+    Args:
+        client (~.pubsub_v1.publisher.AsyncClient): The publisher client used
+            to create this batch.
+        topic (str): The topic. The format for this is
+            ``projects/{project}/topics/{topic}``.
+        settings (~.pubsub_v1.types.BatchSettings): The settings for batch
+            publishing. These should be considered immutable once the batch
+            has been opened.
+        batch_done_callback (Callable[[bool], Any]): Callback called when the
+            response for a batch publish has been received. Called with one
+            boolean argument: successfully published or a permanent error
+            occurred. Temporary errors are not surfaced because they are retried
+            at a lower level.
+        commit_when_full (bool): Whether to commit the batch when the batch
+            is full.
+        commit_retry (Optional[google.api_core.retry_async.AsyncRetry]):
+            Designation of what errors, if any, should be retried when
+            commiting the batch. If not provided, a default retry is used.
+    """
+
+    def __init__(
+        self,
+        client,
+        topic,
+        settings,
+        batch_done_callback=None,
+        commit_when_full=True,
+        commit_retry=gapic_v1.method.DEFAULT,
+    ):
+        self._client = client
+        self._topic = topic
+        self._settings = settings
+        self._batch_done_callback = batch_done_callback
+        self._commit_when_full = commit_when_full
+        self._commit_retry = commit_retry
+
+        self._futures = []
+        self._messages = []
+        self._status = base.BatchStatus.ACCEPTING_MESSAGES
+
+        # The initial size is not zero, we need to account for the size overhead
+        # of the PublishRequest message itself.
+        self._base_request_size = gapic_types.PublishRequest(topic=topic)._pb.ByteSize()
+        self._size = self._base_request_size
+
+    @staticmethod
+    def make_lock():
+        """Return a threading lock.
+
+        The batch itself does not need a lock, but the sequencers shared with
+        the threaded client do, and the lock is never contended on the event
+        loop.
+
+        Returns:
+            _thread.Lock: A newly created lock.
+        """
+        return threading.Lock()
+
+    @property
+    def client(self):
+        """~.pubsub_v1.publisher.AsyncClient: A publisher client."""
+        return self._client
+
+    @property
+    def messages(self):
+        """Sequence: The messages currently in the batch."""
+        return self._messages
+
+    @property
+    def settings(self):
+        """Return the batch settings.
+
+        Returns:
+            ~.pubsub_v1.types.BatchSettings: The batch settings. These are
+                considered immutable once the batch has been opened.
+        """
+        return self._settings
+
+    @property
+    def size(self):
+        """Return the total size of all of the messages currently in the batch.
+
+        The size includes any overhead of the actual ``PublishRequest`` that is
+        sent to the backend.
+
+        Returns:
+            int: The total size of all of the messages currently
+                 in the batch (including the request overhead), in bytes.
+        """
+        return self._size
+
+    @property
+    def status(self):
+        """Return the status of this batch.
+
+        Returns:
+            str: The status of this batch. All statuses are human-readable,
+                all-lowercase strings.
+        """
+        return self._status
+
+    def cancel(self, cancellation_reason):
+        """Complete pending futures with an exception.
+
+        This method must be called before publishing starts (ie: while the
+        batch is still accepting messages.)
+
+        Args:
+            cancellation_reason (BatchCancellationReason): The reason why this
+                batch has been cancelled.
+        """
+        assert (
+            self._status == base.BatchStatus.ACCEPTING_MESSAGES
+        ), "Cancel should not be called after sending has started."
+
+        exc = RuntimeError(cancellation_reason.value)
+        for future in self._futures:
+            _set_future_exception(future, exc)
+        self._status = base.BatchStatus.ERROR
+
+    def commit(self):
+        """Actually publish all of the messages on the active batch.
+
+        .. note::
+
+            This method is non-blocking. It starts :meth:`_commit` as a task
+            on the client's event loop.
+
+        If the current batch is **not** accepting messages, this method
+        does nothing.
+        """
+        if self._status != base.BatchStatus.ACCEPTING_MESSAGES:
+            return
+
+        self._status = base.BatchStatus.STARTING
+        self._client._create_commit_task(self._commit())
+
+    async def _commit(self):
+        """Actually publish all of the messages on the active batch.
+
+        The batch is discarded by the client upon completion.
+        """
+        if self._status not in base.CAN_COMMIT:
+            _LOGGER.debug(
+                "Batch is already in progress or has been cancelled, exiting commit"
+            )
+            return
+
+        self._status = base.BatchStatus.IN_PROGRESS
+
+        if not self._messages:
+            _LOGGER.debug("No messages to publish, exiting commit")
+            self._status = base.BatchStatus.SUCCESS
+            return
+
+        # Begin the request to publish these messages.
+        # Log how long the underlying request takes.
+        start = time.time()
+
+        try:
+            # Performs retries for errors defined by the retry configuration.
+            response = await self._client._publish_rpc(
+                self._topic, self._messages, retry=self._commit_retry
+            )
+        except google.api_core.exceptions.GoogleAPIError as exc:
+            # We failed to publish, even after retries, so set the exception on
+            # all futures and exit.
+            self._status = base.BatchStatus.ERROR
+
+            for future in self._futures:
+                _set_future_exception(future, exc)
+
+            if self._batch_done_callback is not None:
+                # Failed to publish batch.
+                self._batch_done_callback(False)
+
+            _LOGGER.exception("Failed to publish %s messages.", len(self._futures))
+            return
+
+        end = time.time()
+        _LOGGER.debug("gRPC Publish took %s seconds.", end - start)
+        self._client._record_publish_latency(self._topic, end - start)
+
+        batch_transport_succeeded = True
+
+        if len(response.message_ids) == len(self._futures):
+            # Iterate over the futures on the queue and return the response
+            # IDs. We are trusting that there is a 1:1 mapping, and raise
+            # an exception if not.
+            self._status = base.BatchStatus.SUCCESS
+            for message_id, future in zip(response.message_ids, self._futures):
+                if not future.done():
+                    future.set_result(message_id)
+        else:
+            # Sanity check: If the number of message IDs is not equal to
+            # the number of futures I have, then something went wrong.
+            self._status = base.BatchStatus.ERROR
+            exception = exceptions.PublishError(
+                "Some messages were not successfully published."
+            )
+
+            for future in self._futures:
+                _set_future_exception(future, exception)
+
+            # Unknown error -> batch failed to be correctly transported/
+            batch_transport_succeeded = False
+
+            _LOGGER.error(
+                "Only %s of %s messages were published.",
+                len(response.message_ids),
+                len(self._futures),
+            )
+
+        if self._batch_done_callback is not None:
+            self._batch_done_callback(batch_transport_succeeded)
+
+    def publish(self, message):
+        """Publish a single message.
+
+        Add the given message to this object; this will cause it to be
+        published once the batch either has enough messages or a sufficient
+        period of time has elapsed. If the batch is full or the commit is
+        already in progress, the method does not do anything.
+
+        This method is called by :meth:`~.pubsub_v1.publisher.AsyncClient.publish`.
+
+        Args:
+            message (~.pubsub_v1.types.PubsubMessage): The Pub/Sub message.
+
+        Returns:
+            Optional[asyncio.Future]: A future resolving to the message ID, or
+            :data:`None`, which signals that the batch cannot accept a message.
+
+        Raises:
+            pubsub_v1.publisher.exceptions.MessageTooLargeError: If publishing
+                the ``message`` would exceed the max size limit on the backend.
+        """
+        # Coerce the type, just in case.
+        if not isinstance(message, gapic_types.PubsubMessage):
+            # For performance reasons, the message should be constructed by directly
+            # using the raw protobuf class, and only then wrapping it into the
+            # higher-level PubsubMessage class.
+            vanilla_pb = _raw_proto_pubbsub_message(**message)
+            message = gapic_types.PubsubMessage.wrap(vanilla_pb)
+
+        assert (
+            self._status != base.BatchStatus.ERROR
+        ), "Publish after stop() or publish error."
+
+        if self._status != base.BatchStatus.ACCEPTING_MESSAGES:
+            return None
+
+        size_increase = gapic_types.PublishRequest(messages=[message])._pb.ByteSize()
+        new_size, overflow = self._size_with(size_increase)
+
+        future = None
+
+        if not self._messages or not overflow:
+            # Store the actual message in the batch's message queue.
+            self._messages.append(message)
+            self._size = new_size
+
+            # Track the future on this batch (so that the result of the
+            # future can be set).
+            future = self._client._loop.create_future()
+            self._futures.append(future)
+
+        if self._commit_when_full and overflow:
+            self.commit()
+
+        return future
+
+
+def _set_future_exception(future, exc):
+    """Fail a message future, unless the caller has already cancelled it."""
+    if not future.done():
+        future.set_exception(exc)
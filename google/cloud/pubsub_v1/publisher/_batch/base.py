@@ -17,6 +17,8 @@ from __future__ import absolute_import
 import abc
 import enum
 
+from google.cloud.pubsub_v1.publisher import exceptions
+
 
 class Batch(metaclass=abc.ABCMeta):
     """The base batching class for Pub/Sub publishing.
@@ -156,3 +158,56 @@ class BatchCancellationReason(str, enum.Enum):
         "failed. This batch has been cancelled to avoid out-of-order publish."
     )
     CLIENT_STOPPED = "Batch cancelled because the publisher client has been stopped."
+
+
+# The statuses in which a batch can still be committed.
+CAN_COMMIT = (BatchStatus.ACCEPTING_MESSAGES, BatchStatus.STARTING)
+
+# The max accepted size of a PublishRequest.
+SERVER_PUBLISH_MAX_BYTES = 10 * 1000 * 1000
+
+
+class RequestSizeMixin(object):
+    """The size accounting of a batch published in a request of its own.
+
+    The batch must have the ``settings`` property, and the ``_messages``,
+    ``_size`` and ``_base_request_size`` attributes, the latter two being the
+    size of the publish request with and without the messages.
+    """
+
+    def _size_with(self, size_increase):
+        """Return the size of the batch's request with another message.
+
+        Args:
+            size_increase (int): The size the message adds to the request.
+
+        Returns:
+            Tuple[int, bool]: The new size of the request, and whether the
+            message makes the batch overflow, i.e. either reach the max
+            number of messages or exceed the max size of the batch.
+
+        Raises:
+            pubsub_v1.publisher.exceptions.MessageTooLargeError: If the message
+                would not even fit into a request of its own.
+        """
+        if self._base_request_size + size_increase > SERVER_PUBLISH_MAX_BYTES:
+            raise message_too_large_error()
+
+        new_size = self._size + size_increase
+        new_count = len(self._messages) + 1
+        size_limit = min(self.settings.max_bytes, SERVER_PUBLISH_MAX_BYTES)
+        overflow = new_size > size_limit or new_count >= self.settings.max_messages
+        return new_size, overflow
+
+
+def message_too_large_error():
+    """Return the error for a message that does not fit into a publish request.
+
+    Returns:
+        pubsub_v1.publisher.exceptions.MessageTooLargeError: The error.
+    """
+    return exceptions.MessageTooLargeError(
+        "The message being published would produce too large a publish "
+        "request that would exceed the maximum allowed size on the "
+        "backend ({} bytes).".format(SERVER_PUBLISH_MAX_BYTES)
+    )
@@ -14,12 +14,15 @@
 
 from __future__ import absolute_import
 
+import functools
 import logging
 import threading
 import time
 
 import google.api_core.exceptions
 from google.api_core import gapic_v1
+from google.cloud.pubsub_v1 import _wire
+from google.cloud.pubsub_v1 import codecs
 from google.cloud.pubsub_v1.publisher import exceptions
 from google.cloud.pubsub_v1.publisher import futures
 from google.cloud.pubsub_v1.publisher._batch import base
@@ -27,13 +30,14 @@ from google.pubsub_v1 import types as gapic_types
 
 
 _LOGGER = logging.getLogger(__name__)
-_CAN_COMMIT = (base.BatchStatus.ACCEPTING_MESSAGES, base.BatchStatus.STARTING)
-_SERVER_PUBLISH_MAX_BYTES = 10 * 1000 * 1000  # max accepted size of PublishRequest
 
 _raw_proto_pubbsub_message = gapic_types.PubsubMessage.pb()
 
+# The types of the already serialized messages accepted by Batch.publish().
+_ENCODED_MESSAGE_TYPES = (bytes, bytearray, memoryview)
 
-class Batch(base.Batch):
+
+class Batch(base.RequestSizeMixin, base.Batch):
     """A batch of messages.
 
     The batch is the internal group of messages which are either awaiting
@@ -100,13 +104,51 @@ class Batch(base.Batch):
         self._messages = []
         self._status = base.BatchStatus.ACCEPTING_MESSAGES
 
-        # The initial size is not zero, we need to account for the size overhead
-        # of the PublishRequest message itself.
-        self._base_request_size = gapic_types.PublishRequest(topic=topic)._pb.ByteSize()
+        # The outcome shared by the futures of the messages. In fire-and-forget
+        # mode, no futures are created, and the client is notified instead.
+        self._fire_and_forget = client._fire_and_forget is not None
+        self._outcome = None if self._fire_and_forget else futures._BatchOutcome()
+        # The total size of the messages (without the request overhead), as
+        # accounted for by flow control.
+        self._message_bytes = 0
+
+        # The wire-format PublishRequest, built incrementally as the messages are
+        # added to the batch, and sent as-is when the batch is committed. The
+        # topic field is encoded upfront, thus the initial size is not zero.
+        self._encoded_request = bytearray(
+            gapic_types.PublishRequest(topic=topic)._pb.SerializeToString()
+        )
+        self._base_request_size = len(self._encoded_request)
         self._size = self._base_request_size
 
+        # If payload compression is enabled, the data of the large messages is
+        # compressed on a commit thread when the batch is committed, instead
+        # of in the publishing thread. Until then, these messages are left out
+        # of the encoded request, and tracked as (offset of the message in the
+        # request, raw message, encoded size of the message) tuples. Their
+        # uncompressed size counts towards the size of the batch.
+        self._payload_codec = client._payload_codec
+        self._payload_min_bytes = client._payload_min_bytes
+        self._uncompressed = []
+
         self._commit_retry = commit_retry
 
+        # Set by the ordered sequencers, whose batches are sent together with
+        # the batches of other ordering keys of the same topic.
+        self._topic_batcher = None
+        # Set by the ordered sequencers, so that the retry budget and the
+        # circuit breaker hold the batch back instead of failing it.
+        self._ordered = False
+        # Set by the unordered sequencers if hedging is enabled, since only the
+        # messages without an ordering key can be published twice.
+        self._hedged = False
+
+        # Once committed, the batch is either spilled to disk until a commit
+        # thread publishes it, or it takes some of the spiller's memory budget,
+        # if spilling is enabled.
+        self._spill_record = None
+        self._spilled_size = None
+
     @staticmethod
     def make_lock():
         """Return a threading lock.
@@ -176,8 +218,7 @@ class Batch(base.Batch):
             ), "Cancel should not be called after sending has started."
 
             exc = RuntimeError(cancellation_reason.value)
-            for future in self._futures:
-                future.set_exception(exc)
+            self._complete(exc)
             self._status = base.BatchStatus.ERROR
 
     def commit(self):
@@ -185,11 +226,13 @@ class Batch(base.Batch):
 
         .. note::
 
-            This method is non-blocking. It opens a new thread, which calls
-            :meth:`_commit`, which does block.
+            This method is non-blocking. It submits :meth:`_commit`, which
+            does block, to the client's pool of commit threads.
 
-        This synchronously sets the batch status to "starting", and then opens
-        a new thread, which handles actually sending the messages to Pub/Sub.
+        This synchronously sets the batch status to "starting", and then
+        schedules the actual sending of the messages to Pub/Sub. If all of the
+        commit threads are busy, the batch waits in the "starting" status
+        until one becomes available.
 
         If the current batch is **not** accepting messages, this method
         does nothing.
@@ -203,15 +246,34 @@ class Batch(base.Batch):
             else:
                 return
 
-        self._start_commit_thread()
+        self._schedule_commit()
 
-    def _start_commit_thread(self):
-        """Start a new thread to actually handle the commit."""
+    def _schedule_commit(self):
+        """Submit the commit to the client's commit thread pool, or hand the
+        batch over to its topic batcher, if it has one."""
+        if self._topic_batcher is not None:
+            self._topic_batcher.add(self)
+            return
 
-        commit_thread = threading.Thread(
-            name="Thread-CommitBatchPublisher",target=self._commit, daemon=True
-        )
-        commit_thread.start()
+        spiller = self._client._batch_spiller
+        if spiller is not None and self._messages:
+            self._spilled_size = self._size
+            self._spill_record = spiller.store(self._size, self._spill_request)
+            if self._spill_record is not None:
+                # Only the number of messages is still needed.
+                self._encoded_request = None
+                self._messages = [None] * len(self._messages)
+        self._client._commit_executor.submit(self._topic, self._commit)
+
+    def _spill_request(self):
+        """Return the final encoded request of a batch being spilled.
+
+        Returns:
+            bytearray: The wire-format ``PublishRequest``.
+        """
+        if self._uncompressed:
+            self._compress_payloads()
+        return self._encoded_request
 
     def _commit(self):
         """Actually publish all of the messages on the active batch.
@@ -225,8 +287,19 @@ class Batch(base.Batch):
             This method blocks. The :meth:`commit` method is the non-blocking
             version, which calls this one.
         """
+        if self._start_publish():
+            self._publish()
+
+    def _start_publish(self):
+        """Move the batch to the "in progress" status, if possible.
+
+        Returns:
+            bool: Whether the batch has messages that need to be sent to the
+            backend. If ``False``, the batch is either already in progress,
+            cancelled, or empty (in which case it is marked as successful).
+        """
         with self._state_lock:
-            if self._status in _CAN_COMMIT:
+            if self._status in base.CAN_COMMIT:
                 self._status = base.BatchStatus.IN_PROGRESS
             else:
                 # If, in the intervening period between when this method was
@@ -236,7 +309,7 @@ class Batch(base.Batch):
                     "Batch is already in progress or has been cancelled, "
                     "exiting commit"
                 )
-                return
+                return False
 
         # Once in the IN_PROGRESS state, no other thread can publish additional
         # messages or initiate a commit (those operations become a no-op), thus
@@ -249,67 +322,212 @@ class Batch(base.Batch):
         if not self._messages:
             _LOGGER.debug("No messages to publish, exiting commit")
             self._status = base.BatchStatus.SUCCESS
-            return
+            return False
 
+        if self._spilled_size is not None:
+            spiller = self._client._batch_spiller
+            if self._spill_record is None:
+                spiller.release(self._spilled_size)
+            else:
+                try:
+                    self._encoded_request = spiller.load(self._spill_record)
+                except OSError as exc:
+                    self._set_publish_error(exc)
+                    return False
+                finally:
+                    self._spill_record = None
+
+        if self._uncompressed:
+            self._compress_payloads()
+        return True
+
+    def _compress_payloads(self):
+        """Compress the data of the messages left out of the encoded request,
+        and splice the messages into the request.
+
+        A compressed message is marked with the codec's name in its
+        attributes. If compressing does not make a message smaller, the message
+        is added to the request as it is.
+        """
+        codec = self._payload_codec
+        source = memoryview(self._encoded_request)
+        encoded_request = bytearray()
+        position = 0
+
+        for offset, message, encoded_size in self._uncompressed:
+            encoded_request += source[position:offset]
+            position = offset
+
+            # The message itself is not modified, it might be shared with the
+            # caller.
+            compressed = _raw_proto_pubbsub_message()
+            compressed.CopyFrom(message)
+            compressed.data = codec.compress(message.data)
+            compressed.attributes[codecs.ENCODING_ATTRIBUTE] = codec.name
+            encoded_message = compressed.SerializeToString()
+            if len(encoded_message) >= encoded_size:
+                encoded_message = message.SerializeToString()
+
+            encoded_request += _wire.MESSAGES_FIELD_KEY
+            encoded_request += _wire.encode_varint(len(encoded_message))
+            encoded_request += encoded_message
+
+        encoded_request += source[position:]
+        source.release()
+
+        self._encoded_request = encoded_request
+        self._size = len(encoded_request)
+        self._uncompressed = []
+
+    def _publish(self):
+        """Send the messages of an in progress batch in a publish request of
+        its own, and complete the batch with the outcome."""
         # Begin the request to publish these messages.
         # Log how long the underlying request takes.
         start = time.time()
 
-        batch_transport_succeeded = True
+        # gRPC only sends bytes objects. The encoded request is converted once,
+        # releasing the buffer it was built in, and the same object is shared
+        # by the retries and the hedged requests.
+        if not isinstance(self._encoded_request, bytes):
+            self._encoded_request = bytes(self._encoded_request)
+
+        if self._hedged:
+            self._client._hedger.publish(
+                self._topic,
+                self._encoded_request,
+                self._commit_retry,
+                functools.partial(self._on_hedged_publish_done, start),
+            )
+            return
+
         try:
             # Performs retries for errors defined by the retry configuration.
-            response = self._client.api.publish(
-                topic=self._topic, messages=self._messages, retry=self._commit_retry
+            # The batches of an ordered topic are pinned to the channel of the
+            # topic's shared requests.
+            response = self._client._publish_serialized(
+                self._topic,
+                self._encoded_request,
+                retry=self._commit_retry,
+                pinned=self._topic_batcher is not None,
+                ordered=self._ordered,
             )
         except google.api_core.exceptions.GoogleAPIError as exc:
             # We failed to publish, even after retries, so set the exception on
             # all futures and exit.
-            self._status = base.BatchStatus.ERROR
+            self._set_publish_error(exc)
+            return
 
-            for future in self._futures:
-                future.set_exception(exc)
+        self._on_publish_response(start, response)
 
-            batch_transport_succeeded = False
-            if self._batch_done_callback is not None:
-                # Failed to publish batch.
-                self._batch_done_callback(batch_transport_succeeded)
+    def _on_hedged_publish_done(self, start, response, exception):
+        """Complete an in progress batch with the outcome of its hedged
+        publish requests.
 
-            _LOGGER.exception("Failed to publish %s messages.", len(self._futures))
-            return
+        Args:
+            start (float): The time the batch started to be published.
+            response (Optional[~google.pubsub_v1.types.PublishResponse.pb]):
+                The response of the first successful request.
+            exception (Optional[Exception]): The error of the last request,
+                if all of them failed.
+        """
+        if exception is not None:
+            self._set_publish_error(exception)
+        else:
+            self._on_publish_response(start, response)
+
+    def _on_publish_response(self, start, response):
+        """Complete an in progress batch with the response of its publish
+        request.
 
+        Args:
+            start (float): The time the batch started to be published.
+            response (~google.pubsub_v1.types.PublishResponse.pb): The raw
+                protobuf response.
+        """
         end = time.time()
         _LOGGER.debug("gRPC Publish took %s seconds.", end - start)
+        self._client._record_publish_latency(self._topic, end - start)
+
+        self._set_publish_result(response.message_ids)
+
+    @property
+    def _encoded_messages(self):
+        """memoryview: The wire-format ``PublishRequest.messages`` entries of
+        the messages in the batch, i.e. the encoded request without the topic.
+        """
+        return memoryview(self._encoded_request)[self._base_request_size :]
+
+    def _set_publish_error(self, exc):
+        """Complete an in progress batch that failed to be published.
+
+        Args:
+            exc (Exception): The error to set on all of the message futures.
+        """
+        self._status = base.BatchStatus.ERROR
+        self._complete(exc)
+
+        if self._batch_done_callback is not None:
+            # Failed to publish batch.
+            self._batch_done_callback(False)
+
+        _LOGGER.exception("Failed to publish %s messages.", len(self._messages))
 
-        if len(response.message_ids) == len(self._futures):
-            # Iterate over the futures on the queue and return the response
-            # IDs. We are trusting that there is a 1:1 mapping, and raise
-            # an exception if not.
+    def _set_publish_result(self, message_ids):
+        """Complete an in progress batch with the IDs of its published messages.
+
+        Args:
+            message_ids (Sequence[str]): The message IDs returned by the
+                backend, one for each message in the batch, in order.
+        """
+        batch_transport_succeeded = True
+
+        if len(message_ids) == len(self._messages):
+            # The futures look up their message IDs in the response. We are
+            # trusting that there is a 1:1 mapping, and raise an exception if
+            # not.
             self._status = base.BatchStatus.SUCCESS
-            for message_id, future in zip(response.message_ids, self._futures):
-                future.set_result(message_id)
+            self._complete(None, message_ids)
         else:
             # Sanity check: If the number of message IDs is not equal to
-            # the number of futures I have, then something went wrong.
+            # the number of messages I have, then something went wrong.
             self._status = base.BatchStatus.ERROR
             exception = exceptions.PublishError(
                 "Some messages were not successfully published."
             )
-
-            for future in self._futures:
-                future.set_exception(exception)
+            self._complete(exception)
 
             # Unknown error -> batch failed to be correctly transported/
             batch_transport_succeeded = False
 
             _LOGGER.error(
                 "Only %s of %s messages were published.",
-                len(response.message_ids),
-                len(self._futures),
+                len(message_ids),
+                len(self._messages),
             )
 
         if self._batch_done_callback is not None:
             self._batch_done_callback(batch_transport_succeeded)
 
+    def _complete(self, exception, message_ids=None):
+        """Complete the futures of the messages, or notify the client of the
+        outcome in fire-and-forget mode.
+
+        Args:
+            exception (Optional[Exception]): The error to set on all of the
+                message futures, or :data:`None` if the batch succeeded.
+            message_ids (Optional[Sequence[str]]): The message IDs returned by
+                the backend, if the batch succeeded.
+        """
+        if self._fire_and_forget:
+            self._client._on_fire_and_forget_batch_done(
+                self._topic, len(self._messages), self._message_bytes, exception
+            )
+        elif exception is None:
+            self._outcome.set_result(message_ids)
+        else:
+            self._outcome.set_exception(exception)
+
     def publish(self, message):
         """Publish a single message.
 
@@ -318,32 +536,60 @@ class Batch(base.Batch):
         period of time has elapsed. If the batch is full or the commit is
         already in progress, the method does not do anything.
 
-        This method is called by :meth:`~.PublisherClient.publish`.
+        This method is called by :meth:`~.PublisherClient.publish` and
+        :meth:`~.PublisherClient.publish_raw`.
 
         Args:
-            message (~.pubsub_v1.types.PubsubMessage): The Pub/Sub message.
+            message (Union[~.pubsub_v1.types.PubsubMessage, bytes, bytearray, \
+                memoryview]): The Pub/Sub message, or a wire-format
+                ``PubsubMessage``, which is added to the request as it is. A
+                memoryview must be a one-dimensional view of bytes.
 
         Returns:
-            Optional[~google.api_core.future.Future]: An object conforming to
-            the :class:`~concurrent.futures.Future` interface or :data:`None`.
-            If :data:`None` is returned, that signals that the batch cannot
-            accept a message.
+            Optional[~.pubsub_v1.publisher.futures.MessageFuture]: The future
+            of the message or :data:`None`. If :data:`None` is returned, that
+            signals that the batch cannot accept a message. In fire-and-forget
+            mode, the message's future is not created, and :data:`True`
+            signals that the message was accepted.
 
         Raises:
             pubsub_v1.publisher.exceptions.MessageTooLargeError: If publishing
                 the ``message`` would exceed the max size limit on the backend.
         """
 
-        # Coerce the type, just in case.
-        if not isinstance(message, gapic_types.PubsubMessage):
-            # For performance reasons, the message should be constructed by directly
-            # using the raw protobuf class, and only then wrapping it into the
-            # higher-level PubsubMessage class.
-            vanilla_pb = _raw_proto_pubbsub_message(**message)
-            message = gapic_types.PubsubMessage.wrap(vanilla_pb)
+        if isinstance(message, _ENCODED_MESSAGE_TYPES):
+            # Already serialized, the message is spliced into the request
+            # without decoding it.
+            encoded_message = message
+        else:
+            # Coerce the type, just in case.
+            if not isinstance(message, gapic_types.PubsubMessage):
+                # For performance reasons, the message should be constructed by
+                # directly using the raw protobuf class, and only then wrapping
+                # it into the higher-level PubsubMessage class.
+                vanilla_pb = _raw_proto_pubbsub_message(**message)
+                message = gapic_types.PubsubMessage.wrap(vanilla_pb)
+
+            if self._should_compress(message._pb):
+                # Encoded when the batch is committed, see _compress_payloads().
+                encoded_message = None
+            else:
+                # Encode the message only once, outside of the lock.
+                encoded_message = message._pb.SerializeToString()
 
         future = None
 
+        # Add the message as an entry of the PublishRequest.messages field. The
+        # encoded size is exactly what the message adds to the request size.
+        if encoded_message is None:
+            encoded_size = message._pb.ByteSize()
+        else:
+            encoded_size = len(encoded_message)
+        encoded_length = _wire.encode_varint(encoded_size)
+        size_increase = (
+            len(_wire.MESSAGES_FIELD_KEY) + len(encoded_length) + encoded_size
+        )
+
         with self._state_lock:
             assert (
                 self._status != base.BatchStatus.ERROR
@@ -352,34 +598,33 @@ class Batch(base.Batch):
             if self.status != base.BatchStatus.ACCEPTING_MESSAGES:
                 return
 
-            size_increase = gapic_types.PublishRequest(
-                messages=[message]
-            )._pb.ByteSize()
-
-            if (self._base_request_size + size_increase) > _SERVER_PUBLISH_MAX_BYTES:
-                err_msg = (
-                    "The message being published would produce too large a publish "
-                    "request that would exceed the maximum allowed size on the "
-                    "backend ({} bytes).".format(_SERVER_PUBLISH_MAX_BYTES)
-                )
-                raise exceptions.MessageTooLargeError(err_msg)
-
-            new_size = self._size + size_increase
-            new_count = len(self._messages) + 1
-
-            size_limit = min(self.settings.max_bytes, _SERVER_PUBLISH_MAX_BYTES)
-            overflow = new_size > size_limit or new_count >= self.settings.max_messages
+            new_size, overflow = self._size_with(size_increase)
 
             if not self._messages or not overflow:
 
-                # Store the actual message in the batch's message queue.
+                # Store the actual message in the batch's message queue, and
+                # append its encoding to the request.
                 self._messages.append(message)
+                if encoded_message is None:
+                    self._uncompressed.append(
+                        (len(self._encoded_request), message._pb, encoded_size)
+                    )
+                else:
+                    self._encoded_request += _wire.MESSAGES_FIELD_KEY
+                    self._encoded_request += encoded_length
+                    self._encoded_request += encoded_message
                 self._size = new_size
-
-                # Track the future on this batch (so that the result of the
-                # future can be set).
-                future = futures.Future(completed=threading.Event())
-                self._futures.append(future)
+                self._message_bytes += encoded_size
+
+                if self._fire_and_forget:
+                    future = True
+                else:
+                    # Track the future on this batch (it looks up its result
+                    # by its index among the messages).
+                    future = futures.MessageFuture(
+                        self._outcome, len(self._messages) - 1
+                    )
+                    self._futures.append(future)
 
         # Try to commit, but it must be **without** the lock held, since
         # ``commit()`` will try to obtain the lock.
@@ -388,5 +633,232 @@ class Batch(base.Batch):
 
         return future
 
+    def _should_compress(self, message):
+        """Return whether to compress the data of a message.
+
+        Args:
+            message (~.pubsub_v1.types.PubsubMessage.pb): The raw message.
+
+        Returns:
+            bool: Whether payload compression is enabled, and the message is
+            large enough.
+        """
+        return (
+            self._payload_codec is not None
+            and len(message.data) >= self._payload_min_bytes
+        )
+
     def _set_status(self, status):
         self._status = status
+
+    def _set_topic_batcher(self, topic_batcher):
+        self._topic_batcher = topic_batcher
+
+    def _set_ordered(self, ordered):
+        self._ordered = ordered
+
+    def _set_hedged(self, hedged):
+        self._hedged = hedged
+
+    def _set_batch_done_callback(self, batch_done_callback):
+        self._batch_done_callback = batch_done_callback
+
+
+class BulkBatch(Batch):
+    """A batch holding a chunk of the messages of a single
+    :meth:`~.pubsub_v1.publisher.client.Client.publish_many` call.
+
+    The batch is filled with consecutive messages in one go by :meth:`fill`,
+    and does not accept any messages through :meth:`publish`. Instead of a
+    future for each message, the outcome of the batch is reported to the
+    :class:`~.pubsub_v1.publisher.futures.BulkFuture` of the call.
+
+    Args:
+        client (~.pubsub_v1.PublisherClient): The publisher client used to
+            create this batch.
+        topic (str): The topic. The format for this is
+            ``projects/{project}/topics/{topic}``.
+        settings (~.pubsub_v1.types.BatchSettings): The settings limiting the
+            size of the batch.
+        bulk_future (~.pubsub_v1.publisher.futures.BulkFuture): The future
+            tracking all of the messages of the call.
+        offset (int): The index of the batch's first message among the
+            messages of the call.
+        commit_retry (Optional[google.api_core.retry.Retry]): Designation of what
+            errors, if any, should be retried when commiting the batch. If not
+            provided, a default retry is used.
+    """
+
+    def __init__(
+        self,
+        client,
+        topic,
+        settings,
+        bulk_future,
+        offset,
+        commit_retry=gapic_v1.method.DEFAULT,
+    ):
+        super(BulkBatch, self).__init__(
+            client,
+            topic,
+            settings,
+            commit_when_full=False,
+            commit_retry=commit_retry,
+        )
+        self._bulk_future = bulk_future
+        self._offset = offset
+        self._chunk_done_callback = None
+
+    def fill(self, messages, start):
+        """Add consecutive messages to the batch until it is full.
+
+        Args:
+            messages (Sequence[~.pubsub_v1.types.PubsubMessage.pb]): The raw
+                protobuf messages of the call.
+            start (int): The index of the first message to add.
+
+        Returns:
+            int: The index of the first message that was not added.
+
+        Raises:
+            pubsub_v1.publisher.exceptions.MessageTooLargeError: If the first
+                message to add would exceed the max size limit on the backend.
+        """
+        size_limit = min(self.settings.max_bytes, base.SERVER_PUBLISH_MAX_BYTES)
+        max_messages = max(self.settings.max_messages, 1)
+        max_message_size = base.SERVER_PUBLISH_MAX_BYTES - self._base_request_size
+
+        batch_messages = self._messages
+        encoded_request = self._encoded_request
+        size = self._size
+        message_bytes = self._message_bytes
+
+        index = start
+        while index < len(messages) and len(batch_messages) < max_messages:
+            message = messages[index]
+            if self._should_compress(message):
+                encoded_message = None
+                encoded_size = message.ByteSize()
+            else:
+                encoded_message = message.SerializeToString()
+                encoded_size = len(encoded_message)
+            encoded_length = _wire.encode_varint(encoded_size)
+            size_increase = (
+                len(_wire.MESSAGES_FIELD_KEY) + len(encoded_length) + encoded_size
+            )
+
+            if batch_messages and size + size_increase > size_limit:
+                break
+
+            if size_increase > max_message_size:
+                if batch_messages:
+                    break
+                raise base.message_too_large_error()
+
+            batch_messages.append(message)
+            if encoded_message is None:
+                self._uncompressed.append((len(encoded_request), message, encoded_size))
+            else:
+                encoded_request += _wire.MESSAGES_FIELD_KEY
+                encoded_request += encoded_length
+                encoded_request += encoded_message
+            size += size_increase
+            message_bytes += encoded_size
+            index += 1
+
+        self._size = size
+        self._message_bytes = message_bytes
+        return index
+
+    def publish(self, message):
+        """Reject a single message, the batch only holds the messages added
+        by :meth:`fill`.
+
+        Returns:
+            None: Signals that the batch cannot accept a message.
+        """
+        return None
+
+    def cancel(self, cancellation_reason):
+        """Fail the messages of the batch.
+
+        This method must be called before publishing starts (ie: while the
+        batch is still accepting messages.)
+
+        Args:
+            cancellation_reason (BatchCancellationReason): The reason why this
+                batch has been cancelled.
+        """
+        with self._state_lock:
+            assert (
+                self._status == base.BatchStatus.ACCEPTING_MESSAGES
+            ), "Cancel should not be called after sending has started."
+            self._status = base.BatchStatus.ERROR
+
+        self._fail_chunk(RuntimeError(cancellation_reason.value))
+
+    def _set_publish_error(self, exc):
+        """Complete an in progress batch that failed to be published.
+
+        Args:
+            exc (Exception): The error to report for the messages.
+        """
+        self._status = base.BatchStatus.ERROR
+        self._fail_chunk(exc)
+
+        if self._batch_done_callback is not None:
+            # Failed to publish batch.
+            self._batch_done_callback(False)
+
+        _LOGGER.exception("Failed to publish %s messages.", len(self._messages))
+
+    def _set_publish_result(self, message_ids):
+        """Complete an in progress batch with the IDs of its published messages.
+
+        Args:
+            message_ids (Sequence[str]): The message IDs returned by the
+                backend, one for each message in the batch, in order.
+        """
+        batch_transport_succeeded = True
+
+        if len(message_ids) == len(self._messages):
+            self._status = base.BatchStatus.SUCCESS
+            self._bulk_future._set_chunk_result(self._offset, message_ids)
+            self._on_chunk_done()
+        else:
+            # Sanity check: If the number of message IDs is not equal to
+            # the number of messages, then something went wrong.
+            self._status = base.BatchStatus.ERROR
+            self._fail_chunk(
+                exceptions.PublishError(
+                    "Some messages were not successfully published."
+                )
+            )
+
+            # Unknown error -> batch failed to be correctly transported/
+            batch_transport_succeeded = False
+
+            _LOGGER.error(
+                "Only %s of %s messages were published.",
+                len(message_ids),
+                len(self._messages),
+            )
+
+        if self._batch_done_callback is not None:
+            self._batch_done_callback(batch_transport_succeeded)
+
+    def _fail_chunk(self, exc):
+        """Report the messages of the batch as failed.
+
+        Args:
+            exc (Exception): The error to report for the messages.
+        """
+        self._bulk_future._set_chunk_exception(self._offset, len(self._messages), exc)
+        self._on_chunk_done()
+
+    def _on_chunk_done(self):
+        if self._chunk_done_callback is not None:
+            self._chunk_done_callback()
+
+    def _set_chunk_done_callback(self, chunk_done_callback):
+        self._chunk_done_callback = chunk_done_callback
@@ -0,0 +1,190 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import threading
+import time
+
+import google.api_core.exceptions
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher._batch import base
+from google.pubsub_v1 import types as gapic_types
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class OrderedTopicBatcher(object):
+    """Packs committed batches of different ordering keys of a topic into
+    shared publish requests.
+
+    Every ordering key has its own :class:`~.OrderedSequencer` with its own
+    batches, and at most one of them is being published at any time. When
+    many ordering keys are used, these batches tend to be tiny. Instead of
+    sending a request for each of them, the sequencers hand their committed
+    head batches over to the topic batcher, which sends all batches that are
+    ready in as few requests as possible. The messages of a batch are kept
+    together and in order, thus the ordering guarantees are unaffected.
+
+    If a shared request fails (after retries), each of the batches in it is
+    re-sent in a request of its own, so that an error caused by a single
+    ordering key only pauses that ordering key.
+
+    Args:
+        client (~.pubsub_v1.PublisherClient): The publisher client.
+        topic (str): The topic. The format for this is
+            ``projects/{project}/topics/{topic}``.
+    """
+
+    def __init__(self, client, topic):
+        self._client = client
+        self._topic = topic
+        self._base_request_size = gapic_types.PublishRequest(topic=topic)._pb.ByteSize()
+
+        # Guards the variables below.
+        self._lock = threading.Lock()
+        # Committed batches waiting to be sent, from first to last.
+        self._ready = collections.deque()
+        # Whether a send of the ready batches has been submitted to the commit
+        # executor, but has not picked up the ready batches yet.
+        self._send_scheduled = False
+
+    def add(self, batch):
+        """Add a committed batch to be sent with the next request.
+
+        Args:
+            batch (~.pubsub_v1.publisher._batch.thread.Batch): A batch in the
+                "starting" status.
+        """
+        with self._lock:
+            self._ready.append(batch)
+            if self._send_scheduled:
+                return
+            self._send_scheduled = True
+
+        self._client._commit_executor.submit(self._topic, self._send)
+
+    def _take_ready_batches(self):
+        """Take as many ready batches as fit in a single publish request.
+
+        At least one batch is always taken. While the commit executor is busy,
+        the ready batches accumulate and end up in the same request.
+
+        Returns:
+            List[~.pubsub_v1.publisher._batch.thread.Batch]: The batches.
+        """
+        settings = self._client._get_topic_settings(self._topic).batch_settings
+        size_limit = min(settings.max_bytes, base.SERVER_PUBLISH_MAX_BYTES)
+
+        batches = []
+        size = self._base_request_size
+        count = 0
+
+        with self._lock:
+            while self._ready:
+                batch = self._ready[0]
+                new_size = size + batch.size - batch._base_request_size
+                new_count = count + len(batch.messages)
+                overflow = new_size > size_limit or new_count > settings.max_messages
+                if batches and overflow:
+                    break
+
+                batches.append(self._ready.popleft())
+                size = new_size
+                count = new_count
+
+            if not self._ready:
+                self._send_scheduled = False
+                resubmit = False
+            else:
+                # The send stays scheduled for the remaining batches.
+                resubmit = True
+
+        if resubmit:
+            self._client._commit_executor.submit(self._topic, self._send)
+
+        return batches
+
+    def _send(self):
+        """Send the ready batches in a shared publish request and complete
+        each of them with the outcome."""
+        batches = [
+            batch for batch in self._take_ready_batches() if batch._start_publish()
+        ]
+        if not batches:
+            return
+        if len(batches) == 1:
+            batches[0]._publish()
+            return
+
+        # The shared request is assembled as bytes right away, gRPC only sends
+        # bytes objects.
+        request = b"".join(
+            [gapic_types.PublishRequest(topic=self._topic)._pb.SerializeToString()]
+            + [batch._encoded_messages for batch in batches]
+        )
+
+        # All batches of an ordered topic are created with the same retry
+        # settings, unless a custom retry is passed to publish(). The oldest
+        # batch decides in that case.
+        retry = batches[0]._commit_retry
+        start = time.time()
+
+        try:
+            # The requests are pinned to a single channel, so that they cannot
+            # overtake each other on the way to the backend.
+            response = self._client._publish_serialized(
+                self._topic, request, retry=retry, pinned=True, ordered=True
+            )
+        except google.api_core.exceptions.GoogleAPIError:
+            _LOGGER.warning(
+                "Failed to publish %s batches in a shared request, "
+                "re-sending each batch separately.",
+                len(batches),
+                exc_info=True,
+            )
+            for batch in batches:
+                self._client._commit_executor.submit(self._topic, batch._publish)
+            return
+
+        end = time.time()
+        _LOGGER.debug(
+            "gRPC Publish of %s batches took %s seconds.", len(batches), end - start
+        )
+        self._client._record_publish_latency(self._topic, end - start)
+
+        message_ids = response.message_ids
+        message_count = sum(len(batch.messages) for batch in batches)
+        if len(message_ids) != message_count:
+            # There is no way to tell which message IDs belong to which batch.
+            _LOGGER.error(
+                "Only %s of %s messages were published.",
+                len(message_ids),
+                message_count,
+            )
+            exc = exceptions.PublishError(
+                "Some messages were not successfully published."
+            )
+            for batch in batches:
+                batch._set_publish_error(exc)
+            return
+
+        offset = 0
+        for batch in batches:
+            count = len(batch.messages)
+            batch._set_publish_result(message_ids[offset : offset + count])
+            offset += count
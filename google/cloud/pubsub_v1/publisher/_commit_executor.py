@@ -0,0 +1,194 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import threading
+import time
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# The seconds a worker thread waits for a new commit before it exits.
+_DEFAULT_IDLE_TIMEOUT = 10.0
+
+
+class CommitExecutor(object):
+    """A bounded pool of worker threads that run batch commits.
+
+    The pool is shared by all batches of a publisher client. At most
+    ``max_workers`` commits run concurrently, and at most
+    ``max_workers_per_topic`` of them may belong to the same topic. Commits
+    that cannot start yet are queued in FIFO order (per topic) and started as
+    soon as capacity frees up.
+
+    Worker threads are created lazily, up to the limit, and are daemon threads
+    so that they do not block the interpreter shutdown (the same as the
+    per-batch commit threads that were used before). A worker that has had
+    nothing to do for ``idle_timeout`` seconds exits, so that the threads
+    started for a burst of commits do not linger once it is over.
+
+    Args:
+        max_workers (Optional[int]): The maximum number of commits running at
+            the same time. If not given, the number is unbounded, and each
+            commit starts right away, unless the per-topic limit holds it back.
+        max_workers_per_topic (Optional[int]): The maximum number of commits
+            running at the same time for a single topic. If not given, only
+            the ``max_workers`` limit applies.
+        idle_timeout (float): The seconds an idle worker thread waits for a
+            new commit before it exits.
+    """
+
+    def __init__(
+        self,
+        max_workers=None,
+        max_workers_per_topic=None,
+        idle_timeout=_DEFAULT_IDLE_TIMEOUT,
+    ):
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be at least 1.")
+        if max_workers_per_topic is None:
+            max_workers_per_topic = max_workers
+        if max_workers_per_topic is not None and max_workers_per_topic < 1:
+            raise ValueError("max_workers_per_topic must be at least 1.")
+        if idle_timeout <= 0:
+            raise ValueError("idle_timeout must be positive.")
+
+        self._max_workers = max_workers
+        self._max_workers_per_topic = max_workers_per_topic
+        self._idle_timeout = idle_timeout
+
+        # Guards all of the variables below.
+        self._lock = threading.Lock()
+        self._has_work = threading.Condition(lock=self._lock)
+
+        # Commits that are ready to run, in FIFO order, as (topic, callback).
+        self._ready = collections.deque()
+        # topic => number of commits either ready to run or running.
+        self._active_per_topic = {}
+        # topic => deque of callbacks waiting for the per-topic limit.
+        self._waiting_per_topic = {}
+
+        self._num_workers = 0
+        self._num_idle = 0
+        self._shutdown = False
+
+    @property
+    def max_workers(self):
+        """Optional[int]: The maximum number of concurrently running commits,
+        unbounded if :data:`None`."""
+        return self._max_workers
+
+    @property
+    def max_workers_per_topic(self):
+        """Optional[int]: The maximum number of concurrently running commits
+        per topic, unbounded if :data:`None`."""
+        return self._max_workers_per_topic
+
+    def submit(self, topic, callback):
+        """Schedule a commit callback to run on one of the worker threads.
+
+        Args:
+            topic (str): The topic the commit belongs to. Used for enforcing
+                the per-topic concurrency limit.
+            callback (Callable[[], Any]): The function performing the commit.
+        """
+        with self._lock:
+            active = self._active_per_topic.get(topic, 0)
+            if (
+                self._max_workers_per_topic is not None
+                and active >= self._max_workers_per_topic
+            ):
+                waiting = self._waiting_per_topic.setdefault(topic, collections.deque())
+                waiting.append(callback)
+                return
+
+            self._active_per_topic[topic] = active + 1
+            self._ready.append((topic, callback))
+            self._ensure_worker_no_lock()
+            self._has_work.notify()
+
+    def shutdown(self):
+        """Let the worker threads exit once all the submitted work is done.
+
+        This method does not block. Commits that have already been submitted
+        are still executed. Submitting new commits after shutdown is allowed,
+        workers are then started again on demand.
+        """
+        with self._lock:
+            self._shutdown = True
+            self._has_work.notify_all()
+
+    def _ensure_worker_no_lock(self):
+        """Start a new worker thread if the ready commits outnumber the idle
+        workers and the worker limit has not been reached yet.
+
+        ``_lock`` must be held before calling this method.
+        """
+        if len(self._ready) > self._num_idle and (
+            self._max_workers is None or self._num_workers < self._max_workers
+        ):
+            self._num_workers += 1
+            worker = threading.Thread(
+                name="Thread-CommitBatchPublisher", target=self._work, daemon=True
+            )
+            worker.start()
+
+    def _work(self):
+        """Run ready commits until there is no more work after shutdown, or
+        for the idle timeout."""
+        while True:
+            with self._lock:
+                deadline = time.monotonic() + self._idle_timeout
+                while not self._ready and not self._shutdown:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._num_idle += 1
+                    self._has_work.wait(timeout)
+                    self._num_idle -= 1
+
+                if not self._ready:
+                    self._num_workers -= 1
+                    return
+
+                topic, callback = self._ready.popleft()
+
+            try:
+                callback()
+            except Exception:
+                _LOGGER.exception("Unexpected error while committing a batch.")
+            finally:
+                self._on_commit_done(topic)
+
+    def _on_commit_done(self, topic):
+        """Release the topic's slot, or hand it over to the next waiting commit
+        of the same topic."""
+        with self._lock:
+            waiting = self._waiting_per_topic.get(topic)
+            if waiting:
+                # The slot is handed over directly, the active count for the
+                # topic stays the same.
+                self._ready.append((topic, waiting.popleft()))
+                if not waiting:
+                    del self._waiting_per_topic[topic]
+                return
+
+            active = self._active_per_topic[topic] - 1
+            if active:
+                self._active_per_topic[topic] = active
+            else:
+                del self._active_per_topic[topic]
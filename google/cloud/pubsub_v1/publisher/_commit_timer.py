@@ -0,0 +1,117 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CommitTimer(object):
+    """Run callbacks once their deadlines expire, using a single thread.
+
+    The publisher client uses the timer to commit each batch exactly
+    ``max_latency`` seconds after the batch received its first message. The
+    pending deadlines are kept in a min-heap, thus the timer thread only ever
+    touches the entries that are due.
+
+    The timer thread is started lazily on the first scheduled callback and
+    then lives until :meth:`stop` is called. Callbacks are invoked on the
+    timer thread and should therefore return quickly.
+    """
+
+    def __init__(self):
+        # Guards all of the variables below.
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(lock=self._lock)
+
+        # A heap of (deadline, sequence number, callback). The sequence number
+        # breaks ties, so that the callbacks themselves are never compared.
+        self._heap = []
+        self._counter = itertools.count()
+        self._thread = None
+        self._stopped = False
+
+    def __len__(self):
+        """Return the number of callbacks waiting for their deadline."""
+        return len(self._heap)
+
+    def schedule(self, delay, callback):
+        """Schedule a callback to run after the given delay.
+
+        Args:
+            delay (float): The number of seconds to wait before invoking the
+                callback. If infinite, the callback is never invoked.
+            callback (Callable[[], Any]): The function to call.
+        """
+        if math.isinf(delay):
+            return
+
+        deadline = time.monotonic() + max(0, delay)
+
+        with self._lock:
+            if self._stopped:
+                return
+
+            entry = (deadline, next(self._counter), callback)
+            heapq.heappush(self._heap, entry)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    name="Thread-PubSubBatchCommitter", target=self._run, daemon=True
+                )
+                self._thread.start()
+            elif self._heap[0] is entry:
+                # The new deadline is the earliest one, the timer thread must
+                # re-adjust its sleep time.
+                self._wakeup.notify()
+
+    def stop(self):
+        """Stop the timer thread and drop all pending callbacks."""
+        with self._lock:
+            self._stopped = True
+            self._heap = []
+            self._wakeup.notify()
+
+    def _run(self):
+        """Wait for the earliest deadline and invoke the callbacks that are due."""
+        while True:
+            with self._lock:
+                while True:
+                    if self._stopped:
+                        return
+
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        break
+
+                    timeout = self._heap[0][0] - now if self._heap else None
+                    self._wakeup.wait(timeout=timeout)
+
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+
+            for callback in due:
+                try:
+                    callback()
+                except Exception:
+                    _LOGGER.exception("Error invoking a commit timer callback.")
@@ -0,0 +1,209 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import functools
+import threading
+
+from google.api_core import gapic_v1
+from google.cloud.pubsub_v1 import _envelopes
+from google.cloud.pubsub_v1.publisher import futures
+from google.pubsub_v1 import types as gapic_types
+
+
+_raw_proto_pubsub_message = gapic_types.PubsubMessage.pb()
+
+
+class EnvelopePacker(object):
+    """Packs the messages published to a topic with an ordering key into
+    envelope messages, see :mod:`~google.cloud.pubsub_v1._envelopes`.
+
+    An envelope is published once it reaches the maximum size or number of
+    records of the packing settings, or once its maximum latency expires. The
+    records of an envelope share its future.
+
+    The envelopes are handed over to the client's sequencer while holding the
+    packer's lock, thus they are published in order. The caller is responsible
+    for the flow control of the records, the packer releases it once their
+    envelope is published.
+
+    Args:
+        client (~.pubsub_v1.publisher.client.Client): The publisher client.
+        topic (str): The topic the envelopes are published to.
+        ordering_key (str): The ordering key of the envelopes.
+        settings (~.pubsub_v1.types.EnvelopePackingSettings): The packing
+            settings.
+    """
+
+    def __init__(self, client, topic, ordering_key, settings):
+        self._client = client
+        self._topic = topic
+        self._ordering_key = ordering_key
+        self._settings = settings
+
+        # Guards all of the variables below.
+        self._lock = threading.Lock()
+
+        # The raw protobuf records of the current envelope.
+        self._records = []
+        # The size of the current envelope's data.
+        self._size = 0
+        # The flow controlled bytes of the current envelope's records.
+        self._record_bytes = 0
+        # The future shared by the records of the current envelope.
+        self._future = None
+        # Incremented for each envelope, so that the latency timer only
+        # publishes the envelope it was scheduled for.
+        self._generation = 0
+        # Whether the packer no longer accepts records, because the client
+        # was stopped or the packer was removed from the client.
+        self._stopped = False
+        self._retired = False
+
+    def pack(self, record, record_size):
+        """Add a record to the current envelope.
+
+        Args:
+            record (~.pubsub_v1.types.PubsubMessage.pb): The raw protobuf
+                record.
+            record_size (int): The size of the serialized record.
+
+        Returns:
+            Optional[~google.cloud.pubsub_v1.publisher.futures.Future]: The
+            future of the record's envelope, or :data:`None` if the packer
+            was removed from the client, and the record must be packed by a
+            new packer instead.
+
+        Raises:
+            RuntimeError: If the client was stopped.
+        """
+        framed_size = _envelopes.framed_size(record_size)
+
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("Cannot publish on a stopped publisher.")
+            if self._retired:
+                return None
+
+            if self._records and self._size + framed_size > self._settings.max_bytes:
+                self._publish_envelope()
+
+            if not self._records:
+                self._future = futures.Future()
+                self._client._schedule_commit(
+                    self._settings.max_latency,
+                    functools.partial(self._on_latency_expired, self._generation),
+                )
+
+            self._records.append(record)
+            self._size += framed_size
+            self._record_bytes += record_size
+            future = self._future
+
+            if len(self._records) >= self._settings.max_records:
+                self._publish_envelope()
+
+        return future
+
+    def publish_unpacked(self, message, retry, urgent=False):
+        """Publish the current envelope, followed by a message that is not
+        packed, thus preserving the publishing order.
+
+        Args:
+            message (~.pubsub_v1.types.PubsubMessage): The message.
+            retry (Optional[google.api_core.retry.Retry]): The retry settings
+                of the message.
+            urgent (bool): Whether to commit the message's batch right away.
+
+        Returns:
+            ~google.cloud.pubsub_v1.publisher.futures.Future: The future of
+            the message.
+
+        Raises:
+            RuntimeError: If the client was stopped.
+        """
+        with self._lock:
+            self._publish_envelope()
+            return self._client._publish_to_sequencer(
+                self._topic, message, self._ordering_key, retry, urgent
+            )
+
+    def flush(self):
+        """Publish the current envelope, if any."""
+        with self._lock:
+            self._publish_envelope()
+
+    def stop(self):
+        """Publish the current envelope, and reject any further records."""
+        with self._lock:
+            self._stopped = True
+            self._publish_envelope()
+
+    def _on_latency_expired(self, generation):
+        """Publish the envelope the latency timer was scheduled for, and
+        remove the idle packer from the client."""
+        with self._lock:
+            if generation == self._generation:
+                self._publish_envelope()
+            if not self._records:
+                self._retired = self._client._remove_envelope_packer(
+                    self._topic, self._ordering_key, self
+                )
+
+    def _publish_envelope(self):
+        """Hand the current envelope over to the client's sequencer.
+
+        The method assumes the caller has acquired the ``_lock``.
+        """
+        if not self._records:
+            return
+
+        records = self._records
+        record_bytes = self._record_bytes
+        future = self._future
+        self._records = []
+        self._size = 0
+        self._record_bytes = 0
+        self._future = None
+        self._generation += 1
+
+        envelope = _raw_proto_pubsub_message(
+            data=_envelopes.encode(records),
+            ordering_key=self._ordering_key,
+            attributes={_envelopes.ENVELOPE_ATTRIBUTE: _envelopes.FORMAT_VERSION},
+        )
+
+        flow_controller = self._client._get_topic_settings(self._topic).flow_controller
+        try:
+            envelope_future = self._client._publish_to_sequencer(
+                self._topic,
+                gapic_types.PubsubMessage.wrap(envelope),
+                self._ordering_key,
+                gapic_v1.method.DEFAULT,
+            )
+        except Exception as exc:
+            flow_controller._release_many(len(records), record_bytes)
+            future.set_exception(exc)
+            return
+
+        def on_envelope_done(envelope_future):
+            flow_controller._release_many(len(records), record_bytes)
+            exception = envelope_future.exception()
+            if exception is None:
+                future.set_result(envelope_future.result())
+            else:
+                future.set_exception(exception)
+
+        envelope_future.add_done_callback(on_envelope_done)
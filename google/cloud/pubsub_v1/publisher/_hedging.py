@@ -0,0 +1,338 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import collections
+from concurrent import futures
+import functools
+import logging
+import threading
+
+from google.cloud.pubsub_v1.publisher import _commit_timer
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# The number of recent request latencies the hedge delay is computed from.
+_LATENCY_WINDOW = 1000
+
+# The number of latencies to observe before hedging any request.
+_MIN_LATENCY_SAMPLES = 20
+
+# The hedge delay is recomputed once for this many new latencies, instead of
+# sorting the window on every request.
+_DELAY_UPDATE_INTERVAL = 50
+
+# The maximum number of hedged requests that can be sent in a burst, after a
+# period with few hedges.
+_MAX_HEDGE_CREDITS = 10.0
+
+
+class _HedgedRequest(object):
+    """The attempts of sending a publish request, the first of which to
+    succeed completes the request.
+
+    A failed attempt only completes the request if no other attempt is in
+    progress, thus the error of the last attempt to fail is reported if they
+    all fail.
+
+    Args:
+        callback (Callable[[Any, Optional[Exception]], Any]): Invoked once
+            with the response and the error of the request.
+    """
+
+    def __init__(self, callback):
+        self._callback = callback
+
+        # Guards all of the variables below.
+        self._lock = threading.Lock()
+        # The number of attempts in progress.
+        self._pending = 1
+        self._done = False
+        self._exception = None
+
+    @property
+    def done(self):
+        """bool: Whether the request is complete."""
+        return self._done
+
+    def add_attempt(self):
+        """Count a new attempt as in progress, if the request is not complete.
+
+        Returns:
+            bool: Whether the attempt should be made.
+        """
+        with self._lock:
+            if self._done:
+                return False
+            self._pending += 1
+            return True
+
+    def attempt(self, send):
+        """Make an attempt, and complete the request with its outcome if
+        possible.
+
+        Args:
+            send (Callable[[], Any]): Sends the request, and returns the
+                response.
+        """
+        try:
+            response = send()
+        except Exception as exc:
+            self._finish_attempt(None, exc)
+        else:
+            self._finish_attempt(response, None)
+
+    def cancel_attempt(self):
+        """Give up an attempt counted by :meth:`add_attempt` before making it."""
+        self._finish_attempt(None, None)
+
+    def _finish_attempt(self, response, exception):
+        with self._lock:
+            self._pending -= 1
+            if exception is not None:
+                self._exception = exception
+            if self._done:
+                return
+            if response is None:
+                if self._pending or self._exception is None:
+                    return
+                exception = self._exception
+            self._done = True
+        self._callback(response, exception)
+
+
+class PublishHedger(object):
+    """Sends a second copy of the publish requests that take longer than most
+    of the recent requests.
+
+    A request is hedged once it has been in progress for longer than the
+    configured percentile of the latencies of the recent requests. The hedged
+    request is sent from a thread pool of its own, and over the least loaded
+    channel if the client has a pool of channels, which is typically not the
+    channel of the slow request. The first successful response completes the
+    request, the other response is ignored.
+
+    The number of hedged requests is capped: each request adds
+    ``max_hedge_ratio`` hedge credits, up to a small burst, and each hedge
+    takes a full credit.
+
+    The hedges are scheduled on a timer of the hedger, not on the commit timer
+    of the client, so that the requests still in progress when the client is
+    stopped are hedged, too. The timer and the thread pool are started on
+    demand, and shut down once the hedger is stopped and no request is in
+    progress.
+
+    Args:
+        client (~.pubsub_v1.publisher.client.Client): The publisher client.
+        settings (~.pubsub_v1.types.HedgingSettings): The hedging settings.
+        max_outstanding_hedges (Optional[int]): The maximum number of hedged
+            requests in progress at any time, the size of the thread pool. If
+            :data:`None`, only the hedge credits cap the hedged requests.
+    """
+
+    def __init__(self, client, settings, max_outstanding_hedges):
+        if not 0 < settings.latency_percentile <= 100:
+            raise ValueError("latency_percentile must be within (0, 100].")
+        if not 0 <= settings.max_hedge_ratio <= 1:
+            raise ValueError("max_hedge_ratio must be within [0, 1].")
+        if settings.min_delay < 0:
+            raise ValueError("min_delay must not be negative.")
+
+        self._client = client
+        self._settings = settings
+        self._max_outstanding_hedges = max_outstanding_hedges
+
+        # Guards all of the variables below.
+        self._lock = threading.Lock()
+        # The timer and the thread pool of the hedges, None unless started.
+        self._timer = None
+        self._executor = None
+        # The number of requests sent by publish() and still in progress.
+        self._requests_in_progress = 0
+        self._stopped = False
+        self._latencies = collections.deque(maxlen=_LATENCY_WINDOW)
+        self._new_latencies = 0
+        # The delay after which a request is hedged, None until enough
+        # latencies were observed.
+        self._delay = None
+        self._credits = 0.0
+        self._outstanding_hedges = 0
+
+    @property
+    def delay(self):
+        """Optional[float]: The number of seconds after which a request in
+        progress is hedged, if known yet."""
+        return self._delay
+
+    def record_latency(self, latency):
+        """Record the duration of a successful publish request.
+
+        Args:
+            latency (float): The duration of the request, in seconds.
+        """
+        with self._lock:
+            self._latencies.append(latency)
+            self._new_latencies += 1
+            if len(self._latencies) < _MIN_LATENCY_SAMPLES or (
+                self._delay is not None and self._new_latencies < _DELAY_UPDATE_INTERVAL
+            ):
+                return
+
+            latencies = sorted(self._latencies)
+            index = int(len(latencies) * self._settings.latency_percentile / 100)
+            self._delay = max(
+                latencies[min(index, len(latencies) - 1)], self._settings.min_delay
+            )
+            self._new_latencies = 0
+
+    def publish(self, topic, request, retry, callback):
+        """Send a publish request, and hedge it if it is slow.
+
+        The method blocks until the request sent from the calling thread
+        completes, even if a hedged request completed first.
+
+        Args:
+            topic (str): The topic the request publishes to.
+            request (bytes): The wire-format ``PublishRequest``.
+            retry (Optional[google.api_core.retry.Retry]): The retry settings
+                of the request.
+            callback (Callable[[Any, Optional[Exception]], Any]): Invoked once
+                with the raw protobuf response and the error of the first
+                successful request, or of the last failed request if all of
+                them failed.
+        """
+        with self._lock:
+            self._credits = min(
+                self._credits + self._settings.max_hedge_ratio, _MAX_HEDGE_CREDITS
+            )
+            delay = self._delay
+            self._requests_in_progress += 1
+            if delay is not None:
+                self._start_no_lock()
+            timer = self._timer
+
+        send = functools.partial(
+            self._client._publish_serialized, topic, request, retry=retry
+        )
+        hedged_request = _HedgedRequest(callback)
+        try:
+            if delay is not None:
+                timer.schedule(
+                    delay, functools.partial(self._hedge, send, hedged_request)
+                )
+            hedged_request.attempt(send)
+        finally:
+            self._on_request_done()
+
+    def _start_no_lock(self):
+        """Start the timer and the thread pool of the hedges, if needed.
+
+        ``_lock`` must be held before calling this method.
+        """
+        if self._timer is not None:
+            return
+        self._timer = _commit_timer.CommitTimer()
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=self._max_outstanding_hedges,
+            thread_name_prefix="Thread-HedgedBatchPublisher",
+        )
+
+    def _on_request_done(self):
+        with self._lock:
+            self._requests_in_progress -= 1
+            if not self._stopped or self._requests_in_progress:
+                return
+            timer, executor = self._shutdown_no_lock()
+        self._shutdown(timer, executor)
+
+    def _hedge(self, send, hedged_request):
+        """Send a hedged request, if the original request is still in progress
+        and the hedging budget allows it.
+
+        Args:
+            send (Callable[[], Any]): Sends the request.
+            hedged_request (_HedgedRequest): The request.
+        """
+        with self._lock:
+            executor = self._executor
+            if (
+                executor is None
+                or hedged_request.done
+                or self._credits < 1
+                or (
+                    self._max_outstanding_hedges is not None
+                    and self._outstanding_hedges >= self._max_outstanding_hedges
+                )
+            ):
+                return
+            if not hedged_request.add_attempt():
+                return
+            self._credits -= 1
+            self._outstanding_hedges += 1
+
+        _LOGGER.debug("Hedging a publish request in progress for too long.")
+        try:
+            executor.submit(self._send_hedge, send, hedged_request)
+        except RuntimeError:
+            # The client was stopped in the meantime.
+            self._on_hedge_done()
+            hedged_request.cancel_attempt()
+
+    def _send_hedge(self, send, hedged_request):
+        try:
+            hedged_request.attempt(send)
+        finally:
+            self._on_hedge_done()
+
+    def _on_hedge_done(self):
+        with self._lock:
+            self._outstanding_hedges -= 1
+
+    def stop(self):
+        """Stop the hedger once the requests in progress are done.
+
+        This method does not block. The requests in progress, and the requests
+        sent afterwards, e.g. by the batches committed when the client stops,
+        are still hedged.
+        """
+        with self._lock:
+            self._stopped = True
+            if self._requests_in_progress:
+                return
+            timer, executor = self._shutdown_no_lock()
+        self._shutdown(timer, executor)
+
+    def _shutdown_no_lock(self):
+        """Detach the timer and the thread pool of the hedges.
+
+        ``_lock`` must be held before calling this method.
+
+        Returns:
+            Tuple[Optional[~.pubsub_v1.publisher._commit_timer.CommitTimer], \
+                Optional[concurrent.futures.ThreadPoolExecutor]]: The timer
+            and the thread pool to shut down, if started.
+        """
+        timer, executor = self._timer, self._executor
+        self._timer = self._executor = None
+        return timer, executor
+
+    @staticmethod
+    def _shutdown(timer, executor):
+        # The pending hedges belong to requests that are done.
+        if timer is not None:
+            timer.stop()
+        if executor is not None:
+            executor.shutdown(wait=False)
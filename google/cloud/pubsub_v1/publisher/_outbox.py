@@ -0,0 +1,739 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A durable outbox of the messages to publish, backed by a write-ahead log.
+
+The log is a sequence of segment files in the outbox directory, named after
+their index. Each segment is preallocated, memory-mapped, and starts with a
+header, the offset up to which its records were published (acked). The
+header is followed by a sequence of records, each of them a header (the
+length and the CRC-32 of the payload) followed by the payload: the lengths of
+the topic and of the ordering key, the topic, the ordering key and the
+wire-format ``PubsubMessage``. A zero length marks the end of the records of a
+segment.
+
+Records are only ever appended. A segment is deleted once all of its records
+are published, and once a newer segment is being written to. The segments
+left over by a previous process are replayed, their records after the acked
+offset are published again. The acked offset is not flushed to disk, it
+survives the process but not necessarily the system crashing, in which case
+more records are published again.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import errno
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+
+from google.api_core import gapic_v1
+from google.cloud.pubsub_v1.publisher import exceptions
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# The offset up to which the records of a segment were published.
+_SEGMENT_HEADER = struct.Struct("<Q")
+# The length and the CRC-32 of the payload of a record.
+_RECORD_HEADER = struct.Struct("<II")
+# The lengths of the topic and the ordering key of an entry.
+_ENTRY_HEADER = struct.Struct("<HH")
+
+_SEGMENT_NAME = "{:020d}.outbox"
+_SEGMENT_NAME_PATTERN = re.compile(r"^(\d{20})\.outbox$")
+
+OutboxEntry = collections.namedtuple(
+    "OutboxEntry", ["sequence", "segment", "topic", "ordering_key", "message"]
+)
+OutboxEntry.__doc__ = "A message read from the outbox log."
+OutboxEntry.sequence.__doc__ = "The position of the entry in the log."
+OutboxEntry.segment.__doc__ = "The segment holding the entry."
+OutboxEntry.topic.__doc__ = "The topic to publish the message to."
+OutboxEntry.ordering_key.__doc__ = "The ordering key of the message."
+OutboxEntry.message.__doc__ = "The wire-format ``PubsubMessage``."
+
+
+class _Segment(object):
+    """A memory-mapped segment file of the log.
+
+    Args:
+        path (str): The path of the file.
+        fd (int): The file descriptor, open for reading and writing.
+        capacity (int): The size of the file.
+    """
+
+    def __init__(self, path, fd, capacity):
+        self.path = path
+        self.fd = fd
+        self.capacity = capacity
+        self.map = mmap.mmap(fd, capacity)
+        # The offset of the first record to read.
+        self.start = _SEGMENT_HEADER.size
+        # The offset after the last record.
+        self.end = self.start
+        # The offset up to which the records were flushed to disk.
+        self.flushed = self.start
+        # The number of records, and the number of them that were published.
+        self.entries = 0
+        self.acked = 0
+        # The sequence numbers and the end offsets of the records read and
+        # not covered by the acked offset yet, in order, and the sequence
+        # numbers of those of them that were published.
+        self.reads = collections.deque()
+        self.acked_reads = set()
+        # Whether no more records are appended to the segment.
+        self.sealed = False
+
+    def set_acked_offset(self, offset):
+        """Record the offset up to which the records were published."""
+        _SEGMENT_HEADER.pack_into(self.map, 0, offset)
+
+    def flush(self, start, end):
+        """Flush a range of the segment to disk."""
+        start -= start % mmap.ALLOCATIONGRANULARITY
+        self.map.flush(start, end - start)
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+
+class SegmentLog(object):
+    """An append-only log of the messages to publish, in memory-mapped
+    segment files, see the module docstring.
+
+    The log is not thread-safe, the caller is responsible for locking, except
+    for flushing the ranges returned by :meth:`unflushed`.
+
+    Args:
+        directory (str): The directory of the segment files, created if it
+            does not exist.
+        segment_bytes (int): The size of each segment file. A record larger
+            than this gets a segment of its own.
+    """
+
+    def __init__(self, directory, segment_bytes):
+        self._directory = directory
+        self._segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        # The segments with unpublished records, in order.
+        self._segments = []
+        self._active = None
+        # The number of records appended so far, including the replayed ones.
+        self._appended = 0
+
+        # The read position: the number of records read so far, and the
+        # segment and offset of the next record to read.
+        self._read = 0
+        self._read_segment = None
+        self._read_offset = 0
+
+        self._next_index = 0
+        for name in sorted(os.listdir(directory)):
+            match = _SEGMENT_NAME_PATTERN.match(name)
+            if match is None:
+                continue
+            self._next_index = int(match.group(1)) + 1
+            segment = self._open_segment(os.path.join(directory, name))
+            if segment is not None:
+                self._segments.append(segment)
+                self._appended += segment.entries
+
+        if self._segments:
+            self._read_segment = self._segments[0]
+            self._read_offset = self._read_segment.start
+
+    @property
+    def appended(self):
+        """int: The number of records appended, including the replayed ones."""
+        return self._appended
+
+    @property
+    def size(self):
+        """int: The total size of the segment files."""
+        return sum(segment.capacity for segment in self._segments)
+
+    def _open_segment(self, path):
+        """Open a segment left over by a previous process, and find the end of
+        its records.
+
+        Returns:
+            Optional[_Segment]: The sealed segment, or :data:`None` if it has
+            no records, in which case its file is deleted.
+        """
+        fd = os.open(path, os.O_RDWR)
+        capacity = os.fstat(fd).st_size
+        if capacity <= _SEGMENT_HEADER.size:
+            os.close(fd)
+            os.unlink(path)
+            return None
+
+        segment = _Segment(path, fd, capacity)
+        segment.sealed = True
+        # The records before the acked offset were published already.
+        (offset,) = _SEGMENT_HEADER.unpack_from(segment.map, 0)
+        if offset < _SEGMENT_HEADER.size or offset > capacity:
+            if offset:
+                _LOGGER.warning(
+                    "Outbox segment %s has an invalid acked offset %s, all of "
+                    "its records are published again.",
+                    path,
+                    offset,
+                )
+            offset = _SEGMENT_HEADER.size
+        segment.start = offset
+        while offset + _RECORD_HEADER.size <= capacity:
+            length, checksum = _RECORD_HEADER.unpack_from(segment.map, offset)
+            end = offset + _RECORD_HEADER.size + length
+            if length == 0:
+                break
+            if end > capacity or (
+                zlib.crc32(segment.map[offset + _RECORD_HEADER.size : end]) != checksum
+            ):
+                _LOGGER.warning(
+                    "Outbox segment %s is truncated at offset %s, the rest of "
+                    "the segment is ignored.",
+                    path,
+                    offset,
+                )
+                break
+            offset = end
+            segment.entries += 1
+
+        if segment.entries == 0:
+            segment.close()
+            os.unlink(path)
+            return None
+        segment.end = segment.flushed = offset
+        return segment
+
+    def _create_segment(self, capacity):
+        path = os.path.join(self._directory, _SEGMENT_NAME.format(self._next_index))
+        self._next_index += 1
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            _preallocate(fd, capacity)
+            segment = _Segment(path, fd, capacity)
+        except Exception:
+            os.close(fd)
+            os.unlink(path)
+            raise
+        _sync_directory(self._directory)
+        return segment
+
+    def append(self, topic, ordering_key, messages, max_bytes=None):
+        """Append records to the log, either all of them or none.
+
+        Args:
+            topic (str): The topic to publish the messages to.
+            ordering_key (str): The ordering key of the messages.
+            messages (Sequence[bytes]): The wire-format ``PubsubMessage`` of
+                each message.
+            max_bytes (Optional[int]): The maximum total size of the segment
+                files, if any.
+
+        Returns:
+            range: The sequence numbers of the records.
+
+        Raises:
+            ~.pubsub_v1.publisher.exceptions.FlowControlLimitError: If the new
+                segments would exceed ``max_bytes``.
+            OSError: If the new segments cannot be created, e.g. if the disk
+                is full.
+        """
+        topic = topic.encode("utf-8")
+        ordering_key = ordering_key.encode("utf-8")
+        prefix = (
+            _ENTRY_HEADER.pack(len(topic), len(ordering_key)) + topic + ordering_key
+        )
+        records = []
+        for message in messages:
+            payload = prefix + message
+            records.append(
+                _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+            )
+
+        # The sizes of the new segments the records need.
+        capacities = []
+        segment = self._active
+        free = 0 if segment is None else segment.capacity - segment.end
+        for record in records:
+            if len(record) > free:
+                capacity = self._segment_capacity(len(record))
+                capacities.append(capacity)
+                free = capacity - _SEGMENT_HEADER.size
+            free -= len(record)
+        if (
+            capacities
+            and max_bytes is not None
+            and self.size + sum(capacities) > max_bytes
+        ):
+            raise exceptions.FlowControlLimitError(
+                "The outbox would exceed its maximum size of {} bytes.".format(
+                    max_bytes
+                )
+            )
+
+        # The segments are created up front, so that none of the records are
+        # appended if one of them cannot be created.
+        new_segments = collections.deque()
+        try:
+            for capacity in capacities:
+                new_segments.append(self._create_segment(capacity))
+        except Exception:
+            for segment in new_segments:
+                segment.close()
+                os.unlink(segment.path)
+            raise
+
+        first = self._appended
+        for record in records:
+            segment = self._active
+            if segment is None or segment.end + len(record) > segment.capacity:
+                if segment is not None:
+                    self._seal(segment)
+                segment = new_segments.popleft()
+                self._active = segment
+                self._segments.append(segment)
+                if self._read_segment is None:
+                    self._read_segment = segment
+                    self._read_offset = segment.start
+
+            segment.map[segment.end : segment.end + len(record)] = record
+            segment.end += len(record)
+            segment.entries += 1
+            self._appended += 1
+        return range(first, self._appended)
+
+    def _segment_capacity(self, record_size):
+        # A large record gets a segment of its own, with room left for the zero
+        # length marking the end of the records.
+        return max(
+            self._segment_bytes,
+            _SEGMENT_HEADER.size + record_size + _RECORD_HEADER.size,
+        )
+
+    def unflushed(self):
+        """Return the ranges of the segments not flushed to disk yet.
+
+        Returns:
+            Sequence[Tuple[_Segment, int, int]]: The segments, with the start
+            and the end of their unflushed ranges. The ranges must be flushed,
+            and then passed to :meth:`mark_flushed`.
+        """
+        return [
+            (segment, segment.flushed, segment.end)
+            for segment in self._segments
+            if segment.flushed < segment.end
+        ]
+
+    def mark_flushed(self, ranges):
+        """Record the flushed ranges returned by :meth:`unflushed`."""
+        for segment, _, end in ranges:
+            segment.flushed = max(segment.flushed, end)
+
+    def read(self, limit):
+        """Read the next record of the log.
+
+        Args:
+            limit (int): The number of records that can be read, i.e. one
+                more than the sequence number of the last readable record.
+
+        Returns:
+            Optional[OutboxEntry]: The entry, or :data:`None` if all of the
+            readable records were read.
+        """
+        if self._read >= limit:
+            return None
+
+        segment = self._read_segment
+        if self._read_offset >= segment.end:
+            segment = self._read_segment = self._segments[
+                self._segments.index(segment) + 1
+            ]
+            self._read_offset = segment.start
+
+        offset = self._read_offset
+        length, _ = _RECORD_HEADER.unpack_from(segment.map, offset)
+        start = offset + _RECORD_HEADER.size
+        topic_length, key_length = _ENTRY_HEADER.unpack_from(segment.map, start)
+        start += _ENTRY_HEADER.size
+        topic = segment.map[start : start + topic_length].decode("utf-8")
+        start += topic_length
+        ordering_key = segment.map[start : start + key_length].decode("utf-8")
+        start += key_length
+        message = segment.map[start : offset + _RECORD_HEADER.size + length]
+
+        self._read_offset = offset + _RECORD_HEADER.size + length
+        self._read += 1
+        segment.reads.append((self._read - 1, self._read_offset))
+        return OutboxEntry(self._read - 1, segment, topic, ordering_key, message)
+
+    def ack(self, entry):
+        """Record that a record was published, and delete its segment once all
+        of the records of the segment were published.
+
+        The acked offset of the segment is advanced past the records
+        published so far, in order, so that they are not replayed.
+
+        Args:
+            entry (OutboxEntry): The entry of the record.
+        """
+        segment = entry.segment
+        segment.acked += 1
+        segment.acked_reads.add(entry.sequence)
+        acked_offset = None
+        while segment.reads and segment.reads[0][0] in segment.acked_reads:
+            sequence, acked_offset = segment.reads.popleft()
+            segment.acked_reads.remove(sequence)
+        if acked_offset is not None:
+            segment.set_acked_offset(acked_offset)
+
+        if segment.sealed and segment.acked == segment.entries:
+            self._delete(segment)
+
+    def _seal(self, segment):
+        segment.sealed = True
+        if segment.acked == segment.entries:
+            self._delete(segment)
+
+    def _delete(self, segment):
+        """Delete a segment, all of whose records were read and published."""
+        index = self._segments.index(segment)
+        if segment is self._read_segment:
+            # Continue reading from the next segment, if any.
+            self._read_segment = (
+                self._segments[index + 1] if index + 1 < len(self._segments) else None
+            )
+            if self._read_segment is not None:
+                self._read_offset = self._read_segment.start
+        del self._segments[index]
+        segment.close()
+        os.unlink(segment.path)
+
+    def close(self):
+        """Close the segment files, keeping the unpublished records."""
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+        self._active = None
+
+
+class Outbox(object):
+    """Persists the messages published by a client, and publishes them from
+    a background thread.
+
+    :meth:`append` returns once the messages are durably stored, with the
+    records appended concurrently flushed to disk together (group commit).
+    The drainer thread reads the stored messages in order, and publishes
+    them through the client, holding at most ``byte_limit`` bytes of messages
+    in flight. A message is removed from the outbox once it is published, or
+    once it fails with a non-retryable server error. The messages failing
+    otherwise, e.g. cancelled because the client was stopped, stay in the
+    outbox, and are published again by the next client.
+
+    Args:
+        client (~.pubsub_v1.publisher.client.Client): The publisher client.
+        settings (~.pubsub_v1.types.OutboxSettings): The outbox settings.
+    """
+
+    def __init__(self, client, settings):
+        if settings.segment_bytes <= 0:
+            raise ValueError("segment_bytes must be positive.")
+        if settings.byte_limit <= 0:
+            raise ValueError("byte_limit must be positive.")
+
+        self._client = client
+        self._settings = settings
+        self._log = SegmentLog(settings.directory, settings.segment_bytes)
+
+        # Guards all of the variables below, as well as the log.
+        self._condition = threading.Condition()
+        # The number of records durably stored, which can be published.
+        self._durable = self._log.appended
+        self._syncing = False
+        # sequence => callback of a message not published yet
+        self._callbacks = {}
+        self._in_flight_count = 0
+        self._in_flight_bytes = 0
+        self._stopped = False
+        # Whether the outbox was inherited from the parent process.
+        self._forked = False
+
+        if self._durable:
+            _LOGGER.info("Replaying %s messages from the outbox.", self._durable)
+
+        self._drainer = threading.Thread(
+            name="Thread-PublisherOutboxDrainer", target=self._drain, daemon=True
+        )
+        self._drainer.start()
+
+    def append(self, topic, ordering_key, messages, callbacks):
+        """Store messages in the outbox, and wait until they are durable.
+
+        Args:
+            topic (str): The topic to publish the messages to.
+            ordering_key (str): The ordering key of the messages.
+            messages (Sequence[bytes]): The wire-format ``PubsubMessage`` of
+                each message.
+            callbacks (Sequence[Callable[[Optional[str], Optional[Exception]], \
+                Any]]): Invoked with the message ID, or the error, of each
+                message once it is published.
+
+        Raises:
+            RuntimeError: If the outbox was stopped, or belongs to the parent
+                process.
+            ~.pubsub_v1.publisher.exceptions.FlowControlLimitError: If the
+                outbox is full. None of the messages are stored then.
+        """
+        with self._condition:
+            if self._forked:
+                raise RuntimeError(
+                    "The outbox belongs to the parent process, create the "
+                    "publisher after the fork to publish from the child process."
+                )
+            if self._stopped:
+                raise RuntimeError("Cannot publish on a stopped publisher.")
+            sequences = self._log.append(
+                topic, ordering_key, messages, self._settings.max_bytes
+            )
+            for sequence, callback in zip(sequences, callbacks):
+                self._callbacks[sequence] = callback
+
+            if not self._settings.sync:
+                self._durable = self._log.appended
+                self._condition.notify_all()
+            elif sequences:
+                self._wait_durable(sequences[-1] + 1)
+
+    def _wait_durable(self, count):
+        """Wait until the first ``count`` records are flushed to disk.
+
+        The first waiting thread flushes all of the records appended so far,
+        the other threads wait for it.
+
+        The method assumes the caller has acquired the ``_condition``.
+        """
+        while self._durable < count:
+            if self._syncing:
+                self._condition.wait()
+                continue
+
+            self._syncing = True
+            target = self._log.appended
+            ranges = self._log.unflushed()
+            self._condition.release()
+            try:
+                for segment, start, end in ranges:
+                    segment.flush(start, end)
+            finally:
+                self._condition.acquire()
+                self._syncing = False
+                self._condition.notify_all()
+            self._log.mark_flushed(ranges)
+            self._durable = max(self._durable, target)
+            self._close_if_idle()
+
+    def _close_if_idle(self):
+        """Close the log once the outbox is stopped, and nothing uses the log.
+
+        The method assumes the caller has acquired the ``_condition``.
+        """
+        if self._stopped and not self._in_flight_count and not self._syncing:
+            self._log.close()
+
+    def _drain(self):
+        """Publish the durable messages in order, within the byte limit."""
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopped:
+                        return
+                    # At least one message is in flight, however large.
+                    if (
+                        not self._in_flight_count
+                        or self._in_flight_bytes < self._settings.byte_limit
+                    ):
+                        entry = self._log.read(self._durable)
+                        if entry is not None:
+                            break
+                    self._condition.wait()
+
+                callback = self._callbacks.pop(entry.sequence, None)
+                self._in_flight_count += 1
+                self._in_flight_bytes += len(entry.message)
+
+            self._publish(entry, callback)
+
+    def _publish(self, entry, callback):
+        try:
+            future = self._client._publish_from_outbox(
+                entry.topic, entry.message, entry.ordering_key
+            )
+        except RuntimeError as exc:
+            # The client was stopped, the message stays in the outbox.
+            self._on_kept(entry, callback, exc)
+            return
+        except Exception as exc:
+            self._on_published(entry, callback, None, exc)
+            return
+
+        def on_publish_done(future):
+            exception = future.exception()
+            if exception is None:
+                self._on_published(entry, callback, future.result(), None)
+            elif self._client._is_permanent_publish_error(exception):
+                self._on_published(entry, callback, None, exception)
+            else:
+                self._on_kept(entry, callback, exception)
+
+        future.add_done_callback(on_publish_done)
+
+    def _on_published(self, entry, callback, message_id, exception):
+        """Remove a message from the outbox, and report its outcome."""
+        with self._condition:
+            self._in_flight_count -= 1
+            self._in_flight_bytes -= len(entry.message)
+            self._log.ack(entry)
+            self._close_if_idle()
+            self._condition.notify_all()
+
+        if exception is not None:
+            _LOGGER.debug("Failed to publish a message from the outbox: %s", exception)
+        if callback is not None:
+            callback(message_id, exception)
+
+    def _on_kept(self, entry, callback, exception):
+        """Keep a message that failed to publish in the outbox, and report the
+        error."""
+        with self._condition:
+            self._in_flight_count -= 1
+            self._in_flight_bytes -= len(entry.message)
+            self._close_if_idle()
+            self._condition.notify_all()
+
+        _LOGGER.debug(
+            "Failed to publish a message from the outbox, it is kept: %s", exception
+        )
+        if callback is not None:
+            callback(None, exception)
+
+    def stop(self):
+        """Stop publishing the messages, and reject any further messages.
+
+        The messages that were not handed over to the client yet stay in the
+        outbox, their callbacks are invoked with a :class:`RuntimeError`.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if threading.current_thread() is not self._drainer:
+            self._drainer.join()
+
+        with self._condition:
+            callbacks = [callback for callback in self._callbacks.values() if callback]
+            self._callbacks = {}
+            self._close_if_idle()
+
+        exception = RuntimeError(
+            "The publisher was stopped, the message is kept in the outbox."
+        )
+        for callback in callbacks:
+            callback(None, exception)
+
+    def _after_fork(self):
+        """Disable the outbox in the child process after a fork.
+
+        The parent keeps writing to the outbox directory and publishing its
+        messages, thus the child neither stores nor publishes any message, and
+        no drainer thread is started in the child. The child closes its copies
+        of the segment files, and the callbacks of the messages appended by
+        the parent are dropped.
+        """
+        self._log.close()
+        self._condition = threading.Condition()
+        self._syncing = False
+        self._callbacks = {}
+        self._in_flight_count = 0
+        self._in_flight_bytes = 0
+        self._stopped = True
+        self._forked = True
+
+
+def _preallocate(fd, size):
+    """Allocate the disk space of a file of the given size.
+
+    The segments are written through a memory map, where a write to a page
+    the file system cannot allocate (e.g. with the disk full) kills the
+    process with ``SIGBUS``. The space is therefore allocated up front, and an
+    :exc:`OSError` is raised instead if it cannot be.
+
+    Args:
+        fd (int): The file descriptor of the empty file.
+        size (int): The size of the file.
+
+    Raises:
+        OSError: If the space cannot be allocated.
+    """
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as exc:
+            # Fall back to writing the file if the file system does not
+            # support the allocation.
+            if exc.errno not in (errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+    # Writing the zeros allocates the blocks of the file.
+    chunk = bytes(min(size, mmap.ALLOCATIONGRANULARITY * 16))
+    os.lseek(fd, 0, os.SEEK_SET)
+    written = 0
+    while written < size:
+        written += os.write(fd, chunk[: size - written])
+
+
+def _sync_directory(directory):
+    """Flush the entries of a directory to disk, where supported."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def check_retry(retry):
+    """Raise if custom retry settings are passed along with the outbox.
+
+    Args:
+        retry (Optional[google.api_core.retry.Retry]): The retry settings
+            passed to a publish method.
+
+    Raises:
+        ValueError: If the retry settings are not the default ones.
+    """
+    if retry is not gapic_v1.method.DEFAULT:
+        raise ValueError("Custom retry settings cannot be used with the outbox.")
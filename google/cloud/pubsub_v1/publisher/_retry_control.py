@@ -0,0 +1,391 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import functools
+import logging
+import threading
+import time
+
+from google.api_core import exceptions as core_exceptions
+from google.api_core import gapic_v1
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import exceptions
+
+
+_LOGGER = logging.getLogger(__name__)
+
+# The retry budget is spent over a sliding window of this many seconds.
+_BUDGET_WINDOW_SECONDS = 10
+
+# The errors telling that the backend is failing, as opposed to the errors
+# caused by the request itself, e.g. INVALID_ARGUMENT or NOT_FOUND.
+_BACKEND_FAILURES = (
+    core_exceptions.ServerError,
+    core_exceptions.TooManyRequests,
+    core_exceptions.Aborted,
+)
+
+
+def is_backend_failure(exc):
+    """Return whether an error of a publish attempt is a backend failure.
+
+    Args:
+        exc (Exception): The error.
+
+    Returns:
+        bool: Whether the error counts towards opening the circuit breaker.
+    """
+    return isinstance(exc, _BACKEND_FAILURES) and not isinstance(
+        exc, core_exceptions.MethodNotImplemented
+    )
+
+
+class RetryBudget(object):
+    """Caps the number of retries relative to the number of publish requests.
+
+    The requests and retries are counted in one-second buckets over a sliding
+    window of the last 10 seconds. A retry is allowed while the retries in the
+    window stay below ``retry_ratio`` times the requests, plus
+    ``min_retries_per_second`` times the length of the window.
+
+    Args:
+        settings (~.pubsub_v1.types.RetryBudgetSettings): The budget settings.
+        clock (Callable[[], float]): Returns the current time in seconds.
+    """
+
+    def __init__(self, settings, clock=time.monotonic):
+        if settings.retry_ratio < 0:
+            raise ValueError("retry_ratio must not be negative.")
+        if settings.min_retries_per_second < 0:
+            raise ValueError("min_retries_per_second must not be negative.")
+
+        self._retry_ratio = settings.retry_ratio
+        self._min_retries = settings.min_retries_per_second * _BUDGET_WINDOW_SECONDS
+        self._clock = clock
+        self._lock = threading.Lock()
+        # [second, requests, retries] of each second in the window, indexed by
+        # the second modulo the window length
+        self._buckets = [[None, 0, 0] for _ in range(_BUDGET_WINDOW_SECONDS)]
+
+    def _current_bucket(self, second):
+        bucket = self._buckets[second % _BUDGET_WINDOW_SECONDS]
+        if bucket[0] != second:
+            bucket[:] = [second, 0, 0]
+        return bucket
+
+    def record_request(self):
+        """Count a publish request sent for the first time."""
+        with self._lock:
+            self._current_bucket(int(self._clock()))[1] += 1
+
+    def try_retry(self):
+        """Spend a retry of the budget, if there is one left.
+
+        Returns:
+            bool: Whether the failed request may be retried.
+        """
+        with self._lock:
+            second = int(self._clock())
+            bucket = self._current_bucket(second)
+
+            requests = retries = 0
+            for bucket_second, bucket_requests, bucket_retries in self._buckets:
+                if bucket_second is not None and (
+                    bucket_second > second - _BUDGET_WINDOW_SECONDS
+                ):
+                    requests += bucket_requests
+                    retries += bucket_retries
+
+            if retries >= self._retry_ratio * requests + self._min_retries:
+                return False
+            bucket[2] += 1
+            return True
+
+
+class CircuitBreaker(object):
+    """Stops the publish requests while the backend keeps failing.
+
+    The circuit breaker opens after ``failure_threshold`` consecutive publish
+    attempts failed with a backend failure. Once ``reset_timeout`` expires, it
+    becomes half-open and lets up to ``half_open_probes`` requests through at
+    a time. It closes as soon as a request succeeds, and opens again if one
+    fails.
+
+    While the circuit breaker is not closed, the requests that cannot be sent
+    either fail right away, or wait until they can be sent if the batches are
+    held.
+
+    Args:
+        settings (~.pubsub_v1.types.CircuitBreakerSettings): The circuit
+            breaker settings.
+        clock (Callable[[], float]): Returns the current time in seconds.
+    """
+
+    def __init__(self, settings, clock=time.monotonic):
+        if settings.failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1.")
+        if settings.half_open_probes < 1:
+            raise ValueError("half_open_probes must be at least 1.")
+
+        self._settings = settings
+        self._clock = clock
+
+        # Guards all of the variables below, and wakes up the held requests.
+        self._condition = threading.Condition()
+        self._state = types.CircuitBreakerState.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probes = 0
+
+    @property
+    def state(self):
+        """~.pubsub_v1.types.CircuitBreakerState: The current state."""
+        return self._state
+
+    def acquire(self, hold=False):
+        """Wait until a request may be sent.
+
+        Args:
+            hold (bool): Whether to wait for the request to be let through,
+                even if the batches are not held.
+
+        Returns:
+            bool: Whether the request is a probe request, which must be
+            released with :meth:`release` once it completes.
+
+        Raises:
+            ~.pubsub_v1.publisher.exceptions.CircuitBreakerOpenError: If the
+                request cannot be sent, and the batches are not held.
+        """
+        transitions = []
+        try:
+            with self._condition:
+                return self._acquire(hold or self._settings.hold_batches, transitions)
+        finally:
+            self._notify(transitions)
+
+    def wait_while_open(self):
+        """Wait until the circuit breaker is closed or half-open.
+
+        Unlike :meth:`acquire`, this does not take a probe request, it is
+        used before retrying a request already let through.
+        """
+        transitions = []
+        try:
+            with self._condition:
+                while self._state == types.CircuitBreakerState.OPEN:
+                    timeout = self._reset_timeout_no_lock()
+                    if timeout <= 0:
+                        self._set_state(
+                            types.CircuitBreakerState.HALF_OPEN, transitions
+                        )
+                        break
+                    self._condition.wait(timeout)
+        finally:
+            self._notify(transitions)
+
+    def _reset_timeout_no_lock(self):
+        """Return the seconds until the open circuit breaker turns half-open."""
+        return self._opened_at + self._settings.reset_timeout - self._clock()
+
+    def _acquire(self, hold, transitions):
+        while True:
+            timeout = None
+            if self._state == types.CircuitBreakerState.CLOSED:
+                return False
+
+            if self._state == types.CircuitBreakerState.OPEN:
+                timeout = self._reset_timeout_no_lock()
+                if timeout <= 0:
+                    self._set_state(types.CircuitBreakerState.HALF_OPEN, transitions)
+                    continue
+            elif self._probes < self._settings.half_open_probes:
+                self._probes += 1
+                return True
+
+            if not hold:
+                raise exceptions.CircuitBreakerOpenError(
+                    "The circuit breaker is {}, the backend is failing.".format(
+                        self._state.value.replace("_", "-")
+                    )
+                )
+            self._condition.wait(timeout)
+
+    def release(self, probe):
+        """Release a request returned by :meth:`acquire`.
+
+        Args:
+            probe (bool): Whether the request was a probe request.
+        """
+        if probe:
+            with self._condition:
+                self._probes -= 1
+                self._condition.notify_all()
+
+    def record_success(self):
+        """Record a successful publish request, closing the circuit breaker."""
+        transitions = []
+        with self._condition:
+            self._failures = 0
+            if self._state != types.CircuitBreakerState.CLOSED:
+                self._set_state(types.CircuitBreakerState.CLOSED, transitions)
+                self._condition.notify_all()
+        self._notify(transitions)
+
+    def record_failure(self):
+        """Record a publish attempt that failed with a backend failure."""
+        transitions = []
+        with self._condition:
+            self._failures += 1
+            if self._state == types.CircuitBreakerState.HALF_OPEN or (
+                self._state == types.CircuitBreakerState.CLOSED
+                and self._failures >= self._settings.failure_threshold
+            ):
+                self._opened_at = self._clock()
+                self._set_state(types.CircuitBreakerState.OPEN, transitions)
+        self._notify(transitions)
+
+    def _set_state(self, state, transitions):
+        """Change the state, and record the transition for :meth:`_notify`.
+
+        The method assumes the caller has acquired the ``_condition``.
+        """
+        self._state = state
+        transitions.append(state)
+        if state == types.CircuitBreakerState.OPEN:
+            _LOGGER.warning(
+                "Publish circuit breaker opened after %s consecutive failures.",
+                self._failures,
+            )
+        else:
+            _LOGGER.info("Publish circuit breaker is %s.", state.value)
+
+    def _notify(self, transitions):
+        """Invoke the state callback for each transition, without holding the
+        ``_condition``."""
+        callback = self._settings.state_callback
+        if callback is None:
+            return
+        for state in transitions:
+            try:
+                callback(state)
+            except Exception:
+                _LOGGER.exception("Circuit breaker state callback failed.")
+
+
+class RetryController(object):
+    """Applies the client-wide retry budget and circuit breaker to the
+    publish requests.
+
+    The retry settings of each request are wrapped so that every failed
+    attempt is reported to the circuit breaker, and that a retry is only
+    made if the circuit breaker is closed, and the retry budget allows it.
+
+    The requests publishing messages with an ordering key are exempt, as
+    failing them would pause their ordering keys until
+    :meth:`~.pubsub_v1.publisher.client.Client.resume_publish` is called.
+    They are held back while the circuit breaker is open instead, and they
+    are retried according to their own retry settings once it is half-open.
+
+    Args:
+        retry_budget (Optional[RetryBudget]): The retry budget, if any.
+        circuit_breaker (Optional[CircuitBreaker]): The circuit breaker, if
+            any.
+        default_retry (Optional[google.api_core.retry.Retry]): The retry
+            settings of the requests sent with the default retry.
+    """
+
+    def __init__(self, retry_budget, circuit_breaker, default_retry):
+        self._retry_budget = retry_budget
+        self._circuit_breaker = circuit_breaker
+        self._default_retry = default_retry
+
+    def call(self, send, retry, ordered=False):
+        """Send a publish request.
+
+        Args:
+            send (Callable[..., Any]): Sends the request, called with the
+                ``retry`` keyword argument.
+            retry (Optional[google.api_core.retry.Retry]): The retry settings
+                of the request.
+            ordered (bool): Whether the request publishes messages with an
+                ordering key.
+
+        Returns:
+            Any: The response.
+
+        Raises:
+            ~.pubsub_v1.publisher.exceptions.CircuitBreakerOpenError: If the
+                circuit breaker does not let the request through.
+        """
+        breaker = self._circuit_breaker
+        probe = False if breaker is None else breaker.acquire(hold=ordered)
+        try:
+            if self._retry_budget is not None:
+                self._retry_budget.record_request()
+
+            if retry is gapic_v1.method.DEFAULT:
+                retry = self._default_retry
+            if retry is not None:
+                retry = retry.with_predicate(
+                    functools.partial(self._should_retry, retry._predicate, ordered)
+                )
+
+            try:
+                response = send(retry=retry)
+            except Exception as exc:
+                # With retries, the predicate has already seen the error.
+                if retry is None and breaker is not None and is_backend_failure(exc):
+                    breaker.record_failure()
+                raise
+
+            if breaker is not None:
+                breaker.record_success()
+            return response
+        finally:
+            if breaker is not None:
+                breaker.release(probe)
+
+    def _should_retry(self, predicate, ordered, exc):
+        """Return whether to retry a failed attempt.
+
+        Args:
+            predicate (Callable[[Exception], bool]): The predicate of the
+                request's retry settings.
+            ordered (bool): Whether the request publishes messages with an
+                ordering key.
+            exc (Exception): The error of the failed attempt.
+
+        Returns:
+            bool: Whether to retry the request.
+        """
+        breaker = self._circuit_breaker
+        if breaker is not None and is_backend_failure(exc):
+            breaker.record_failure()
+
+        if ordered:
+            if not predicate(exc):
+                return False
+            if breaker is not None:
+                breaker.wait_while_open()
+            return True
+
+        if breaker is not None and breaker.state != types.CircuitBreakerState.CLOSED:
+            return False
+
+        if not predicate(exc):
+            return False
+        return self._retry_budget is None or self._retry_budget.try_retry()
@@ -15,6 +15,7 @@
 from __future__ import absolute_import
 
 import abc
+import weakref
 
 
 class Sequencer(metaclass=abc.ABCMeta):
@@ -22,6 +23,8 @@ class Sequencer(metaclass=abc.ABCMeta):
        sequences messages to be published.
     """
 
+    __slots__ = ()
+
     @staticmethod
     @abc.abstractmethod
     def is_finished(self):  # pragma: NO COVER
@@ -43,6 +46,15 @@ class Sequencer(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    @staticmethod
+    @abc.abstractmethod
+    def expedite(self):  # pragma: NO COVER
+        """ Commit the batch holding the latest published message as soon as
+            possible, without waiting for it to fill up or for its max latency
+            to expire.
+        """
+        raise NotImplementedError
+
     @staticmethod
     @abc.abstractmethod
     def publish(self, message, retry=None):  # pragma: NO COVER
@@ -55,9 +67,8 @@ class Sequencer(metaclass=abc.ABCMeta):
                 The retry settings to apply when publishing the message.
 
         Returns:
-            A class instance that conforms to Python Standard library's
-            :class:`~concurrent.futures.Future` interface (but not an
-            instance of that class). The future might return immediately with a
+            ~google.cloud.pubsub_v1.publisher.futures.MessageFuture: The
+            future of the message. The future might return immediately with a
             `pubsub_v1.publisher.exceptions.PublishToPausedOrderingKeyException`
             if the ordering key is paused.  Otherwise, the future tracks the
             lifetime of the message publish.
@@ -68,3 +79,29 @@ class Sequencer(metaclass=abc.ABCMeta):
                 a call to stop() or after all batches have been published.
         """
         raise NotImplementedError
+
+
+def batch_commit_callback(func, batch):
+    """ Return a commit timer callback invoking ``func(batch)``, without
+        keeping the batch alive.
+
+        A batch that fills up commits long before its max latency expires.
+        The timer must not hold on to its messages until then.
+
+        Args:
+            func (Callable[[~.pubsub_v1.publisher._batch.base.Batch], Any]):
+                The function committing the batch.
+            batch (~.pubsub_v1.publisher._batch.base.Batch): The batch.
+
+        Returns:
+            Callable[[], None]: The callback, which does nothing once the
+            batch has been discarded.
+    """
+    batch_ref = weakref.ref(batch)
+
+    def callback():
+        batch = batch_ref()
+        if batch is not None:
+            func(batch)
+
+    return callback
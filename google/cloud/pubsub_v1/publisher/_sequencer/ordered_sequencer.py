@@ -14,13 +14,15 @@
 
 import enum
 import collections
-import concurrent.futures as futures
 import threading
+import time
 
 from google.api_core import gapic_v1
 from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher import futures
 from google.cloud.pubsub_v1.publisher._sequencer import base as sequencer_base
 from google.cloud.pubsub_v1.publisher._batch import base as batch_base
+from google.cloud.pubsub_v1.publisher._batch import thread
 
 
 class _OrderedSequencerStatus(str, enum.Enum):
@@ -66,6 +68,11 @@ class _OrderedSequencerStatus(str, enum.Enum):
     FINISHED = "finished"
 
 
+# Stands in for the deque of batches while a sequencer has no batches, so that
+# idle (finished or paused) sequencers do not hold on to an allocated deque.
+_NO_BATCHES = ()
+
+
 class OrderedSequencer(sequencer_base.Sequencer):
     """ Sequences messages into batches ordered by an ordering key for one topic.
 
@@ -81,20 +88,44 @@ class OrderedSequencer(sequencer_base.Sequencer):
             topic (str): The topic. The format for this is
                 ``projects/{project}/topics/{topic}``.
             ordering_key (str): The ordering key for this sequencer.
+            topic_batcher (Optional[~.OrderedTopicBatcher]):
+                The batcher that sends the committed batches of this sequencer
+                together with the batches of other ordering keys of the topic.
+                If not given, each batch is sent in a request of its own.
     """
 
-    def __init__(self, client, topic, ordering_key):
+    # A client can have millions of sequencers, one per ordering key, thus
+    # their memory footprint is kept small.
+    __slots__ = (
+        "_client",
+        "_topic",
+        "_ordering_key",
+        "_topic_batcher",
+        "_state_lock",
+        "_ordered_batches",
+        "_state",
+        "_tail_commit_deadline",
+    )
+
+    def __init__(self, client, topic, ordering_key, topic_batcher=None):
         self._client = client
         self._topic = topic
         self._ordering_key = ordering_key
+        self._topic_batcher = topic_batcher
         # Guards the variables below
         self._state_lock = threading.Lock()
         # Batches ordered from first (head/left) to last (right/tail).
         # Invariant: always has at least one batch after the first publish,
-        # unless paused or stopped.
-        self._ordered_batches = collections.deque()
+        # unless paused or stopped. Replaced by _NO_BATCHES while there are
+        # no batches, the deque is only allocated when needed.
+        self._ordered_batches = _NO_BATCHES
         # See _OrderedSequencerStatus for valid state transitions.
         self._state = _OrderedSequencerStatus.ACCEPTING_MESSAGES
+        # The time (in time.monotonic() terms) at which the last batch in
+        # _ordered_batches should be committed. Only the last batch can be
+        # non-full, all batches before it are committed as soon as they
+        # become the head of the deque.
+        self._tail_commit_deadline = None
 
     def is_finished(self):
         """ Whether the sequencer is finished and should be cleaned up.
@@ -150,6 +181,25 @@ class OrderedSequencer(sequencer_base.Sequencer):
                 # operation is idempotent.
                 self._ordered_batches[0].commit()
 
+    def expedite(self):
+        """ Commit the last batch as soon as the batches before it have been
+            published, without waiting for its max latency to expire.
+
+            If paused or no batches exist, this method does nothing.
+        """
+        with self._state_lock:
+            if (
+                self._state != _OrderedSequencerStatus.ACCEPTING_MESSAGES
+                or not self._ordered_batches
+            ):
+                return
+
+            # The commit deadline of the last batch has passed, thus it is
+            # committed as soon as it becomes the head batch.
+            self._tail_commit_deadline = time.monotonic()
+            if len(self._ordered_batches) == 1:
+                self._ordered_batches[0].commit()
+
     def _batch_done_callback(self, success):
         """ Deal with completion of a batch.
 
@@ -157,7 +207,7 @@ class OrderedSequencer(sequencer_base.Sequencer):
             or a failure. (Temporary failures are retried infinitely when
             ordering keys are enabled.)
         """
-        ensure_cleanup_and_commit_timer_runs = False
+        schedule_cleanup = False
         with self._state_lock:
             assert self._state != _OrderedSequencerStatus.PAUSED, (
                 "This method should not be called after pause() because "
@@ -174,19 +224,20 @@ class OrderedSequencer(sequencer_base.Sequencer):
 
             if success:
                 if len(self._ordered_batches) == 0:
+                    self._ordered_batches = _NO_BATCHES
                     # Mark this sequencer as finished.
                     # If new messages come in for this ordering key and this
                     # sequencer hasn't been cleaned up yet, it will go back
                     # into accepting-messages state. Otherwise, the client
                     # must create a new OrderedSequencer.
                     self._state = _OrderedSequencerStatus.FINISHED
-                    # Ensure cleanup thread runs at some point.
-                    ensure_cleanup_and_commit_timer_runs = True
+                    # Ensure the sequencer is cleaned up at some point.
+                    schedule_cleanup = True
                 elif len(self._ordered_batches) == 1:
-                    # Wait for messages and/or commit timeout
-                    # Ensure there's actually a commit timer thread that'll commit
-                    # after a delay.
-                    ensure_cleanup_and_commit_timer_runs = True
+                    # Wait for more messages until the batch's commit deadline,
+                    # or commit right away if the deadline has already passed
+                    # while the previous batch was being published.
+                    self._commit_or_schedule_head_no_lock()
                 else:
                     # If there is more than one batch, we know that the next batch
                     # must be full and, therefore, ready to be committed.
@@ -195,8 +246,46 @@ class OrderedSequencer(sequencer_base.Sequencer):
                 # Unrecoverable error detected
                 self._pause()
 
-        if ensure_cleanup_and_commit_timer_runs:
-            self._client.ensure_cleanup_and_commit_timer_runs()
+        if schedule_cleanup:
+            self._client._schedule_sequencer_cleanup(self._topic, self._ordering_key)
+
+    def _commit_or_schedule_head_no_lock(self):
+        """ Commit the head batch if its commit deadline has passed, otherwise
+            schedule a commit for when the deadline expires.
+
+            The head batch must be the last batch in the deque, i.e. the one
+            _tail_commit_deadline refers to.
+
+            _state_lock must be taken before calling this method.
+        """
+        batch = self._ordered_batches[0]
+        if self._tail_commit_deadline is None:
+            settings = self._client._get_topic_settings(self._topic).batch_settings
+            delay = settings.max_latency
+        else:
+            delay = self._tail_commit_deadline - time.monotonic()
+
+        if delay <= 0:
+            batch.commit()
+        else:
+            callback = sequencer_base.batch_commit_callback(self._commit_if_head, batch)
+            self._client._schedule_commit(delay, callback)
+
+    def _commit_if_head(self, batch):
+        """ Commit the given batch if it is still the head batch, i.e. the
+            batch allowed to be published next.
+
+            Called by the client's commit timer once the batch's commit
+            deadline expires. If the batch is not the head batch, it gets
+            committed when the batches before it finish publishing.
+        """
+        with self._state_lock:
+            if (
+                self._state == _OrderedSequencerStatus.ACCEPTING_MESSAGES
+                and self._ordered_batches
+                and self._ordered_batches[0] is batch
+            ):
+                batch.commit()
 
     def _pause(self):
         """ Pause this sequencer: set state to paused, cancel all batches, and
@@ -212,7 +301,7 @@ class OrderedSequencer(sequencer_base.Sequencer):
             batch.cancel(
                 batch_base.BatchCancellationReason.PRIOR_ORDERED_MESSAGE_FAILED
             )
-        self._ordered_batches.clear()
+        self._ordered_batches = _NO_BATCHES
 
     def unpause(self):
         """ Unpause this sequencer.
@@ -234,14 +323,19 @@ class OrderedSequencer(sequencer_base.Sequencer):
             commit_retry (Optional[google.api_core.retry.Retry]):
                 The retry settings to apply when publishing the batch.
         """
-        return self._client._batch_class(
+        batch = self._client._batch_class(
             client=self._client,
             topic=self._topic,
-            settings=self._client.batch_settings,
+            settings=self._client.get_batch_settings(self._topic),
             batch_done_callback=self._batch_done_callback,
             commit_when_full=False,
             commit_retry=commit_retry,
         )
+        if isinstance(batch, thread.Batch):
+            batch._set_ordered(True)
+            if self._topic_batcher is not None:
+                batch._set_topic_batcher(self._topic_batcher)
+        return batch
 
     def publish(self, message, retry=gapic_v1.method.DEFAULT):
         """ Publish message for this ordering key.
@@ -253,9 +347,8 @@ class OrderedSequencer(sequencer_base.Sequencer):
                 The retry settings to apply when publishing the message.
 
         Returns:
-            A class instance that conforms to Python Standard library's
-            :class:`~concurrent.futures.Future` interface (but not an
-            instance of that class). The future might return immediately with a
+            ~google.cloud.pubsub_v1.publisher.futures.MessageFuture: The
+            future of the message. The future might return immediately with a
             PublishToPausedOrderingKeyException if the ordering key is paused.
             Otherwise, the future tracks the lifetime of the message publish.
 
@@ -266,12 +359,10 @@ class OrderedSequencer(sequencer_base.Sequencer):
         """
         with self._state_lock:
             if self._state == _OrderedSequencerStatus.PAUSED:
-                future = futures.Future()
                 exception = exceptions.PublishToPausedOrderingKeyException(
                     self._ordering_key
                 )
-                future.set_exception(exception)
-                return future
+                return futures._failed_message_future(exception)
 
             # If waiting to be cleaned-up, convert to accepting messages to
             # prevent this sequencer from being cleaned-up only to have another
@@ -286,19 +377,80 @@ class OrderedSequencer(sequencer_base.Sequencer):
                 self._state == _OrderedSequencerStatus.ACCEPTING_MESSAGES
             ), "Publish is only allowed in accepting-messages state."
 
+            new_batch = None
             if not self._ordered_batches:
                 new_batch = self._create_batch(commit_retry=retry)
-                self._ordered_batches.append(new_batch)
+                self._ordered_batches = collections.deque([new_batch])
 
             batch = self._ordered_batches[-1]
             future = batch.publish(message)
             while future is None:
-                batch = self._create_batch(commit_retry=retry)
+                batch = new_batch = self._create_batch(commit_retry=retry)
                 self._ordered_batches.append(batch)
                 future = batch.publish(message)
 
+            if new_batch is not None:
+                # The new batch just received its first message, thus its
+                # latency starts counting now. If it is the only batch, its
+                # commit is scheduled right away, otherwise it is scheduled
+                # (or done) when the batches before it finish publishing.
+                max_latency = self._client.get_batch_settings(self._topic).max_latency
+                self._tail_commit_deadline = time.monotonic() + max_latency
+                if len(self._ordered_batches) == 1:
+                    callback = sequencer_base.batch_commit_callback(
+                        self._commit_if_head, new_batch
+                    )
+                    self._client._schedule_commit(max_latency, callback)
+
             return future
 
+    def publish_batch(self, batch):
+        """ Queue a batch filled by the client after the batches of this
+        ordering key.
+
+        The batch is complete, thus it is committed as soon as all batches
+        before it have been published, without waiting for ``max_latency``.
+        The same goes for the head batch, which is committed right away.
+
+        Args:
+            batch (~.pubsub_v1.publisher._batch.thread.BulkBatch):
+                The batch holding a chunk of a bulk publish.
+
+        Raises:
+            RuntimeError:
+                If called after this sequencer has been stopped, either by
+                a call to stop() or after all batches have been published.
+        """
+        with self._state_lock:
+            if self._state == _OrderedSequencerStatus.PAUSED:
+                exception = exceptions.PublishToPausedOrderingKeyException(
+                    self._ordering_key
+                )
+                batch._fail_chunk(exception)
+                return
+
+            if self._state == _OrderedSequencerStatus.FINISHED:
+                self._state = _OrderedSequencerStatus.ACCEPTING_MESSAGES
+
+            if self._state == _OrderedSequencerStatus.STOPPED:
+                raise RuntimeError("Cannot publish on a stopped sequencer.")
+
+            batch._set_batch_done_callback(self._batch_done_callback)
+            if self._topic_batcher is not None:
+                batch._set_topic_batcher(self._topic_batcher)
+
+            # The batch is full, it is due as soon as it becomes the head.
+            self._tail_commit_deadline = time.monotonic()
+            if self._ordered_batches:
+                self._ordered_batches.append(batch)
+            else:
+                self._ordered_batches = collections.deque([batch])
+
+            # Messages are waiting behind the head batch, thus there is no
+            # point in waiting for more messages. This is a no-op if the head
+            # batch is already being published.
+            self._ordered_batches[0].commit()
+
     # Used only for testing.
     def _set_batch(self, batch):
         self._ordered_batches = collections.deque([batch])
@@ -14,6 +14,7 @@
 
 from google.api_core import gapic_v1
 
+from google.cloud.pubsub_v1.publisher._batch import thread
 from google.cloud.pubsub_v1.publisher._sequencer import base
 
 
@@ -23,6 +24,8 @@ class UnorderedSequencer(base.Sequencer):
         Public methods are NOT thread-safe.
     """
 
+    __slots__ = ("_client", "_topic", "_current_batch", "_stopped")
+
     def __init__(self, client, topic):
         self._client = client
         self._topic = topic
@@ -73,6 +76,15 @@ class UnorderedSequencer(base.Sequencer):
             # batch.
             self._current_batch = None
 
+    def expedite(self):
+        """ Commit the current batch right away, see :meth:`commit`.
+
+            Raises:
+                RuntimeError:
+                    If called after stop() has already been called.
+        """
+        self.commit()
+
     def unpause(self):
         """ Not relevant for this class. """
         raise NotImplementedError
@@ -85,14 +97,26 @@ class UnorderedSequencer(base.Sequencer):
             commit_retry (Optional[google.api_core.retry.Retry]):
                 The retry settings to apply when publishing the batch.
         """
-        return self._client._batch_class(
+        batch = self._client._batch_class(
             client=self._client,
             topic=self._topic,
-            settings=self._client.batch_settings,
+            settings=self._client.get_batch_settings(self._topic),
             batch_done_callback=None,
             commit_when_full=True,
             commit_retry=commit_retry,
         )
+        self._set_hedged(batch)
+        return batch
+
+    def _set_hedged(self, batch):
+        """ Let the batch hedge its publish requests, if the client hedges
+            the requests of the messages without an ordering key.
+
+        Args:
+            batch (~.pubsub_v1.publisher._batch.base.Batch): The batch.
+        """
+        if isinstance(batch, thread.Batch) and self._client._hedger is not None:
+            batch._set_hedged(True)
 
     def publish(self, message, retry=gapic_v1.method.DEFAULT):
         """ Batch message into existing or new batch.
@@ -118,9 +142,10 @@ class UnorderedSequencer(base.Sequencer):
         if self._stopped:
             raise RuntimeError("Unordered sequencer already stopped.")
 
+        new_batch = None
         if not self._current_batch:
-            newbatch = self._create_batch(commit_retry=retry)
-            self._current_batch = newbatch
+            new_batch = self._create_batch(commit_retry=retry)
+            self._current_batch = new_batch
 
         batch = self._current_batch
         future = None
@@ -129,12 +154,39 @@ class UnorderedSequencer(base.Sequencer):
             future = batch.publish(message)
             # batch is full, triggering commit_when_full
             if future is None:
-                batch = self._create_batch(commit_retry=retry)
+                batch = new_batch = self._create_batch(commit_retry=retry)
                 # At this point, we lose track of the old batch, but we don't
                 # care since it's already committed (because it was full.)
                 self._current_batch = batch
+
+        if new_batch is not None:
+            # The new batch just received its first message, thus its latency
+            # starts counting now.
+            max_latency = self._client.get_batch_settings(self._topic).max_latency
+            callback = base.batch_commit_callback(_commit_batch, new_batch)
+            self._client._schedule_commit(max_latency, callback)
         return future
 
+    def publish_batch(self, batch):
+        """ Commit a batch filled by the client, bypassing the current batch.
+
+        Args:
+            batch (~.pubsub_v1.publisher._batch.thread.BulkBatch):
+                The batch holding a chunk of a bulk publish.
+
+        Raises:
+            RuntimeError:
+                If called after stop() has already been called.
+        """
+        if self._stopped:
+            raise RuntimeError("Unordered sequencer already stopped.")
+        self._set_hedged(batch)
+        batch.commit()
+
     # Used only for testing.
     def _set_batch(self, batch):
         self._current_batch = batch
+
+
+def _commit_batch(batch):
+    batch.commit()
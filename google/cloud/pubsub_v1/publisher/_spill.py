@@ -0,0 +1,239 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import collections
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+
+_LOGGER = logging.getLogger(__name__)
+
+_SEGMENT_NAME = "{:020d}.spill"
+
+SpillRecord = collections.namedtuple("SpillRecord", ["segment", "offset", "length"])
+SpillRecord.__doc__ = "The location of a spilled publish request."
+SpillRecord.segment.__doc__ = "The segment file holding the request."
+SpillRecord.offset.__doc__ = "The offset of the request in the segment file."
+SpillRecord.length.__doc__ = "The size of the request."
+
+
+class _SpillSegment(object):
+    """A file of spilled publish requests, written and read at any offset.
+
+    Args:
+        path (str): The path of the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        # The offset after the last reserved request.
+        self.end = 0
+        # The number of requests reserved, and not read back yet.
+        self.pending = 0
+        # Whether no more requests are written to the segment.
+        self.sealed = False
+
+    def delete(self):
+        os.close(self.fd)
+        os.unlink(self.path)
+
+
+class BatchSpiller(object):
+    """Keeps the committed batches waiting for a commit thread within a memory
+    budget, by spilling the batches beyond the budget to disk.
+
+    A spilled batch is written to the current segment file as its final
+    wire-format ``PublishRequest``, and the batch drops its messages. The
+    commit thread publishing the batch reads the request back, the commit
+    threads thus still publish the batches in the order they were committed.
+
+    Once the spilled batches reach ``max_bytes``, the batches are kept in
+    memory beyond the budget instead, and :meth:`wait_for_capacity` blocks the
+    publishing threads until the memory budget is available again.
+
+    Args:
+        settings (~.pubsub_v1.types.SpillSettings): The spill settings.
+    """
+
+    def __init__(self, settings):
+        if settings.memory_bytes < 0:
+            raise ValueError("memory_bytes must not be negative.")
+        if settings.segment_bytes <= 0:
+            raise ValueError("segment_bytes must be positive.")
+
+        self._settings = settings
+        os.makedirs(settings.directory, exist_ok=True)
+        # Several clients may share the directory.
+        self._directory = tempfile.mkdtemp(prefix="publisher-", dir=settings.directory)
+
+        # Guards all of the variables below, and wakes up the threads waiting
+        # for the memory budget.
+        self._condition = threading.Condition()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._segments = []
+        self._next_index = 0
+        self._stopped = False
+
+    @property
+    def memory_bytes(self):
+        """int: The total size of the batches waiting in memory."""
+        return self._memory_bytes
+
+    @property
+    def disk_bytes(self):
+        """int: The total size of the spilled batches, not read back yet."""
+        return self._disk_bytes
+
+    def store(self, size, encode):
+        """Account for a committed batch waiting for a commit thread, and spill
+        it to disk if it does not fit into the memory budget.
+
+        Args:
+            size (int): The size of the batch's publish request, an upper
+                bound of the size of the encoded request.
+            encode (Callable[[], Union[bytes, bytearray]]): Returns the
+                final wire-format ``PublishRequest`` of the batch, only called
+                if the batch is spilled.
+
+        Returns:
+            Optional[SpillRecord]: The record of the spilled batch, which must
+            be passed to :meth:`load`. If :data:`None`, the batch is kept in
+            memory, and :meth:`release` must be called with its size once it
+            no longer waits.
+        """
+        with self._condition:
+            if self._memory_bytes + size <= self._settings.memory_bytes or (
+                self._settings.max_bytes is not None
+                and self._disk_bytes + size > self._settings.max_bytes
+            ):
+                self._memory_bytes += size
+                return None
+            segment, offset = self._reserve(size)
+
+        try:
+            request = encode()
+            written = os.pwrite(segment.fd, request, offset)
+            if written != len(request):
+                raise OSError("Short write of a spilled batch.")
+        except Exception:
+            _LOGGER.exception("Failed to spill a batch, keeping it in memory.")
+            with self._condition:
+                self._free(segment)
+                self._memory_bytes += size
+            return None
+
+        return SpillRecord(segment, offset, len(request))
+
+    def _reserve(self, size):
+        """Reserve room for a request in the current segment.
+
+        The method assumes the caller has acquired the ``_condition``.
+
+        Returns:
+            Tuple[_SpillSegment, int]: The segment and the offset.
+        """
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or segment.end >= self._settings.segment_bytes:
+            if segment is not None:
+                segment.sealed = True
+            path = os.path.join(self._directory, _SEGMENT_NAME.format(self._next_index))
+            self._next_index += 1
+            segment = _SpillSegment(path)
+            self._segments.append(segment)
+
+        offset = segment.end
+        segment.end += size
+        segment.pending += 1
+        self._disk_bytes += size
+        return segment, offset
+
+    def load(self, record):
+        """Read a spilled request back, and free its room on disk.
+
+        Args:
+            record (SpillRecord): The record returned by :meth:`store`.
+
+        Returns:
+            bytes: The wire-format ``PublishRequest``.
+
+        Raises:
+            OSError: If the request cannot be read back.
+        """
+        try:
+            request = os.pread(record.segment.fd, record.length, record.offset)
+        finally:
+            with self._condition:
+                self._free(record.segment)
+        if len(request) != record.length:
+            raise OSError("Short read of a spilled batch.")
+        return request
+
+    def _free(self, segment):
+        """Release a request of a segment, and delete the segment, or reuse it
+        if it is the current one, once it has no pending requests.
+
+        The method assumes the caller has acquired the ``_condition``.
+        """
+        segment.pending -= 1
+        if segment.pending:
+            return
+
+        self._disk_bytes -= segment.end
+        if segment.sealed or self._stopped:
+            self._segments.remove(segment)
+            segment.delete()
+        else:
+            os.ftruncate(segment.fd, 0)
+            segment.end = 0
+        self._remove_directory_if_done()
+        self._condition.notify_all()
+
+    def release(self, size):
+        """Release the memory budget taken by a batch kept in memory.
+
+        Args:
+            size (int): The size passed to :meth:`store`.
+        """
+        with self._condition:
+            self._memory_bytes -= size
+            self._condition.notify_all()
+
+    def wait_for_capacity(self):
+        """Block while the batches in memory exceed the memory budget, which
+        only happens once the spilled batches reached ``max_bytes``."""
+        with self._condition:
+            while self._memory_bytes > self._settings.memory_bytes:
+                self._condition.wait()
+
+    def stop(self):
+        """Remove the spill directory once all of the spilled batches are read
+        back."""
+        with self._condition:
+            self._stopped = True
+            for segment in [s for s in self._segments if not s.pending]:
+                self._segments.remove(segment)
+                segment.delete()
+            self._remove_directory_if_done()
+
+    def _remove_directory_if_done(self):
+        """The method assumes the caller has acquired the ``_condition``."""
+        if self._stopped and not self._segments:
+            shutil.rmtree(self._directory, ignore_errors=True)
@@ -0,0 +1,150 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import collections
+import fnmatch
+
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher.flow_controller import FlowController
+from google.cloud.pubsub_v1.publisher.flow_controller import FlowControllerChain
+
+
+TopicConfig = collections.namedtuple(
+    "TopicConfig", ["batch_settings", "bulk_batch_settings", "flow_controller"]
+)
+TopicConfig.__doc__ = "The settings in effect for a topic."
+TopicConfig.batch_settings.__doc__ = "The batch settings of the topic."
+TopicConfig.bulk_batch_settings.__doc__ = (
+    "The batch settings of ``publish_many()``, whose batches must also fit "
+    "within the flow control limits."
+)
+TopicConfig.flow_controller.__doc__ = (
+    "The flow controller of the topic, a chain of the topic's own flow "
+    "controller and the client's, or only the latter."
+)
+
+_PATTERN_CHARACTERS = frozenset("*?[")
+
+
+class TopicSettingsResolver(object):
+    """Resolves the settings of the topics a publisher client publishes to.
+
+    The settings of a topic are resolved on its first lookup, and cached. The
+    later lookups are a plain dictionary lookup, without locking. Concurrent
+    first lookups of a topic might both resolve its settings, but they resolve
+    to the same result.
+
+    Each entry of the topic settings with flow control settings gets a flow
+    controller of its own, shared by all of the topics the entry applies to.
+
+    Args:
+        batch_settings (~.pubsub_v1.types.BatchSettings): The client's batch
+            settings.
+        flow_control (~.pubsub_v1.types.PublishFlowControl): The client's flow
+            control settings.
+        flow_controller (~.pubsub_v1.publisher.flow_controller.FlowController):
+            The client's flow controller.
+        topic_settings (Optional[Mapping[str, ~.pubsub_v1.types.TopicSettings]]):
+            The settings overriding the client's settings, by topic name or
+            :mod:`fnmatch` pattern.
+    """
+
+    def __init__(self, batch_settings, flow_control, flow_controller, topic_settings):
+        self._default = self._create_config(
+            batch_settings, [(flow_control, flow_controller)]
+        )
+
+        # topic => TopicConfig of the exact topic names
+        self._exact = {}
+        # (pattern, TopicConfig) in order
+        self._patterns = []
+        for name, settings in (topic_settings or {}).items():
+            flow_controls = [(flow_control, flow_controller)]
+            if settings.flow_control is not None:
+                flow_controls.insert(
+                    0, (settings.flow_control, FlowController(settings.flow_control))
+                )
+            config = self._create_config(
+                settings.batch_settings or batch_settings, flow_controls
+            )
+            if _PATTERN_CHARACTERS.intersection(name):
+                self._patterns.append((name, config))
+            else:
+                self._exact[name] = config
+
+        # topic => TopicConfig, the cache of the resolved topics
+        self._topics = {}
+
+    @staticmethod
+    def _create_config(batch_settings, flow_controls):
+        """Create the settings of a topic.
+
+        Args:
+            batch_settings (~.pubsub_v1.types.BatchSettings): The batch
+                settings.
+            flow_controls (Sequence[Tuple[~.pubsub_v1.types.PublishFlowControl, \
+                ~.pubsub_v1.publisher.flow_controller.FlowController]]): The
+                flow control settings and flow controllers, in the order of
+                acquisition.
+
+        Returns:
+            TopicConfig: The settings.
+        """
+        # The flow controllers only admit bulk batches within their limits.
+        bulk_batch_settings = batch_settings
+        for flow_control, _ in flow_controls:
+            if (
+                flow_control.limit_exceeded_behavior
+                == types.LimitExceededBehavior.IGNORE
+            ):
+                continue
+            bulk_batch_settings = bulk_batch_settings._replace(
+                max_messages=min(
+                    bulk_batch_settings.max_messages, flow_control.message_limit
+                ),
+                max_bytes=min(bulk_batch_settings.max_bytes, flow_control.byte_limit),
+            )
+
+        if len(flow_controls) == 1:
+            flow_controller = flow_controls[0][1]
+        else:
+            flow_controller = FlowControllerChain(
+                flow_controller for _, flow_controller in flow_controls
+            )
+        return TopicConfig(batch_settings, bulk_batch_settings, flow_controller)
+
+    def get(self, topic):
+        """Return the settings in effect for a topic.
+
+        Args:
+            topic (str): The topic.
+
+        Returns:
+            TopicConfig: The settings.
+        """
+        config = self._topics.get(topic)
+        if config is None:
+            config = self._topics.setdefault(topic, self._resolve(topic))
+        return config
+
+    def _resolve(self, topic):
+        config = self._exact.get(topic)
+        if config is not None:
+            return config
+        for pattern, config in self._patterns:
+            if fnmatch.fnmatchcase(topic, pattern):
+                return config
+        return self._default
@@ -0,0 +1,581 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import asyncio
+import copy
+import functools
+import logging
+import math
+import os
+
+from google.api_core import gapic_v1
+from google.api_core import retry_async
+from google.auth.credentials import AnonymousCredentials
+from google.oauth2 import service_account
+
+from google.cloud.pubsub_v1 import _gapic
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher._adaptive_batching import AdaptiveBatchSizer
+from google.cloud.pubsub_v1.publisher._batch import aio
+from google.cloud.pubsub_v1.publisher._sequencer import ordered_sequencer
+from google.cloud.pubsub_v1.publisher._sequencer import unordered_sequencer
+from google.cloud.pubsub_v1.publisher.flow_controller import AsyncFlowController
+from google.pubsub_v1 import types as gapic_types
+from google.pubsub_v1.services.publisher import async_client as publisher_async_client
+
+_LOGGER = logging.getLogger(__name__)
+
+_BLACKLISTED_METHODS = (
+    "publish",
+    "from_service_account_file",
+    "from_service_account_info",
+    "from_service_account_json",
+    "get_transport_class",
+)
+
+_raw_proto_pubbsub_message = gapic_types.PubsubMessage.pb()
+
+
+@_gapic.add_methods(
+    publisher_async_client.PublisherAsyncClient, blacklist=_BLACKLISTED_METHODS
+)
+class AsyncClient(object):
+    """An asyncio publisher client for Google Cloud Pub/Sub.
+
+    This client batches, orders and flow-controls the published messages the
+    same way as :class:`~google.cloud.pubsub_v1.publisher.client.Client`, but
+    runs entirely on the asyncio event loop, on top of the GAPIC
+    ``PublisherAsyncClient``. No helper threads are used: the batches are
+    committed by event loop timers and sent by tasks.
+
+    The client must only be used from a single event loop, and its methods
+    must be called from that loop's thread.
+
+    Args:
+        batch_settings (~google.cloud.pubsub_v1.types.BatchSettings): The
+            settings for batch publishing.
+        publisher_options (~google.cloud.pubsub_v1.types.PublisherOptions): The
+            options for the publisher client. Note that enabling message ordering will
+            override the publish retry timeout to be infinite.
+        kwargs (dict): Any additional arguments provided are sent as keyword
+            arguments to the underlying
+            :class:`~google.pubsub_v1.services.publisher.PublisherAsyncClient`.
+            Generally you should not need to set additional keyword
+            arguments. Regional endpoints can be set via ``client_options`` that
+            takes a single key-value pair that defines the endpoint.
+
+    Example:
+
+    .. code-block:: python
+
+        from google.cloud import pubsub_v1
+
+        async def main():
+            publisher_client = pubsub_v1.PublisherAsyncClient(
+                # Optional
+                batch_settings = pubsub_v1.types.BatchSettings(
+                    max_messages=500,
+                    max_latency=0.05,
+                ),
+            )
+
+            topic = publisher_client.topic_path('[PROJECT]', '[TOPIC]')
+            future = await publisher_client.publish(topic, b'data')
+            message_id = await future
+
+            await publisher_client.stop()
+    """
+
+    def __init__(self, batch_settings=(), publisher_options=(), **kwargs):
+        assert (
+            type(batch_settings) is types.BatchSettings or len(batch_settings) == 0
+        ), "batch_settings must be of type BatchSettings or an empty tuple."
+        assert (
+            type(publisher_options) is types.PublisherOptions
+            or len(publisher_options) == 0
+        ), "publisher_options must be of type PublisherOptions or an empty tuple."
+
+        # Sanity check: Is our goal to use the emulator?
+        # If so, create a grpc insecure channel with the emulator host
+        # as the target.
+        if os.environ.get("PUBSUB_EMULATOR_HOST"):
+            kwargs["client_options"] = {
+                "api_endpoint": os.environ.get("PUBSUB_EMULATOR_HOST")
+            }
+            kwargs["credentials"] = AnonymousCredentials()
+
+        # For a transient failure, retry publishing the message infinitely.
+        self.publisher_options = types.PublisherOptions(*publisher_options)
+        self._enable_message_ordering = self.publisher_options[0]
+        if self.publisher_options.fire_and_forget is not None:
+            raise ValueError(
+                "The fire-and-forget mode is not supported by the asyncio client."
+            )
+        if self.publisher_options.payload_compression is not None:
+            raise ValueError(
+                "Payload compression is not supported by the asyncio client."
+            )
+        if self.publisher_options.envelope_packing is not None:
+            raise ValueError("Envelope packing is not supported by the asyncio client.")
+        if self.publisher_options.topic_settings is not None:
+            raise ValueError("Topic settings are not supported by the asyncio client.")
+        if (
+            self.publisher_options.retry_budget is not None
+            or self.publisher_options.circuit_breaker is not None
+        ):
+            raise ValueError(
+                "Retry budgets and circuit breakers are not supported by the "
+                "asyncio client."
+            )
+        if self.publisher_options.hedging is not None:
+            raise ValueError("Hedging is not supported by the asyncio client.")
+        if self.publisher_options.outbox is not None:
+            raise ValueError("The outbox is not supported by the asyncio client.")
+        if self.publisher_options.spill is not None:
+            raise ValueError("Spilling is not supported by the asyncio client.")
+
+        # Add the metrics headers, and instantiate the underlying GAPIC
+        # client.
+        self.api = publisher_async_client.PublisherAsyncClient(**kwargs)
+        self._target = self.api._client._transport._host
+        self._batch_class = aio.Batch
+
+        # The GAPIC default retry settings of the Publish RPC, applied without
+        # blocking the event loop between the attempts.
+        transport = self.api._client._transport
+        self._default_publish_retry = _to_async_retry(
+            transport._wrapped_methods[transport.publish]._retry
+        )
+        self.batch_settings = types.BatchSettings(*batch_settings)
+
+        # Adjusts the batch settings of each topic to its traffic, if enabled.
+        adaptive_batch_settings = self.publisher_options.adaptive_batch_settings
+        if adaptive_batch_settings is None:
+            self._batch_sizer = None
+        else:
+            self._batch_sizer = AdaptiveBatchSizer(
+                self.batch_settings, adaptive_batch_settings
+            )
+
+        # (topic, ordering_key) => sequencers object. The sequencers are the
+        # same as with the threaded client, only their batches differ.
+        self._sequencers = {}
+        self._is_stopped = False
+
+        # The object controlling the message publishing flow
+        self._flow_controller = AsyncFlowController(self.publisher_options.flow_control)
+
+        # The event loop the client runs on, and the tasks sending the committed
+        # batches. Both are only known once the client is used on a loop.
+        self._loop = None
+        self._commit_tasks = set()
+
+        # Limit the number of concurrently running publish requests, overall
+        # and per topic.
+        self._rpc_semaphore = None
+        self._topic_rpc_semaphores = {}
+
+    @classmethod
+    def from_service_account_file(cls, filename, batch_settings=(), **kwargs):
+        """Creates an instance of this client using the provided credentials
+        file.
+
+        Args:
+            filename (str): The path to the service account private key json
+                file.
+            batch_settings (~google.cloud.pubsub_v1.types.BatchSettings): The
+                settings for batch publishing.
+            kwargs: Additional arguments to pass to the constructor.
+
+        Returns:
+            A Publisher :class:`~google.cloud.pubsub_v1.publisher.AsyncClient`
+            instance that is the constructed client.
+        """
+        credentials = service_account.Credentials.from_service_account_file(filename)
+        kwargs["credentials"] = credentials
+        return cls(batch_settings, **kwargs)
+
+    from_service_account_json = from_service_account_file
+
+    @property
+    def target(self):
+        """Return the target (where the API is).
+
+        Returns:
+            str: The location of the API.
+        """
+        return self._target
+
+    def _bind_to_running_loop(self):
+        """Bind the client to the event loop it is used on.
+
+        Raises:
+            RuntimeError:
+                If the client was already used on a different event loop.
+        """
+        loop = asyncio.get_event_loop()
+        if self._loop is None:
+            self._loop = loop
+            max_rpcs = self.publisher_options.concurrency_control.max_outstanding_rpcs
+            if max_rpcs is not None:
+                self._rpc_semaphore = asyncio.Semaphore(max_rpcs)
+        elif self._loop is not loop:
+            raise RuntimeError(
+                "The publisher client cannot be used on more than one event loop."
+            )
+
+    def get_batch_settings(self, topic):
+        """Return the batch settings currently in effect for a topic.
+
+        These are the client's batch settings, unless adaptive batch settings
+        are enabled in the publisher options. In that case the returned
+        settings reflect the latest adjustment to the topic's traffic.
+
+        Args:
+            topic (str): The topic.
+
+        Returns:
+            ~google.cloud.pubsub_v1.types.BatchSettings: The batch settings
+            applied to the next batch of the topic.
+        """
+        if self._batch_sizer is None:
+            return self.batch_settings
+        return self._batch_sizer.get_settings(topic)
+
+    def _record_publish_latency(self, topic, latency):
+        """Record the duration of a successful publish request.
+
+        Args:
+            topic (str): The topic the messages were published to.
+            latency (float): The duration of the request, in seconds.
+        """
+        if self._batch_sizer is not None:
+            self._batch_sizer.record_publish_latency(topic, latency)
+
+    def _get_or_create_sequencer(self, topic, ordering_key):
+        """Get an existing sequencer or create a new one given the (topic,
+        ordering_key) pair.
+        """
+        sequencer_key = (topic, ordering_key)
+        sequencer = self._sequencers.get(sequencer_key)
+        if sequencer is None:
+            if ordering_key == "":
+                sequencer = unordered_sequencer.UnorderedSequencer(self, topic)
+            else:
+                sequencer = ordered_sequencer.OrderedSequencer(
+                    self, topic, ordering_key
+                )
+            self._sequencers[sequencer_key] = sequencer
+
+        return sequencer
+
+    def resume_publish(self, topic, ordering_key):
+        """Resume publish on an ordering key that has had unrecoverable errors.
+
+        Args:
+            topic (str): The topic to publish messages to.
+            ordering_key: A string that identifies related messages for which
+                publish order should be respected.
+
+        Raises:
+            RuntimeError:
+                If called after publisher has been stopped by a `stop()` method
+                call.
+            ValueError:
+                If the topic/ordering key combination has not been seen before
+                by this client.
+        """
+        if self._is_stopped:
+            raise RuntimeError("Cannot resume publish on a stopped publisher.")
+
+        if not self._enable_message_ordering:
+            raise ValueError(
+                "Cannot resume publish on a topic/ordering key if ordering "
+                "is not enabled."
+            )
+
+        sequencer_key = (topic, ordering_key)
+        sequencer = self._sequencers.get(sequencer_key)
+        if sequencer is None:
+            _LOGGER.debug(
+                "Error: The topic/ordering key combination has not " "been seen before."
+            )
+        else:
+            sequencer.unpause()
+
+    async def publish(
+        self, topic, data, ordering_key="", retry=gapic_v1.method.DEFAULT, **attrs
+    ):
+        """Publish a single message.
+
+        .. note::
+            Messages in Pub/Sub are blobs of bytes. They are *binary* data,
+            not text. You must send data as a bytestring, and this library
+            will raise an exception if you send a text string.
+
+        Add the given message to a batch; this will cause it to be published
+        once the batch either has enough messages or a sufficient period of
+        time has elapsed. Awaiting this method only waits for the message to
+        be accepted, i.e. for flow control capacity if
+        ``LimitExceededBehavior.BLOCK`` is used, while the returned future
+        tracks the publishing itself.
+
+        Example:
+            >>> from google.cloud import pubsub_v1
+            >>> client = pubsub_v1.PublisherAsyncClient()
+            >>> topic = client.topic_path('[PROJECT]', '[TOPIC]')
+            >>> data = b'The rain in Wales falls mainly on the snails.'
+            >>> future = await client.publish(topic, data, username='guido')
+            >>> message_id = await future
+
+        Args:
+            topic (str): The topic to publish messages to.
+            data (bytes): A bytestring representing the message body. This
+                must be a bytestring.
+            ordering_key: A string that identifies related messages for which
+                publish order should be respected. Message ordering must be
+                enabled for this client to use this feature.
+            retry (Optional[google.api_core.retry_async.AsyncRetry]): Designation
+                of what errors, if any, should be retried. If `ordering_key` is
+                specified, the total retry deadline will be changed to "infinity".
+            attrs (Mapping[str, str]): A dictionary of attributes to be
+                sent as metadata. (These may be text strings or byte strings.)
+
+        Returns:
+            asyncio.Future: A future resolving to the ID of the published
+            message.
+
+        Raises:
+            RuntimeError:
+                If called after publisher has been stopped by a `stop()` method
+                call.
+
+            pubsub_v1.publisher.exceptions.MessageTooLargeError: If publishing
+                the ``message`` would exceed the max size limit on the backend.
+        """
+        # Sanity check: Is the data being sent as a bytestring?
+        # If it is literally anything else, complain loudly about it.
+        if not isinstance(data, bytes):
+            raise TypeError(
+                "Data being published to Pub/Sub must be sent as a bytestring."
+            )
+
+        if not self._enable_message_ordering and ordering_key != "":
+            raise ValueError(
+                "Cannot publish a message with an ordering key when message "
+                "ordering is not enabled."
+            )
+
+        # Coerce all attributes to text strings.
+        for k, v in copy.copy(attrs).items():
+            if isinstance(v, str):
+                continue
+            if isinstance(v, bytes):
+                attrs[k] = v.decode("utf-8")
+                continue
+            raise TypeError(
+                "All attributes being published to Pub/Sub must "
+                "be sent as text strings."
+            )
+
+        self._bind_to_running_loop()
+
+        # Create the Pub/Sub message object. For performance reasons, the message
+        # should be constructed by directly using the raw protobuf class, and only
+        # then wrapping it into the higher-level PubsubMessage class.
+        vanilla_pb = _raw_proto_pubbsub_message(
+            data=data, ordering_key=ordering_key, attributes=attrs
+        )
+        message = gapic_types.PubsubMessage.wrap(vanilla_pb)
+
+        # Messages should go through flow control to prevent excessive
+        # queuing on the client side (depending on the settings).
+        try:
+            await self._flow_controller.add(message)
+        except exceptions.FlowControlLimitError as exc:
+            future = self._loop.create_future()
+            future.set_exception(exc)
+            return future
+
+        if self._is_stopped:
+            self._flow_controller.release(message)
+            raise RuntimeError("Cannot publish on a stopped publisher.")
+
+        if self._batch_sizer is not None:
+            self._batch_sizer.record_arrivals(topic)
+
+        # Set retry timeout to "infinite" when message ordering is enabled.
+        # Note that this then also impacts messages added with an empty
+        # ordering key.
+        if self._enable_message_ordering:
+            if retry is gapic_v1.method.DEFAULT:
+                retry = self._default_publish_retry
+            retry = retry.with_deadline(2.0**32)
+
+        # Delegate the publishing to the sequencer.
+        sequencer = self._get_or_create_sequencer(topic, ordering_key)
+        try:
+            future = sequencer.publish(message, retry=retry)
+        except Exception:
+            self._flow_controller.release(message)
+            raise
+
+        if not isinstance(future, asyncio.Future):
+            # A paused ordering key, the sequencer returns a (threading) future
+            # that has already failed.
+            failed_future = self._loop.create_future()
+            failed_future.set_exception(future.exception())
+            future = failed_future
+
+        future.add_done_callback(lambda _: self._flow_controller.release(message))
+        return future
+
+    async def stop(self):
+        """Immediately publish all outstanding messages and wait until the
+        publishing finishes.
+
+        Prevents future calls to `publish()`. Method should be awaited prior
+        to deleting this `AsyncClient()` object in order to ensure that no
+        pending messages are lost. The results of the publishing are reported
+        through the futures returned by `publish()`.
+
+        Raises:
+            RuntimeError:
+                If called after publisher has been stopped by a `stop()` method
+                call.
+        """
+        if self._is_stopped:
+            raise RuntimeError("Cannot stop a publisher already stopped.")
+
+        self._is_stopped = True
+
+        for sequencer in self._sequencers.values():
+            sequencer.stop()
+
+        if self._commit_tasks:
+            await asyncio.gather(*self._commit_tasks, return_exceptions=True)
+
+    def _schedule_commit(self, delay, callback):
+        """Schedule a batch commit callback to run after the given delay.
+
+        Args:
+            delay (float): The number of seconds to wait before committing,
+                typically the max latency of the batch. If infinite, the
+                callback is never invoked.
+            callback (Callable[[], Any]): The function committing the batch.
+        """
+        if not math.isinf(delay):
+            self._loop.call_later(delay, callback)
+
+    def _schedule_sequencer_cleanup(self, topic, ordering_key):
+        """Schedule the removal of a sequencer that has finished publishing.
+
+        Args:
+            topic (str): The topic of the sequencer.
+            ordering_key (str): The ordering key of the sequencer.
+        """
+        delay = self.batch_settings.max_latency
+        if math.isinf(delay):
+            delay = 0
+        cleanup = functools.partial(
+            self._remove_sequencer_if_finished, topic, ordering_key
+        )
+        self._loop.call_later(delay, cleanup)
+
+    def _remove_sequencer_if_finished(self, topic, ordering_key):
+        """Remove a sequencer if it is finished and should be cleaned up."""
+        sequencer_key = (topic, ordering_key)
+        sequencer = self._sequencers.get(sequencer_key)
+        if sequencer is not None and sequencer.is_finished():
+            del self._sequencers[sequencer_key]
+
+    def _create_commit_task(self, commit):
+        """Run a batch commit as a task on the client's event loop.
+
+        The client holds on to the task until it is done, the event loop only
+        keeps weak references to its tasks.
+
+        Args:
+            commit (Coroutine): The batch commit.
+        """
+        task = self._loop.create_task(commit)
+        self._commit_tasks.add(task)
+        task.add_done_callback(self._commit_tasks.discard)
+
+    async def _publish_rpc(self, topic, messages, retry=gapic_v1.method.DEFAULT):
+        """Send a publish request, once the number of publish requests that
+        are already running drops below the limit.
+
+        Args:
+            topic (str): The topic to publish the messages to.
+            messages (Sequence[~.pubsub_v1.types.PubsubMessage]): The messages.
+            retry (Optional[google.api_core.retry_async.AsyncRetry]): Designation
+                of what errors, if any, should be retried.
+
+        Returns:
+            ~google.pubsub_v1.types.PublishResponse: The response.
+        """
+        if retry is gapic_v1.method.DEFAULT:
+            retry = self._default_publish_retry
+
+        concurrency_control = self.publisher_options.concurrency_control
+        max_topic_rpcs = concurrency_control.max_outstanding_rpcs_per_topic
+        topic_semaphore = None
+        if max_topic_rpcs is not None:
+            topic_semaphore = self._topic_rpc_semaphores.get(topic)
+            if topic_semaphore is None:
+                topic_semaphore = asyncio.Semaphore(max_topic_rpcs)
+                self._topic_rpc_semaphores[topic] = topic_semaphore
+
+        # The limits are unbounded if not set.
+        semaphores = [
+            semaphore
+            for semaphore in (topic_semaphore, self._rpc_semaphore)
+            if semaphore is not None
+        ]
+        acquired = []
+        try:
+            for semaphore in semaphores:
+                await semaphore.acquire()
+                acquired.append(semaphore)
+            return await self.api.publish(topic=topic, messages=messages, retry=retry)
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+    # Used only for testing.
+    def _set_batch_class(self, batch_class):
+        self._batch_class = batch_class
+
+
+def _to_async_retry(retry):
+    """Return the asyncio counterpart of retry settings.
+
+    Args:
+        retry (google.api_core.retry.Retry): The retry settings.
+
+    Returns:
+        google.api_core.retry_async.AsyncRetry: The same retry settings.
+    """
+    return retry_async.AsyncRetry(
+        predicate=retry._predicate,
+        initial=retry._initial,
+        maximum=retry._maximum,
+        multiplier=retry._multiplier,
+        deadline=retry._deadline,
+        on_error=retry._on_error,
+    )
@@ -14,27 +14,50 @@
 
 from __future__ import absolute_import
 
+import collections
 import copy
+import functools
 import logging
+import math
 import os
 import pkg_resources
 import threading
-import time
+import warnings
 
+from google.api_core import exceptions as core_exceptions
 from google.api_core import gapic_v1
 from google.auth.credentials import AnonymousCredentials
 from google.oauth2 import service_account
 
+from google.cloud.pubsub_v1 import _channel_pool
+from google.cloud.pubsub_v1 import _envelopes
+from google.cloud.pubsub_v1 import _fork
 from google.cloud.pubsub_v1 import _gapic
+from google.cloud.pubsub_v1 import _raw_rpc
+from google.cloud.pubsub_v1 import codecs
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.publisher import exceptions
 from google.cloud.pubsub_v1.publisher import futures
+from google.cloud.pubsub_v1.publisher._adaptive_batching import AdaptiveBatchSizer
 from google.cloud.pubsub_v1.publisher._batch import thread
+from google.cloud.pubsub_v1.publisher._batch.topic_batcher import OrderedTopicBatcher
+from google.cloud.pubsub_v1.publisher._commit_executor import CommitExecutor
+from google.cloud.pubsub_v1.publisher._commit_timer import CommitTimer
+from google.cloud.pubsub_v1.publisher._envelope_packer import EnvelopePacker
+from google.cloud.pubsub_v1.publisher._hedging import PublishHedger
+from google.cloud.pubsub_v1.publisher._outbox import Outbox
+from google.cloud.pubsub_v1.publisher._outbox import check_retry
+from google.cloud.pubsub_v1.publisher._retry_control import CircuitBreaker
+from google.cloud.pubsub_v1.publisher._retry_control import RetryBudget
+from google.cloud.pubsub_v1.publisher._retry_control import RetryController
 from google.cloud.pubsub_v1.publisher._sequencer import ordered_sequencer
 from google.cloud.pubsub_v1.publisher._sequencer import unordered_sequencer
+from google.cloud.pubsub_v1.publisher._spill import BatchSpiller
+from google.cloud.pubsub_v1.publisher._topic_settings import TopicSettingsResolver
 from google.cloud.pubsub_v1.publisher.flow_controller import FlowController
 from google.pubsub_v1 import types as gapic_types
 from google.pubsub_v1.services.publisher import client as publisher_client
+from google.pubsub_v1.services.publisher.transports import PublisherGrpcTransport
 
 try:
     __version__ = pkg_resources.get_distribution("google-cloud-pubsub").version
@@ -52,6 +75,14 @@ _BLACKLISTED_METHODS = (
 )
 
 _raw_proto_pubbsub_message = gapic_types.PubsubMessage.pb()
+_raw_proto_publish_response = gapic_types.PublishResponse.pb()
+
+PublishCounts = collections.namedtuple("PublishCounts", ["published", "failed"])
+PublishCounts.__doc__ = (
+    "The number of messages published by a client in fire-and-forget mode."
+)
+PublishCounts.published.__doc__ = "The number of successfully published messages."
+PublishCounts.failed.__doc__ = "The number of messages that failed to be published."
 
 
 @_gapic.add_methods(publisher_client.PublisherClient, blacklist=_BLACKLISTED_METHODS)
@@ -68,6 +99,14 @@ class Client(object):
         publisher_options (~google.cloud.pubsub_v1.types.PublisherOptions): The
             options for the publisher client. Note that enabling message ordering will
             override the publish retry timeout to be infinite.
+        channel_pool_size (int): The number of gRPC channels to spread the
+            requests over, each with a connection of its own. The requests of
+            an ordered topic are always sent over the same channel. Defaults
+            to a single channel. Cannot be combined with a custom
+            ``transport``.
+        compression_settings (~google.cloud.pubsub_v1.types.CompressionSettings):
+            The compression of the publish requests. By default the requests
+            are not compressed.
         kwargs (dict): Any additional arguments provided are sent as keyword
             arguments to the underlying
             :class:`~google.cloud.pubsub_v1.gapic.publisher_client.PublisherClient`.
@@ -95,6 +134,9 @@ class Client(object):
                     message_limit=2000,
                     limit_exceeded_behavior=pubsub_v1.types.LimitExceededBehavior.BLOCK,
                 ),
+                concurrency_control=pubsub_v1.types.PublishConcurrencyControl(
+                    max_outstanding_rpcs=16,
+                ),
             ),
 
             # Optional
@@ -104,7 +146,14 @@ class Client(object):
         )
     """
 
-    def __init__(self, batch_settings=(), publisher_options=(), **kwargs):
+    def __init__(
+        self,
+        batch_settings=(),
+        publisher_options=(),
+        channel_pool_size=1,
+        compression_settings=None,
+        **kwargs
+    ):
         assert (
             type(batch_settings) is types.BatchSettings or len(batch_settings) == 0
         ), "batch_settings must be of type BatchSettings or an empty tuple."
@@ -112,6 +161,12 @@ class Client(object):
             type(publisher_options) is types.PublisherOptions
             or len(publisher_options) == 0
         ), "publisher_options must be of type PublisherOptions or an empty tuple."
+        if channel_pool_size < 1:
+            raise ValueError("channel_pool_size must be at least 1.")
+        if channel_pool_size > 1 and "transport" in kwargs:
+            raise ValueError(
+                "channel_pool_size cannot be combined with a custom transport."
+            )
 
         # Sanity check: Is our goal to use the emulator?
         # If so, create a grpc insecure channel with the emulator host
@@ -125,26 +180,212 @@ class Client(object):
         # For a transient failure, retry publishing the message infinitely.
         self.publisher_options = types.PublisherOptions(*publisher_options)
         self._enable_message_ordering = self.publisher_options[0]
+        if (
+            self.publisher_options.envelope_packing is not None
+            and self.publisher_options.fire_and_forget is not None
+        ):
+            raise ValueError(
+                "Envelope packing cannot be combined with the fire-and-forget mode."
+            )
+        if (
+            self.publisher_options.outbox is not None
+            and self.publisher_options.fire_and_forget is not None
+        ):
+            raise ValueError(
+                "The outbox cannot be combined with the fire-and-forget mode."
+            )
+
+        # The arguments of the underlying GAPIC client are kept, to create it
+        # again in the child process after a fork.
+        self._client_kwargs = kwargs
+        self._channel_pool_size = channel_pool_size
+        self._create_api()
+        self._batch_class = thread.Batch
+        self.batch_settings = types.BatchSettings(*batch_settings)
+        self._is_stopped = False
+
+        # In fire-and-forget mode, the batches report their outcome to the
+        # client instead of completing a future for each message.
+        self._fire_and_forget = self.publisher_options.fire_and_forget
+
+        # The codec compressing the data of large messages on the commit
+        # threads, if enabled.
+        payload_compression = self.publisher_options.payload_compression
+        if payload_compression is None:
+            self._payload_codec = None
+            self._payload_min_bytes = None
+        else:
+            self._payload_codec = codecs.get_codec(payload_compression.codec)
+            self._payload_min_bytes = payload_compression.min_bytes
+
+        # Packs the messages into envelopes, if enabled.
+        self._envelope_packing = self.publisher_options.envelope_packing
+
+        if compression_settings is None:
+            compression_settings = types.CompressionSettings()
+        self._compression_settings = compression_settings
+
+        self._init_publishing_state()
+
+        # Stores the messages on disk before publishing them, if enabled. The
+        # outbox starts publishing the messages left over by a previous client
+        # right away, thus it is created last.
+        outbox = self.publisher_options.outbox
+        if outbox is None:
+            self._outbox = None
+        else:
+            self._outbox = Outbox(self, outbox)
+
+        _fork.register(self)
+
+    def _create_api(self):
+        """Instantiate the underlying GAPIC client, and the raw Publish RPC."""
+        kwargs = self._client_kwargs
 
         # Add the metrics headers, and instantiate the underlying GAPIC
         # client.
         self.api = publisher_client.PublisherClient(**kwargs)
+        if self._channel_pool_size > 1:
+            transport = _channel_pool.create_transport(
+                PublisherGrpcTransport,
+                self.api._transport,
+                self._channel_pool_size,
+                client_info=kwargs.get("client_info"),
+            )
+            self.api = publisher_client.PublisherClient(transport=transport)
         self._target = self.api._transport._host
-        self._batch_class = thread.Batch
-        self.batch_settings = types.BatchSettings(*batch_settings)
+
+        # The Publish RPC taking an already serialized PublishRequest, see
+        # _publish_serialized().
+        self._serialized_publish_rpc = _raw_rpc.RawUnaryRpc(
+            self.api._transport,
+            "publish",
+            "/google.pubsub.v1.Publisher/Publish",
+            request_serializer=None,
+            response_deserializer=_raw_proto_publish_response.FromString,
+            routing_field="topic",
+        )
+
+    def _init_publishing_state(self):
+        """Create the batches' bookkeeping, the locks and the helper threads'
+        pools of the client, without any pending messages."""
+        # Adjusts the batch settings of each topic to its traffic, if enabled.
+        adaptive_batch_settings = self.publisher_options.adaptive_batch_settings
+        if adaptive_batch_settings is None:
+            self._batch_sizer = None
+        else:
+            self._batch_sizer = AdaptiveBatchSizer(
+                self.batch_settings, adaptive_batch_settings
+            )
 
         # The batches on the publisher client are responsible for holding
         # messages. One batch exists for each topic.
         self._batch_lock = self._batch_class.make_lock()
         # (topic, ordering_key) => sequencers object
         self._sequencers = {}
-        self._is_stopped = False
-        # Thread created to commit all sequencers after a timeout.
-        self._commit_thread = None
+        # topic => batcher packing the batches of different ordering keys into
+        # shared publish requests
+        self._topic_batchers = {}
+        # Commits each batch once its max latency expires, and cleans up the
+        # finished sequencers.
+        self._commit_timer = CommitTimer()
 
         # The object controlling the message publishing flow
         self._flow_controller = FlowController(self.publisher_options.flow_control)
 
+        # The batch settings and flow controllers of the topics, overridden by
+        # the topic settings, if any. The client's flow controller is a global
+        # cap shared by all topics.
+        self._topic_settings = TopicSettingsResolver(
+            self.batch_settings,
+            self.publisher_options.flow_control,
+            self._flow_controller,
+            self.publisher_options.topic_settings,
+        )
+
+        # The outcome of the messages published in fire-and-forget mode.
+        self._publish_counts_lock = threading.Lock()
+        self._published_count = 0
+        self._failed_count = 0
+
+        # (topic, ordering_key) => EnvelopePacker
+        self._envelope_packers = {}
+        self._envelope_packers_lock = threading.Lock()
+        self._envelope_packers_stopped = self._is_stopped
+
+        # Caps the retries of the publish requests, and stops sending them
+        # while the backend keeps failing, if enabled.
+        retry_budget = self.publisher_options.retry_budget
+        if retry_budget is not None:
+            retry_budget = RetryBudget(retry_budget)
+        circuit_breaker = self.publisher_options.circuit_breaker
+        if circuit_breaker is not None:
+            circuit_breaker = CircuitBreaker(circuit_breaker)
+        self._circuit_breaker = circuit_breaker
+        if retry_budget is None and circuit_breaker is None:
+            self._retry_controller = None
+        else:
+            transport = self.api._transport
+            self._retry_controller = RetryController(
+                retry_budget,
+                circuit_breaker,
+                transport._wrapped_methods[transport.publish]._retry,
+            )
+
+        # The pool of threads running the batch commits (publish requests).
+        concurrency_control = self.publisher_options.concurrency_control
+        self._commit_executor = CommitExecutor(
+            max_workers=concurrency_control.max_outstanding_rpcs,
+            max_workers_per_topic=concurrency_control.max_outstanding_rpcs_per_topic,
+        )
+
+        # Spills the committed batches waiting for a commit thread to disk
+        # beyond a memory budget, if enabled.
+        spill = self.publisher_options.spill
+        if spill is None:
+            self._batch_spiller = None
+        else:
+            self._batch_spiller = BatchSpiller(spill)
+
+        # Hedges the slow publish requests of the messages without an
+        # ordering key, if enabled. There cannot be more hedged requests than
+        # requests in progress.
+        hedging = self.publisher_options.hedging
+        if hedging is None:
+            self._hedger = None
+        else:
+            self._hedger = PublishHedger(
+                self, hedging, concurrency_control.max_outstanding_rpcs
+            )
+
+    def _after_fork(self):
+        """Rebuild the client in the child process after a fork.
+
+        Only the forking thread exists in the child, thus the helper threads
+        of the client are gone, and its locks might be held forever. The gRPC
+        channels of the parent cannot be used either. The client's transport,
+        locks, sequencers and helper threads are thus created again, and the
+        messages that the parent had not published yet are dropped, the parent
+        still publishes them. Their futures never complete in the child.
+
+        A transport instance passed to the client cannot be created again, the
+        child keeps using it, and a warning is logged. The outbox, if enabled,
+        is disabled in the child, the outbox directory stays owned by the
+        parent.
+        """
+        if _fork.can_create_transport(self._client_kwargs):
+            self._create_api()
+        else:
+            _LOGGER.warning(
+                "The publisher client was created with a custom transport, "
+                "which cannot be created again after a fork. The child process "
+                "shares the gRPC channel of the parent, which might not work, "
+                "create the client after the fork instead."
+            )
+        self._init_publishing_state()
+        if self._outbox is not None:
+            self._outbox._after_fork()
+
     @classmethod
     def from_service_account_file(cls, filename, batch_settings=(), **kwargs):
         """Creates an instance of this client using the provided credentials
@@ -176,6 +417,118 @@ class Client(object):
         """
         return self._target
 
+    def get_batch_settings(self, topic):
+        """Return the batch settings currently in effect for a topic.
+
+        These are the client's batch settings, or the batch settings of the
+        topic if overridden in the publisher options' topic settings. If
+        adaptive batch settings are enabled in the publisher options, the
+        returned settings reflect the latest adjustment to the topic's
+        traffic, within those settings.
+
+        Args:
+            topic (str): The topic.
+
+        Returns:
+            ~google.cloud.pubsub_v1.types.BatchSettings: The batch settings
+            applied to the next batch of the topic.
+        """
+        batch_settings = self._topic_settings.get(topic).batch_settings
+        if self._batch_sizer is None:
+            return batch_settings
+        return self._batch_sizer.get_settings(topic, batch_settings)
+
+    def _get_topic_settings(self, topic):
+        """Return the settings in effect for a topic.
+
+        Args:
+            topic (str): The topic.
+
+        Returns:
+            ~google.cloud.pubsub_v1.publisher._topic_settings.TopicConfig: The
+            static batch settings and the flow controller of the topic.
+        """
+        return self._topic_settings.get(topic)
+
+    def _record_publish_latency(self, topic, latency):
+        """Record the duration of a successful publish request.
+
+        Args:
+            topic (str): The topic the messages were published to.
+            latency (float): The duration of the request, in seconds.
+        """
+        if self._batch_sizer is not None:
+            self._batch_sizer.record_publish_latency(topic, latency)
+        if self._hedger is not None:
+            self._hedger.record_latency(latency)
+
+    def get_publish_counts(self):
+        """Return the number of messages published so far in fire-and-forget
+        mode.
+
+        The counts are only kept if fire-and-forget mode is enabled in the
+        publisher options, otherwise the outcome of each message is reported
+        by its future.
+
+        Returns:
+            PublishCounts: The number of messages that were successfully
+            published, and that failed to be published.
+        """
+        with self._publish_counts_lock:
+            return PublishCounts(self._published_count, self._failed_count)
+
+    def get_circuit_breaker_state(self):
+        """Return the state of the client's circuit breaker.
+
+        Returns:
+            Optional[~google.cloud.pubsub_v1.types.CircuitBreakerState]: The
+            state, or :data:`None` if the circuit breaker is not enabled in
+            the publisher options.
+        """
+        if self._circuit_breaker is None:
+            return None
+        return self._circuit_breaker.state
+
+    def _on_fire_and_forget_batch_done(
+        self, topic, message_count, message_bytes, exception
+    ):
+        """Release the flow control of a completed batch and report its
+        outcome, in fire-and-forget mode.
+
+        Args:
+            topic (str): The topic the messages were published to.
+            message_count (int): The number of messages in the batch.
+            message_bytes (int): The total size of the messages.
+            exception (Optional[Exception]): The error, if the messages failed
+                to be published.
+        """
+        flow_controller = self._topic_settings.get(topic).flow_controller
+        flow_controller._release_many(message_count, message_bytes)
+        self._report_fire_and_forget_outcome(topic, message_count, exception)
+
+    def _report_fire_and_forget_outcome(self, topic, message_count, exception):
+        """Count the messages and invoke the error callback on failure.
+
+        Args:
+            topic (str): The topic the messages were published to.
+            message_count (int): The number of messages.
+            exception (Optional[Exception]): The error, if the messages failed
+                to be published.
+        """
+        error_callback = self._fire_and_forget.error_callback
+        if exception is not None and error_callback is not None:
+            try:
+                error_callback(topic, exception, message_count)
+            except Exception:
+                _LOGGER.exception("Error in the fire-and-forget error callback.")
+
+        # The messages are counted last, once they are fully processed.
+        with self._publish_counts_lock:
+            if exception is None:
+                self._published_count += message_count
+            else:
+                self._failed_count += message_count
+
     def _get_or_create_sequencer(self, topic, ordering_key):
         """ Get an existing sequencer or create a new one given the (topic,
             ordering_key) pair.
@@ -186,13 +539,74 @@ class Client(object):
             if ordering_key == "":
                 sequencer = unordered_sequencer.UnorderedSequencer(self, topic)
             else:
+                topic_batcher = self._topic_batchers.get(topic)
+                if topic_batcher is None:
+                    topic_batcher = OrderedTopicBatcher(self, topic)
+                    self._topic_batchers[topic] = topic_batcher
                 sequencer = ordered_sequencer.OrderedSequencer(
-                    self, topic, ordering_key
+                    self, topic, ordering_key, topic_batcher=topic_batcher
                 )
             self._sequencers[sequencer_key] = sequencer
 
         return sequencer
 
+    def _publish_serialized(
+        self,
+        topic,
+        request,
+        retry=gapic_v1.method.DEFAULT,
+        pinned=False,
+        ordered=False,
+    ):
+        """Send an already serialized ``PublishRequest`` to the backend.
+
+        The request bytes are handed to gRPC as they are, skipping the
+        construction and serialization of the request message, and the
+        response is not wrapped into a proto-plus message. The default retry
+        and timeout settings, as well as the request metadata, are the same as
+        with the ``publish()`` method of the underlying GAPIC client.
+
+        The request is compressed according to the client's compression
+        settings, if it is large enough. Its retries are subject to the
+        client's retry budget and circuit breaker, if enabled.
+
+        Args:
+            topic (str): The topic the request publishes to, used for
+                request routing.
+            request (bytes): The wire-format ``PublishRequest``.
+            retry (Optional[google.api_core.retry.Retry]): Designation of what
+                errors, if any, should be retried.
+            pinned (bool): Whether to send all of the requests to the topic
+                over the same channel, if the client has a pool of channels.
+            ordered (bool): Whether the request publishes messages with an
+                ordering key. Such requests are held back by the circuit
+                breaker, and their retries are not limited by the retry
+                budget.
+
+        Returns:
+            ~google.pubsub_v1.types.PublishResponse.pb: The raw protobuf
+            response.
+        """
+        compression = self._compression_settings.publish
+        if len(request) < self._compression_settings.min_request_bytes:
+            compression = None
+
+        if self._retry_controller is None:
+            return self._serialized_publish_rpc(
+                request, topic, retry=retry, pinned=pinned, compression=compression
+            )
+        return self._retry_controller.call(
+            functools.partial(
+                self._serialized_publish_rpc,
+                request,
+                topic,
+                pinned=pinned,
+                compression=compression,
+            ),
+            retry,
+            ordered=ordered,
+        )
+
     def resume_publish(self, topic, ordering_key):
         """ Resume publish on an ordering key that has had unrecoverable errors.
 
@@ -230,7 +644,13 @@ class Client(object):
                 sequencer.unpause()
 
     def publish(
-        self, topic, data, ordering_key="", retry=gapic_v1.method.DEFAULT, **attrs
+        self,
+        topic,
+        data,
+        ordering_key="",
+        retry=gapic_v1.method.DEFAULT,
+        priority=types.PublishPriority.NORMAL,
+        **attrs
     ):
         """Publish a single message.
 
@@ -269,14 +689,25 @@ class Client(object):
             retry (Optional[google.api_core.retry.Retry]): Designation of what
                 errors, if any, should be retried. If `ordering_key` is specified,
                 the total retry deadline will be changed to "infinity".
+            priority (~google.cloud.pubsub_v1.types.PublishPriority): The
+                priority of the message. A high-priority message commits its
+                batch right away, and skips ahead of the normal-priority
+                messages blocked by the flow control. Any other value than a
+                :class:`~google.cloud.pubsub_v1.types.PublishPriority` is
+                treated as the ``priority`` attribute of the message, for
+                backwards compatibility.
             attrs (Mapping[str, str]): A dictionary of attributes to be
                 sent as metadata. (These may be text strings or byte strings.)
 
         Returns:
-            A :class:`~google.cloud.pubsub_v1.publisher.futures.Future`
-            instance that conforms to Python Standard library's
-            :class:`~concurrent.futures.Future` interface (but not an
-            instance of that class).
+            A :class:`~google.cloud.pubsub_v1.publisher.futures.MessageFuture`
+            instance, a subclass of
+            :class:`~google.cloud.pubsub_v1.publisher.futures.Future`. In
+            fire-and-forget mode, :data:`None` is returned, and the outcome
+            is reported through the error callback and
+            :meth:`get_publish_counts`.
+            With envelope packing, the future is shared by all of the records
+            of an envelope, and its result is the message ID of the envelope.
 
         Raises:
             RuntimeError:
@@ -285,6 +716,9 @@ class Client(object):
 
             pubsub_v1.publisher.exceptions.MessageTooLargeError: If publishing
                 the ``message`` would exceed the max size limit on the backend.
+
+            ValueError: If the attributes contain an attribute reserved for
+                marking compressed messages or envelopes.
         """
         # Sanity check: Is the data being sent as a bytestring?
         # If it is literally anything else, complain loudly about it.
@@ -299,6 +733,13 @@ class Client(object):
                 "ordering is not enabled."
             )
 
+        if not isinstance(priority, types.PublishPriority):
+            attrs["priority"] = priority
+            priority = types.PublishPriority.NORMAL
+        urgent = priority is types.PublishPriority.HIGH
+
+        _check_reserved_attributes(attrs)
+
         # Coerce all attributes to text strings.
         for k, v in copy.copy(attrs).items():
             if isinstance(v, str):
@@ -317,96 +758,608 @@ class Client(object):
         vanilla_pb = _raw_proto_pubbsub_message(
             data=data, ordering_key=ordering_key, attributes=attrs
         )
-        message = gapic_types.PubsubMessage.wrap(vanilla_pb)
+        if self._outbox is not None:
+            return self._publish_to_outbox(
+                topic, vanilla_pb.SerializeToString(), ordering_key, retry
+            )
+        if self._envelope_packing is not None:
+            return self._publish_packed(
+                topic, vanilla_pb, vanilla_pb.ByteSize(), ordering_key, retry, urgent
+            )
+        if self._payload_codec is None or len(data) < self._payload_min_bytes:
+            # Encode the message before it reaches the batch, so that the batch
+            # only appends the encoding while the client-wide lock is held.
+            message = vanilla_pb.SerializeToString()
+        else:
+            # The batch compresses the payload when it is committed.
+            message = gapic_types.PubsubMessage.wrap(vanilla_pb)
+
+        return self._publish_message(
+            topic, message, vanilla_pb.ByteSize(), ordering_key, retry, urgent
+        )
+
+    def publish_raw(
+        self, topic, message, ordering_key="", retry=gapic_v1.method.DEFAULT
+    ):
+        """Publish a single already serialized message.
+
+        The wire-format ``PubsubMessage`` is added to the publish request as
+        it is, without decoding it and encoding it again. This is useful for
+        relaying messages received in their serialized form, or for publishing
+        the same message repeatedly. Otherwise the message is published the
+        same way as with :meth:`publish`.
+
+        The message is not validated, an invalid message makes the whole
+        publish request of its batch fail.
+        The message is never packed into an envelope.
+
+        Example:
+            >>> from google.cloud import pubsub_v1
+            >>> client = pubsub_v1.PublisherClient()
+            >>> topic = client.topic_path('[PROJECT]', '[TOPIC]')
+            >>> message = pubsub_v1.types.PubsubMessage(data=b'payload')
+            >>> encoded = pubsub_v1.types.PubsubMessage.serialize(message)
+            >>> response = client.publish_raw(topic, encoded)
+
+        Args:
+            topic (str): The topic to publish messages to.
+            message (Union[bytes, bytearray, memoryview]): The wire-format
+                ``PubsubMessage``. The client keeps a reference to it until
+                the message is published, and a memoryview must be contiguous.
+            ordering_key: The ordering key of the message, which must be the
+                same as the ordering key in the serialized message, because the
+                message is not decoded. Message ordering must be enabled for
+                this client to use this feature.
+            retry (Optional[google.api_core.retry.Retry]): Designation of what
+                errors, if any, should be retried. If `ordering_key` is specified,
+                the total retry deadline will be changed to "infinity".
+
+        Returns:
+            A :class:`~google.cloud.pubsub_v1.publisher.futures.MessageFuture`
+            instance, a subclass of
+            :class:`~google.cloud.pubsub_v1.publisher.futures.Future`. In
+            fire-and-forget mode, :data:`None` is returned, as with
+            :meth:`publish`.
+
+        Raises:
+            RuntimeError:
+                If called after publisher has been stopped by a `stop()` method
+                call.
+
+            pubsub_v1.publisher.exceptions.MessageTooLargeError: If publishing
+                the ``message`` would exceed the max size limit on the backend.
+        """
+        if isinstance(message, memoryview):
+            # The size of a view of anything but bytes is not its length.
+            message = message.cast("B")
+        elif not isinstance(message, (bytes, bytearray)):
+            raise TypeError(
+                "A serialized message must be sent as bytes, bytearray or memoryview."
+            )
+
+        if not self._enable_message_ordering and ordering_key != "":
+            raise ValueError(
+                "Cannot publish a message with an ordering key when message "
+                "ordering is not enabled."
+            )
+
+        if self._outbox is not None:
+            return self._publish_to_outbox(topic, bytes(message), ordering_key, retry)
+
+        # Publish the pending envelope first, to preserve the publishing order.
+        self._flush_envelope_packer(topic, ordering_key)
+        return self._publish_message(topic, message, len(message), ordering_key, retry)
+
+    def _publish_to_outbox(self, topic, message, ordering_key, retry):
+        """Store a message in the outbox, which publishes it later on.
+
+        Args:
+            topic (str): The topic to publish the message to.
+            message (bytes): The wire-format message.
+            ordering_key (str): The ordering key of the message.
+            retry (Optional[google.api_core.retry.Retry]): The retry settings
+                passed to the publish method, which must be the default ones.
+
+        Returns:
+            ~google.cloud.pubsub_v1.publisher.futures.MessageFuture: The future
+            of the message.
+        """
+        check_retry(retry)
+        outcome = futures._BatchOutcome()
+        try:
+            self._outbox.append(
+                topic,
+                ordering_key,
+                [message],
+                [functools.partial(_set_outcome, outcome)],
+            )
+        except exceptions.FlowControlLimitError as exc:
+            return futures._failed_message_future(exc)
+        return futures.MessageFuture(outcome, 0)
+
+    def _publish_from_outbox(self, topic, message, ordering_key):
+        """Publish a message read from the outbox.
+
+        Args:
+            topic (str): The topic to publish the message to.
+            message (bytes): The wire-format message.
+            ordering_key (str): The ordering key of the message.
+
+        Returns:
+            ~google.cloud.pubsub_v1.publisher.futures.Future: The future of
+            the message.
+
+        Raises:
+            RuntimeError: If the publisher has been stopped.
+        """
+        retry = gapic_v1.method.DEFAULT
+        if self._envelope_packing is not None:
+            message = _raw_proto_pubbsub_message.FromString(message)
+            return self._publish_packed(
+                topic, message, message.ByteSize(), ordering_key, retry
+            )
+        return self._publish_message(topic, message, len(message), ordering_key, retry)
+
+    def _is_permanent_publish_error(self, exception):
+        """Return whether a message failed to publish with an error that
+        publishing it again cannot fix.
+
+        Only the server errors that the default retry settings do not retry
+        are permanent. A message cancelled by the client, e.g. because it was
+        stopped or the ordering key is paused, or rejected by the circuit
+        breaker or the retry budget, can be published again later.
+
+        Args:
+            exception (Exception): The error of the message.
+
+        Returns:
+            bool: Whether the error is permanent.
+        """
+        if isinstance(exception, exceptions.CircuitBreakerOpenError):
+            return False
+        if not isinstance(exception, core_exceptions.GoogleAPICallError):
+            return False
+        transport = self.api._transport
+        retry = transport._wrapped_methods[transport.publish]._retry
+        return retry is None or not retry._predicate(exception)
+
+    def _publish_message(
+        self, topic, message, message_size, ordering_key, retry, urgent=False
+    ):
+        """Publish a message through its sequencer, subject to flow control.
+
+        Args:
+            topic (str): The topic to publish the message to.
+            message (Union[~.pubsub_v1.types.PubsubMessage, bytes, bytearray, \
+                memoryview]): The message, or the wire-format message.
+            message_size (int): The size of the serialized message.
+            ordering_key (str): The ordering key of the message.
+            retry (Optional[google.api_core.retry.Retry]): The retry settings
+                passed to :meth:`publish`.
+            urgent (bool): Whether the message has a high priority.
+
+        Returns:
+            Optional[~google.cloud.pubsub_v1.publisher.futures.MessageFuture]:
+            The future of the message, or :data:`None` in fire-and-forget mode.
+        """
+        self._wait_for_spill_capacity()
 
         # Messages should go through flow control to prevent excessive
         # queuing on the client side (depending on the settings).
+        flow_controller = self._topic_settings.get(topic).flow_controller
         try:
-            self._flow_controller.add(message)
+            flow_controller._add_many(1, message_size, priority=urgent)
         except exceptions.FlowControlLimitError as exc:
-            future = futures.Future()
-            future.set_exception(exc)
+            if self._fire_and_forget is not None:
+                self._report_fire_and_forget_outcome(topic, 1, exc)
+                return None
+            return futures._failed_message_future(exc)
+
+        future = self._publish_to_sequencer(topic, message, ordering_key, retry, urgent)
+
+        if self._fire_and_forget is None:
+
+            def on_publish_done(future):
+                flow_controller._release_many(1, message_size)
+
+            future.add_done_callback(on_publish_done)
             return future
 
-        def on_publish_done(future):
-            self._flow_controller.release(message)
+        # In fire-and-forget mode, the batch releases the flow control of the
+        # message. Anything but True is a future that failed right away,
+        # because the ordering key is paused.
+        if future is not True:
+            self._on_fire_and_forget_batch_done(
+                topic, 1, message_size, future.exception()
+            )
+        return None
+
+    def _wait_for_spill_capacity(self):
+        """Block while the committed batches exceed the memory budget of the
+        spiller, because the spilled batches reached their maximum size."""
+        if self._batch_spiller is not None:
+            self._batch_spiller.wait_for_capacity()
+
+    def _publish_to_sequencer(self, topic, message, ordering_key, retry, urgent=False):
+        """Hand a message over to its sequencer, after its flow control.
+
+        Args:
+            topic (str): The topic to publish the message to.
+            message (Union[~.pubsub_v1.types.PubsubMessage, bytes, bytearray, \
+                memoryview]): The message, or the wire-format message.
+            ordering_key (str): The ordering key of the message.
+            retry (Optional[google.api_core.retry.Retry]): The retry settings
+                passed to :meth:`publish`.
+            urgent (bool): Whether to commit the message's batch right away.
+
+        Returns:
+            Union[~google.cloud.pubsub_v1.publisher.futures.MessageFuture, bool]:
+            The future of the message, or :data:`True` in fire-and-forget mode
+            if the message was added to a batch.
+
+        Raises:
+            RuntimeError: If the publisher has been stopped.
+        """
+        if self._batch_sizer is not None:
+            self._batch_sizer.record_arrivals(topic)
+
+        # Computed before taking the lock, which all publishing threads share.
+        retry = self._get_commit_retry(retry)
 
         with self._batch_lock:
             if self._is_stopped:
                 raise RuntimeError("Cannot publish on a stopped publisher.")
 
-            # Set retry timeout to "infinite" when message ordering is enabled.
-            # Note that this then also impacts messages added with an empty
-            # ordering key.
-            if self._enable_message_ordering:
-                if retry is gapic_v1.method.DEFAULT:
-                    # use the default retry for the publish GRPC method as a base
-                    transport = self.api._transport
-                    retry = transport._wrapped_methods[transport.publish]._retry
-                retry = retry.with_deadline(2.0 ** 32)
-
             # Delegate the publishing to the sequencer.
             sequencer = self._get_or_create_sequencer(topic, ordering_key)
             future = sequencer.publish(message, retry=retry)
+            if urgent:
+                sequencer.expedite()
+            return future
+
+    def _publish_packed(
+        self, topic, message, message_size, ordering_key, retry, urgent=False
+    ):
+        """Publish a message as a record of an envelope, subject to flow
+        control.
+
+        A message that does not fit into an envelope, that is published with
+        custom retry settings, or that has a high priority, is published on its
+        own instead, after the pending envelope of its topic and ordering key.
+
+        Args:
+            topic (str): The topic to publish the message to.
+            message (~.pubsub_v1.types.PubsubMessage.pb): The raw protobuf
+                message.
+            message_size (int): The size of the serialized message.
+            ordering_key (str): The ordering key of the message.
+            retry (Optional[google.api_core.retry.Retry]): The retry settings
+                passed to :meth:`publish`.
+            urgent (bool): Whether the message has a high priority.
+
+        Returns:
+            ~google.cloud.pubsub_v1.publisher.futures.Future: The future of
+            the message, shared by all of the records of its envelope.
+        """
+        self._wait_for_spill_capacity()
+
+        # The flow control applies to the records, it is acquired before
+        # packing a record, so that the packers never block on it.
+        flow_controller = self._topic_settings.get(topic).flow_controller
+        try:
+            flow_controller._add_many(1, message_size, priority=urgent)
+        except exceptions.FlowControlLimitError as exc:
+            return futures._failed_message_future(exc)
+
+        unpacked = (
+            urgent
+            or retry is not gapic_v1.method.DEFAULT
+            or _envelopes.framed_size(message_size) > self._envelope_packing.max_bytes
+        )
+        try:
+            if unpacked:
+                packer = self._get_or_create_envelope_packer(topic, ordering_key)
+                future = packer.publish_unpacked(
+                    gapic_types.PubsubMessage.wrap(message), retry, urgent
+                )
+            else:
+                future = None
+                while future is None:
+                    packer = self._get_or_create_envelope_packer(topic, ordering_key)
+                    # The packer returns None if it was removed in the meantime.
+                    future = packer.pack(message, message_size)
+        except Exception:
+            # The message was not accepted, e.g. because the client was stopped.
+            flow_controller._release_many(1, message_size)
+            raise
+
+        if unpacked:
+
+            def on_publish_done(future):
+                flow_controller._release_many(1, message_size)
+
             future.add_done_callback(on_publish_done)
+        return future
 
-            # Create a timer thread if necessary to enforce the batching
-            # timeout.
-            self._ensure_commit_timer_runs_no_lock()
+    def _get_or_create_envelope_packer(self, topic, ordering_key):
+        """Get an existing envelope packer or create a new one.
 
-            return future
+        Args:
+            topic (str): The topic.
+            ordering_key (str): The ordering key.
 
-    def ensure_cleanup_and_commit_timer_runs(self):
-        """ Ensure a cleanup/commit timer thread is running.
+        Returns:
+            ~google.cloud.pubsub_v1.publisher._envelope_packer.EnvelopePacker:
+            The packer.
 
-            If a cleanup/commit timer thread is already running, this does nothing.
+        Raises:
+            RuntimeError: If the publisher has been stopped.
         """
-        with self._batch_lock:
-            self._ensure_commit_timer_runs_no_lock()
+        packer_key = (topic, ordering_key)
+        with self._envelope_packers_lock:
+            if self._envelope_packers_stopped:
+                raise RuntimeError("Cannot publish on a stopped publisher.")
+            packer = self._envelope_packers.get(packer_key)
+            if packer is None:
+                packer = EnvelopePacker(
+                    self, topic, ordering_key, self._envelope_packing
+                )
+                self._envelope_packers[packer_key] = packer
+            return packer
+
+    def _remove_envelope_packer(self, topic, ordering_key, packer):
+        """Remove an idle envelope packer.
 
-    def _ensure_commit_timer_runs_no_lock(self):
-        """ Ensure a commit timer thread is running, without taking
-            _batch_lock.
+        Args:
+            topic (str): The topic of the packer.
+            ordering_key (str): The ordering key of the packer.
+            packer (~.pubsub_v1.publisher._envelope_packer.EnvelopePacker):
+                The packer.
 
-            _batch_lock must be held before calling this method.
+        Returns:
+            bool: Whether the packer was removed.
         """
-        if not self._commit_thread and self.batch_settings.max_latency < float("inf"):
-            self._start_commit_thread()
-
-    def _start_commit_thread(self):
-        """Start a new thread to actually wait and commit the sequencers."""
-        self._commit_thread = threading.Thread(
-            name="Thread-PubSubBatchCommitter",
-            target=self._wait_and_commit_sequencers,
-            daemon=True
-        )
-        self._commit_thread.start()
+        packer_key = (topic, ordering_key)
+        with self._envelope_packers_lock:
+            if self._envelope_packers.get(packer_key) is not packer:
+                return False
+            del self._envelope_packers[packer_key]
+            return True
 
-    def _wait_and_commit_sequencers(self):
-        """ Wait up to the batching timeout, and commit all sequencers.
+    def _flush_envelope_packer(self, topic, ordering_key):
+        """Publish the pending envelope of a topic and ordering key, if any.
+
+        Args:
+            topic (str): The topic.
+            ordering_key (str): The ordering key.
         """
-        # Sleep for however long we should be waiting.
-        time.sleep(self.batch_settings.max_latency)
-        _LOGGER.debug("Commit thread is waking up")
+        if self._envelope_packing is None:
+            return
+        with self._envelope_packers_lock:
+            packer = self._envelope_packers.get((topic, ordering_key))
+        if packer is not None:
+            packer.flush()
+
+    def publish_many(
+        self, topic, messages, ordering_key="", retry=gapic_v1.method.DEFAULT
+    ):
+        """Publish many messages at once.
+
+        The messages are split into batches right away, each of them filled
+        and committed in one go, instead of being added to the batches one by
+        one. This avoids most of the per-message overhead of :meth:`publish`,
+        such as taking the locks and creating a future for each message.
+
+        If an ordering key is given, the messages are published in order after
+        any messages already published with that key.
+
+        Example:
+            >>> from google.cloud import pubsub_v1
+            >>> client = pubsub_v1.PublisherClient()
+            >>> topic = client.topic_path('[PROJECT]', '[TOPIC]')
+            >>> messages = [(b'first', {'username': 'guido'}), (b'second', {})]
+            >>> future = client.publish_many(topic, messages)
+            >>> message_ids = future.result()
+
+        Args:
+            topic (str): The topic to publish messages to.
+            messages (Iterable[Union[Tuple[bytes, Mapping[str, str]], \
+                ~.pubsub_v1.types.PubsubMessage]]): The messages to publish,
+                either as ``(data, attrs)`` pairs, or as already constructed
+                messages. An already constructed message must have the same
+                ordering key as the one passed to this method.
+            ordering_key: A string that identifies related messages for which
+                publish order should be respected. Message ordering must be
+                enabled for this client to use this feature.
+            retry (Optional[google.api_core.retry.Retry]): Designation of what
+                errors, if any, should be retried. If `ordering_key` is specified,
+                the total retry deadline will be changed to "infinity".
+
+        Returns:
+            ~google.cloud.pubsub_v1.publisher.futures.BulkFuture: A single
+            future for all of the messages, resolving to the list of their
+            message IDs, in order.
+
+        Raises:
+            RuntimeError:
+                If called after publisher has been stopped by a `stop()` method
+                call.
+        """
+        if not self._enable_message_ordering and ordering_key != "":
+            raise ValueError(
+                "Cannot publish a message with an ordering key when message "
+                "ordering is not enabled."
+            )
+
+        messages = [_to_raw_message(message, ordering_key) for message in messages]
+        if self._outbox is not None:
+            return self._publish_many_to_outbox(topic, messages, ordering_key, retry)
+
+        self._wait_for_spill_capacity()
+
+        # Publish the pending envelope first, to preserve the publishing order.
+        self._flush_envelope_packer(topic, ordering_key)
+        bulk_future = futures.BulkFuture(len(messages))
+        if self._batch_sizer is not None and messages:
+            self._batch_sizer.record_arrivals(topic, count=len(messages))
+
+        # The flow controllers only admit chunks that fit within their limits.
+        topic_settings = self._topic_settings.get(topic)
+        settings = topic_settings.bulk_batch_settings
+        flow_controller = topic_settings.flow_controller
 
         with self._batch_lock:
             if self._is_stopped:
-                return
-            self._commit_sequencers()
-            self._commit_thread = None
-
-    def _commit_sequencers(self):
-        """ Clean up finished sequencers and commit the rest. """
-        finished_sequencer_keys = [
-            key
-            for key, sequencer in self._sequencers.items()
-            if sequencer.is_finished()
+                raise RuntimeError("Cannot publish on a stopped publisher.")
+            retry = self._get_commit_retry(retry)
+
+        offset = 0
+        while offset < len(messages):
+            batch = thread.BulkBatch(
+                self, topic, settings, bulk_future, offset, commit_retry=retry
+            )
+            try:
+                end = batch.fill(messages, offset)
+            except exceptions.MessageTooLargeError as exc:
+                bulk_future._set_chunk_exception(offset, len(messages) - offset, exc)
+                break
+
+            # Messages should go through flow control to prevent excessive
+            # queuing on the client side (depending on the settings).
+            message_count = end - offset
+            try:
+                flow_controller._add_many(message_count, batch._message_bytes)
+            except exceptions.FlowControlLimitError as exc:
+                bulk_future._set_chunk_exception(offset, message_count, exc)
+                offset = end
+                continue
+
+            batch._set_chunk_done_callback(
+                functools.partial(
+                    flow_controller._release_many,
+                    message_count,
+                    batch._message_bytes,
+                )
+            )
+
+            with self._batch_lock:
+                if self._is_stopped:
+                    # The publisher was stopped in the meantime.
+                    exc = RuntimeError("Cannot publish on a stopped publisher.")
+                    batch._fail_chunk(exc)
+                    bulk_future._set_chunk_exception(end, len(messages) - end, exc)
+                    break
+
+                sequencer = self._get_or_create_sequencer(topic, ordering_key)
+                sequencer.publish_batch(batch)
+
+            offset = end
+
+        return bulk_future
+
+    def _publish_many_to_outbox(self, topic, messages, ordering_key, retry):
+        """Store many messages in the outbox, which publishes them later on.
+
+        Args:
+            topic (str): The topic to publish the messages to.
+            messages (Sequence[~.pubsub_v1.types.PubsubMessage.pb]): The raw
+                protobuf messages.
+            ordering_key (str): The ordering key of the messages.
+            retry (Optional[google.api_core.retry.Retry]): The retry settings
+                passed to :meth:`publish_many`, which must be the default ones.
+
+        Returns:
+            ~google.cloud.pubsub_v1.publisher.futures.BulkFuture: The future
+            of the messages.
+        """
+        check_retry(retry)
+        bulk_future = futures.BulkFuture(len(messages))
+        callbacks = [
+            functools.partial(_set_bulk_future_outcome, bulk_future, offset)
+            for offset in range(len(messages))
         ]
-        for sequencer_key in finished_sequencer_keys:
-            del self._sequencers[sequencer_key]
+        try:
+            self._outbox.append(
+                topic,
+                ordering_key,
+                [message.SerializeToString() for message in messages],
+                callbacks,
+            )
+        except exceptions.FlowControlLimitError as exc:
+            bulk_future._set_chunk_exception(0, len(messages), exc)
+        return bulk_future
+
+    def _get_commit_retry(self, retry):
+        """Return the retry settings to publish the messages with.
+
+        Sets the retry timeout to "infinite" when message ordering or the
+        outbox is enabled. Note that this then also impacts messages added with
+        an empty ordering key.
+
+        Args:
+            retry (Optional[google.api_core.retry.Retry]): The retry settings
+                passed to a publish method.
+
+        Returns:
+            Optional[google.api_core.retry.Retry]: The retry settings to use.
+        """
+        if self._enable_message_ordering or self.publisher_options.outbox is not None:
+            if retry is gapic_v1.method.DEFAULT:
+                # use the default retry for the publish GRPC method as a base
+                transport = self.api._transport
+                retry = transport._wrapped_methods[transport.publish]._retry
+            retry = retry.with_deadline(2.0 ** 32)
+        return retry
+
+    def ensure_cleanup_and_commit_timer_runs(self):
+        """Deprecated, this method does nothing.
+
+        The batches are committed by the client's commit timer, which starts
+        on its own when a batch needs it. The method is kept for backwards
+        compatibility, and will be removed in a future release.
+        """
+        warnings.warn(
+            "ensure_cleanup_and_commit_timer_runs() is deprecated and does nothing, "
+            "the commit timer starts on its own.",
+            category=DeprecationWarning,
+        )
+
+    def _schedule_commit(self, delay, callback):
+        """Schedule a batch commit callback to run after the given delay.
+
+        Args:
+            delay (float): The number of seconds to wait before committing,
+                typically the max latency of the batch. If infinite, the
+                callback is never invoked.
+            callback (Callable[[], Any]): The function committing the batch.
+        """
+        self._commit_timer.schedule(delay, callback)
+
+    def _schedule_sequencer_cleanup(self, topic, ordering_key):
+        """Schedule the removal of a sequencer that has finished publishing.
+
+        The sequencer is only removed if it is still finished when the cleanup
+        runs, because new messages might be published to it in the meantime.
+
+        Args:
+            topic (str): The topic of the sequencer.
+            ordering_key (str): The ordering key of the sequencer.
+        """
+        delay = self._topic_settings.get(topic).batch_settings.max_latency
+        if math.isinf(delay):
+            delay = 0
+        cleanup = functools.partial(
+            self._remove_sequencer_if_finished, topic, ordering_key
+        )
+        self._commit_timer.schedule(delay, cleanup)
 
-        for sequencer in self._sequencers.values():
-            sequencer.commit()
+    def _remove_sequencer_if_finished(self, topic, ordering_key):
+        """Remove a sequencer if it is finished and should be cleaned up."""
+        sequencer_key = (topic, ordering_key)
+        with self._batch_lock:
+            sequencer = self._sequencers.get(sequencer_key)
+            if sequencer is not None and sequencer.is_finished():
+                del self._sequencers[sequencer_key]
 
     def stop(self):
         """Immediately publish all outstanding messages.
@@ -427,15 +1380,40 @@ class Client(object):
                 If called after publisher has been stopped by a `stop()` method
                 call.
         """
+        # The outbox stops handing messages over first, the messages left in
+        # it are published by the next client.
+        if self._outbox is not None:
+            self._outbox.stop()
+
+        # The pending envelopes are published first, the packers acquire the
+        # batch locks while publishing them.
+        with self._envelope_packers_lock:
+            packers = list(self._envelope_packers.values())
+            self._envelope_packers = {}
+            self._envelope_packers_stopped = True
+        for packer in packers:
+            packer.stop()
+
         with self._batch_lock:
             if self._is_stopped:
                 raise RuntimeError("Cannot stop a publisher already stopped.")
 
             self._is_stopped = True
 
+            # Pending commits are no longer needed, stop() commits all batches
+            # right away.
+            self._commit_timer.stop()
+
             for sequencer in self._sequencers.values():
                 sequencer.stop()
 
+            # The commit threads exit once the remaining batches are published.
+            self._commit_executor.shutdown()
+            if self._batch_spiller is not None:
+                self._batch_spiller.stop()
+            if self._hedger is not None:
+                self._hedger.stop()
+
     # Used only for testing.
     def _set_batch(self, topic, batch, ordering_key=""):
         sequencer = self._get_or_create_sequencer(topic, ordering_key)
@@ -449,3 +1427,100 @@ class Client(object):
     def _set_sequencer(self, topic, sequencer, ordering_key=""):
         sequencer_key = (topic, ordering_key)
         self._sequencers[sequencer_key] = sequencer
+
+
+def _check_reserved_attributes(attrs):
+    """Check that the attributes of a message to publish are not reserved.
+
+    Args:
+        attrs (Mapping[str, str]): The attributes.
+
+    Raises:
+        ValueError: If the attributes contain an attribute reserved for
+            marking compressed messages or envelopes.
+    """
+    if codecs.ENCODING_ATTRIBUTE in attrs:
+        raise ValueError(
+            "The {!r} attribute is reserved for marking compressed "
+            "messages.".format(codecs.ENCODING_ATTRIBUTE)
+        )
+    if _envelopes.ENVELOPE_ATTRIBUTE in attrs:
+        raise ValueError(
+            "The {!r} attribute is reserved for marking envelopes.".format(
+                _envelopes.ENVELOPE_ATTRIBUTE
+            )
+        )
+
+
+def _set_outcome(outcome, message_id, exception):
+    """Complete the outcome of a message published from the outbox."""
+    if exception is None:
+        outcome.set_result([message_id])
+    else:
+        outcome.set_exception(exception)
+
+
+def _set_bulk_future_outcome(bulk_future, offset, message_id, exception):
+    """Complete a message of a bulk future published from the outbox."""
+    if exception is None:
+        bulk_future._set_chunk_result(offset, [message_id])
+    else:
+        bulk_future._set_chunk_exception(offset, 1, exception)
+
+
+def _to_raw_message(message, ordering_key):
+    """Convert a message passed to :meth:`Client.publish_many` to a raw
+    protobuf message.
+
+    Args:
+        message (Union[Tuple[bytes, Mapping[str, str]], \
+            ~.pubsub_v1.types.PubsubMessage]): A ``(data, attrs)`` pair, or an
+            already constructed message.
+        ordering_key (str): The ordering key of the messages.
+
+    Returns:
+        ~.pubsub_v1.types.PubsubMessage.pb: The raw protobuf message.
+
+    Raises:
+        TypeError: If the data is not a bytestring, or an attribute is not a
+            text string.
+        ValueError: If an already constructed message has a different
+            ordering key, or the attributes contain an attribute reserved for
+            marking compressed messages or envelopes.
+    """
+    if isinstance(message, gapic_types.PubsubMessage):
+        message = message._pb
+    if isinstance(message, _raw_proto_pubbsub_message):
+        if message.ordering_key != ordering_key:
+            raise ValueError(
+                "The ordering key of a message must match the ordering key "
+                "passed to publish_many()."
+            )
+        _check_reserved_attributes(message.attributes)
+        return message
+
+    data, attrs = message
+    if not isinstance(data, bytes):
+        raise TypeError("Data being published to Pub/Sub must be sent as a bytestring.")
+
+    # Coerce all attributes to text strings, copying them only if needed.
+    if attrs:
+        _check_reserved_attributes(attrs)
+        decoded = None
+        for k, v in attrs.items():
+            if isinstance(v, bytes):
+                v = v.decode("utf-8")
+                if decoded is None:
+                    decoded = dict(attrs)
+                decoded[k] = v
+            elif not isinstance(v, str):
+                raise TypeError(
+                    "All attributes being published to Pub/Sub must "
+                    "be sent as text strings."
+                )
+        if decoded is not None:
+            attrs = decoded
+
+    return _raw_proto_pubbsub_message(
+        data=data, ordering_key=ordering_key, attributes=attrs
+    )
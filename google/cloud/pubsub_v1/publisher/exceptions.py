@@ -15,6 +15,7 @@
 from __future__ import absolute_import
 
 from google.api_core.exceptions import GoogleAPICallError
+from google.api_core.exceptions import ServiceUnavailable
 from google.cloud.pubsub_v1.exceptions import TimeoutError
 
 
@@ -42,7 +43,13 @@ class FlowControlLimitError(Exception):
     """An action resulted in exceeding the flow control limits."""
 
 
+class CircuitBreakerOpenError(ServiceUnavailable):
+    """A batch was not published, because the publisher client's circuit
+    breaker is open after the backend kept failing."""
+
+
 __all__ = (
+    "CircuitBreakerOpenError",
     "FlowControlLimitError",
     "MessageTooLargeError",
     "PublishError",
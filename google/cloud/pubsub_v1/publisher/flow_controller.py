@@ -12,9 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 from collections import deque
 import logging
 import threading
+import time
 import warnings
 
 from google.cloud.pubsub_v1 import types
@@ -32,9 +34,146 @@ class _QuantityReservation(object):
         self.needed = needed
 
 
+class _TokenBucket(object):
+    """A token bucket limiting the rate of a quantity, e.g. of messages.
+
+    The bucket holds up to ``burst`` tokens, and is refilled at ``rate``
+    tokens per second. A quantity larger than the burst size is admitted once
+    the bucket is full, and its excess is paid back before anything else is
+    admitted.
+
+    The bucket is not thread-safe.
+
+    Args:
+        rate (float): The number of tokens added per second.
+        burst (float): The capacity of the bucket.
+        clock (Callable[[], float]): The monotonic clock, in seconds.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        if rate <= 0 or burst <= 0:
+            raise ValueError("Flow control rates and bursts must be positive.")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = burst
+        self._updated = clock()
+
+    def delay(self, amount):
+        """Return the number of seconds until the quantity can be taken.
+
+        Args:
+            amount (float): The quantity.
+
+        Returns:
+            float: The delay, zero if the quantity can be taken right away.
+        """
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        missing = min(amount, self.burst) - self._tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount):
+        """Take a quantity, which :meth:`delay` reported as available.
+
+        Args:
+            amount (float): The quantity.
+        """
+        self._tokens -= amount
+
+
+def _create_token_buckets(settings):
+    """Create the token buckets for the rate limits of flow control settings.
+
+    Args:
+        settings (~google.cloud.pubsub_v1.types.PublishFlowControl): The flow
+            control settings.
+
+    Returns:
+        Tuple[Optional[_TokenBucket], Optional[_TokenBucket]]: The buckets
+        limiting the message and the byte rate, if the rate is limited.
+
+    Raises:
+        ValueError: If a rate is limited, but the limits are ignored.
+    """
+    if settings.limit_exceeded_behavior == types.LimitExceededBehavior.IGNORE and (
+        settings.messages_per_second is not None
+        or settings.bytes_per_second is not None
+    ):
+        raise ValueError(
+            "Flow control rate limits require the BLOCK or ERROR limit exceeded "
+            "behavior, they would be ignored."
+        )
+
+    buckets = []
+    for rate, burst in (
+        (settings.messages_per_second, settings.message_burst),
+        (settings.bytes_per_second, settings.byte_burst),
+    ):
+        if rate is None:
+            buckets.append(None)
+        else:
+            buckets.append(_TokenBucket(rate, rate if burst is None else burst))
+    return tuple(buckets)
+
+
+def _rate_info(message_bucket, byte_bucket):
+    """Return the flow control rate limits information.
+
+    Args:
+        message_bucket (Optional[_TokenBucket]): The bucket limiting the
+            message rate, if any.
+        byte_bucket (Optional[_TokenBucket]): The bucket limiting the byte
+            rate, if any.
+
+    Returns:
+        str
+    """
+    msg = "messages per second: {} (burst: {}), bytes per second: {} (burst: {})"
+    rates = []
+    for bucket in (message_bucket, byte_bucket):
+        if bucket is None:
+            rates.extend(("unlimited", "-"))
+        else:
+            rates.extend((bucket.rate, bucket.burst))
+    return msg.format(*rates)
+
+
+class _Waiter(object):
+    """A caller blocked on adding messages to the flow.
+
+    Each waiter waits on its own condition, so that releasing capacity only
+    wakes up the waiters that can be admitted.
+
+    Args:
+        message_count (int): The number of messages the caller adds.
+        byte_count (int): The total size of the messages, in bytes.
+        lock (threading.Lock): The lock of the flow controller.
+        priority (bool): Whether the messages have a high priority.
+    """
+
+    def __init__(self, message_count, byte_count, lock, priority=False):
+        self.message_count = message_count
+        self.byte_reservation = _QuantityReservation(reserved=0, needed=byte_count)
+        self.condition = threading.Condition(lock=lock)
+        self.priority = priority
+        self.admitted = False
+
+
 class FlowController(object):
     """A class used to control the flow of messages passing through it.
 
+    Besides the limits on the messages awaiting to be published, the rates of
+    messages and bytes entering the flow can be limited with token buckets.
+
+    The blocked callers are admitted in FIFO order, except for high-priority
+    messages, which skip ahead of the other waiting messages. Each blocked
+    caller waits on its own condition, and is woken up directly by the thread
+    releasing enough capacity (or, if only the rate limits hold it back, once
+    the token buckets are refilled), thus releasing capacity does not wake up
+    all of them.
+
     Args:
         settings (~google.cloud.pubsub_v1.types.PublishFlowControl):
             Desired flow control configuration.
@@ -43,27 +182,33 @@ class FlowController(object):
     def __init__(self, settings):
         self._settings = settings
 
+        # The token buckets limiting the rates of messages and bytes, if any.
+        self._message_bucket, self._byte_bucket = _create_token_buckets(settings)
+        self._rate_limited = (
+            self._message_bucket is not None or self._byte_bucket is not None
+        )
+
         # Load statistics. They represent the number of messages added, but not
         # yet released (and their total size).
         self._message_count = 0
         self._total_bytes = 0
 
-        # A FIFO queue of threads blocked on adding a message, from first to last.
-        # Only relevant if the configured limit exceeded behavior is BLOCK.
+        # A FIFO queue of _Waiter instances blocked on adding messages, from
+        # first to last, the high-priority waiters first. Only relevant if the
+        # configured limit exceeded behavior is BLOCK.
         self._waiting = deque()
+        self._priority_waiter_count = 0
 
-        # Reservations of available flow control bytes by the waiting threads.
-        # Each value is a _QuantityReservation instance.
-        self._byte_reservations = dict()
+        # The suffix of the waiting queue whose byte reservations are not yet
+        # complete. The free capacity is reserved in FIFO order, thus all the
+        # waiters before them hold complete reservations.
+        self._reserving = deque()
         self._reserved_bytes = 0
 
         # The lock is used to protect all internal state (message and byte count,
         # waiting threads to add, etc.).
         self._operational_lock = threading.Lock()
 
-        # The condition for blocking the flow if capacity is exceeded.
-        self._has_capacity = threading.Condition(lock=self._operational_lock)
-
     def add(self, message):
         """Add a message to flow control.
 
@@ -85,10 +230,39 @@ class FlowController(object):
         if self._settings.limit_exceeded_behavior == types.LimitExceededBehavior.IGNORE:
             return
 
+        self._add_many(1, message._pb.ByteSize())
+
+    def _add_many(self, message_count, byte_count, priority=False):
+        """Add several messages to flow control at once.
+
+        The messages are treated as a single unit, i.e. they are either all
+        accepted or all rejected, and a blocked caller waits until there is
+        enough capacity for all of them.
+
+        Args:
+            message_count (int): The number of messages entering the flow
+                control.
+            byte_count (int): The total size of the messages, in bytes.
+            priority (bool): Whether the messages have a high priority, and
+                skip ahead of the other blocked messages.
+
+        Raises:
+            :exception:`~pubsub_v1.publisher.exceptions.FlowControlLimitError`:
+                Under the same conditions as :meth:`add`.
+        """
+        if self._settings.limit_exceeded_behavior == types.LimitExceededBehavior.IGNORE:
+            return
+
         with self._operational_lock:
-            if not self._would_overflow(message):
-                self._message_count += 1
-                self._total_bytes += message._pb.ByteSize()
+            overflow = self._would_overflow(message_count, byte_count)
+            if (
+                not self._waiting
+                and not overflow
+                and self._rate_delay(message_count, byte_count) == 0
+            ):
+                self._message_count += message_count
+                self._total_bytes += byte_count
+                self._take_tokens(message_count, byte_count)
                 return
 
             # Adding a message would overflow, react.
@@ -99,13 +273,20 @@ class FlowController(object):
                 # Raising an error means rejecting a message, thus we do not
                 # add anything to the existing load, but we do report the would-be
                 # load if we accepted the message.
-                load_info = self._load_info(
-                    message_count=self._message_count + 1,
-                    total_bytes=self._total_bytes + message._pb.ByteSize(),
-                )
-                error_msg = "Flow control limits would be exceeded - {}.".format(
-                    load_info
-                )
+                if overflow:
+                    load_info = self._load_info(
+                        message_count=self._message_count + message_count,
+                        total_bytes=self._total_bytes + byte_count,
+                    )
+                    error_msg = "Flow control limits would be exceeded - {}.".format(
+                        load_info
+                    )
+                else:
+                    error_msg = (
+                        "Flow control rate limits would be exceeded - {}.".format(
+                            _rate_info(self._message_bucket, self._byte_bucket)
+                        )
+                    )
                 raise exceptions.FlowControlLimitError(error_msg)
 
             assert (
@@ -116,11 +297,11 @@ class FlowController(object):
             # Sanity check - if a message exceeds total flow control limits all
             # by itself, it would block forever, thus raise error.
             if (
-                message._pb.ByteSize() > self._settings.byte_limit
-                or self._settings.message_limit < 1
+                byte_count > self._settings.byte_limit
+                or message_count > self._settings.message_limit
             ):
                 load_info = self._load_info(
-                    message_count=1, total_bytes=message._pb.ByteSize()
+                    message_count=message_count, total_bytes=byte_count
                 )
                 error_msg = (
                     "Total flow control limits too low for the message, "
@@ -128,33 +309,38 @@ class FlowController(object):
                 )
                 raise exceptions.FlowControlLimitError(error_msg)
 
-            current_thread = threading.current_thread()
+            waiter = _Waiter(
+                message_count, byte_count, self._operational_lock, priority=priority
+            )
+            if priority:
+                self._enqueue_priority_waiter(waiter)
+            else:
+                self._waiting.append(waiter)
+                self._reserving.append(waiter)
+            self._distribute_available_bytes()
+            self._admit_waiting()
 
-            while self._would_overflow(message):
-                if current_thread not in self._byte_reservations:
-                    self._waiting.append(current_thread)
-                    self._byte_reservations[current_thread] = _QuantityReservation(
-                        reserved=0, needed=message._pb.ByteSize()
-                    )
+            while not waiter.admitted:
+                # Wait until admitted by a release, or until the token buckets
+                # are refilled if only the rates hold back the first waiter.
+                timeout = None
+                if waiter is self._waiting[0] and self._can_admit(waiter):
+                    timeout = self._rate_delay(message_count, byte_count)
 
                 _LOGGER.debug(
                     "Blocking until there is enough free capacity in the flow - "
                     "{}.".format(self._load_info())
                 )
 
-                self._has_capacity.wait()
+                waiter.condition.wait(timeout=timeout)
 
                 _LOGGER.debug(
                     "Woke up from waiting on free capacity in the flow - "
                     "{}.".format(self._load_info())
                 )
 
-            # Message accepted, increase the load and remove thread stats.
-            self._message_count += 1
-            self._total_bytes += message._pb.ByteSize()
-            self._reserved_bytes -= self._byte_reservations[current_thread].reserved
-            del self._byte_reservations[current_thread]
-            self._waiting.remove(current_thread)
+                if not waiter.admitted:
+                    self._admit_waiting()
 
     def release(self, message):
         """Release a mesage from flow control.
@@ -166,39 +352,71 @@ class FlowController(object):
         if self._settings.limit_exceeded_behavior == types.LimitExceededBehavior.IGNORE:
             return
 
+        self._release_many(1, message._pb.ByteSize())
+
+    def _release_many(self, message_count, byte_count):
+        """Release several messages from flow control at once.
+
+        Args:
+            message_count (int): The number of messages leaving the flow
+                control.
+            byte_count (int): The total size of the messages, in bytes.
+        """
+        if self._settings.limit_exceeded_behavior == types.LimitExceededBehavior.IGNORE:
+            return
+
         with self._operational_lock:
             # Releasing a message decreases the load.
-            self._message_count -= 1
-            self._total_bytes -= message._pb.ByteSize()
+            self._message_count -= message_count
+            self._total_bytes -= byte_count
 
             if self._message_count < 0 or self._total_bytes < 0:
                 warnings.warn(
                     "Releasing a message that was never added or already released.",
                     category=RuntimeWarning,
-                    stacklevel=2,
+                    stacklevel=3,
                 )
                 self._message_count = max(0, self._message_count)
                 self._total_bytes = max(0, self._total_bytes)
 
             self._distribute_available_bytes()
+            self._admit_waiting()
 
-            # If at least one thread waiting to add() can be unblocked, wake them up.
-            if self._ready_to_unblock():
-                _LOGGER.debug("Notifying threads waiting to add messages to flow.")
-                self._has_capacity.notify_all()
+    def _enqueue_priority_waiter(self, waiter):
+        """Queue a high-priority waiter after the other high-priority waiters,
+        but before all of the normal-priority ones.
+
+        The waiters give back their byte reservations, which are distributed
+        again in the new order of the queue. This takes time proportional to
+        the number of waiters, which is fine as long as high-priority messages
+        are rare.
+
+        The method assumes that the caller has obtained ``_operational_lock``.
+
+        Args:
+            waiter (_Waiter): The high-priority waiter.
+        """
+        self._waiting.insert(self._priority_waiter_count, waiter)
+        self._priority_waiter_count += 1
+
+        for queued in self._waiting:
+            reservation = queued.byte_reservation
+            self._reserved_bytes -= reservation.reserved
+            reservation.reserved = 0
+        self._reserving = deque(self._waiting)
 
     def _distribute_available_bytes(self):
         """Distribute availalbe free capacity among the waiting threads in FIFO order.
 
+        Only the waiters with incomplete reservations are visited, thus the
+        cost is proportional to the number of waiters receiving capacity.
+
         The method assumes that the caller has obtained ``_operational_lock``.
         """
         available = self._settings.byte_limit - self._total_bytes - self._reserved_bytes
 
-        for thread in self._waiting:
-            if available <= 0:
-                break
-
-            reservation = self._byte_reservations[thread]
+        while self._reserving and available > 0:
+            reservation = self._reserving[0].byte_reservation
             still_needed = reservation.needed - reservation.reserved
 
             # Sanity check for any internal inconsistencies.
@@ -214,49 +432,118 @@ class FlowController(object):
             self._reserved_bytes += can_give
             available -= can_give
 
-    def _ready_to_unblock(self):
-        """Determine if any of the threads waiting to add a message can proceed.
+            if reservation.reserved >= reservation.needed:
+                self._reserving.popleft()
+
+    def _admit_waiting(self):
+        """Admit the waiting threads that can proceed, in FIFO order.
+
+        Each admitted thread is woken up directly. If the first waiting thread
+        is only held back by the rate limits, it is woken up to wait until the
+        token buckets are refilled instead.
 
         The method assumes that the caller has obtained ``_operational_lock``.
+        """
+        while self._waiting:
+            waiter = self._waiting[0]
+            if not self._can_admit(waiter):
+                break
+
+            reservation = waiter.byte_reservation
+            if self._rate_delay(waiter.message_count, reservation.needed) > 0:
+                waiter.condition.notify()
+                break
+
+            # Message accepted, increase the load and remove the waiter.
+            self._waiting.popleft()
+            if waiter.priority:
+                self._priority_waiter_count -= 1
+            self._message_count += waiter.message_count
+            self._total_bytes += reservation.needed
+            self._take_tokens(waiter.message_count, reservation.needed)
+            self._reserved_bytes -= reservation.reserved
+            waiter.admitted = True
+
+            _LOGGER.debug("Notifying a thread waiting to add messages to flow.")
+            waiter.condition.notify()
+
+    def _can_admit(self, waiter):
+        """Determine if the limits allow admitting the first waiting thread.
+
+        The method assumes that the caller has obtained ``_operational_lock``.
+
+        Args:
+            waiter (_Waiter): The first waiting thread.
 
         Returns:
             bool
         """
-        if self._waiting:
-            # It's enough to only check the head of the queue, because FIFO
-            # distribution of any free capacity.
-            reservation = self._byte_reservations[self._waiting[0]]
-            return (
-                reservation.reserved >= reservation.needed
-                and self._message_count < self._settings.message_limit
-            )
-
-        return False
+        reservation = waiter.byte_reservation
+        return (
+            reservation.reserved >= reservation.needed
+            and self._message_count + waiter.message_count
+            <= self._settings.message_limit
+        )
 
-    def _would_overflow(self, message):
-        """Determine if accepting a message would exceed flow control limits.
+    def _would_overflow(self, message_count, byte_count):
+        """Determine if accepting messages would exceed flow control limits.
 
         The method assumes that the caller has obtained ``_operational_lock``.
 
         Args:
-            message (:class:`~google.cloud.pubsub_v1.types.PubsubMessage`):
-                The message entering the flow control.
+            message_count (int): The number of messages entering the flow
+                control.
+            byte_count (int): The total size of the messages, in bytes.
 
         Returns:
             bool
         """
-        reservation = self._byte_reservations.get(threading.current_thread())
+        bytes_taken = self._total_bytes + self._reserved_bytes + byte_count
+        size_overflow = bytes_taken > self._settings.byte_limit
+        msg_count_overflow = (
+            self._message_count + message_count > self._settings.message_limit
+        )
 
-        if reservation:
-            enough_reserved = reservation.reserved >= reservation.needed
-        else:
-            enough_reserved = False
+        return size_overflow or msg_count_overflow
 
-        bytes_taken = self._total_bytes + self._reserved_bytes + message._pb.ByteSize()
-        size_overflow = bytes_taken > self._settings.byte_limit and not enough_reserved
-        msg_count_overflow = self._message_count + 1 > self._settings.message_limit
+    def _rate_delay(self, message_count, byte_count):
+        """Determine how long the rate limits delay accepting messages.
 
-        return size_overflow or msg_count_overflow
+        The method assumes that the caller has obtained ``_operational_lock``.
+
+        Args:
+            message_count (int): The number of messages entering the flow
+                control.
+            byte_count (int): The total size of the messages, in bytes.
+
+        Returns:
+            float: The number of seconds until the messages can be accepted,
+            zero if they can be accepted right away.
+        """
+        if not self._rate_limited:
+            return 0
+
+        delay = 0
+        if self._message_bucket is not None:
+            delay = self._message_bucket.delay(message_count)
+        if self._byte_bucket is not None:
+            delay = max(delay, self._byte_bucket.delay(byte_count))
+        return delay
+
+    def _take_tokens(self, message_count, byte_count):
+        """Take the tokens of accepted messages from the token buckets.
+
+        The method assumes that the caller has obtained ``_operational_lock``.
+
+        Args:
+            message_count (int): The number of messages entering the flow
+                control.
+            byte_count (int): The total size of the messages, in bytes.
+        """
+        if self._message_bucket is not None:
+            self._message_bucket.take(message_count)
+        if self._byte_bucket is not None:
+            self._byte_bucket.take(byte_count)
 
     def _load_info(self, message_count=None, total_bytes=None):
         """Return the current flow control load information.
@@ -290,3 +577,261 @@ class FlowController(object):
             self._settings.byte_limit,
             self._reserved_bytes,
         )
+
+
+class FlowControllerChain(object):
+    """Applies several flow controllers to the same messages, e.g. a topic's
+    own budget and the client's global one.
+
+    The messages are added to the flow controllers in order, and released in
+    reverse order. If a flow controller rejects the messages, they are
+    released from the flow controllers they were already added to.
+
+    Args:
+        flow_controllers (Sequence[FlowController]): The flow controllers.
+    """
+
+    def __init__(self, flow_controllers):
+        self._flow_controllers = tuple(flow_controllers)
+
+    def add(self, message):
+        """Add a message to all of the flow controllers, see
+        :meth:`FlowController.add`."""
+        self._add_many(1, message._pb.ByteSize())
+
+    def _add_many(self, message_count, byte_count, priority=False):
+        """Add several messages to all of the flow controllers at once, see
+        :meth:`FlowController._add_many`."""
+        added = []
+        try:
+            for flow_controller in self._flow_controllers:
+                flow_controller._add_many(message_count, byte_count, priority=priority)
+                added.append(flow_controller)
+        except exceptions.FlowControlLimitError:
+            for flow_controller in reversed(added):
+                flow_controller._release_many(message_count, byte_count)
+            raise
+
+    def release(self, message):
+        """Release a message from all of the flow controllers."""
+        self._release_many(1, message._pb.ByteSize())
+
+    def _release_many(self, message_count, byte_count):
+        """Release several messages from all of the flow controllers at once."""
+        for flow_controller in reversed(self._flow_controllers):
+            flow_controller._release_many(message_count, byte_count)
+
+
+class AsyncFlowController(object):
+    """The asyncio counterpart of :class:`FlowController`.
+
+    Coroutines waiting to add a message are suspended instead of blocking a
+    thread, and are admitted in FIFO order. Only the first waiting message is
+    considered when capacity frees up, so that smaller messages cannot starve
+    a larger one. If the first waiting message is only held back by the rate
+    limits, it is admitted by a timer once the token buckets are refilled.
+
+    All methods must be called from the event loop's thread.
+
+    Args:
+        settings (~google.cloud.pubsub_v1.types.PublishFlowControl):
+            Desired flow control configuration.
+    """
+
+    def __init__(self, settings):
+        self._settings = settings
+
+        # Load statistics. They represent the number of messages added, but not
+        # yet released (and their total size).
+        self._message_count = 0
+        self._total_bytes = 0
+
+        # A FIFO queue of (future, message size) of the coroutines suspended on
+        # adding a message, from first to last.
+        self._waiting = deque()
+
+        # The token buckets limiting the rates of messages and bytes, if any,
+        # and the timer admitting the waiting messages once they are refilled.
+        self._message_bucket, self._byte_bucket = _create_token_buckets(settings)
+        self._rate_timer = None
+
+    async def add(self, message):
+        """Add a message to flow control.
+
+        Adding a message updates the internal load statistics, and an action is
+        taken if these limits are exceeded (depending on the flow control settings).
+
+        Args:
+            message (:class:`~google.cloud.pubsub_v1.types.PubsubMessage`):
+                The message entering the flow control.
+
+        Raises:
+            :exception:`~pubsub_v1.publisher.exceptions.FlowControlLimitError`:
+                Raised when the desired action is
+                :attr:`~google.cloud.pubsub_v1.types.LimitExceededBehavior.ERROR` and
+                the message would exceed flow control limits, or when the desired action
+                is :attr:`~google.cloud.pubsub_v1.types.LimitExceededBehavior.BLOCK` and
+                the message would block forever against the flow control limits.
+        """
+        behavior = self._settings.limit_exceeded_behavior
+        if behavior == types.LimitExceededBehavior.IGNORE:
+            return
+
+        message_size = message._pb.ByteSize()
+
+        fits = self._fits(message_size)
+        if not self._waiting and fits and self._rate_delay(message_size) == 0:
+            self._admit(message_size)
+            return
+
+        # Adding a message would overflow (or jump the queue), react.
+        if behavior == types.LimitExceededBehavior.ERROR:
+            if fits:
+                error_msg = "Flow control rate limits would be exceeded - {}.".format(
+                    _rate_info(self._message_bucket, self._byte_bucket)
+                )
+            else:
+                load_info = self._load_info(
+                    message_count=self._message_count + 1,
+                    total_bytes=self._total_bytes + message_size,
+                )
+                error_msg = "Flow control limits would be exceeded - {}.".format(
+                    load_info
+                )
+            raise exceptions.FlowControlLimitError(error_msg)
+
+        assert behavior == types.LimitExceededBehavior.BLOCK
+
+        # Sanity check - if a message exceeds total flow control limits all
+        # by itself, it would block forever, thus raise error.
+        if message_size > self._settings.byte_limit or self._settings.message_limit < 1:
+            load_info = self._load_info(message_count=1, total_bytes=message_size)
+            error_msg = (
+                "Total flow control limits too low for the message, "
+                "would block forever - {}.".format(load_info)
+            )
+            raise exceptions.FlowControlLimitError(error_msg)
+
+        _LOGGER.debug(
+            "Waiting until there is enough free capacity in the flow - "
+            "{}.".format(self._load_info())
+        )
+
+        entry = (asyncio.get_event_loop().create_future(), message_size)
+        self._waiting.append(entry)
+        # Schedule the admission if only the rate limits hold the message back.
+        self._admit_waiting()
+        try:
+            # The load is increased by the coroutine that admits the message.
+            await entry[0]
+        except asyncio.CancelledError:
+            if entry[0].done() and not entry[0].cancelled():
+                # Admitted just before the cancellation, give the capacity back.
+                self._message_count -= 1
+                self._total_bytes -= message_size
+            else:
+                self._waiting.remove(entry)
+            self._admit_waiting()
+            raise
+
+    def release(self, message):
+        """Release a mesage from flow control.
+
+        Args:
+            message (:class:`~google.cloud.pubsub_v1.types.PubsubMessage`):
+                The message entering the flow control.
+        """
+        if self._settings.limit_exceeded_behavior == types.LimitExceededBehavior.IGNORE:
+            return
+
+        # Releasing a message decreases the load.
+        self._message_count -= 1
+        self._total_bytes -= message._pb.ByteSize()
+
+        if self._message_count < 0 or self._total_bytes < 0:
+            warnings.warn(
+                "Releasing a message that was never added or already released.",
+                category=RuntimeWarning,
+                stacklevel=2,
+            )
+            self._message_count = max(0, self._message_count)
+            self._total_bytes = max(0, self._total_bytes)
+
+        self._admit_waiting()
+
+    def _admit_waiting(self):
+        """Admit the waiting messages that fit, in FIFO order."""
+        while self._waiting:
+            future, message_size = self._waiting[0]
+            if not self._fits(message_size):
+                break
+
+            delay = self._rate_delay(message_size)
+            if delay > 0:
+                if self._rate_timer is None:
+                    self._rate_timer = asyncio.get_event_loop().call_later(
+                        delay, self._on_rate_timer
+                    )
+                break
+
+            self._waiting.popleft()
+            self._admit(message_size)
+            future.set_result(None)
+
+    def _on_rate_timer(self):
+        """Admit the waiting messages once the token buckets are refilled."""
+        self._rate_timer = None
+        self._admit_waiting()
+
+    def _admit(self, message_size):
+        """Increase the load, and take the tokens of an admitted message."""
+        self._message_count += 1
+        self._total_bytes += message_size
+        if self._message_bucket is not None:
+            self._message_bucket.take(1)
+        if self._byte_bucket is not None:
+            self._byte_bucket.take(message_size)
+
+    def _rate_delay(self, message_size):
+        """Return the number of seconds until the rate limits admit a message."""
+        delay = 0
+        if self._message_bucket is not None:
+            delay = self._message_bucket.delay(1)
+        if self._byte_bucket is not None:
+            delay = max(delay, self._byte_bucket.delay(message_size))
+        return delay
+
+    def _fits(self, message_size):
+        """Determine if a message of the given size fits within the limits."""
+        return (
+            self._message_count + 1 <= self._settings.message_limit
+            and self._total_bytes + message_size <= self._settings.byte_limit
+        )
+
+    def _load_info(self, message_count=None, total_bytes=None):
+        """Return the current flow control load information.
+
+        Args:
+            message_count (Optional[int]):
+                The value to override the current message count with.
+            total_bytes (Optional[int]):
+                The value to override the current total bytes with.
+
+        Returns:
+            str
+        """
+        msg = "messages: {} / {}, bytes: {} / {} (waiting: {})"
+
+        if message_count is None:
+            message_count = self._message_count
+
+        if total_bytes is None:
+            total_bytes = self._total_bytes
+
+        return msg.format(
+            message_count,
+            self._settings.message_limit,
+            total_bytes,
+            self._settings.byte_limit,
+            len(self._waiting),
+        )
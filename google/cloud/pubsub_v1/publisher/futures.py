@@ -14,7 +14,10 @@
 
 from __future__ import absolute_import
 
+import threading
+
 from google.cloud.pubsub_v1 import futures
+from google.cloud.pubsub_v1.publisher import exceptions
 
 
 class Future(futures.Future):
@@ -50,3 +53,281 @@ class Future(futures.Future):
         if err is None:
             return self._result
         raise err
+
+
+class _BatchOutcome(object):
+    """The outcome of publishing a batch, shared by the futures of all of the
+    messages in the batch.
+
+    A single completion event and callback list serve all of the messages,
+    and the message IDs are stored as returned by the backend. The result of
+    each message is only looked up when asked for.
+    """
+
+    __slots__ = ("_completed", "_lock", "_message_ids", "_exception", "_callbacks")
+
+    def __init__(self):
+        self._completed = threading.Event()
+        self._lock = threading.Lock()
+        self._message_ids = None
+        self._exception = None
+        # Pairs of (future, callback), invoked in order upon completion.
+        self._callbacks = []
+
+    def add_done_callback(self, future, callback):
+        """Invoke a callback with a message future once the batch is done.
+
+        Args:
+            future (MessageFuture): The future to pass to the callback.
+            callback (Callable[[MessageFuture], Any]): The callback.
+        """
+        with self._lock:
+            if not self._completed.is_set():
+                self._callbacks.append((future, callback))
+                return
+        callback(future)
+
+    def set_result(self, message_ids):
+        """Complete the batch with the IDs of its published messages.
+
+        Args:
+            message_ids (Sequence[str]): The message IDs, one for each message
+                in the batch, in order.
+        """
+        self._complete(message_ids, None)
+
+    def set_exception(self, exception):
+        """Complete the batch with an error for all of its messages.
+
+        Args:
+            exception (Exception): The error.
+        """
+        self._complete(None, exception)
+
+    def _complete(self, message_ids, exception):
+        with self._lock:
+            # Sanity check: A batch can only complete once.
+            if self._completed.is_set():
+                raise RuntimeError("A batch can only complete once.")
+            self._message_ids = message_ids
+            self._exception = exception
+            self._completed.set()
+            callbacks = self._callbacks
+            self._callbacks = None
+
+        for future, callback in callbacks:
+            callback(future)
+
+
+class MessageFuture(Future):
+    """This future object is returned from publishing a message with
+    :meth:`~.pubsub_v1.publisher.client.Client.publish`.
+
+    Calling :meth:`result` will resolve the future by returning the message
+    ID, unless an error occurs.
+
+    The future is compact: it only refers to the outcome of its batch, which
+    is shared by the futures of all of the messages in the batch. Its result
+    is set by the batch, not with :meth:`set_result` or :meth:`set_exception`.
+
+    Args:
+        outcome (_BatchOutcome): The outcome of the message's batch.
+        index (int): The index of the message in the batch.
+    """
+
+    __slots__ = ("_outcome", "_index")
+
+    def __init__(self, outcome, index):
+        # The state of the base class is held by the outcome of the batch,
+        # so its initializer (and the event it creates) is skipped.
+        self._outcome = outcome
+        self._index = index
+
+    def done(self):
+        """Return True the future is done, False otherwise.
+
+        This still returns True in failure cases; checking :meth:`result` or
+        :meth:`exception` is the canonical way to assess success or failure.
+        """
+        return self._outcome._completed.is_set()
+
+    def result(self, timeout=None):
+        """Return the message ID or raise an exception.
+
+        This blocks until the message has been published successfully and
+        returns the message ID unless an exception is raised.
+
+        Args:
+            timeout (Union[int, float]): The number of seconds before this call
+                times out and raises TimeoutError.
+
+        Returns:
+            str: The message ID.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the request times out.
+            Exception: For undefined exceptions in the underlying
+                call execution.
+        """
+        err = self.exception(timeout=timeout)
+        if err is None:
+            return self._outcome._message_ids[self._index]
+        raise err
+
+    def exception(self, timeout=None):
+        """Return the exception raised by the call, if any.
+
+        Args:
+            timeout (Union[int, float]): The number of seconds before this call
+                times out and raises TimeoutError.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the request times out.
+
+        Returns:
+            Exception: The exception raised by the call, if any.
+        """
+        if not self._outcome._completed.wait(timeout=timeout):
+            raise exceptions.TimeoutError("Timed out waiting for result.")
+        return self._outcome._exception
+
+    def add_done_callback(self, callback):
+        """Attach the provided callable to the future.
+
+        The provided function is called, with this future as its only argument,
+        when the future finishes running.
+
+        Args:
+            callback (Callable): The function to call.
+
+        Returns:
+            None
+        """
+        self._outcome.add_done_callback(self, callback)
+
+    def set_result(self, result):
+        """Not supported, the result is set by the batch of the message.
+
+        Raises:
+            RuntimeError: Always.
+        """
+        raise RuntimeError("The result of a message is set by its batch.")
+
+    def set_exception(self, exception):
+        """Not supported, the result is set by the batch of the message.
+
+        Raises:
+            RuntimeError: Always.
+        """
+        raise RuntimeError("The result of a message is set by its batch.")
+
+
+def _failed_message_future(exception):
+    """Create the future of a message that failed before it was batched.
+
+    Args:
+        exception (Exception): The error.
+
+    Returns:
+        MessageFuture: The completed future.
+    """
+    outcome = _BatchOutcome()
+    outcome.set_exception(exception)
+    return MessageFuture(outcome, 0)
+
+
+class BulkFuture(futures.Future):
+    """This future object is returned from
+    :meth:`~.pubsub_v1.publisher.client.Client.publish_many` and tracks all of
+    the messages published by the call.
+
+    The messages are published in chunks, each of them in a batch of its own.
+    The future completes once every chunk has been published (or has failed).
+    Calling :meth:`result` then returns the message IDs, in the same order as
+    the published messages, unless an error occurs.
+
+    Args:
+        message_count (int): The number of messages published.
+    """
+
+    def __init__(self, message_count):
+        super(BulkFuture, self).__init__()
+        self._message_ids = [None] * message_count
+        self._pending_count = message_count
+        self._first_exception = None
+        self._chunk_lock = threading.Lock()
+
+        if not message_count:
+            self.set_result([])
+
+    @property
+    def message_ids(self):
+        """List[Optional[str]]: The IDs of the published messages so far, in
+        the order of the messages. The entries of the messages that have not
+        been published (yet) are :data:`None`.
+        """
+        return list(self._message_ids)
+
+    def result(self, timeout=None):
+        """Return the message IDs or raise an exception.
+
+        This blocks until all of the messages have been published successfully
+        and returns the message IDs, unless an exception is raised. If some of
+        the messages failed to publish, the first error is raised, and
+        :attr:`message_ids` tells which of the messages were published.
+
+        Args:
+            timeout (Union[int, float]): The number of seconds before this call
+                times out and raises TimeoutError.
+
+        Returns:
+            List[str]: The message IDs.
+
+        Raises:
+            concurrent.futures.TimeoutError: If the request times out.
+            Exception: For undefined exceptions in the underlying
+                call execution.
+        """
+        err = self.exception(timeout=timeout)
+        if err is None:
+            return self._result
+        raise err
+
+    def _set_chunk_result(self, offset, message_ids):
+        """Record the IDs of a successfully published chunk of messages.
+
+        Args:
+            offset (int): The index of the first message of the chunk.
+            message_ids (Sequence[str]): The IDs of the messages of the chunk.
+        """
+        with self._chunk_lock:
+            self._message_ids[offset : offset + len(message_ids)] = message_ids
+            self._pending_count -= len(message_ids)
+            done = not self._pending_count
+
+        if done:
+            self._complete()
+
+    def _set_chunk_exception(self, offset, count, exception):
+        """Record that a chunk of messages failed to publish.
+
+        Args:
+            offset (int): The index of the first message of the chunk.
+            count (int): The number of messages in the chunk.
+            exception (Exception): The error.
+        """
+        with self._chunk_lock:
+            if self._first_exception is None:
+                self._first_exception = exception
+            self._pending_count -= count
+            done = not self._pending_count
+
+        if done:
+            self._complete()
+
+    def _complete(self):
+        """Complete the future once every chunk has been accounted for."""
+        if self._first_exception is None:
+            self.set_result(list(self._message_ids))
+        else:
+            self.set_exception(self._first_exception)
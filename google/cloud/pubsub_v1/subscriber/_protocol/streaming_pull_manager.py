@@ -25,6 +25,7 @@ import grpc
 
 from google.api_core import bidi
 from google.api_core import exceptions
+from google.cloud.pubsub_v1 import _envelopes
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.subscriber._protocol import dispatcher
 from google.cloud.pubsub_v1.subscriber._protocol import heartbeater
@@ -125,6 +126,10 @@ class StreamingPullManager(object):
             This setting affects when the on close callbacks get invoked, and
             consequently, when the StreamingPullFuture associated with the stream gets
             resolved.
+        unpack_envelopes (bool):
+            If ``True``, the records of each envelope message are delivered to the
+            callback instead of the envelope, see
+            :class:`~google.cloud.pubsub_v1.subscriber.message.Envelope`.
     """
 
     def __init__(
@@ -135,12 +140,14 @@ class StreamingPullManager(object):
         scheduler=None,
         use_legacy_flow_control=False,
         await_callbacks_on_shutdown=False,
+        unpack_envelopes=False,
     ):
         self._client = client
         self._subscription = subscription
         self._flow_control = flow_control
         self._use_legacy_flow_control = use_legacy_flow_control
         self._await_callbacks_on_shutdown = await_callbacks_on_shutdown
+        self._unpack_envelopes = unpack_envelopes
         self._ack_histogram = histogram.Histogram()
         self._last_histogram_size = 0
         self._ack_deadline = 10
@@ -399,7 +406,34 @@ class StreamingPullManager(object):
             self._messages_on_hold.size,
             self._on_hold_bytes,
         )
-        self._scheduler.schedule(self._callback, msg)
+        if isinstance(msg, google.cloud.pubsub_v1.subscriber.message.Envelope):
+            self._scheduler.schedule(self._dispatch_envelope, msg)
+        else:
+            self._scheduler.schedule(self._callback, msg)
+
+    def _dispatch_envelope(self, envelope):
+        """Invoke the user callback for each record of an envelope, in order.
+
+        The records are small, thus they are processed one after another in
+        the scheduler's thread of the envelope, rather than scheduling the
+        callback for each of them. An envelope that cannot be unpacked is
+        passed to the callback as it is.
+
+        Args:
+            envelope (google.cloud.pubsub_v1.message.Envelope): The envelope.
+        """
+        try:
+            records = envelope.unpack()
+        except ValueError:
+            _LOGGER.exception(
+                "Cannot unpack envelope %s, passing it to the callback as it is.",
+                envelope.message_id,
+            )
+            self._callback(envelope)
+            return
+
+        for record in records:
+            self._callback(record)
 
     def _send_unary_request(self, request):
         """Send a request using a separate unary request instead of over the
@@ -409,25 +443,25 @@ class StreamingPullManager(object):
             request (gapic_types.StreamingPullRequest): The stream request to be
                 mapped into unary requests.
         """
+        # The fields are read from the raw protobuf request, and the requests
+        # are sent through the client's raw protobuf RPCs, skipping the
+        # proto-plus wrappers of the GAPIC client.
+        request = request._pb
+
         if request.ack_ids:
-            self._client.acknowledge(
-                subscription=self._subscription, ack_ids=list(request.ack_ids)
-            )
+            self._client._acknowledge(self._subscription, list(request.ack_ids))
 
         if request.modify_deadline_ack_ids:
             # Send ack_ids with the same deadline seconds together.
             deadline_to_ack_ids = collections.defaultdict(list)
 
-            for n, ack_id in enumerate(request.modify_deadline_ack_ids):
-                deadline = request.modify_deadline_seconds[n]
+            for ack_id, deadline in zip(
+                request.modify_deadline_ack_ids, request.modify_deadline_seconds
+            ):
                 deadline_to_ack_ids[deadline].append(ack_id)
 
             for deadline, ack_ids in deadline_to_ack_ids.items():
-                self._client.modify_ack_deadline(
-                    subscription=self._subscription,
-                    ack_ids=ack_ids,
-                    ack_deadline_seconds=deadline,
-                )
+                self._client._modify_ack_deadline(self._subscription, ack_ids, deadline)
 
         _LOGGER.debug("Sent request(s) over unary RPC.")
 
@@ -496,11 +530,12 @@ class StreamingPullManager(object):
             self._get_initial_request, stream_ack_deadline_seconds
         )
         self._rpc = bidi.ResumableBidiRpc(
-            start_rpc=self._client.api.streaming_pull,
+            start_rpc=self._client._streaming_pull,
             initial_request=get_initial_request,
             should_recover=self._should_recover,
             should_terminate=self._should_terminate,
             throttle_reopen=True,
+            metadata=self._client._get_stream_metadata(),
         )
         self._rpc.add_done_callback(self._on_rpc_done)
 
@@ -695,7 +730,16 @@ class StreamingPullManager(object):
 
         with self._pause_resume_lock:
             for received_message in received_messages:
-                message = google.cloud.pubsub_v1.subscriber.message.Message(
+                # The envelopes are leased and flow controlled as a whole, and
+                # only unpacked once released to the callback.
+                message_class = google.cloud.pubsub_v1.subscriber.message.Message
+                if (
+                    self._unpack_envelopes
+                    and _envelopes.ENVELOPE_ATTRIBUTE
+                    in received_message.message.attributes
+                ):
+                    message_class = google.cloud.pubsub_v1.subscriber.message.Envelope
+                message = message_class(
                     received_message.message,
                     received_message.ack_id,
                     received_message.delivery_attempt,
@@ -14,17 +14,25 @@
 
 from __future__ import absolute_import
 
+import itertools
+import logging
 import os
 import pkg_resources
 
 from google.auth.credentials import AnonymousCredentials
 from google.oauth2 import service_account
+from google.protobuf import empty_pb2
 
+from google.cloud.pubsub_v1 import _channel_pool
+from google.cloud.pubsub_v1 import _fork
 from google.cloud.pubsub_v1 import _gapic
+from google.cloud.pubsub_v1 import _raw_rpc
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.subscriber import futures
 from google.cloud.pubsub_v1.subscriber._protocol import streaming_pull_manager
+from google.pubsub_v1 import types as gapic_types
 from google.pubsub_v1.services.subscriber import client as subscriber_client
+from google.pubsub_v1.services.subscriber.transports import SubscriberGrpcTransport
 
 
 try:
@@ -34,6 +42,11 @@ except pkg_resources.DistributionNotFound:
     # a PIP package.
     __version__ = "0.0"
 
+_LOGGER = logging.getLogger(__name__)
+
+_raw_proto_acknowledge_request = gapic_types.AcknowledgeRequest.pb()
+_raw_proto_modify_ack_deadline_request = gapic_types.ModifyAckDeadlineRequest.pb()
+
 _BLACKLISTED_METHODS = (
     "publish",
     "from_service_account_file",
@@ -50,6 +63,15 @@ class Client(object):
     get sensible defaults.
 
     Args:
+        channel_pool_size (int): The number of gRPC channels to spread the
+            requests over, each with a connection of its own. A streaming pull
+            always uses the same channel, also when it is reopened. Defaults
+            to a single channel. Cannot be combined with a custom
+            ``transport``.
+        compression_settings (~google.cloud.pubsub_v1.types.CompressionSettings):
+            The compression of the streaming pulls, and of the acknowledgement
+            and ack deadline modification requests. By default nothing is
+            compressed.
         kwargs (dict): Any additional arguments provided are sent as keyword
             keyword arguments to the underlying
             :class:`~google.cloud.pubsub_v1.gapic.subscriber_client.SubscriberClient`.
@@ -72,7 +94,14 @@ class Client(object):
         )
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, channel_pool_size=1, compression_settings=None, **kwargs):
+        if channel_pool_size < 1:
+            raise ValueError("channel_pool_size must be at least 1.")
+        if channel_pool_size > 1 and "transport" in kwargs:
+            raise ValueError(
+                "channel_pool_size cannot be combined with a custom transport."
+            )
+
         # Sanity check: Is our goal to use the emulator?
         # If so, create a grpc insecure channel with the emulator host
         # as the target.
@@ -82,10 +111,81 @@ class Client(object):
             }
             kwargs["credentials"] = AnonymousCredentials()
 
+        # The arguments of the underlying GAPIC client are kept, to create it
+        # again in the child process after a fork.
+        self._client_kwargs = kwargs
+        self._channel_pool_size = channel_pool_size
+        self._create_api()
+
+        # Assigns the streaming pulls to the channels of the pool in turn.
+        self._stream_counter = itertools.count()
+
+        if compression_settings is None:
+            compression_settings = types.CompressionSettings()
+        self._compression_settings = compression_settings
+
+        _fork.register(self)
+
+    def _create_api(self):
+        """Instantiate the underlying GAPIC client, and the raw RPCs."""
+        kwargs = self._client_kwargs
+
         # Instantiate the underlying GAPIC client.
         self._api = subscriber_client.SubscriberClient(**kwargs)
+        if self._channel_pool_size > 1:
+            transport = _channel_pool.create_transport(
+                SubscriberGrpcTransport,
+                self._api._transport,
+                self._channel_pool_size,
+                client_info=kwargs.get("client_info"),
+            )
+            self._api = subscriber_client.SubscriberClient(transport=transport)
         self._target = self._api._transport._host
 
+        # The RPCs used by the streaming pull managers to send acknowledgements
+        # and ack deadline modifications, see _acknowledge() and
+        # _modify_ack_deadline().
+        transport = self._api._transport
+        self._acknowledge_rpc = _raw_rpc.RawUnaryRpc(
+            transport,
+            "acknowledge",
+            "/google.pubsub.v1.Subscriber/Acknowledge",
+            request_serializer=_raw_proto_acknowledge_request.SerializeToString,
+            response_deserializer=empty_pb2.Empty.FromString,
+            routing_field="subscription",
+        )
+        self._modify_ack_deadline_rpc = _raw_rpc.RawUnaryRpc(
+            transport,
+            "modify_ack_deadline",
+            "/google.pubsub.v1.Subscriber/ModifyAckDeadline",
+            request_serializer=(
+                _raw_proto_modify_ack_deadline_request.SerializeToString
+            ),
+            response_deserializer=empty_pb2.Empty.FromString,
+            routing_field="subscription",
+        )
+
+    def _after_fork(self):
+        """Rebuild the client in the child process after a fork.
+
+        The gRPC channels of the parent cannot be used in the child, thus the
+        transport is created again. The streaming pulls opened before the fork
+        are not carried over to the child.
+
+        A transport instance passed to the client cannot be created again, the
+        child keeps using it, and a warning is logged.
+        """
+        if _fork.can_create_transport(self._client_kwargs):
+            self._create_api()
+        else:
+            _LOGGER.warning(
+                "The subscriber client was created with a custom transport, "
+                "which cannot be created again after a fork. The child process "
+                "shares the gRPC channel of the parent, which might not work, "
+                "create the client after the fork instead."
+            )
+        self._stream_counter = itertools.count()
+
     @classmethod
     def from_service_account_file(cls, filename, **kwargs):
         """Creates an instance of this client using the provided credentials
@@ -128,6 +228,7 @@ class Client(object):
         scheduler=None,
         use_legacy_flow_control=False,
         await_callbacks_on_shutdown=False,
+        unpack_envelopes=False,
     ):
         """Asynchronously start receiving messages on a given subscription.
 
@@ -220,6 +321,13 @@ class Client(object):
                 immediately after the background stream and its helper threads have been
                 terminated, but some of the message callback threads might still be
                 running at that point.
+            unpack_envelopes (bool):
+                If ``True``, the envelope messages published with envelope packing
+                enabled are unpacked, and their records are passed to the callback
+                one after another, as
+                :class:`~google.cloud.pubsub_v1.subscriber.message.Record`
+                instances. An envelope is acknowledged once all of its records are
+                acknowledged. Other messages are passed to the callback as usual.
 
         Returns:
             A :class:`~google.cloud.pubsub_v1.subscriber.futures.StreamingPullFuture`
@@ -234,6 +342,7 @@ class Client(object):
             scheduler=scheduler,
             use_legacy_flow_control=use_legacy_flow_control,
             await_callbacks_on_shutdown=await_callbacks_on_shutdown,
+            unpack_envelopes=unpack_envelopes,
         )
 
         future = futures.StreamingPullFuture(manager)
@@ -242,6 +351,106 @@ class Client(object):
 
         return future
 
+    def _acknowledge(self, subscription, ack_ids):
+        """Acknowledge messages.
+
+        The same as :meth:`acknowledge`, but the request is sent as a raw
+        protobuf message, skipping the proto-plus wrappers of the GAPIC client.
+
+        Args:
+            subscription (str): The subscription the messages were received
+                from.
+            ack_ids (Sequence[str]): The acknowledgment IDs of the messages.
+        """
+        request = _raw_proto_acknowledge_request(
+            subscription=subscription, ack_ids=ack_ids
+        )
+        self._acknowledge_rpc(
+            request, subscription, compression=self._get_ack_compression(request)
+        )
+
+    def _modify_ack_deadline(self, subscription, ack_ids, ack_deadline_seconds):
+        """Modify the ack deadline of messages.
+
+        The same as :meth:`modify_ack_deadline`, but the request is sent as a
+        raw protobuf message, skipping the proto-plus wrappers of the GAPIC
+        client.
+
+        Args:
+            subscription (str): The subscription the messages were received
+                from.
+            ack_ids (Sequence[str]): The acknowledgment IDs of the messages.
+            ack_deadline_seconds (int): The new ack deadline, in seconds.
+        """
+        request = _raw_proto_modify_ack_deadline_request(
+            subscription=subscription,
+            ack_ids=ack_ids,
+            ack_deadline_seconds=ack_deadline_seconds,
+        )
+        self._modify_ack_deadline_rpc(
+            request, subscription, compression=self._get_ack_compression(request)
+        )
+
+    def _get_ack_compression(self, request):
+        """Return the compression of an acknowledgement or ack deadline
+        modification request.
+
+        Args:
+            request (Any): The raw protobuf request.
+
+        Returns:
+            Optional[grpc.Compression]: The compression, if any.
+        """
+        compression = self._compression_settings.acknowledge
+        if (
+            compression is None
+            or request.ByteSize() < self._compression_settings.min_request_bytes
+        ):
+            return None
+        return compression
+
+    def _streaming_pull(self, requests, metadata=None):
+        """Open a streaming pull.
+
+        The same as :meth:`streaming_pull`, but the stream is compressed
+        according to the client's compression settings.
+
+        Args:
+            requests (Iterator[~google.pubsub_v1.types.StreamingPullRequest]):
+                The requests of the stream.
+            metadata (Optional[Sequence[Tuple[str, str]]]): Additional
+                metadata sent along with the stream.
+
+        Returns:
+            Iterable[~google.pubsub_v1.types.StreamingPullResponse]: The
+            responses of the stream.
+        """
+        compression = self._compression_settings.streaming_pull
+        if compression is None:
+            return self._api.streaming_pull(requests, metadata=metadata)
+
+        # The GAPIC client does not pass the compression on to gRPC, thus the
+        # wrapped RPC is invoked directly, the same way as the GAPIC client
+        # does it.
+        transport = self._api._transport
+        transport.streaming_pull._prefetch_first_result_ = False
+        rpc = transport._wrapped_methods[transport.streaming_pull]
+        return rpc(requests, timeout=None, metadata=metadata, compression=compression)
+
+    def _get_stream_metadata(self):
+        """Return the metadata of a new streaming pull.
+
+        If the client has a pool of channels, the metadata pins the stream to
+        a channel, so that the stream keeps using the channel when it is
+        reopened. The streams are assigned to the channels in turn.
+
+        Returns:
+            Optional[Sequence[Tuple[str, str]]]: The metadata, if any.
+        """
+        if not isinstance(self._api._transport.grpc_channel, _channel_pool.ChannelPool):
+            return None
+        return _channel_pool.affinity_metadata(str(next(self._stream_counter)))
+
     def close(self):
         """Close the underlying channel to release socket resources.
 
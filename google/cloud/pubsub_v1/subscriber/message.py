@@ -18,8 +18,11 @@ import datetime as dt
 import json
 import math
 import pytz
+import threading
 import time
 
+from google.cloud.pubsub_v1 import _envelopes
+from google.cloud.pubsub_v1 import codecs
 from google.cloud.pubsub_v1.subscriber._protocol import requests
 
 
@@ -64,7 +67,8 @@ class Message(object):
         message_id (str): The message ID. In general, you should not need
             to use this directly.
         data (bytes): The data in the message. Note that this will be a
-            :class:`bytes`, not a text string.
+            :class:`bytes`, not a text string. The data of a message
+            compressed by the publisher is decompressed when first accessed.
         attributes (.ScalarMapContainer): The attributes sent along with the
             message. See :attr:`attributes` for more information on this type.
         publish_time (datetime): The time that this message was originally
@@ -108,6 +112,14 @@ class Message(object):
         # properties.
         self._attributes = message.attributes
         self._data = message.data
+
+        # The name of the codec the publisher compressed the data with, if any.
+        # The data is decompressed when it is first accessed, and the marker
+        # attribute is hidden from the application.
+        self._payload_encoding = None
+        if codecs.ENCODING_ATTRIBUTE in self._attributes:
+            self._attributes = dict(self._attributes)
+            self._payload_encoding = self._attributes.pop(codecs.ENCODING_ATTRIBUTE)
         self._publish_time = dt.datetime.fromtimestamp(
             message.publish_time.seconds + message.publish_time.nanos / 1e9,
             tz=pytz.UTC,
@@ -117,7 +129,7 @@ class Message(object):
 
     def __repr__(self):
         # Get an abbreviated version of the data.
-        abbv_data = self._message.data
+        abbv_data = self.data
         if len(abbv_data) > 50:
             abbv_data = abbv_data[:50] + b"..."
 
@@ -144,7 +156,8 @@ class Message(object):
 
         Returns:
             .ScalarMapContainer: The message's attributes. This is a
-            ``dict``-like object provided by ``google.protobuf``.
+            ``dict``-like object provided by ``google.protobuf``, or a
+            ``dict`` if the message was compressed by the publisher.
         """
         return self._attributes
 
@@ -155,7 +168,18 @@ class Message(object):
         Returns:
             bytes: The message data. This is always a bytestring; if you
                 want a text string, call :meth:`bytes.decode`.
+
+        Raises:
+            ValueError: If the data was compressed with a codec that is not
+                registered in this process.
         """
+        encoding = self._payload_encoding
+        if encoding is not None:
+            # Decompressing the original data is idempotent, in case several
+            # threads access the data at once.
+            codec = codecs.get_codec(encoding)
+            self._data = codec.decompress(self._message.data)
+            self._payload_encoding = None
         return self._data
 
     @property
@@ -274,3 +298,127 @@ class Message(object):
                 ack_id=self._ack_id, byte_size=self.size, ordering_key=self.ordering_key
             )
         )
+
+
+# The outcomes of the records of an envelope, in increasing precedence.
+_RECORD_ACKED = 0
+_RECORD_DROPPED = 1
+_RECORD_NACKED = 2
+
+
+class Envelope(Message):
+    """A Pub/Sub message packing several records.
+
+    A publisher client with envelope packing enabled (see
+    :class:`~.pubsub_v1.types.EnvelopePackingSettings`) packs the messages into
+    envelopes. If subscribed with ``unpack_envelopes=True``, the records of
+    each envelope are delivered to the callback instead of the envelope
+    itself.
+
+    The envelope is acknowledged once all of its records are acknowledged. If
+    any of the records is nacked (or dropped), the envelope is nacked (or
+    dropped) once all of its records are done, and all of its records are
+    thus re-delivered.
+    """
+
+    def __init__(self, message, ack_id, delivery_attempt, request_queue):
+        super(Envelope, self).__init__(message, ack_id, delivery_attempt, request_queue)
+        self._lock = threading.Lock()
+        # The indexes of the records that are not done yet.
+        self._pending = set()
+        self._outcome = _RECORD_ACKED
+
+    def unpack(self):
+        """Return the records packed into the envelope.
+
+        Returns:
+            List[Record]: The records. If there are none, the envelope is
+            acknowledged right away.
+
+        Raises:
+            ValueError: If the envelope has an unknown format, or its data
+                cannot be decoded.
+        """
+        raw_records = _envelopes.decode(self.attributes, self.data)
+        records = [
+            Record(raw_record, index, self)
+            for index, raw_record in enumerate(raw_records)
+        ]
+        with self._lock:
+            self._pending = set(range(len(records)))
+        if not records:
+            self.ack()
+        return records
+
+    def _record_done(self, index, outcome):
+        """Settle the envelope once all of its records are done.
+
+        Args:
+            index (int): The index of the record.
+            outcome (int): What was done with the record.
+        """
+        with self._lock:
+            if index not in self._pending:
+                return
+            self._pending.remove(index)
+            self._outcome = max(self._outcome, outcome)
+            if self._pending:
+                return
+
+        if self._outcome == _RECORD_ACKED:
+            self.ack()
+        elif self._outcome == _RECORD_DROPPED:
+            self.drop()
+        else:
+            self.nack()
+
+
+class Record(Message):
+    """A record unpacked from an :class:`Envelope`.
+
+    A record behaves like a message, with the publish time, ordering key and
+    delivery attempt of its envelope, and with the ID of its envelope followed
+    by its index as its ID. Acknowledging, dropping or nacking a record only
+    affects its envelope once all of the envelope's records are done, while
+    modifying the ack deadline of a record modifies the ack deadline of the
+    whole envelope.
+
+    Args:
+        record (~.pubsub_v1.types.PubsubMessage.pb): The raw protobuf record.
+        index (int): The index of the record in its envelope.
+        envelope (Envelope): The envelope.
+    """
+
+    def __init__(self, record, index, envelope):
+        self._message = record
+        self._ack_id = envelope.ack_id
+        self._delivery_attempt = envelope.delivery_attempt
+        self._request_queue = envelope._request_queue
+        self.message_id = "{}-{}".format(envelope.message_id, index)
+        self._received_timestamp = envelope._received_timestamp
+        self._attributes = record.attributes
+        self._data = record.data
+        self._payload_encoding = None
+        self._publish_time = envelope.publish_time
+        self._ordering_key = envelope.ordering_key
+        self._size = record.ByteSize()
+
+        self._index = index
+        self._envelope = envelope
+
+    def ack(self):
+        """Acknowledge the record, see :meth:`Message.ack`."""
+        self._envelope._record_done(self._index, _RECORD_ACKED)
+
+    def drop(self):
+        """Release the record from lease management, see :meth:`Message.drop`."""
+        self._envelope._record_done(self._index, _RECORD_DROPPED)
+
+    def modify_ack_deadline(self, seconds):
+        """Reset the deadline for acknowledging the whole envelope, see
+        :meth:`Message.modify_ack_deadline`."""
+        self._envelope.modify_ack_deadline(seconds)
+
+    def nack(self):
+        """Decline to acknowledge the record, see :meth:`Message.nack`."""
+        self._envelope._record_done(self._index, _RECORD_NACKED)
@@ -65,6 +65,88 @@ BatchSettings.max_messages.__doc__ = (
     "publishing the batch."
 )
 
+AdaptiveBatchSettings = collections.namedtuple(
+    "AdaptiveBatchSettings", ["min_messages", "min_latency"]
+)
+AdaptiveBatchSettings.__new__.__defaults__ = (
+    1,  # min_messages: 1
+    0.0,  # min_latency: 0 seconds
+)
+AdaptiveBatchSettings.__doc__ = (
+    "The settings for adjusting the batch settings to the observed traffic. "
+    "The ``max_messages`` and ``max_latency`` of the client's batch settings "
+    "are the upper bounds of the adjusted values."
+)
+AdaptiveBatchSettings.min_messages.__doc__ = (
+    "The lower bound of the adjusted maximum number of messages in a batch."
+)
+AdaptiveBatchSettings.min_latency.__doc__ = (
+    "The lower bound of the adjusted maximum number of seconds to wait for "
+    "additional messages before publishing a batch."
+)
+
+FireAndForgetSettings = collections.namedtuple(
+    "FireAndForgetSettings", ["error_callback"]
+)
+FireAndForgetSettings.__new__.__defaults__ = (
+    None,  # error_callback: failures are only counted and logged
+)
+FireAndForgetSettings.__doc__ = (
+    "The settings for publishing messages without a future for each message."
+)
+FireAndForgetSettings.error_callback.__doc__ = (
+    "A callable invoked once for each batch of messages that failed to be "
+    "published, with the topic, the exception, and the number of messages "
+    "as its arguments."
+)
+
+PayloadCompressionSettings = collections.namedtuple(
+    "PayloadCompressionSettings", ["codec", "min_bytes"]
+)
+PayloadCompressionSettings.__new__.__defaults__ = (
+    "zlib",  # codec: zlib
+    1024,  # min_bytes: 1 KiB
+)
+PayloadCompressionSettings.__doc__ = (
+    "The settings for compressing the data of the published messages, see "
+    ":mod:`~google.cloud.pubsub_v1.codecs`."
+)
+PayloadCompressionSettings.codec.__doc__ = (
+    "The name of the codec to compress the data with: ``zlib``, ``lzma``, "
+    "``zstd``, or the name of a codec registered with "
+    ":func:`~google.cloud.pubsub_v1.codecs.register_codec`."
+)
+PayloadCompressionSettings.min_bytes.__doc__ = (
+    "The minimum size of the data of a message to compress, in bytes. Smaller "
+    "messages, as well as messages that do not become smaller when "
+    "compressed, are published as they are."
+)
+
+EnvelopePackingSettings = collections.namedtuple(
+    "EnvelopePackingSettings", ["max_bytes", "max_records", "max_latency"]
+)
+EnvelopePackingSettings.__new__.__defaults__ = (
+    256 * 1024,  # max_bytes: 256 KiB
+    1000,  # max_records: 1000
+    0.01,  # max_latency: 10 ms
+)
+EnvelopePackingSettings.__doc__ = (
+    "The settings for packing the published messages into envelope messages, "
+    "each of them carrying many small records."
+)
+EnvelopePackingSettings.max_bytes.__doc__ = (
+    "The maximum size of the data of an envelope. Larger messages are "
+    "published on their own, without an envelope."
+)
+EnvelopePackingSettings.max_records.__doc__ = (
+    "The maximum number of records to pack into an envelope."
+)
+EnvelopePackingSettings.max_latency.__doc__ = (
+    "The maximum number of seconds to wait for additional records before "
+    "publishing an envelope. The envelope is then published like any other "
+    "message, subject to the batch settings."
+)
+
 
 class LimitExceededBehavior(str, enum.Enum):
     """The possible actions when exceeding the publish flow control limits."""
@@ -74,13 +156,39 @@ class LimitExceededBehavior(str, enum.Enum):
     ERROR = "error"
 
 
+class PublishPriority(enum.Enum):
+    """The priority of a published message.
+
+    A high-priority message is published right away, together with the rest
+    of its batch, instead of waiting for the batch to fill up or for its
+    ``max_latency`` to expire, and it skips ahead of the normal-priority
+    messages blocked by the publish flow control.
+    """
+
+    NORMAL = "normal"
+    HIGH = "high"
+
+
 PublishFlowControl = collections.namedtuple(
-    "PublishFlowControl", ["message_limit", "byte_limit", "limit_exceeded_behavior"]
+    "PublishFlowControl",
+    [
+        "message_limit",
+        "byte_limit",
+        "limit_exceeded_behavior",
+        "messages_per_second",
+        "bytes_per_second",
+        "message_burst",
+        "byte_burst",
+    ],
 )
 PublishFlowControl.__new__.__defaults__ = (
     10 * BatchSettings.__new__.__defaults__[2],  # message limit
     10 * BatchSettings.__new__.__defaults__[0],  # byte limit
     LimitExceededBehavior.IGNORE,  # desired behavior
+    None,  # messages_per_second: no message rate limit
+    None,  # bytes_per_second: no byte rate limit
+    None,  # message_burst: one second's worth of messages
+    None,  # byte_burst: one second's worth of bytes
 )
 PublishFlowControl.__doc__ = "The client flow control settings for message publishing."
 PublishFlowControl.message_limit.__doc__ = (
@@ -92,17 +200,280 @@ PublishFlowControl.byte_limit.__doc__ = (
 PublishFlowControl.limit_exceeded_behavior.__doc__ = (
     "The action to take when publish flow control limits are exceeded."
 )
+PublishFlowControl.messages_per_second.__doc__ = (
+    "The maximum sustained rate of messages entering the flow, if any. The "
+    "rate limits apply on top of the other limits, with the same "
+    "``limit_exceeded_behavior``, which must thus not be ``IGNORE``."
+)
+PublishFlowControl.bytes_per_second.__doc__ = (
+    "The maximum sustained rate of bytes entering the flow, if any."
+)
+PublishFlowControl.message_burst.__doc__ = (
+    "The number of messages that may enter the flow at once, above the "
+    "message rate. Defaults to ``messages_per_second``."
+)
+PublishFlowControl.byte_burst.__doc__ = (
+    "The number of bytes that may enter the flow at once, above the byte "
+    "rate. Defaults to ``bytes_per_second``."
+)
+
+TopicSettings = collections.namedtuple(
+    "TopicSettings", ["batch_settings", "flow_control"]
+)
+TopicSettings.__new__.__defaults__ = (
+    None,  # batch_settings: the client's batch settings
+    None,  # flow_control: only the client's flow control
+)
+TopicSettings.__doc__ = (
+    "The settings overriding the publisher client's settings for some topics."
+)
+TopicSettings.batch_settings.__doc__ = (
+    "The batch settings of the topics. If ``None``, the client's batch "
+    "settings apply."
+)
+TopicSettings.flow_control.__doc__ = (
+    "The flow control settings of a separate budget shared by the topics, "
+    "which applies in addition to the client's flow control, the latter "
+    "acting as a global cap. If ``None``, only the client's flow control "
+    "applies."
+)
+
+PublishConcurrencyControl = collections.namedtuple(
+    "PublishConcurrencyControl",
+    ["max_outstanding_rpcs", "max_outstanding_rpcs_per_topic"],
+)
+PublishConcurrencyControl.__new__.__defaults__ = (
+    None,  # max_outstanding_rpcs: unbounded
+    None,  # max_outstanding_rpcs_per_topic: bound only by the client limit
+)
+PublishConcurrencyControl.__doc__ = (
+    "The settings for limiting the number of concurrent publish requests."
+)
+PublishConcurrencyControl.max_outstanding_rpcs.__doc__ = (
+    "The maximum number of batches the client publishes concurrently. This is "
+    "also the size of the client's pool of commit threads. Batches above this "
+    "limit wait in a queue until a commit thread becomes available. If "
+    "``None``, the number is unbounded, each committed batch is published "
+    "right away. The commit threads exit after a few seconds without work."
+)
+PublishConcurrencyControl.max_outstanding_rpcs_per_topic.__doc__ = (
+    "The maximum number of batches the client publishes concurrently to a "
+    "single topic. If ``None``, only the client-wide limit applies."
+)
+
+RetryBudgetSettings = collections.namedtuple(
+    "RetryBudgetSettings", ["retry_ratio", "min_retries_per_second"]
+)
+RetryBudgetSettings.__new__.__defaults__ = (
+    0.1,  # retry_ratio: one retry for every 10 publish requests
+    10.0,  # min_retries_per_second: 10
+)
+RetryBudgetSettings.__doc__ = (
+    "The settings for capping the retries of the failed publish requests "
+    "across the whole client. Once the budget is spent, the failed requests "
+    "are not retried, and their batches fail with the last error."
+)
+RetryBudgetSettings.retry_ratio.__doc__ = (
+    "The maximum number of retries per publish request sent, over the last "
+    "10 seconds."
+)
+RetryBudgetSettings.min_retries_per_second.__doc__ = (
+    "The number of retries allowed per second on top of the ``retry_ratio``, "
+    "so that a client sending few requests can still retry them."
+)
+
+
+class CircuitBreakerState(str, enum.Enum):
+    """The possible states of the publisher client's circuit breaker.
+
+    The publish requests are sent normally while the circuit breaker is
+    closed. None are sent while it is open, because the backend is failing,
+    and only a few probe requests are sent while it is half-open, to find out
+    whether the backend has recovered.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+CircuitBreakerSettings = collections.namedtuple(
+    "CircuitBreakerSettings",
+    [
+        "failure_threshold",
+        "reset_timeout",
+        "half_open_probes",
+        "hold_batches",
+        "state_callback",
+    ],
+)
+CircuitBreakerSettings.__new__.__defaults__ = (
+    5,  # failure_threshold: 5
+    30.0,  # reset_timeout: 30 seconds
+    1,  # half_open_probes: 1
+    False,  # hold_batches: fail fast
+    None,  # state_callback: none
+)
+CircuitBreakerSettings.__doc__ = (
+    "The settings for stopping to publish while the backend is failing. The "
+    "circuit breaker opens after consecutive failed publish attempts, then "
+    "lets probe requests through after a while, and closes once one of them "
+    "succeeds."
+)
+CircuitBreakerSettings.failure_threshold.__doc__ = (
+    "The number of consecutive publish attempts failing with a transient "
+    "error, e.g. ``UNAVAILABLE`` or ``DEADLINE_EXCEEDED``, that opens the "
+    "circuit breaker."
+)
+CircuitBreakerSettings.reset_timeout.__doc__ = (
+    "The number of seconds the circuit breaker stays open before letting "
+    "probe requests through."
+)
+CircuitBreakerSettings.half_open_probes.__doc__ = (
+    "The maximum number of probe requests in flight while the circuit "
+    "breaker is half-open."
+)
+CircuitBreakerSettings.hold_batches.__doc__ = (
+    "Whether to hold the batches until they can be sent while the circuit "
+    "breaker is not closed. If ``False``, the batches fail right away with "
+    ":class:`~google.cloud.pubsub_v1.publisher.exceptions.CircuitBreakerOpenError`. "
+    "The batches with an ordering key are always held."
+)
+CircuitBreakerSettings.state_callback.__doc__ = (
+    "A callable invoked with the new :class:`CircuitBreakerState` whenever "
+    "the state of the circuit breaker changes."
+)
+
+HedgingSettings = collections.namedtuple(
+    "HedgingSettings", ["latency_percentile", "max_hedge_ratio", "min_delay"]
+)
+HedgingSettings.__new__.__defaults__ = (
+    95.0,  # latency_percentile: 95th percentile
+    0.05,  # max_hedge_ratio: 5% of the requests
+    0.0,  # min_delay: 0 seconds
+)
+HedgingSettings.__doc__ = (
+    "The settings for sending a second copy of the slow publish requests of "
+    "the messages without an ordering key. The first response wins, but the "
+    "messages of a hedged request might be published twice, thus delivered "
+    "twice to the subscribers."
+)
+HedgingSettings.latency_percentile.__doc__ = (
+    "The percentile of the recent publish request latencies after which a "
+    "request still in progress is hedged."
+)
+HedgingSettings.max_hedge_ratio.__doc__ = (
+    "The maximum number of hedged requests per publish request sent."
+)
+HedgingSettings.min_delay.__doc__ = (
+    "The minimum number of seconds to wait before hedging a request."
+)
+
+OutboxSettings = collections.namedtuple(
+    "OutboxSettings",
+    ["directory", "segment_bytes", "max_bytes", "byte_limit", "sync"],
+)
+OutboxSettings.__new__.__defaults__ = (
+    64 * 1024 * 1024,  # segment_bytes: 64 MiB
+    None,  # max_bytes: the outbox is unbounded
+    10 * BatchSettings.__new__.__defaults__[0],  # byte_limit
+    True,  # sync: publish() waits until the messages are on disk
+)
+OutboxSettings.__doc__ = (
+    "The settings for storing the published messages in a durable local "
+    "outbox, from which they are published in the background. The messages "
+    "left in the outbox are published again by the next client using the same "
+    "directory, thus they might be published twice."
+)
+OutboxSettings.directory.__doc__ = (
+    "The directory of the outbox files, created if it does not exist. It must "
+    "not be used by several clients at the same time."
+)
+OutboxSettings.segment_bytes.__doc__ = (
+    "The size of each outbox file. A file is deleted once all of its messages "
+    "were published."
+)
+OutboxSettings.max_bytes.__doc__ = (
+    "The maximum total size of the outbox files. The messages that do not fit "
+    "fail with a FlowControlLimitError."
+)
+OutboxSettings.byte_limit.__doc__ = (
+    "The maximum total size of the messages read from the outbox and not "
+    "published yet."
+)
+OutboxSettings.sync.__doc__ = (
+    "Whether ``publish()`` waits until the message is flushed to disk. If "
+    "False, the messages are only written to the page cache, and survive a "
+    "crash of the process, but not of the machine."
+)
+
+SpillSettings = collections.namedtuple(
+    "SpillSettings", ["directory", "memory_bytes", "max_bytes", "segment_bytes"]
+)
+SpillSettings.__new__.__defaults__ = (
+    10 * BatchSettings.__new__.__defaults__[0],  # memory_bytes
+    None,  # max_bytes: the spilled batches are unbounded
+    16 * 1024 * 1024,  # segment_bytes: 16 MiB
+)
+SpillSettings.__doc__ = (
+    "The settings for spilling the committed batches waiting for a commit "
+    "thread to disk, once they exceed a memory budget. The spilled batches are "
+    "read back by the commit threads, they are not kept across restarts."
+)
+SpillSettings.directory.__doc__ = (
+    "The directory in which each client creates a spill directory of its own, "
+    "removed once the client is stopped and all of its batches are published."
+)
+SpillSettings.memory_bytes.__doc__ = (
+    "The maximum total size of the committed batches waiting in memory. The "
+    "batches committed beyond this budget are spilled to disk."
+)
+SpillSettings.max_bytes.__doc__ = (
+    "The maximum total size of the spilled batches. Once both budgets are "
+    "exhausted, the batches are kept in memory, and publishing blocks until "
+    "the memory budget is available again."
+)
+SpillSettings.segment_bytes.__doc__ = (
+    "The size after which the spilled batches are written to a new file. A "
+    "file is deleted once all of its batches were read back."
+)
 
 # Define the default publisher options.
 #
 # This class is used when creating a publisher client to pass in options
 # to enable/disable features.
 PublisherOptions = collections.namedtuple(
-    "PublisherConfig", ["enable_message_ordering", "flow_control"]
+    "PublisherConfig",
+    [
+        "enable_message_ordering",
+        "flow_control",
+        "concurrency_control",
+        "adaptive_batch_settings",
+        "fire_and_forget",
+        "payload_compression",
+        "envelope_packing",
+        "topic_settings",
+        "retry_budget",
+        "circuit_breaker",
+        "hedging",
+        "outbox",
+        "spill",
+    ],
 )
 PublisherOptions.__new__.__defaults__ = (
     False,  # enable_message_ordering: False
     PublishFlowControl(),  # default flow control settings
+    PublishConcurrencyControl(),  # default concurrency control settings
+    None,  # adaptive_batch_settings: static batch settings
+    None,  # fire_and_forget: publish() returns a future for each message
+    None,  # payload_compression: the message data is not compressed
+    None,  # envelope_packing: each message is published on its own
+    None,  # topic_settings: the same settings apply to all topics
+    None,  # retry_budget: the failed requests are retried independently
+    None,  # circuit_breaker: the requests are always sent
+    None,  # hedging: the requests are sent once
+    None,  # outbox: the messages are only kept in memory
+    None,  # spill: the committed batches are kept in memory
 )
 PublisherOptions.__doc__ = "The options for the publisher client."
 PublisherOptions.enable_message_ordering.__doc__ = (
@@ -112,6 +483,63 @@ PublisherOptions.flow_control.__doc__ = (
     "Flow control settings for message publishing by the client. By default "
     "the publisher client does not do any throttling."
 )
+PublisherOptions.concurrency_control.__doc__ = (
+    "Settings for limiting the number of concurrent publish requests made by "
+    "the client."
+)
+PublisherOptions.adaptive_batch_settings.__doc__ = (
+    "If set, the batch settings of each topic are adjusted to the observed "
+    "message arrival rate and publish latency, within the given bounds. By "
+    "default the batch settings are static."
+)
+PublisherOptions.fire_and_forget.__doc__ = (
+    "If set, ``publish()`` does not return a future for each message, and the "
+    "outcome of the batches is reported through the given fire-and-forget "
+    "settings and the client's publish counts instead."
+)
+PublisherOptions.payload_compression.__doc__ = (
+    "If set, the data of large messages is compressed before publishing them, "
+    "which reduces their stored size. Subscriber clients decompress the data "
+    "transparently."
+)
+PublisherOptions.envelope_packing.__doc__ = (
+    "If set, the messages published with ``publish()`` are packed into "
+    "envelope messages, which subscribers unpack if they are subscribed with "
+    "``unpack_envelopes=True``. Cannot be combined with the fire-and-forget "
+    "mode."
+)
+PublisherOptions.topic_settings.__doc__ = (
+    "A mapping of topic names, or of :mod:`fnmatch` patterns of topic names, "
+    "to :class:`TopicSettings` overriding the client's settings for those "
+    "topics. An exact topic name takes precedence over the patterns, which "
+    "are matched in order. By default the same settings apply to all topics."
+)
+PublisherOptions.retry_budget.__doc__ = (
+    "If set, the retries of the failed publish requests are capped across "
+    "the client. By default each request is retried on its own, according to "
+    "its retry settings."
+)
+PublisherOptions.circuit_breaker.__doc__ = (
+    "If set, the client stops publishing while the backend keeps failing, "
+    "see :class:`CircuitBreakerSettings`. By default the requests are always "
+    "sent."
+)
+PublisherOptions.hedging.__doc__ = (
+    "If set, the slow publish requests of the messages without an ordering "
+    "key are sent a second time, accepting that their messages might be "
+    "published twice. By default each request is sent once."
+)
+PublisherOptions.outbox.__doc__ = (
+    "If set, the published messages are stored in a durable local outbox "
+    "before publishing them, see :class:`OutboxSettings`. Cannot be combined "
+    "with the fire-and-forget mode. By default the messages are only kept in "
+    "memory."
+)
+PublisherOptions.spill.__doc__ = (
+    "If set, the committed batches waiting for a commit thread are spilled to "
+    "disk beyond a memory budget, see :class:`SpillSettings`. By default they "
+    "are kept in memory."
+)
 
 # Define the type class and default values for flow control settings.
 #
@@ -155,6 +583,38 @@ FlowControl.max_duration_per_lease_extension.__doc__ = (
     "fails to extend the deadline."
 )
 
+CompressionSettings = collections.namedtuple(
+    "CompressionSettings",
+    ["publish", "streaming_pull", "acknowledge", "min_request_bytes"],
+)
+CompressionSettings.__new__.__defaults__ = (
+    None,  # publish: not compressed
+    None,  # streaming_pull: not compressed
+    None,  # acknowledge: not compressed
+    1024,  # min_request_bytes: 1 KiB
+)
+CompressionSettings.__doc__ = (
+    "The settings for compressing the requests sent by a client. Each RPC "
+    "takes a :class:`grpc.Compression` algorithm, or ``None`` to send the "
+    "requests uncompressed."
+)
+CompressionSettings.publish.__doc__ = (
+    "The compression of the ``Publish`` requests of a publisher client."
+)
+CompressionSettings.streaming_pull.__doc__ = (
+    "The compression of the streaming pulls of a subscriber client. A stream "
+    "is compressed as a whole, regardless of the size of its requests."
+)
+CompressionSettings.acknowledge.__doc__ = (
+    "The compression of the ``Acknowledge`` and ``ModifyAckDeadline`` "
+    "requests of a subscriber client."
+)
+CompressionSettings.min_request_bytes.__doc__ = (
+    "The minimum size of a unary request to compress, in bytes. Smaller "
+    "requests are sent uncompressed, since compressing them costs more CPU "
+    "time than it saves bandwidth."
+)
+
 
 # The current api core helper does not find new proto messages of type proto.Message,
 # thus we need our own helper. Adjusted from
@@ -194,11 +654,25 @@ _shared_modules = [
 _local_modules = [pubsub_gapic_types]
 
 names = [
+    "AdaptiveBatchSettings",
+    "FireAndForgetSettings",
+    "PayloadCompressionSettings",
+    "EnvelopePackingSettings",
     "BatchSettings",
     "LimitExceededBehavior",
+    "PublishPriority",
     "PublishFlowControl",
+    "PublishConcurrencyControl",
+    "RetryBudgetSettings",
+    "CircuitBreakerState",
+    "CircuitBreakerSettings",
+    "HedgingSettings",
+    "OutboxSettings",
+    "SpillSettings",
+    "TopicSettings",
     "PublisherOptions",
     "FlowControl",
+    "CompressionSettings",
 ]
 
 for module in _shared_modules:
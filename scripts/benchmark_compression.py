@@ -0,0 +1,220 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure the bytes on the wire and the CPU cost of compressed publishing.
+
+The publisher client sends batches of JSON messages to an in-process gRPC
+server that answers the ``Publish`` requests. The client connects to the
+server through a local TCP proxy counting the bytes sent by the client, thus
+the results show the actual size of the requests on the wire, including the
+gRPC framing, for each compression algorithm.
+
+The CPU time covers both the client and the server, which run in the same
+process, so it includes compressing and decompressing the requests.
+
+Usage:
+    python scripts/benchmark_compression.py [--requests N]
+"""
+
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from concurrent import futures
+
+import grpc
+
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.pubsub_v1 import types as gapic_types
+from google.pubsub_v1.services.publisher.transports import PublisherGrpcTransport
+
+# The approximate sizes of the publish requests.
+_BATCH_SIZES = (1024, 16 * 1024, 256 * 1024, 2 * 1024 * 1024)
+_ALGORITHMS = (
+    ("none", None),
+    ("deflate", grpc.Compression.Deflate),
+    ("gzip", grpc.Compression.Gzip),
+)
+_MESSAGE_SIZE = 512
+_TOPIC = "projects/benchmark/topics/compression"
+
+_raw_publish_request = gapic_types.PublishRequest.pb()
+_raw_publish_response = gapic_types.PublishResponse.pb()
+
+
+def _make_message(rng):
+    """Return a JSON event of about _MESSAGE_SIZE bytes."""
+    event = {
+        "event_id": "%032x" % rng.getrandbits(128),
+        "timestamp": 1600000000 + rng.randrange(10**7),
+        "type": rng.choice(["click", "view", "purchase", "signup"]),
+        "user": {
+            "id": rng.randrange(10**6),
+            "country": rng.choice(["US", "DE", "FR", "JP", "BR"]),
+            "agent": "Mozilla/5.0 (X11; Linux x86_64) Gecko/20100101 Firefox/84.0",
+        },
+        "items": [],
+    }
+    while len(json.dumps(event)) < _MESSAGE_SIZE:
+        event["items"].append(
+            {"sku": "SKU-%06d" % rng.randrange(10**6), "qty": rng.randrange(1, 5)}
+        )
+    return json.dumps(event).encode("utf-8")
+
+
+def _make_request(rng, size):
+    messages = []
+    while sum(len(data) for data in messages) < size:
+        messages.append(_make_message(rng))
+    request = _raw_publish_request(
+        topic=_TOPIC,
+        messages=[gapic_types.PubsubMessage(data=data)._pb for data in messages],
+    )
+    return request.SerializeToString(), len(messages)
+
+
+def _publish(request, context):
+    message_count = len(_raw_publish_request.FromString(request).messages)
+    return _raw_publish_response(
+        message_ids=[str(i) for i in range(message_count)]
+    ).SerializeToString()
+
+
+def _start_server():
+    handler = grpc.method_handlers_generic_handler(
+        "google.pubsub.v1.Publisher",
+        {"Publish": grpc.unary_unary_rpc_method_handler(_publish)},
+    )
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    server.add_generic_rpc_handlers((handler,))
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, port
+
+
+class CountingProxy(object):
+    """A TCP proxy counting the bytes sent from the clients to the server."""
+
+    def __init__(self, server_port):
+        self._server_port = server_port
+        self._lock = threading.Lock()
+        self.upstream_bytes = 0
+
+        self._listener = socket.socket()
+        self._listener.bind(("localhost", 0))
+        self._listener.listen()
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self._listener.accept()
+            upstream = socket.create_connection(("localhost", self._server_port))
+            for source, target, counted in (
+                (client, upstream, True),
+                (upstream, client, False),
+            ):
+                threading.Thread(
+                    target=self._pump, args=(source, target, counted), daemon=True
+                ).start()
+
+    def _pump(self, source, target, counted):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                if counted:
+                    with self._lock:
+                        self.upstream_bytes += len(data)
+                target.sendall(data)
+        except OSError:
+            pass
+        finally:
+            target.close()
+
+
+def _create_client(port, compression):
+    transport = PublisherGrpcTransport(
+        channel=grpc.insecure_channel("localhost:{}".format(port))
+    )
+    compression_settings = types.CompressionSettings(
+        publish=compression, min_request_bytes=0
+    )
+    return publisher.Client(
+        transport=transport, compression_settings=compression_settings
+    )
+
+
+def _run(proxy, request, compression, request_count):
+    client = _create_client(proxy.port, compression)
+    # Warm up the connection, and leave out the connection setup.
+    client._publish_serialized(_TOPIC, request)
+
+    bytes_before = proxy.upstream_bytes
+    cpu_before = time.process_time()
+    for _ in range(request_count):
+        client._publish_serialized(_TOPIC, request)
+    cpu_time = time.process_time() - cpu_before
+
+    # Let the proxy count the last request.
+    time.sleep(0.1)
+    wire_bytes = proxy.upstream_bytes - bytes_before
+    client.api._transport.grpc_channel.close()
+    return wire_bytes / request_count, cpu_time / request_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--requests", type=int, default=50, help="requests per measurement"
+    )
+    args = parser.parse_args()
+
+    server, server_port = _start_server()
+    proxy = CountingProxy(server_port)
+    rng = random.Random(0)
+
+    print(
+        "{:>10} {:>9} {:>10} {:>14} {:>7} {:>15}".format(
+            "batch", "messages", "algorithm", "bytes/request", "ratio", "CPU ms/request"
+        )
+    )
+    try:
+        for size in _BATCH_SIZES:
+            request, message_count = _make_request(rng, size)
+            baseline = None
+            for name, compression in _ALGORITHMS:
+                wire_bytes, cpu_time = _run(proxy, request, compression, args.requests)
+                if baseline is None:
+                    baseline = wire_bytes
+                print(
+                    "{:>10} {:>9} {:>10} {:>14.0f} {:>7.2f} {:>15.3f}".format(
+                        len(request),
+                        message_count,
+                        name,
+                        wire_bytes,
+                        wire_bytes / baseline,
+                        cpu_time * 1000,
+                    )
+                )
+    finally:
+        server.stop(None)
+
+
+if __name__ == "__main__":
+    main()
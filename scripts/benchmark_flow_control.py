@@ -0,0 +1,133 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure the publish flow control under many contending publisher threads.
+
+Hundreds of publisher threads add messages to a flow controller with BLOCK
+behavior and a low message limit, thus nearly all of them are blocked at any
+time. A few releasing threads play the role of the completed publish
+requests, and release the messages as fast as they are added.
+
+The results show the throughput of the flow controller, the CPU time spent
+per admitted message, and the worst time a publisher waited to be admitted.
+A flow controller waking up all of the blocked threads on each release burns
+CPU time proportional to the number of publishers.
+
+Usage:
+    python scripts/benchmark_flow_control.py [--publishers N ...] [--seconds S]
+"""
+
+import argparse
+import queue
+import threading
+import time
+
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher.flow_controller import FlowController
+
+_MESSAGE_SIZE = 100
+_RELEASERS = 4
+
+
+def _run(publisher_count, message_limit, seconds):
+    settings = types.PublishFlowControl(
+        message_limit=message_limit,
+        byte_limit=message_limit * _MESSAGE_SIZE,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = FlowController(settings)
+    admitted = queue.Queue()
+    stopped = threading.Event()
+    admissions = [0] * publisher_count
+    max_waits = [0.0] * publisher_count
+
+    def publish(index):
+        while not stopped.is_set():
+            start = time.monotonic()
+            flow_controller._add_many(1, _MESSAGE_SIZE)
+            max_waits[index] = max(max_waits[index], time.monotonic() - start)
+            admissions[index] += 1
+            admitted.put(True)
+
+    def release():
+        while admitted.get():
+            flow_controller._release_many(1, _MESSAGE_SIZE)
+
+    releasers = [threading.Thread(target=release) for _ in range(_RELEASERS)]
+    publishers = [
+        threading.Thread(target=publish, args=(index,))
+        for index in range(publisher_count)
+    ]
+    for thread in releasers + publishers:
+        thread.start()
+
+    # Leave out the start-up of the threads.
+    time.sleep(0.5)
+    max_waits[:] = [0.0] * publisher_count
+    admissions_before = sum(admissions)
+    cpu_before = time.process_time()
+    start = time.monotonic()
+    time.sleep(seconds)
+    count = sum(admissions) - admissions_before
+    cpu_time = time.process_time() - cpu_before
+    elapsed = time.monotonic() - start
+
+    # The releasers keep admitting the blocked publishers until all of them
+    # notice the stop.
+    stopped.set()
+    for thread in publishers:
+        thread.join()
+    for _ in releasers:
+        admitted.put(False)
+    for thread in releasers:
+        thread.join()
+
+    return count / elapsed, cpu_time / max(count, 1), max(max_waits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--publishers",
+        type=int,
+        nargs="+",
+        default=[10, 100, 500],
+        help="numbers of publisher threads",
+    )
+    parser.add_argument(
+        "--message-limit", type=int, default=10, help="flow control message limit"
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=3, help="duration of each measurement"
+    )
+    args = parser.parse_args()
+
+    print(
+        "{:>10} {:>14} {:>18} {:>13}".format(
+            "publishers", "messages/s", "CPU us/message", "max wait ms"
+        )
+    )
+    for publisher_count in args.publishers:
+        throughput, cpu_time, max_wait = _run(
+            publisher_count, args.message_limit, args.seconds
+        )
+        print(
+            "{:>10} {:>14.0f} {:>18.1f} {:>13.1f}".format(
+                publisher_count, throughput, cpu_time * 10**6, max_wait * 1000
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
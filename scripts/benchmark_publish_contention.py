@@ -0,0 +1,148 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure the publisher throughput with many threads publishing at once.
+
+Every thread publishes to a topic of its own (or to a shared topic with
+``--shared-topic``), and the publish requests are answered locally without
+any network traffic, thus the results reflect the client-side overhead and
+lock contention only.
+
+The results show the throughput, the time the client-wide lock guarding the
+sequencers and batches is held per message, and the share of the publish
+time spent waiting for that lock. In CPython, the GIL bounds the throughput
+whatever the lock hold time is.
+
+Usage:
+    python scripts/benchmark_publish_contention.py [--threads N ...] [--shared-topic]
+"""
+
+import argparse
+import threading
+import time
+
+import mock
+
+from google.auth import credentials
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.pubsub_v1 import types as gapic_types
+
+_raw_publish_request = gapic_types.PublishRequest.pb()
+_raw_publish_response = gapic_types.PublishResponse.pb()
+
+
+def _fake_publish_serialized(topic, request, retry=None, pinned=False, ordered=False):
+    message_count = len(_raw_publish_request.FromString(request).messages)
+    return _raw_publish_response(message_ids=["id"] * message_count)
+
+
+class _TimedLock(object):
+    """A lock recording the total time spent waiting to acquire it, and the
+    total time it was held."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._acquired_at = None
+        self.wait_time = 0.0
+        self.hold_time = 0.0
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._lock.acquire()
+        self._acquired_at = time.perf_counter()
+        self.wait_time += self._acquired_at - start
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.hold_time += time.perf_counter() - self._acquired_at
+        self._lock.release()
+
+
+def _run(thread_count, message_count, shared_topic):
+    """Publish from the given number of threads and return the throughput in
+    messages per second, the lock hold time per message, and the share of the
+    time spent waiting for the lock.
+    """
+    client = publisher.Client(
+        credentials=mock.Mock(spec=credentials.Credentials),
+        batch_settings=types.BatchSettings(max_latency=0.01),
+    )
+    client._publish_serialized = _fake_publish_serialized
+    client._batch_lock = _TimedLock()
+    start_barrier = threading.Barrier(thread_count + 1)
+    data = b"x" * 100
+
+    def publish(index):
+        topic = "projects/p/topics/{}".format("shared" if shared_topic else index)
+        start_barrier.wait()
+        for _ in range(message_count):
+            future = client.publish(topic, data, key="value")
+        future.result()
+
+    threads = [
+        threading.Thread(target=publish, args=(index,)) for index in range(thread_count)
+    ]
+    for thread in threads:
+        thread.start()
+
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    client.stop()
+    lock = client._batch_lock
+    total_count = thread_count * message_count
+    wait_share = lock.wait_time / (elapsed * thread_count)
+    return total_count / elapsed, lock.hold_time / total_count, wait_share
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8, 16, 32],
+        help="numbers of publishing threads",
+    )
+    parser.add_argument(
+        "--messages", type=int, default=2000, help="messages published per thread"
+    )
+    parser.add_argument(
+        "--shared-topic",
+        action="store_true",
+        help="publish to a single topic from all threads",
+    )
+    args = parser.parse_args()
+
+    print(
+        "{:>8} {:>14} {:>20} {:>12}".format(
+            "threads", "messages/s", "lock held us/message", "lock wait %"
+        )
+    )
+    for thread_count in args.threads:
+        throughput, hold_time, wait_share = _run(
+            thread_count, args.messages, args.shared_topic
+        )
+        print(
+            "{:>8} {:>14.0f} {:>20.1f} {:>12.1f}".format(
+                thread_count, throughput, hold_time * 10**6, wait_share * 100
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -34,7 +34,7 @@ dependencies = [
     "proto-plus >= 1.7.1",
     "grpc-google-iam-v1 >= 0.12.3, < 0.13dev",
 ]
-extras = {}
+extras = {"zstd": ["zstandard >= 0.15.0"]}
 
 
 # Setup boilerplate below this line.
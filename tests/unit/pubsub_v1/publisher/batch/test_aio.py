@@ -0,0 +1,217 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import mock
+import pytest
+
+import google.api_core.exceptions
+from google.auth import credentials
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher._batch.base import BatchCancellationReason
+from google.cloud.pubsub_v1.publisher._batch.base import BatchStatus
+from google.cloud.pubsub_v1.publisher._batch.aio import Batch
+from google.pubsub_v1 import types as gapic_types
+
+
+def create_batch(batch_done_callback=None, commit_when_full=True, **batch_settings):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = publisher.AsyncClient(credentials=creds)
+    client._bind_to_running_loop()
+    settings = types.BatchSettings(**batch_settings)
+    return Batch(
+        client,
+        "topic_name",
+        settings,
+        batch_done_callback=batch_done_callback,
+        commit_when_full=commit_when_full,
+    )
+
+
+def patch_publish_rpc(batch, **kwargs):
+    return mock.patch.object(batch.client, "_publish_rpc", **kwargs)
+
+
+async def run_commit_tasks(batch):
+    await asyncio.gather(*batch.client._commit_tasks)
+
+
+@pytest.mark.asyncio
+async def test_publish():
+    batch = create_batch()
+    future = batch.publish(gapic_types.PubsubMessage(data=b"foo"))
+
+    assert isinstance(future, asyncio.Future)
+    assert len(batch.messages) == 1
+    assert batch.size == (
+        gapic_types.PublishRequest(
+            topic="topic_name", messages=[gapic_types.PubsubMessage(data=b"foo")]
+        )._pb.ByteSize()
+    )
+
+
+@pytest.mark.asyncio
+async def test_publish_dict():
+    batch = create_batch()
+    batch.publish({"data": b"foo", "attributes": {"bar": "baz"}})
+
+    assert batch.messages == [
+        gapic_types.PubsubMessage(data=b"foo", attributes={"bar": "baz"})
+    ]
+
+
+@pytest.mark.asyncio
+async def test_publish_not_accepting_messages():
+    batch = create_batch()
+    batch._status = BatchStatus.IN_PROGRESS
+
+    assert batch.publish(gapic_types.PubsubMessage(data=b"foo")) is None
+
+
+@pytest.mark.asyncio
+async def test_publish_single_message_size_exceeds_server_size_limit():
+    batch = create_batch(max_bytes=1000 * 1000 * 1000)
+    message = gapic_types.PubsubMessage(data=b"x" * (10 * 1000 * 1000))
+
+    with pytest.raises(exceptions.MessageTooLargeError):
+        batch.publish(message)
+
+
+@pytest.mark.asyncio
+async def test_publish_full_batch_commits():
+    batch = create_batch(max_messages=1)
+    response = gapic_types.PublishResponse(message_ids=["a"])
+
+    with patch_publish_rpc(batch, return_value=response) as publish_rpc:
+        future = batch.publish(gapic_types.PubsubMessage(data=b"foo"))
+        assert batch.status == BatchStatus.STARTING
+        assert batch.publish(gapic_types.PubsubMessage(data=b"bar")) is None
+
+        await run_commit_tasks(batch)
+
+    publish_rpc.assert_called_once()
+    assert future.result() == "a"
+    assert batch.status == BatchStatus.SUCCESS
+
+
+@pytest.mark.asyncio
+async def test_commit_success():
+    done_callback = mock.Mock()
+    batch = create_batch(batch_done_callback=done_callback)
+    futures = [
+        batch.publish(gapic_types.PubsubMessage(data=data)) for data in (b"a", b"b")
+    ]
+    response = gapic_types.PublishResponse(message_ids=["1", "2"])
+
+    with patch_publish_rpc(batch, return_value=response) as publish_rpc:
+        batch.commit()
+        await run_commit_tasks(batch)
+
+    publish_rpc.assert_called_once_with(
+        "topic_name", batch.messages, retry=batch._commit_retry
+    )
+    assert [future.result() for future in futures] == ["1", "2"]
+    assert batch.status == BatchStatus.SUCCESS
+    done_callback.assert_called_once_with(True)
+
+
+@pytest.mark.asyncio
+async def test_commit_empty_batch():
+    batch = create_batch()
+
+    with patch_publish_rpc(batch) as publish_rpc:
+        batch.commit()
+        await run_commit_tasks(batch)
+
+    publish_rpc.assert_not_called()
+    assert batch.status == BatchStatus.SUCCESS
+
+
+@pytest.mark.asyncio
+async def test_commit_twice():
+    batch = create_batch()
+    batch.publish(gapic_types.PubsubMessage(data=b"a"))
+
+    with patch_publish_rpc(batch) as publish_rpc:
+        batch.commit()
+        batch.commit()
+        assert len(batch.client._commit_tasks) == 1
+        await run_commit_tasks(batch)
+
+    publish_rpc.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_commit_api_error():
+    done_callback = mock.Mock()
+    batch = create_batch(batch_done_callback=done_callback)
+    future = batch.publish(gapic_types.PubsubMessage(data=b"a"))
+    error = google.api_core.exceptions.InternalServerError("Boom!")
+
+    with patch_publish_rpc(batch, side_effect=error):
+        batch.commit()
+        await run_commit_tasks(batch)
+
+    assert future.exception() is error
+    assert batch.status == BatchStatus.ERROR
+    done_callback.assert_called_once_with(False)
+
+
+@pytest.mark.asyncio
+async def test_commit_wrong_messages_count():
+    done_callback = mock.Mock()
+    batch = create_batch(batch_done_callback=done_callback)
+    futures = [
+        batch.publish(gapic_types.PubsubMessage(data=data)) for data in (b"a", b"b")
+    ]
+    response = gapic_types.PublishResponse(message_ids=["1"])
+
+    with patch_publish_rpc(batch, return_value=response):
+        batch.commit()
+        await run_commit_tasks(batch)
+
+    for future in futures:
+        assert isinstance(future.exception(), exceptions.PublishError)
+    assert batch.status == BatchStatus.ERROR
+    done_callback.assert_called_once_with(False)
+
+
+@pytest.mark.asyncio
+async def test_commit_skips_cancelled_futures():
+    batch = create_batch()
+    cancelled = batch.publish(gapic_types.PubsubMessage(data=b"a"))
+    future = batch.publish(gapic_types.PubsubMessage(data=b"b"))
+    cancelled.cancel()
+    response = gapic_types.PublishResponse(message_ids=["1", "2"])
+
+    with patch_publish_rpc(batch, return_value=response):
+        batch.commit()
+        await run_commit_tasks(batch)
+
+    assert future.result() == "2"
+
+
+@pytest.mark.asyncio
+async def test_cancel():
+    batch = create_batch()
+    future = batch.publish(gapic_types.PubsubMessage(data=b"a"))
+
+    batch.cancel(BatchCancellationReason.PRIOR_ORDERED_MESSAGE_FAILED)
+
+    assert batch.status == BatchStatus.ERROR
+    with pytest.raises(RuntimeError):
+        future.result()
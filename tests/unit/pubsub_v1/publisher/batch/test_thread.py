@@ -13,8 +13,10 @@
 # limitations under the License.
 
 import datetime
+import os
 import threading
 import time
+import zlib
 
 import mock
 import pytest
@@ -22,19 +24,25 @@ import pytest
 import google.api_core.exceptions
 from google.api_core import gapic_v1
 from google.auth import credentials
+from google.cloud.pubsub_v1 import codecs
 from google.cloud.pubsub_v1 import publisher
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher import futures
 from google.cloud.pubsub_v1.publisher._batch.base import BatchStatus
 from google.cloud.pubsub_v1.publisher._batch.base import BatchCancellationReason
+from google.cloud.pubsub_v1.publisher._batch import base
 from google.cloud.pubsub_v1.publisher._batch import thread
 from google.cloud.pubsub_v1.publisher._batch.thread import Batch
 from google.pubsub_v1 import types as gapic_types
 
 
-def create_client():
+def create_client(payload_compression=None):
     creds = mock.Mock(spec=credentials.Credentials)
-    return publisher.Client(credentials=creds)
+    if payload_compression is None:
+        return publisher.Client(credentials=creds)
+    publisher_options = types.PublisherOptions(payload_compression=payload_compression)
+    return publisher.Client(credentials=creds, publisher_options=publisher_options)
 
 
 def create_batch(
@@ -42,6 +50,7 @@ def create_batch(
     batch_done_callback=None,
     commit_when_full=True,
     commit_retry=gapic_v1.method.DEFAULT,
+    payload_compression=None,
     **batch_settings
 ):
     """Return a batch object suitable for testing.
@@ -54,13 +63,15 @@ def create_batch(
             has reached byte-size or number-of-messages limits.
         commit_retry (Optional[google.api_core.retry.Retry]): The retry settings
             for the batch commit call.
+        payload_compression (Optional[~.pubsub_v1.types.PayloadCompressionSettings]):
+            The payload compression settings of the batch's client.
         batch_settings (Mapping[str, str]): Arguments passed on to the
             :class:``~.pubsub_v1.types.BatchSettings`` constructor.
 
     Returns:
         ~.pubsub_v1.publisher.batch.thread.Batch: A batch object.
     """
-    client = create_client()
+    client = create_client(payload_compression)
     settings = types.BatchSettings(**batch_settings)
     return Batch(
         client,
@@ -90,10 +101,10 @@ def test_commit():
     batch = create_batch()
 
     with mock.patch.object(
-        Batch, "_start_commit_thread", autospec=True
-    ) as _start_commit_thread:
+        Batch, "_schedule_commit", autospec=True
+    ) as _schedule_commit:
         batch.commit()
-        _start_commit_thread.assert_called_once()
+        _schedule_commit.assert_called_once()
 
     # The batch's status needs to be something other than "accepting messages",
     # since the commit started.
@@ -104,16 +115,44 @@ def test_commit():
 def test_commit_no_op():
     batch = create_batch()
     batch._status = BatchStatus.IN_PROGRESS
-    with mock.patch.object(threading, "Thread", autospec=True) as Thread:
+    with mock.patch.object(
+        batch.client._commit_executor, "submit", autospec=True
+    ) as submit:
         batch.commit()
 
-    # Make sure a thread was not created.
-    Thread.assert_not_called()
+    # Make sure the commit was not scheduled.
+    submit.assert_not_called()
 
     # Check that batch status is unchanged.
     assert batch.status == BatchStatus.IN_PROGRESS
 
 
+def test_commit_submits_to_client_executor():
+    batch = create_batch()
+    with mock.patch.object(
+        batch.client._commit_executor, "submit", autospec=True
+    ) as submit:
+        batch.commit()
+
+    submit.assert_called_once_with("topic_name", batch._commit)
+    assert batch.status == BatchStatus.STARTING
+
+
+def test_commit_hands_batch_to_topic_batcher():
+    batch = create_batch()
+    topic_batcher = mock.Mock(spec=["add"])
+    batch._set_topic_batcher(topic_batcher)
+
+    with mock.patch.object(
+        batch.client._commit_executor, "submit", autospec=True
+    ) as submit:
+        batch.commit()
+
+    submit.assert_not_called()
+    topic_batcher.add.assert_called_once_with(batch)
+    assert batch.status == BatchStatus.STARTING
+
+
 def test_blocking__commit():
     batch = create_batch()
     futures = (
@@ -124,7 +163,7 @@ def test_blocking__commit():
     # Set up the underlying API publish method to return a PublishResponse.
     publish_response = gapic_types.PublishResponse(message_ids=["a", "b"])
     patch = mock.patch.object(
-        type(batch.client.api), "publish", return_value=publish_response
+        type(batch.client), "_publish_serialized", return_value=publish_response
     )
     with patch as publish:
         batch._commit()
@@ -132,13 +171,23 @@ def test_blocking__commit():
     # Establish that the underlying API call was made with expected
     # arguments.
     publish.assert_called_once_with(
+        "topic_name",
+        mock.ANY,
+        retry=gapic_v1.method.DEFAULT,
+        pinned=False,
+        ordered=False,
+    )
+    request = gapic_types.PublishRequest.deserialize(publish.call_args[0][1])
+    assert request == gapic_types.PublishRequest(
         topic="topic_name",
         messages=[
             gapic_types.PubsubMessage(data=b"This is my message."),
             gapic_types.PubsubMessage(data=b"This is another message."),
         ],
-        retry=gapic_v1.method.DEFAULT,
     )
+    # The encoded request is handed over without another copy.
+    assert publish.call_args[0][1] is batch._encoded_request
+    assert isinstance(batch._encoded_request, bytes)
 
     # Establish that all of the futures are done, and that they have the
     # expected values.
@@ -155,7 +204,7 @@ def test_blocking__commit_custom_retry():
     # Set up the underlying API publish method to return a PublishResponse.
     publish_response = gapic_types.PublishResponse(message_ids=["a"])
     patch = mock.patch.object(
-        type(batch.client.api), "publish", return_value=publish_response
+        type(batch.client), "_publish_serialized", return_value=publish_response
     )
     with patch as publish:
         batch._commit()
@@ -163,9 +212,16 @@ def test_blocking__commit_custom_retry():
     # Establish that the underlying API call was made with expected
     # arguments.
     publish.assert_called_once_with(
+        "topic_name",
+        mock.ANY,
+        retry=mock.sentinel.custom_retry,
+        pinned=False,
+        ordered=False,
+    )
+    request = gapic_types.PublishRequest.deserialize(publish.call_args[0][1])
+    assert request == gapic_types.PublishRequest(
         topic="topic_name",
         messages=[gapic_types.PubsubMessage(data=b"This is my message.")],
-        retry=mock.sentinel.custom_retry,
     )
 
 
@@ -173,14 +229,15 @@ def test_client_api_publish_not_blocking_additional_publish_calls():
     batch = create_batch(max_messages=1)
     api_publish_called = threading.Event()
 
-    def api_publish_delay(topic="", messages=(), retry=None):
+    def api_publish_delay(topic, request, retry=None, pinned=False, ordered=False):
         api_publish_called.set()
         time.sleep(1.0)
+        messages = gapic_types.PublishRequest.deserialize(request).messages
         message_ids = [str(i) for i in range(len(messages))]
         return gapic_types.PublishResponse(message_ids=message_ids)
 
     api_publish_patch = mock.patch.object(
-        type(batch.client.api), "publish", side_effect=api_publish_delay
+        type(batch.client), "_publish_serialized", side_effect=api_publish_delay
     )
 
     with api_publish_patch:
@@ -224,7 +281,7 @@ def test_blocking__commit_already_started(_LOGGER):
 
 def test_blocking__commit_no_messages():
     batch = create_batch()
-    with mock.patch.object(type(batch.client.api), "publish") as publish:
+    with mock.patch.object(type(batch.client), "_publish_serialized") as publish:
         batch._commit()
 
     assert publish.call_count == 0
@@ -240,7 +297,7 @@ def test_blocking__commit_wrong_messageid_length():
     # Set up a PublishResponse that only returns one message ID.
     publish_response = gapic_types.PublishResponse(message_ids=["a"])
     patch = mock.patch.object(
-        type(batch.client.api), "publish", return_value=publish_response
+        type(batch.client), "_publish_serialized", return_value=publish_response
     )
 
     with patch:
@@ -260,7 +317,9 @@ def test_block__commmit_api_error():
 
     # Make the API throw an error when publishing.
     error = google.api_core.exceptions.InternalServerError("uh oh")
-    patch = mock.patch.object(type(batch.client.api), "publish", side_effect=error)
+    patch = mock.patch.object(
+        type(batch.client), "_publish_serialized", side_effect=error
+    )
 
     with patch:
         batch._commit()
@@ -279,7 +338,9 @@ def test_block__commmit_retry_error():
 
     # Make the API throw an error when publishing.
     error = google.api_core.exceptions.RetryError("uh oh", None)
-    patch = mock.patch.object(type(batch.client.api), "publish", side_effect=error)
+    patch = mock.patch.object(
+        type(batch.client), "_publish_serialized", side_effect=error
+    )
 
     with patch:
         batch._commit()
@@ -314,6 +375,55 @@ def test_publish_updating_batch_size():
     assert batch.size == expected_request_size
     assert batch.size > 0  # I do not always trust protobuf.
 
+    # The size matches the pre-encoded request exactly.
+    expected_request = gapic_types.PublishRequest(topic="topic_foo", messages=messages)
+    assert bytes(batch._encoded_request) == expected_request._pb.SerializeToString()
+    assert batch.size == len(batch._encoded_request)
+
+
+def test_publish_large_message_encoded_length():
+    batch = create_batch(topic="topic_foo")
+    # A payload whose length needs a multi-byte varint.
+    message = gapic_types.PubsubMessage(data=b"x" * 20000, attributes={"a": "b"})
+
+    batch.publish(message)
+
+    expected_request = gapic_types.PublishRequest(topic="topic_foo", messages=[message])
+    assert bytes(batch._encoded_request) == expected_request._pb.SerializeToString()
+    assert batch.size == expected_request._pb.ByteSize()
+
+
+def test_publish_rejected_message_not_encoded():
+    batch = create_batch(topic="topic_foo", max_messages=1, commit_when_full=False)
+    batch.publish(gapic_types.PubsubMessage(data=b"foo"))
+    encoded_request = bytes(batch._encoded_request)
+
+    assert batch.publish(gapic_types.PubsubMessage(data=b"bar")) is None
+    assert bytes(batch._encoded_request) == encoded_request
+
+
+@pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+def test_publish_encoded_message(buffer_type):
+    batch = create_batch(topic="topic_foo")
+    first = gapic_types.PubsubMessage(data=b"foo", attributes={"a": "b"})
+    second = gapic_types.PubsubMessage(data=b"bar")
+
+    batch.publish(buffer_type(first._pb.SerializeToString()))
+    batch.publish(second)
+
+    expected_request = gapic_types.PublishRequest(
+        topic="topic_foo", messages=[first, second]
+    )
+    assert bytes(batch._encoded_request) == expected_request._pb.SerializeToString()
+    assert batch.size == expected_request._pb.ByteSize()
+    assert batch._message_bytes == first._pb.ByteSize() + second._pb.ByteSize()
+
+
+def test_publish_encoded_message_too_large():
+    batch = create_batch(topic="topic_foo")
+    with pytest.raises(exceptions.MessageTooLargeError):
+        batch.publish(b"x" * base.SERVER_PUBLISH_MAX_BYTES)
+
 
 def test_publish():
     batch = create_batch()
@@ -394,7 +504,7 @@ def test_publish_exceed_max_messages():
         assert batch._futures == futures
 
 
-@mock.patch.object(thread, "_SERVER_PUBLISH_MAX_BYTES", 1000)
+@mock.patch.object(base, "SERVER_PUBLISH_MAX_BYTES", 1000)
 def test_publish_single_message_size_exceeds_server_size_limit():
     batch = create_batch(
         topic="topic_foo",
@@ -413,7 +523,7 @@ def test_publish_single_message_size_exceeds_server_size_limit():
         batch.publish(big_message)
 
 
-@mock.patch.object(thread, "_SERVER_PUBLISH_MAX_BYTES", 1000)
+@mock.patch.object(base, "SERVER_PUBLISH_MAX_BYTES", 1000)
 def test_publish_total_messages_size_exceeds_server_size_limit():
     batch = create_batch(topic="topic_foo", max_messages=10, max_bytes=1500)
 
@@ -508,7 +618,7 @@ def test_batch_done_callback_called_on_success():
     publish_response = gapic_types.PublishResponse(message_ids=["a"])
 
     with mock.patch.object(
-        type(batch.client.api), "publish", return_value=publish_response
+        type(batch.client), "_publish_serialized", return_value=publish_response
     ):
         batch._commit()
 
@@ -516,6 +626,24 @@ def test_batch_done_callback_called_on_success():
     assert batch_done_callback_tracker.success
 
 
+def test_publish_latency_recorded_on_success():
+    batch = create_batch(topic="topic_foo")
+    batch.publish(gapic_types.PubsubMessage(data=b"foobarbaz"))
+
+    publish_response = gapic_types.PublishResponse(message_ids=["a"])
+    with mock.patch.object(
+        type(batch.client), "_publish_serialized", return_value=publish_response
+    ), mock.patch.object(
+        type(batch.client), "_record_publish_latency"
+    ) as record_latency:
+        batch._commit()
+
+    record_latency.assert_called_once()
+    topic, latency = record_latency.call_args[0]
+    assert topic == "topic_foo"
+    assert latency >= 0
+
+
 def test_batch_done_callback_called_on_publish_failure():
     batch_done_callback_tracker = BatchDoneCallbackTracker()
     batch = create_batch(batch_done_callback=batch_done_callback_tracker)
@@ -531,8 +659,8 @@ def test_batch_done_callback_called_on_publish_failure():
     error = google.api_core.exceptions.InternalServerError("uh oh")
 
     with mock.patch.object(
-        type(batch.client.api),
-        "publish",
+        type(batch.client),
+        "_publish_serialized",
         return_value=publish_response,
         side_effect=error,
     ):
@@ -554,9 +682,288 @@ def test_batch_done_callback_called_on_publish_response_invalid():
     publish_response = gapic_types.PublishResponse(message_ids=[])
 
     with mock.patch.object(
-        type(batch.client.api), "publish", return_value=publish_response
+        type(batch.client), "_publish_serialized", return_value=publish_response
     ):
         batch._commit()
 
     assert batch_done_callback_tracker.called
     assert not batch_done_callback_tracker.success
+
+
+def test_publish_futures_share_batch_outcome():
+    batch = create_batch()
+    first = batch.publish({"data": b"foo"})
+    second = batch.publish({"data": b"bar"})
+
+    assert isinstance(first, futures.MessageFuture)
+    assert first._outcome is second._outcome is batch._outcome
+    assert (first._index, second._index) == (0, 1)
+
+
+def create_fire_and_forget_batch(**batch_settings):
+    client = create_client()
+    client._fire_and_forget = types.FireAndForgetSettings()
+    settings = types.BatchSettings(**batch_settings)
+    return Batch(client, "topic_name", settings)
+
+
+def test_fire_and_forget_publish():
+    batch = create_fire_and_forget_batch()
+    assert batch.publish({"data": b"foo"}) is True
+    assert batch.publish({"data": b"bar"}) is True
+
+    assert batch._futures == []
+    assert batch._message_bytes == 10
+
+
+def test_fire_and_forget_commit_notifies_client():
+    batch = create_fire_and_forget_batch()
+    batch.publish({"data": b"foo"})
+    batch.publish({"data": b"bar"})
+
+    publish_response = gapic_types.PublishResponse(message_ids=["a", "b"])
+    patch_publish = mock.patch.object(
+        type(batch.client), "_publish_serialized", return_value=publish_response
+    )
+    patch_done = mock.patch.object(type(batch.client), "_on_fire_and_forget_batch_done")
+    with patch_publish, patch_done as batch_done:
+        batch._commit()
+
+    batch_done.assert_called_once_with("topic_name", 2, 10, None)
+
+
+def test_fire_and_forget_commit_error_notifies_client():
+    batch = create_fire_and_forget_batch()
+    batch.publish({"data": b"foo"})
+
+    error = google.api_core.exceptions.InternalServerError("uh oh")
+    patch_publish = mock.patch.object(
+        type(batch.client), "_publish_serialized", side_effect=error
+    )
+    patch_done = mock.patch.object(type(batch.client), "_on_fire_and_forget_batch_done")
+    with patch_publish, patch_done as batch_done:
+        batch._commit()
+
+    batch_done.assert_called_once_with("topic_name", 1, 5, error)
+
+
+def test_fire_and_forget_cancel_notifies_client():
+    batch = create_fire_and_forget_batch()
+    batch.publish({"data": b"foo"})
+
+    with mock.patch.object(
+        type(batch.client), "_on_fire_and_forget_batch_done"
+    ) as batch_done:
+        batch.cancel(BatchCancellationReason.PRIOR_ORDERED_MESSAGE_FAILED)
+
+    batch_done.assert_called_once_with("topic_name", 1, 5, mock.ANY)
+    exc = batch_done.call_args[0][3]
+    assert exc.args[0] == BatchCancellationReason.PRIOR_ORDERED_MESSAGE_FAILED.value
+
+
+def create_bulk_batch(
+    bulk_future, offset=0, payload_compression=None, **batch_settings
+):
+    client = create_client(payload_compression)
+    settings = types.BatchSettings(**batch_settings)
+    return thread.BulkBatch(client, "topic_name", settings, bulk_future, offset)
+
+
+def _raw_messages(*datas):
+    return [gapic_types.PubsubMessage(data=data)._pb for data in datas]
+
+
+def test_bulk_batch_fill_up_to_max_messages():
+    messages = _raw_messages(b"foo", b"bar", b"baz")
+    batch = create_bulk_batch(futures.BulkFuture(3), max_messages=2)
+
+    assert batch.fill(messages, 0) == 2
+    assert batch.messages == messages[:2]
+    assert batch._message_bytes == sum(m.ByteSize() for m in messages[:2])
+
+    expected_request = gapic_types.PublishRequest(
+        topic="topic_name", messages=messages[:2]
+    )
+    assert bytes(batch._encoded_request) == expected_request._pb.SerializeToString()
+    assert batch.size == len(batch._encoded_request)
+
+
+def test_bulk_batch_fill_up_to_max_bytes():
+    messages = _raw_messages(b"x" * 100, b"y" * 100)
+    batch = create_bulk_batch(futures.BulkFuture(2), max_bytes=150)
+
+    assert batch.fill(messages, 0) == 1
+    assert batch.messages == messages[:1]
+
+
+def test_bulk_batch_fill_from_start_index():
+    messages = _raw_messages(b"foo", b"bar", b"baz")
+    batch = create_bulk_batch(futures.BulkFuture(3), offset=1)
+
+    assert batch.fill(messages, 1) == 3
+    assert batch.messages == messages[1:]
+
+
+def test_bulk_batch_fill_message_too_large():
+    data = b"x" * base.SERVER_PUBLISH_MAX_BYTES
+    messages = _raw_messages(b"foo", data)
+
+    batch = create_bulk_batch(futures.BulkFuture(2))
+    # The oversized message is left out of a non-empty batch...
+    assert batch.fill(messages, 0) == 1
+
+    # ...and rejected as the first message of a batch.
+    batch = create_bulk_batch(futures.BulkFuture(2), offset=1)
+    with pytest.raises(exceptions.MessageTooLargeError):
+        batch.fill(messages, 1)
+
+
+def test_bulk_batch_does_not_accept_single_messages():
+    batch = create_bulk_batch(futures.BulkFuture(1))
+    message = gapic_types.PubsubMessage(data=b"foo")
+
+    assert batch.publish(message) is None
+    assert batch.messages == []
+
+
+def test_bulk_batch_commit_sets_chunk_result():
+    bulk_future = futures.BulkFuture(3)
+    bulk_future._set_chunk_result(0, ["a"])
+    batch = create_bulk_batch(bulk_future, offset=1)
+    batch.fill(_raw_messages(b"foo", b"bar", b"baz"), 1)
+
+    chunk_done_callback = mock.Mock(spec=())
+    batch._set_chunk_done_callback(chunk_done_callback)
+    batch_done_callback = BatchDoneCallbackTracker()
+    batch._set_batch_done_callback(batch_done_callback)
+
+    publish_response = gapic_types.PublishResponse(message_ids=["b", "c"])
+    with mock.patch.object(
+        type(batch.client), "_publish_serialized", return_value=publish_response
+    ):
+        batch._commit()
+
+    assert batch.status == BatchStatus.SUCCESS
+    assert bulk_future.result() == ["a", "b", "c"]
+    chunk_done_callback.assert_called_once_with()
+    assert batch_done_callback.success
+
+
+def test_bulk_batch_commit_error_sets_chunk_exception():
+    bulk_future = futures.BulkFuture(2)
+    batch = create_bulk_batch(bulk_future)
+    batch.fill(_raw_messages(b"foo", b"bar"), 0)
+    chunk_done_callback = mock.Mock(spec=())
+    batch._set_chunk_done_callback(chunk_done_callback)
+
+    error = google.api_core.exceptions.InternalServerError("uh oh")
+    with mock.patch.object(
+        type(batch.client), "_publish_serialized", side_effect=error
+    ):
+        batch._commit()
+
+    assert batch.status == BatchStatus.ERROR
+    assert bulk_future.exception() is error
+    chunk_done_callback.assert_called_once_with()
+
+
+def test_bulk_batch_commit_invalid_response():
+    bulk_future = futures.BulkFuture(2)
+    batch = create_bulk_batch(bulk_future)
+    batch.fill(_raw_messages(b"foo", b"bar"), 0)
+
+    publish_response = gapic_types.PublishResponse(message_ids=["a"])
+    with mock.patch.object(
+        type(batch.client), "_publish_serialized", return_value=publish_response
+    ):
+        batch._commit()
+
+    assert batch.status == BatchStatus.ERROR
+    assert isinstance(bulk_future.exception(), exceptions.PublishError)
+    assert bulk_future.message_ids == [None, None]
+
+
+def test_bulk_batch_cancel():
+    bulk_future = futures.BulkFuture(2)
+    batch = create_bulk_batch(bulk_future)
+    batch.fill(_raw_messages(b"foo", b"bar"), 0)
+
+    batch.cancel(BatchCancellationReason.PRIOR_ORDERED_MESSAGE_FAILED)
+
+    assert batch.status == BatchStatus.ERROR
+    exc = bulk_future.exception()
+    assert isinstance(exc, RuntimeError)
+    assert exc.args == (BatchCancellationReason.PRIOR_ORDERED_MESSAGE_FAILED.value,)
+
+
+def _published_request(batch):
+    message_ids = [str(index) for index in range(len(batch.messages))]
+    publish_response = gapic_types.PublishResponse(message_ids=message_ids)
+    with mock.patch.object(
+        type(batch.client), "_publish_serialized", return_value=publish_response
+    ) as publish:
+        batch._commit()
+    return gapic_types.PublishRequest.deserialize(publish.call_args[0][1])
+
+
+def test_payload_compressed_on_commit():
+    batch = create_batch(
+        payload_compression=types.PayloadCompressionSettings(min_bytes=100)
+    )
+    large_data = b"x" * 1000
+    batch.publish({"data": b"small", "attributes": {"key": "value"}})
+    batch.publish({"data": large_data, "attributes": {"key": "value"}})
+    batch.publish({"data": b"tiny"})
+
+    # The large message is not compressed by the publishing thread.
+    assert len(batch._uncompressed) == 1
+    size = batch.size
+    message_bytes = batch._message_bytes
+
+    request = _published_request(batch)
+
+    assert [message.data for message in request.messages] == [
+        b"small",
+        zlib.compress(large_data),
+        b"tiny",
+    ]
+    assert request.messages[1].attributes == {
+        "key": "value",
+        codecs.ENCODING_ATTRIBUTE: "zlib",
+    }
+    assert request.messages[0].attributes == {"key": "value"}
+    assert batch.size == gapic_types.PublishRequest.pb(request).ByteSize()
+    assert batch.size < size
+    # Flow control accounts for the uncompressed messages.
+    assert batch._message_bytes == message_bytes
+    # The published message is not modified.
+    assert batch.messages[1].data == large_data
+
+
+def test_payload_incompressible_published_as_is():
+    compression = types.PayloadCompressionSettings(min_bytes=100, codec="lzma")
+    batch = create_batch(payload_compression=compression)
+    data = os.urandom(500)
+    batch.publish({"data": data})
+
+    request = _published_request(batch)
+
+    assert request.messages[0].data == data
+    assert codecs.ENCODING_ATTRIBUTE not in request.messages[0].attributes
+
+
+def test_payload_compressed_in_bulk_batch():
+    bulk_future = futures.BulkFuture(2)
+    compression = types.PayloadCompressionSettings(min_bytes=100)
+    batch = create_bulk_batch(bulk_future, payload_compression=compression)
+    messages = _raw_messages(b"y" * 1000, b"small")
+
+    assert batch.fill(messages, 0) == 2
+    request = _published_request(batch)
+
+    assert [message.data for message in request.messages] == [
+        zlib.compress(b"y" * 1000),
+        b"small",
+    ]
+    assert bulk_future.result() == ["0", "1"]
+    assert messages[0].data == b"y" * 1000
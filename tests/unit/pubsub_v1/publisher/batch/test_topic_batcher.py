@@ -0,0 +1,243 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+
+import google.api_core.exceptions
+from google.auth import credentials
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher._batch.base import BatchStatus
+from google.cloud.pubsub_v1.publisher._batch.thread import Batch
+from google.cloud.pubsub_v1.publisher._batch.topic_batcher import OrderedTopicBatcher
+from google.pubsub_v1 import types as gapic_types
+
+
+TOPIC = "projects/project/topics/topic"
+
+
+def create_client(**batch_settings):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = publisher.Client(
+        credentials=creds, batch_settings=types.BatchSettings(**batch_settings)
+    )
+    # Run the submitted commits inline, in the order they are submitted.
+    client._commit_executor = mock.Mock(spec=["submit"])
+    return client
+
+
+def create_batcher(client):
+    return OrderedTopicBatcher(client, TOPIC)
+
+
+def create_committed_batch(client, topic_batcher, *payloads):
+    batch = Batch(client, TOPIC, client.batch_settings, commit_when_full=False)
+    batch._set_topic_batcher(topic_batcher)
+    futures = [batch.publish(gapic_types.PubsubMessage(data=p)) for p in payloads]
+    batch.commit()
+    return batch, futures
+
+
+def run_submitted(client):
+    """Run the callbacks submitted to the (mock) commit executor so far."""
+    calls = client._commit_executor.submit.call_args_list
+    client._commit_executor.submit.reset_mock()
+    for call in calls:
+        topic, callback = call[0]
+        assert topic == TOPIC
+        callback()
+    return len(calls)
+
+
+def decode(request_bytes):
+    return gapic_types.PublishRequest.deserialize(request_bytes)
+
+
+def test_add_schedules_single_send():
+    client = create_client()
+    topic_batcher = create_batcher(client)
+
+    create_committed_batch(client, topic_batcher, b"a")
+    create_committed_batch(client, topic_batcher, b"b")
+
+    client._commit_executor.submit.assert_called_once_with(TOPIC, topic_batcher._send)
+
+
+def test_ready_batches_sent_in_one_request():
+    client = create_client()
+    topic_batcher = create_batcher(client)
+    done_callbacks = []
+
+    batch1, futures1 = create_committed_batch(client, topic_batcher, b"a", b"b")
+    batch2, futures2 = create_committed_batch(client, topic_batcher, b"c")
+    for batch in (batch1, batch2):
+        batch._batch_done_callback = done_callbacks.append
+
+    response = gapic_types.PublishResponse(message_ids=["1", "2", "3"])
+    with mock.patch.object(
+        type(client), "_publish_serialized", return_value=response
+    ) as publish:
+        assert run_submitted(client) == 1
+
+    publish.assert_called_once()
+    assert publish.call_args[1]["pinned"]
+    request = decode(publish.call_args[0][1])
+    assert request.topic == TOPIC
+    assert [message.data for message in request.messages] == [b"a", b"b", b"c"]
+
+    assert [future.result() for future in futures1] == ["1", "2"]
+    assert [future.result() for future in futures2] == ["3"]
+    assert batch1.status == BatchStatus.SUCCESS
+    assert batch2.status == BatchStatus.SUCCESS
+    assert done_callbacks == [True, True]
+    assert not topic_batcher._send_scheduled
+
+
+def test_single_ready_batch_published_on_its_own():
+    client = create_client()
+    topic_batcher = create_batcher(client)
+    batch, _ = create_committed_batch(client, topic_batcher, b"a")
+
+    with mock.patch.object(batch, "_publish", autospec=True) as batch_publish:
+        run_submitted(client)
+
+    batch_publish.assert_called_once_with()
+
+
+def test_request_limited_by_max_messages():
+    client = create_client(max_messages=3)
+    topic_batcher = create_batcher(client)
+
+    create_committed_batch(client, topic_batcher, b"a", b"b")
+    create_committed_batch(client, topic_batcher, b"c", b"d")
+    create_committed_batch(client, topic_batcher, b"e")
+
+    requests = []
+
+    def publish_serialized(topic, request, retry=None, pinned=False, ordered=False):
+        messages = decode(request).messages
+        requests.append([message.data for message in messages])
+        return gapic_types.PublishResponse(
+            message_ids=[str(i) for i in range(len(messages))]
+        )
+
+    with mock.patch.object(
+        type(client), "_publish_serialized", side_effect=publish_serialized
+    ):
+        # The first send takes only the first batch and resubmits itself for
+        # the rest.
+        assert run_submitted(client) == 1
+        assert run_submitted(client) == 1
+        assert run_submitted(client) == 0
+
+    assert requests == [[b"a", b"b"], [b"c", b"d", b"e"]]
+
+
+def test_request_limited_by_max_bytes():
+    client = create_client(max_bytes=50)
+    topic_batcher = create_batcher(client)
+
+    create_committed_batch(client, topic_batcher, b"x" * 20)
+    create_committed_batch(client, topic_batcher, b"y" * 20)
+
+    taken = topic_batcher._take_ready_batches()
+
+    assert len(taken) == 1
+    client._commit_executor.submit.assert_called_with(TOPIC, topic_batcher._send)
+    assert topic_batcher._send_scheduled
+
+
+def test_cancelled_batches_skipped():
+    client = create_client()
+    topic_batcher = create_batcher(client)
+
+    batch1, _ = create_committed_batch(client, topic_batcher, b"a")
+    batch2, futures2 = create_committed_batch(client, topic_batcher, b"b")
+    batch1._status = BatchStatus.ERROR
+
+    response = gapic_types.PublishResponse(message_ids=["1"])
+    with mock.patch.object(
+        type(client), "_publish_serialized", return_value=response
+    ) as publish:
+        run_submitted(client)
+
+    request = decode(publish.call_args[0][1])
+    assert [message.data for message in request.messages] == [b"b"]
+    assert futures2[0].result() == "1"
+
+
+def test_failed_shared_request_resends_batches_separately():
+    client = create_client()
+    topic_batcher = create_batcher(client)
+
+    batch1, futures1 = create_committed_batch(client, topic_batcher, b"a")
+    batch2, futures2 = create_committed_batch(client, topic_batcher, b"b")
+
+    error = google.api_core.exceptions.InternalServerError("Boom!")
+    responses = [
+        error,
+        gapic_types.PublishResponse(message_ids=["1"]),
+        error,
+    ]
+    with mock.patch.object(type(client), "_publish_serialized", side_effect=responses):
+        run_submitted(client)
+        assert futures1[0].running()
+
+        # Each batch is resubmitted with its own publish request.
+        client._commit_executor.submit.assert_has_calls(
+            [mock.call(TOPIC, batch1._publish), mock.call(TOPIC, batch2._publish)]
+        )
+        assert run_submitted(client) == 2
+
+    assert futures1[0].result() == "1"
+    assert futures2[0].exception() is error
+    assert batch1.status == BatchStatus.SUCCESS
+    assert batch2.status == BatchStatus.ERROR
+
+
+def test_message_id_count_mismatch_fails_all_batches():
+    client = create_client()
+    topic_batcher = create_batcher(client)
+
+    _, futures1 = create_committed_batch(client, topic_batcher, b"a")
+    _, futures2 = create_committed_batch(client, topic_batcher, b"b")
+
+    response = gapic_types.PublishResponse(message_ids=["1"])
+    with mock.patch.object(type(client), "_publish_serialized", return_value=response):
+        run_submitted(client)
+
+    for future in futures1 + futures2:
+        assert isinstance(future.exception(), exceptions.PublishError)
+
+
+def test_client_shares_batcher_between_ordering_keys():
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = publisher.Client(
+        credentials=creds,
+        publisher_options=types.PublisherOptions(enable_message_ordering=True),
+    )
+
+    sequencer1 = client._get_or_create_sequencer(TOPIC, "key1")
+    sequencer2 = client._get_or_create_sequencer(TOPIC, "key2")
+    sequencer3 = client._get_or_create_sequencer("other_topic", "key1")
+    unordered = client._get_or_create_sequencer(TOPIC, "")
+
+    assert sequencer1._topic_batcher is sequencer2._topic_batcher
+    assert sequencer1._topic_batcher is client._topic_batchers[TOPIC]
+    assert sequencer3._topic_batcher is not sequencer1._topic_batcher
+    assert not hasattr(unordered, "_topic_batcher")
+
+    batch = sequencer1._create_batch()
+    assert batch._topic_batcher is sequencer1._topic_batcher
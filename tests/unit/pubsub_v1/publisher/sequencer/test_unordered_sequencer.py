@@ -19,6 +19,7 @@ from google.auth import credentials
 from google.cloud.pubsub_v1 import publisher
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.publisher._batch import base
+from google.cloud.pubsub_v1.publisher._batch import thread
 from google.cloud.pubsub_v1.publisher._sequencer import unordered_sequencer
 from google.pubsub_v1 import types as gapic_types
 
@@ -71,6 +72,20 @@ def test_commit_no_batch():
     sequencer.commit()
 
 
+def test_expedite_commits_current_batch():
+    client = create_client()
+    sequencer = unordered_sequencer.UnorderedSequencer(client, "topic_name")
+    future = sequencer.publish(create_message())
+    batch = sequencer._current_batch
+
+    with mock.patch.object(batch, "commit") as commit:
+        sequencer.expedite()
+
+    commit.assert_called_once()
+    assert sequencer._current_batch is None
+    assert not future.done()
+
+
 def test_unpause():
     client = create_client()
     sequencer = unordered_sequencer.UnorderedSequencer(client, "topic_name")
@@ -142,3 +157,28 @@ def test_publish_after_batch_error():
     # message.
     future = sequencer.publish(message)
     assert future is not None
+
+
+def test_publish_batch():
+    client = create_client()
+    sequencer = unordered_sequencer.UnorderedSequencer(client, "topic_name")
+    batch = mock.Mock(spec=client._batch_class)
+    sequencer._set_batch(batch)
+    bulk_batch = mock.Mock(spec=thread.BulkBatch)
+
+    sequencer.publish_batch(bulk_batch)
+
+    # The bulk batch is committed right away, without affecting the current
+    # batch.
+    bulk_batch.commit.assert_called_once_with()
+    batch.commit.assert_not_called()
+    assert sequencer._current_batch is batch
+
+
+def test_publish_batch_after_stop():
+    client = create_client()
+    sequencer = unordered_sequencer.UnorderedSequencer(client, "topic_name")
+    sequencer.stop()
+
+    with pytest.raises(RuntimeError):
+        sequencer.publish_batch(mock.Mock(spec=thread.BulkBatch))
@@ -0,0 +1,163 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import pytest
+
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import _adaptive_batching
+from google.cloud.pubsub_v1.publisher._adaptive_batching import AdaptiveBatchSizer
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    clock = FakeClock()
+    with mock.patch.object(_adaptive_batching.time, "monotonic", new=clock):
+        yield clock
+
+
+def create_sizer(**adaptive_settings):
+    batch_settings = types.BatchSettings(max_latency=0.05, max_messages=100)
+    return AdaptiveBatchSizer(
+        batch_settings, types.AdaptiveBatchSettings(**adaptive_settings)
+    )
+
+
+def publish_messages(sizer, clock, count, interval):
+    for _ in range(count):
+        sizer.record_arrivals("topic")
+        clock.now += interval
+
+
+def test_static_settings_until_measured(clock):
+    sizer = create_sizer()
+    assert sizer.get_settings("topic") == sizer._batch_settings
+
+    publish_messages(sizer, clock, 10, 0.001)
+    assert sizer.get_settings("topic") == sizer._batch_settings
+
+    sizer.record_publish_latency("other_topic", 0.02)
+    assert sizer.get_settings("topic") == sizer._batch_settings
+
+
+def test_burst_uses_large_batches(clock):
+    sizer = create_sizer()
+    # A message arrives every millisecond, and a request takes 20 ms.
+    publish_messages(sizer, clock, 50, 0.001)
+    clock.now -= 0.001
+    sizer.record_publish_latency("topic", 0.02)
+
+    settings = sizer.get_settings("topic")
+    assert settings.max_messages == 20
+    assert settings.max_latency == pytest.approx(0.019)
+
+
+def test_settings_bounded_by_batch_settings(clock):
+    sizer = create_sizer()
+    publish_messages(sizer, clock, 50, 0.0001)
+    clock.now -= 0.0001
+    sizer.record_publish_latency("topic", 1.0)
+
+    settings = sizer.get_settings("topic")
+    assert settings.max_messages == 100
+    assert settings.max_latency == pytest.approx(0.0099)
+
+    # Slow requests call for waiting longer than the max latency.
+    publish_messages(sizer, clock, 50, 0.01)
+    clock.now -= 0.01
+    settings = sizer.get_settings("topic")
+    assert settings.max_messages == 100
+    assert settings.max_latency == 0.05
+
+
+def test_settings_bounded_by_topic_batch_settings(clock):
+    sizer = create_sizer()
+    topic_settings = types.BatchSettings(max_latency=0.01, max_messages=10)
+    assert sizer.get_settings("topic", topic_settings) == topic_settings
+
+    publish_messages(sizer, clock, 50, 0.0001)
+    clock.now -= 0.0001
+    sizer.record_publish_latency("topic", 1.0)
+
+    settings = sizer.get_settings("topic", topic_settings)
+    assert settings.max_messages == 10
+    assert settings.max_latency == pytest.approx(0.0009)
+
+
+def test_quiet_topic_sends_right_away(clock):
+    sizer = create_sizer()
+    publish_messages(sizer, clock, 10, 1.0)
+    sizer.record_publish_latency("topic", 0.02)
+
+    settings = sizer.get_settings("topic")
+    assert settings.max_messages == 1
+    assert settings.max_latency == 0.0
+
+
+def test_pause_after_burst_sends_right_away(clock):
+    sizer = create_sizer()
+    publish_messages(sizer, clock, 50, 0.001)
+    sizer.record_publish_latency("topic", 0.02)
+
+    # The moving average still reflects the burst, but there has not been any
+    # message for a while.
+    clock.now += 5.0
+    settings = sizer.get_settings("topic")
+    assert settings.max_messages == 1
+    assert settings.max_latency == 0.0
+
+
+def test_settings_bounded_by_adaptive_settings(clock):
+    sizer = create_sizer(min_messages=5)
+    publish_messages(sizer, clock, 10, 1.0)
+    sizer.record_publish_latency("topic", 0.02)
+
+    settings = sizer.get_settings("topic")
+    assert settings.max_messages == 5
+    assert settings.max_latency == 0.05
+
+    sizer = create_sizer(min_latency=0.002)
+    publish_messages(sizer, clock, 10, 1.0)
+    sizer.record_publish_latency("topic", 0.02)
+
+    settings = sizer.get_settings("topic")
+    assert settings.max_messages == 1
+    assert settings.max_latency == 0.002
+
+
+def test_bulk_arrivals(clock):
+    sizer = create_sizer()
+    sizer.record_arrivals("topic")
+    clock.now += 0.01
+    sizer.record_arrivals("topic", count=10)
+    sizer.record_publish_latency("topic", 0.01)
+
+    assert sizer._topics["topic"].arrival_interval == pytest.approx(0.001)
+    assert sizer.get_settings("topic").max_messages == 10
+
+
+def test_publish_latency_moving_average(clock):
+    sizer = create_sizer()
+    sizer.record_publish_latency("topic", 0.01)
+    sizer.record_publish_latency("topic", 0.06)
+
+    assert sizer._topics["topic"].publish_latency == pytest.approx(0.02)
@@ -0,0 +1,245 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import mock
+import pytest
+
+from google.auth import credentials
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import _commit_executor
+from google.cloud.pubsub_v1.publisher._commit_executor import CommitExecutor
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:  # pragma: NO COVER
+            pytest.fail("Condition not met in time.")
+        time.sleep(0.01)
+
+
+class _BlockingCommit(object):
+    """A commit callback that blocks until released by the test."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.started.set()
+        self.release.wait(timeout=5.0)
+
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        CommitExecutor(max_workers=0)
+
+    with pytest.raises(ValueError):
+        CommitExecutor(max_workers=1, max_workers_per_topic=0)
+
+    with pytest.raises(ValueError):
+        CommitExecutor(idle_timeout=0)
+
+
+def test_per_topic_limit_defaults_to_client_limit():
+    executor = CommitExecutor(max_workers=7)
+    assert executor.max_workers == 7
+    assert executor.max_workers_per_topic == 7
+
+
+def test_unbounded_by_default():
+    executor = CommitExecutor()
+    blockers = [_BlockingCommit() for _ in range(3)]
+
+    for blocker in blockers:
+        executor.submit("topic", blocker)
+
+    for blocker in blockers:
+        assert blocker.started.wait(timeout=5.0)
+        blocker.release.set()
+    executor.shutdown()
+    _wait_for(lambda: executor._num_workers == 0)
+
+
+def test_idle_workers_exit_after_burst():
+    executor = CommitExecutor(idle_timeout=0.1)
+    blockers = [_BlockingCommit() for _ in range(5)]
+    threads_before = set(threading.enumerate())
+
+    for blocker in blockers:
+        executor.submit("topic", blocker)
+    for blocker in blockers:
+        assert blocker.started.wait(timeout=5.0)
+    workers = set(threading.enumerate()) - threads_before
+    assert executor._num_workers == 5
+    assert len(workers) == 5
+
+    for blocker in blockers:
+        blocker.release.set()
+
+    # The workers exit without a shutdown, once idle for the timeout.
+    _wait_for(lambda: executor._num_workers == 0)
+    _wait_for(lambda: not any(worker.is_alive() for worker in workers))
+
+    # Workers are started again on demand.
+    done = threading.Event()
+    executor.submit("topic", done.set)
+    assert done.wait(timeout=5.0)
+    executor.shutdown()
+
+
+def test_idle_worker_picks_up_new_work():
+    executor = CommitExecutor(max_workers=1, idle_timeout=5.0)
+    first = threading.Event()
+    second = threading.Event()
+
+    executor.submit("topic", first.set)
+    assert first.wait(timeout=5.0)
+    _wait_for(lambda: executor._num_idle == 1)
+
+    executor.submit("topic", second.set)
+    assert second.wait(timeout=5.0)
+    assert executor._num_workers == 1
+    executor.shutdown()
+
+
+def test_submit_runs_callback():
+    executor = CommitExecutor(max_workers=2)
+    done = threading.Event()
+
+    executor.submit("topic", done.set)
+
+    assert done.wait(timeout=5.0)
+    executor.shutdown()
+
+
+def test_client_wide_limit():
+    executor = CommitExecutor(max_workers=2)
+    commits = [_BlockingCommit() for _ in range(3)]
+
+    for index, commit in enumerate(commits):
+        executor.submit("topic_{}".format(index), commit)
+
+    assert commits[0].started.wait(timeout=5.0)
+    assert commits[1].started.wait(timeout=5.0)
+    assert not commits[2].started.wait(timeout=0.1)
+    assert executor._num_workers == 2
+
+    # Finishing one commit lets the queued one start on the same worker.
+    commits[0].release.set()
+    assert commits[2].started.wait(timeout=5.0)
+    assert executor._num_workers == 2
+
+    for commit in commits:
+        commit.release.set()
+    executor.shutdown()
+
+
+def test_per_topic_limit():
+    executor = CommitExecutor(max_workers=4, max_workers_per_topic=1)
+    first = _BlockingCommit()
+    second = _BlockingCommit()
+    other_topic = _BlockingCommit()
+
+    executor.submit("topic", first)
+    executor.submit("topic", second)
+    executor.submit("other_topic", other_topic)
+
+    assert first.started.wait(timeout=5.0)
+    assert other_topic.started.wait(timeout=5.0)
+    assert not second.started.wait(timeout=0.1)
+
+    first.release.set()
+    assert second.started.wait(timeout=5.0)
+
+    second.release.set()
+    other_topic.release.set()
+    _wait_for(lambda: not executor._active_per_topic)
+    assert not executor._waiting_per_topic
+    executor.shutdown()
+
+
+def test_per_topic_waiting_commits_run_in_order():
+    executor = CommitExecutor(max_workers=4, max_workers_per_topic=1)
+    blocker = _BlockingCommit()
+    calls = []
+    all_done = threading.Event()
+
+    executor.submit("topic", blocker)
+    for index in range(5):
+        executor.submit("topic", lambda index=index: calls.append(index))
+    executor.submit("topic", all_done.set)
+
+    blocker.release.set()
+    assert all_done.wait(timeout=5.0)
+    assert calls == [0, 1, 2, 3, 4]
+    executor.shutdown()
+
+
+def test_callback_error_is_logged_and_slot_released():
+    executor = CommitExecutor(max_workers=1, max_workers_per_topic=1)
+    done = threading.Event()
+
+    def fail():
+        raise RuntimeError("Boom!")
+
+    with mock.patch.object(_commit_executor, "_LOGGER") as _LOGGER:
+        executor.submit("topic", fail)
+        executor.submit("topic", done.set)
+        assert done.wait(timeout=5.0)
+
+    _LOGGER.exception.assert_called_once()
+    executor.shutdown()
+
+
+def test_shutdown_runs_pending_work_and_stops_workers():
+    executor = CommitExecutor(max_workers=1)
+    blocker = _BlockingCommit()
+    done = threading.Event()
+
+    executor.submit("topic", blocker)
+    executor.submit("topic", done.set)
+    executor.shutdown()
+
+    blocker.release.set()
+    assert done.wait(timeout=5.0)
+    _wait_for(lambda: executor._num_workers == 0)
+
+
+def test_submit_after_shutdown():
+    executor = CommitExecutor(max_workers=1)
+    executor.shutdown()
+
+    done = threading.Event()
+    executor.submit("topic", done.set)
+
+    assert done.wait(timeout=5.0)
+    _wait_for(lambda: executor._num_workers == 0)
+
+
+def test_client_creates_executor_from_options():
+    creds = mock.Mock(spec=credentials.Credentials)
+    options = types.PublisherOptions(
+        concurrency_control=types.PublishConcurrencyControl(
+            max_outstanding_rpcs=5, max_outstanding_rpcs_per_topic=2
+        )
+    )
+    client = publisher.Client(publisher_options=options, credentials=creds)
+
+    assert client._commit_executor.max_workers == 5
+    assert client._commit_executor.max_workers_per_topic == 2
@@ -0,0 +1,120 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import mock
+
+from google.cloud.pubsub_v1.publisher import _commit_timer
+from google.cloud.pubsub_v1.publisher._commit_timer import CommitTimer
+
+
+def test_infinite_delay_is_never_scheduled():
+    timer = CommitTimer()
+    timer.schedule(float("inf"), mock.Mock())
+
+    assert len(timer) == 0
+    assert timer._thread is None
+
+
+def test_callback_invoked_after_delay():
+    timer = CommitTimer()
+    done = threading.Event()
+
+    start = time.monotonic()
+    timer.schedule(0.05, done.set)
+
+    assert done.wait(timeout=5.0)
+    assert time.monotonic() - start >= 0.05
+    timer.stop()
+
+
+def test_callbacks_invoked_in_deadline_order():
+    timer = CommitTimer()
+    calls = []
+    all_done = threading.Event()
+
+    timer.schedule(0.15, lambda: (calls.append("late"), all_done.set()))
+    timer.schedule(0.05, lambda: calls.append("early"))
+    timer.schedule(0.1, lambda: calls.append("middle"))
+
+    assert all_done.wait(timeout=5.0)
+    assert calls == ["early", "middle", "late"]
+    timer.stop()
+
+
+def test_earlier_deadline_wakes_up_timer_thread():
+    timer = CommitTimer()
+    early_done = threading.Event()
+
+    timer.schedule(600, mock.Mock())
+    # Let the timer thread go to sleep waiting for the long deadline.
+    time.sleep(0.05)
+    timer.schedule(0, early_done.set)
+
+    assert early_done.wait(timeout=5.0)
+    assert len(timer) == 1
+    timer.stop()
+
+
+def test_single_thread_for_many_callbacks():
+    timer = CommitTimer()
+    done = threading.Event()
+
+    for _ in range(10):
+        timer.schedule(0.05, mock.Mock())
+    timer.schedule(0.05, done.set)
+
+    assert done.wait(timeout=5.0)
+    threads = [
+        thread
+        for thread in threading.enumerate()
+        if thread.name == "Thread-PubSubBatchCommitter"
+    ]
+    assert timer._thread in threads
+    timer.stop()
+
+
+def test_callback_error_is_logged():
+    timer = CommitTimer()
+    done = threading.Event()
+
+    def fail():
+        raise RuntimeError("Boom!")
+
+    with mock.patch.object(_commit_timer, "_LOGGER") as _LOGGER:
+        timer.schedule(0, fail)
+        timer.schedule(0.01, done.set)
+        assert done.wait(timeout=5.0)
+
+    _LOGGER.exception.assert_called_once()
+    timer.stop()
+
+
+def test_stop_drops_pending_callbacks():
+    timer = CommitTimer()
+    callback = mock.Mock()
+
+    timer.schedule(0.05, callback)
+    timer.stop()
+    timer._thread.join(timeout=5.0)
+
+    assert not timer._thread.is_alive()
+    assert len(timer) == 0
+    callback.assert_not_called()
+
+    # Scheduling after stop is a no-op.
+    timer.schedule(0, callback)
+    assert len(timer) == 0
@@ -0,0 +1,344 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import itertools
+import threading
+
+from google.auth import credentials
+import mock
+import pytest
+
+from google.api_core import exceptions as core_exceptions
+from google.api_core import retry as retries
+from google.cloud.pubsub_v1 import _envelopes
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.pubsub_v1 import types as gapic_types
+
+
+_raw_publish_request = gapic_types.PublishRequest.pb()
+_raw_publish_response = gapic_types.PublishResponse.pb()
+
+
+def create_client(packing=None, **options):
+    creds = mock.Mock(spec=credentials.Credentials)
+    if packing is None:
+        packing = types.EnvelopePackingSettings(max_latency=0.01)
+    publisher_options = types.PublisherOptions(envelope_packing=packing, **options)
+    client = publisher.Client(credentials=creds, publisher_options=publisher_options)
+
+    # Record the published messages instead of sending the requests.
+    client.published = []
+    published_lock = threading.Lock()
+    message_ids = itertools.count()
+
+    def publish_serialized(topic, request, retry=None, pinned=False, ordered=False):
+        messages = _raw_publish_request.FromString(request).messages
+        with published_lock:
+            client.published.extend(messages)
+            ids = [str(next(message_ids)) for _ in messages]
+        return _raw_publish_response(message_ids=ids)
+
+    client._publish_serialized = publish_serialized
+    return client
+
+
+def unpack(envelope):
+    assert envelope.attributes[_envelopes.ENVELOPE_ATTRIBUTE] == "1"
+    return [
+        (record.data, dict(record.attributes))
+        for record in _envelopes.decode(envelope.attributes, envelope.data)
+    ]
+
+
+def test_framed_size():
+    for size in (0, 1, 127, 128, 300, 16383, 16384, 10**6):
+        record = gapic_types.PubsubMessage(data=b"x" * size)._pb
+        expected = len(_envelopes.encode([record]))
+        assert _envelopes.framed_size(record.ByteSize()) == expected
+
+
+def test_records_packed_into_envelope():
+    client = create_client()
+
+    futures = [
+        client.publish("topic", b"foo", spam="eggs"),
+        client.publish("topic", b"bar"),
+    ]
+
+    # The records share the future of their envelope.
+    assert futures[0] is futures[1]
+    assert futures[0].result(timeout=5) == "0"
+
+    (envelope,) = client.published
+    assert unpack(envelope) == [(b"foo", {"spam": "eggs"}), (b"bar", {})]
+    assert client._flow_controller._message_count == 0
+    assert client._flow_controller._total_bytes == 0
+
+
+def test_envelope_published_at_max_records():
+    packing = types.EnvelopePackingSettings(max_records=2, max_latency=float("inf"))
+    client = create_client(packing)
+
+    futures = [client.publish("topic", data) for data in (b"a", b"b", b"c")]
+
+    assert futures[0] is futures[1]
+    assert futures[1] is not futures[2]
+    assert futures[0].result(timeout=5) == "0"
+    assert not futures[2].done()
+
+    client.stop()
+    assert futures[2].result(timeout=5) == "1"
+    assert [unpack(envelope) for envelope in client.published] == [
+        [(b"a", {}), (b"b", {})],
+        [(b"c", {})],
+    ]
+
+
+def test_envelope_published_at_max_bytes():
+    record_size = _envelopes.framed_size(
+        gapic_types.PubsubMessage(data=b"x" * 10)._pb.ByteSize()
+    )
+    packing = types.EnvelopePackingSettings(
+        max_bytes=2 * record_size + 1, max_latency=float("inf")
+    )
+    client = create_client(packing)
+
+    futures = [client.publish("topic", b"x" * 10) for _ in range(3)]
+
+    assert futures[0] is futures[1]
+    assert futures[1] is not futures[2]
+    assert futures[0].result(timeout=5) == "0"
+    client.stop()
+    assert futures[2].result(timeout=5) == "1"
+    assert [len(unpack(envelope)) for envelope in client.published] == [2, 1]
+
+
+def test_large_message_published_unpacked():
+    packing = types.EnvelopePackingSettings(max_bytes=100, max_latency=float("inf"))
+    client = create_client(packing)
+
+    small_future = client.publish("topic", b"small")
+    large_future = client.publish("topic", b"x" * 200, spam="eggs")
+
+    # The pending envelope is published first.
+    assert large_future.result(timeout=5) == "1"
+    assert small_future.result(timeout=5) == "0"
+    envelope, message = client.published
+    assert unpack(envelope) == [(b"small", {})]
+    assert message.data == b"x" * 200
+    assert dict(message.attributes) == {"spam": "eggs"}
+    assert client._flow_controller._message_count == 0
+
+
+def test_custom_retry_published_unpacked():
+    client = create_client()
+
+    future = client.publish("topic", b"foo", retry=retries.Retry(deadline=60))
+
+    assert future.result(timeout=5) == "0"
+    (message,) = client.published
+    assert message.data == b"foo"
+    assert _envelopes.ENVELOPE_ATTRIBUTE not in message.attributes
+
+
+def test_high_priority_published_unpacked_right_away():
+    client = create_client(types.EnvelopePackingSettings(max_latency=float("inf")))
+
+    packed_future = client.publish("topic", b"packed")
+    future = client.publish("topic", b"urgent", priority=types.PublishPriority.HIGH)
+
+    assert future.result(timeout=5) == "1"
+    assert packed_future.result(timeout=5) == "0"
+    envelope, message = client.published
+    assert unpack(envelope) == [(b"packed", {})]
+    assert message.data == b"urgent"
+
+
+def test_ordering_keys_packed_separately():
+    client = create_client(
+        types.EnvelopePackingSettings(max_latency=float("inf")),
+        enable_message_ordering=True,
+    )
+
+    first = client.publish("topic", b"a", ordering_key="k1")
+    second = client.publish("topic", b"b", ordering_key="k2")
+    third = client.publish("topic", b"c", ordering_key="k1")
+
+    assert first is third
+    assert first is not second
+    client.stop()
+    first.result(timeout=5)
+    second.result(timeout=5)
+    envelopes = sorted(client.published, key=lambda envelope: envelope.ordering_key)
+    assert [envelope.ordering_key for envelope in envelopes] == ["k1", "k2"]
+    assert unpack(envelopes[0]) == [(b"a", {}), (b"c", {})]
+
+
+def test_publish_many_after_pending_envelope():
+    packing = types.EnvelopePackingSettings(max_latency=float("inf"))
+    client = create_client(packing, enable_message_ordering=True)
+
+    future = client.publish("topic", b"packed", ordering_key="key")
+    bulk_future = client.publish_many("topic", [(b"bulk", {})], ordering_key="key")
+
+    bulk_future.result(timeout=5)
+    future.result(timeout=5)
+    assert len(client.published) == 2
+    assert unpack(client.published[0]) == [(b"packed", {})]
+    assert client.published[1].data == b"bulk"
+
+
+def test_idle_packer_removed():
+    client = create_client()
+
+    client.publish("topic", b"foo").result(timeout=5)
+
+    # The packer is removed once the latency timer finds it empty.
+    for _ in range(100):
+        if not client._envelope_packers:
+            break
+        threading.Event().wait(0.01)
+    assert client._envelope_packers == {}
+
+    assert client.publish("topic", b"bar").result(timeout=5) == "1"
+
+
+def test_retired_packer_hands_record_over():
+    client = create_client(types.EnvelopePackingSettings(max_latency=float("inf")))
+    # The packer is removed by its latency timer right after it is looked up.
+    retired = client._get_or_create_envelope_packer("topic", "")
+    retired._retired = True
+    del client._envelope_packers[("topic", "")]
+
+    get_packer = client._get_or_create_envelope_packer
+    packers = iter([retired])
+
+    def get_retired_packer_first(topic, ordering_key):
+        return next(packers, None) or get_packer(topic, ordering_key)
+
+    with mock.patch.object(
+        client,
+        "_get_or_create_envelope_packer",
+        side_effect=get_retired_packer_first,
+    ) as get_packer_mock:
+        future = client.publish("topic", b"foo")
+
+    assert get_packer_mock.call_count == 2
+    assert client._envelope_packers[("topic", "")] is not retired
+    client.stop()
+    assert future.result(timeout=5) == "0"
+
+
+def test_stop_publishes_pending_envelope():
+    client = create_client(types.EnvelopePackingSettings(max_latency=float("inf")))
+
+    future = client.publish("topic", b"foo")
+    client.stop()
+
+    assert future.result(timeout=5) == "0"
+    with pytest.raises(RuntimeError):
+        client.publish("topic", b"bar")
+
+
+def create_client_with_flow_control():
+    flow_control = types.PublishFlowControl(
+        message_limit=10, limit_exceeded_behavior=types.LimitExceededBehavior.ERROR
+    )
+    return create_client(
+        types.EnvelopePackingSettings(max_latency=float("inf")),
+        flow_control=flow_control,
+    )
+
+
+def test_rejected_record_releases_flow_control():
+    client = create_client_with_flow_control()
+    flow_controller = client._flow_controller
+
+    # A packer stopped on its own rejects the record.
+    client._get_or_create_envelope_packer("topic", "").stop()
+    with pytest.raises(RuntimeError):
+        client.publish("topic", b"foo")
+    assert flow_controller._message_count == 0
+
+    # Once the client is stopped, no packer can be created.
+    client.stop()
+    with pytest.raises(RuntimeError):
+        client.publish("topic", b"foo")
+    with pytest.raises(RuntimeError):
+        client.publish("topic", b"foo", priority=types.PublishPriority.HIGH)
+    assert flow_controller._message_count == 0
+    assert flow_controller._total_bytes == 0
+
+
+def test_unpacked_message_rejected_releases_flow_control():
+    client = create_client_with_flow_control()
+    packer = client._get_or_create_envelope_packer("topic", "")
+
+    with mock.patch.object(
+        client, "_publish_to_sequencer", side_effect=RuntimeError("stopped")
+    ):
+        with pytest.raises(RuntimeError):
+            client.publish("topic", b"foo", priority=types.PublishPriority.HIGH)
+
+    assert client._envelope_packers[("topic", "")] is packer
+    assert client._flow_controller._message_count == 0
+    assert client._flow_controller._total_bytes == 0
+
+
+def test_envelope_publish_error():
+    client = create_client()
+    error = core_exceptions.InvalidArgument("boom")
+    client._publish_serialized = mock.Mock(side_effect=error)
+
+    future = client.publish("topic", b"foo")
+
+    with pytest.raises(core_exceptions.InvalidArgument):
+        future.result(timeout=5)
+    assert client._flow_controller._message_count == 0
+
+
+def test_flow_control_applies_to_records():
+    flow_control = types.PublishFlowControl(
+        message_limit=2, limit_exceeded_behavior=types.LimitExceededBehavior.ERROR
+    )
+    client = create_client(
+        types.EnvelopePackingSettings(max_latency=float("inf")),
+        flow_control=flow_control,
+    )
+
+    envelope_future = client.publish("topic", b"a")
+    client.publish("topic", b"b")
+    future = client.publish("topic", b"c")
+
+    assert isinstance(future.exception(), exceptions.FlowControlLimitError)
+    client.stop()
+    envelope_future.result(timeout=5)
+    assert unpack(client.published[0]) == [(b"a", {}), (b"b", {})]
+
+
+def test_init_with_fire_and_forget():
+    with pytest.raises(ValueError):
+        create_client(fire_and_forget=types.FireAndForgetSettings())
+
+
+def test_envelope_attribute_reserved():
+    client = create_client()
+    attrs = {_envelopes.ENVELOPE_ATTRIBUTE: "1"}
+
+    with pytest.raises(ValueError):
+        client.publish("topic", b"foo", **attrs)
+    with pytest.raises(ValueError):
+        client.publish_many("topic", [(b"foo", attrs)])
@@ -14,14 +14,19 @@
 
 from __future__ import absolute_import
 
+import asyncio
+import collections
 import threading
 import time
 import warnings
 
+import mock
 import pytest
 
 from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import flow_controller as flow_controller_module
 from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher.flow_controller import AsyncFlowController
 from google.cloud.pubsub_v1.publisher.flow_controller import FlowController
 from google.pubsub_v1 import types as grpc_types
 
@@ -34,8 +39,7 @@ def _run_in_daemon(
     error_event=None,
     action_pause=None,
 ):
-    """Run flow controller action (add or remove messages) in a daemon thread.
-    """
+    """Run flow controller action (add or remove messages) in a daemon thread."""
     assert action in ("add", "release")
 
     def run_me():
@@ -400,8 +404,8 @@ def test_warning_on_internal_reservation_stats_error_when_unblocking():
         pytest.fail("Adding a message on overflow did not block.")  # pragma: NO COVER
 
     # Intentionally corrupt internal stats
-    reservation = next(iter(flow_controller._byte_reservations.values()), None)
-    assert reservation is not None, "No messages blocked by flow controller."
+    assert flow_controller._waiting, "No messages blocked by flow controller."
+    reservation = flow_controller._waiting[0].byte_reservation
     reservation.reserved = reservation.needed + 1
 
     with warnings.catch_warnings(record=True) as warned:
@@ -412,3 +416,567 @@ def test_warning_on_internal_reservation_stats_error_when_unblocking():
     matches = [warning for warning in warned if warning.category is RuntimeWarning]
     assert len(matches) == 1
     assert "too many bytes reserved" in str(matches[0].message).lower()
+
+
+def _block_threads(flow_controller, count, admitted):
+    for index in range(count):
+
+        def add(index=index):
+            flow_controller._add_many(1, 10)
+            admitted.append(index)
+
+        threading.Thread(target=add, daemon=True).start()
+        while len(flow_controller._waiting) <= index:
+            time.sleep(0.001)
+
+
+def test_blocked_threads_admitted_in_fifo_order():
+    settings = types.PublishFlowControl(
+        message_limit=1,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = FlowController(settings)
+    flow_controller._add_many(1, 10)
+    admitted = []
+    _block_threads(flow_controller, 20, admitted)
+
+    for count in range(1, 21):
+        flow_controller._release_many(1, 10)
+        while len(admitted) < count:
+            time.sleep(0.001)
+
+    assert admitted == list(range(20))
+    assert not flow_controller._waiting
+
+
+def test_release_wakes_up_only_the_admitted_thread():
+    settings = types.PublishFlowControl(
+        message_limit=100,
+        byte_limit=20,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = FlowController(settings)
+    flow_controller._add_many(2, 20)
+    admitted = []
+    _block_threads(flow_controller, 10, admitted)
+
+    with flow_controller._operational_lock:
+        waiters = list(flow_controller._waiting)
+        for waiter in waiters:
+            waiter.condition.notify = mock.Mock(wraps=waiter.condition.notify)
+
+    flow_controller._release_many(1, 10)
+    while not admitted:
+        time.sleep(0.001)
+
+    assert admitted == [0]
+    assert [waiter.condition.notify.call_count for waiter in waiters] == [1] + [0] * 9
+    # No free bytes were left for the other waiters.
+    assert list(flow_controller._reserving) == waiters[1:]
+
+
+def test_priority_waiters_skip_ahead_of_normal_waiters():
+    settings = types.PublishFlowControl(
+        message_limit=1,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = FlowController(settings)
+    flow_controller._add_many(1, 10)
+    admitted = []
+
+    def add(name, priority):
+        flow_controller._add_many(1, 10, priority=priority)
+        admitted.append(name)
+
+    for count, (name, priority) in enumerate(
+        [("normal-1", False), ("high-1", True), ("normal-2", False), ("high-2", True)]
+    ):
+        threading.Thread(target=add, args=(name, priority), daemon=True).start()
+        while len(flow_controller._waiting) <= count:
+            time.sleep(0.001)
+
+    for count in range(1, 5):
+        flow_controller._release_many(1, 10)
+        while len(admitted) < count:
+            time.sleep(0.001)
+
+    assert admitted == ["high-1", "high-2", "normal-1", "normal-2"]
+    assert flow_controller._priority_waiter_count == 0
+
+
+def test_priority_waiter_takes_over_reserved_bytes():
+    settings = types.PublishFlowControl(
+        byte_limit=100,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = FlowController(settings)
+    flow_controller._add_many(1, 50)
+    admitted = []
+
+    def add(name, byte_count, priority):
+        flow_controller._add_many(1, byte_count, priority=priority)
+        admitted.append(name)
+
+    # The normal waiter reserves the 50 free bytes, but needs 30 more.
+    threading.Thread(target=add, args=("normal", 80, False), daemon=True).start()
+    while not flow_controller._waiting:
+        time.sleep(0.001)
+    assert flow_controller._reserved_bytes == 50
+
+    # The high-priority waiter takes over the reserved bytes, and only needs
+    # 10 more bytes instead of 60.
+    threading.Thread(target=add, args=("high", 60, True), daemon=True).start()
+    while len(flow_controller._waiting) < 2:
+        time.sleep(0.001)
+    with flow_controller._operational_lock:
+        high, normal = flow_controller._waiting
+        assert high.byte_reservation.reserved == 50
+        assert normal.byte_reservation.reserved == 0
+
+    flow_controller._release_many(1, 50)
+    while not admitted:
+        time.sleep(0.001)
+    assert admitted == ["high"]
+    assert flow_controller._reserved_bytes == 40
+
+
+def test_add_many_accounts_messages_as_a_unit():
+    settings = types.PublishFlowControl(
+        message_limit=5,
+        byte_limit=10000,
+        limit_exceeded_behavior=types.LimitExceededBehavior.ERROR,
+    )
+    flow_controller = FlowController(settings)
+
+    flow_controller._add_many(3, 300)
+    assert flow_controller._message_count == 3
+    assert flow_controller._total_bytes == 300
+
+    # The chunk does not fit as a whole, thus none of its messages is added.
+    with pytest.raises(exceptions.FlowControlLimitError) as error:
+        flow_controller._add_many(3, 300)
+    assert "messages: 6 / 5" in str(error.value)
+    assert flow_controller._message_count == 3
+
+    flow_controller._release_many(3, 300)
+    assert flow_controller._message_count == 0
+    assert flow_controller._total_bytes == 0
+
+
+def test_add_many_blocks_until_the_whole_chunk_fits():
+    settings = types.PublishFlowControl(
+        message_limit=5,
+        byte_limit=10000,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = FlowController(settings)
+    flow_controller._add_many(3, 300)
+
+    adding_done = threading.Event()
+
+    def add_chunk():
+        flow_controller._add_many(4, 400)
+        adding_done.set()
+
+    threading.Thread(target=add_chunk, daemon=True).start()
+    assert not adding_done.wait(timeout=0.1)
+
+    flow_controller._release_many(3, 300)
+    assert adding_done.wait(timeout=5.0)
+    assert flow_controller._message_count == 4
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    bucket = flow_controller_module._TokenBucket(10, 5, clock=clock)
+
+    assert bucket.delay(5) == 0
+    bucket.take(5)
+    assert bucket.delay(1) == pytest.approx(0.1)
+
+    clock.now += 0.2
+    assert bucket.delay(2) == 0
+    bucket.take(2)
+
+    # The bucket never holds more than the burst size.
+    clock.now += 10
+    assert bucket.delay(5) == 0
+    assert bucket.delay(6) == 0  # Admitted once the bucket is full ...
+    bucket.take(6)
+    assert bucket.delay(1) == pytest.approx(0.2)  # ... and paid back later.
+
+
+@pytest.mark.parametrize("rate,burst", [(0, None), (-1, None), (10, 0)])
+def test_invalid_rate_limits(rate, burst):
+    settings = types.PublishFlowControl(
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+        messages_per_second=rate,
+        message_burst=burst,
+    )
+    with pytest.raises(ValueError):
+        FlowController(settings)
+
+
+def test_message_rate_error():
+    settings = types.PublishFlowControl(
+        limit_exceeded_behavior=types.LimitExceededBehavior.ERROR,
+        messages_per_second=10,
+        message_burst=2,
+    )
+    flow_controller = FlowController(settings)
+    clock = FakeClock()
+    flow_controller._message_bucket = flow_controller_module._TokenBucket(
+        10, 2, clock=clock
+    )
+    msg = grpc_types.PubsubMessage(data=b"foo")
+
+    flow_controller.add(msg)
+    flow_controller.add(msg)
+    with pytest.raises(exceptions.FlowControlLimitError) as error:
+        flow_controller.add(msg)
+    assert "rate limits would be exceeded" in str(error.value)
+    assert "messages per second: 10 (burst: 2)" in str(error.value)
+    # The rejected message does not increase the load.
+    assert flow_controller._message_count == 2
+
+    # The rate limit applies regardless of the messages being released.
+    flow_controller.release(msg)
+    with pytest.raises(exceptions.FlowControlLimitError):
+        flow_controller.add(msg)
+
+    clock.now += 0.1
+    flow_controller.add(msg)
+
+
+def test_byte_rate_error_chunk_larger_than_burst():
+    settings = types.PublishFlowControl(
+        limit_exceeded_behavior=types.LimitExceededBehavior.ERROR,
+        bytes_per_second=100,
+    )
+    flow_controller = FlowController(settings)
+    clock = FakeClock()
+    flow_controller._byte_bucket = flow_controller_module._TokenBucket(
+        100, 100, clock=clock
+    )
+
+    # A chunk larger than the burst size is admitted when the bucket is full.
+    flow_controller._add_many(3, 300)
+    clock.now += 1
+    with pytest.raises(exceptions.FlowControlLimitError):
+        flow_controller._add_many(1, 1)
+
+    clock.now += 1.1
+    flow_controller._add_many(1, 1)
+
+
+@pytest.mark.parametrize("rates", [{"messages_per_second": 1}, {"bytes_per_second": 1}])
+def test_rate_limits_rejected_on_ignore(rates):
+    # IGNORE is the default behavior.
+    settings = types.PublishFlowControl(**rates)
+
+    with pytest.raises(ValueError) as error:
+        FlowController(settings)
+    assert "rate limits" in str(error.value)
+
+
+def test_rate_limit_blocks_until_tokens_refilled():
+    settings = types.PublishFlowControl(
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+        messages_per_second=20,
+        message_burst=1,
+    )
+    flow_controller = FlowController(settings)
+    msg = grpc_types.PubsubMessage(data=b"foo")
+
+    admit_waiting = mock.Mock(wraps=flow_controller._admit_waiting)
+    with mock.patch.object(flow_controller, "_admit_waiting", admit_waiting):
+        start = time.monotonic()
+        for _ in range(3):
+            flow_controller.add(msg)
+        elapsed = time.monotonic() - start
+
+    assert elapsed >= 0.09
+    # The blocked thread sleeps until the tokens are refilled instead of
+    # spinning.
+    assert admit_waiting.call_count <= 6
+
+
+def test_rate_limit_admits_waiting_threads_in_fifo_order():
+    settings = types.PublishFlowControl(
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+        messages_per_second=10,
+        message_burst=1,
+    )
+    flow_controller = FlowController(settings)
+    flow_controller._add_many(1, 10)
+    admitted = []
+
+    def add(name):
+        flow_controller._add_many(1, 10)
+        admitted.append(name)
+
+    first = threading.Thread(target=add, args=("first",), daemon=True)
+    first.start()
+    while not flow_controller._waiting:
+        time.sleep(0.001)
+    second = threading.Thread(target=add, args=("second",), daemon=True)
+    second.start()
+
+    first.join(timeout=5)
+    second.join(timeout=5)
+    assert admitted == ["first", "second"]
+    assert flow_controller._waiting == collections.deque()
+    assert flow_controller._reserving == collections.deque()
+    assert flow_controller._reserved_bytes == 0
+
+
+def test_rate_limit_applies_after_capacity_frees_up():
+    settings = types.PublishFlowControl(
+        message_limit=1,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+        bytes_per_second=10**6,
+    )
+    flow_controller = FlowController(settings)
+    flow_controller._add_many(1, 10)
+    adding_done = threading.Event()
+
+    def add():
+        flow_controller._add_many(1, 10)
+        adding_done.set()
+
+    threading.Thread(target=add, daemon=True).start()
+    assert not adding_done.wait(timeout=0.1)
+
+    flow_controller._release_many(1, 10)
+    assert adding_done.wait(timeout=5)
+
+
+def test_chain_adds_to_and_releases_from_all_flow_controllers():
+    topic_settings = types.PublishFlowControl(
+        message_limit=1, limit_exceeded_behavior=types.LimitExceededBehavior.ERROR
+    )
+    global_settings = types.PublishFlowControl(
+        message_limit=2, limit_exceeded_behavior=types.LimitExceededBehavior.ERROR
+    )
+    topic_controller = FlowController(topic_settings)
+    global_controller = FlowController(global_settings)
+    chain = flow_controller_module.FlowControllerChain(
+        [topic_controller, global_controller]
+    )
+    msg = grpc_types.PubsubMessage(data=b"foo")
+
+    chain.add(msg)
+    assert topic_controller._message_count == 1
+    assert global_controller._message_count == 1
+
+    # Rejected by the topic's flow controller.
+    with pytest.raises(exceptions.FlowControlLimitError):
+        chain.add(msg)
+    assert global_controller._message_count == 1
+
+    # The priority is passed on to the flow controllers.
+    with mock.patch.object(topic_controller, "_add_many") as add_many:
+        chain._add_many(1, 10, priority=True)
+    add_many.assert_called_once_with(1, 10, priority=True)
+    global_controller._release_many(1, 10)
+
+    # Rejected by the global flow controller, after the topic's admitted it.
+    chain.release(msg)
+    global_controller.add(msg)
+    global_controller.add(msg)
+    with pytest.raises(exceptions.FlowControlLimitError):
+        chain.add(msg)
+    assert topic_controller._message_count == 0
+    assert global_controller._message_count == 2
+
+
+@pytest.mark.asyncio
+async def test_async_no_overflow_no_error():
+    settings = types.PublishFlowControl(
+        message_limit=100,
+        byte_limit=10000,
+        limit_exceeded_behavior=types.LimitExceededBehavior.ERROR,
+    )
+    flow_controller = AsyncFlowController(settings)
+
+    # there should be no errors
+    for data in (b"foo", b"bar", b"baz"):
+        msg = grpc_types.PubsubMessage(data=data)
+        await flow_controller.add(msg)
+
+    assert flow_controller._message_count == 3
+
+
+@pytest.mark.asyncio
+async def test_async_overflow_error():
+    settings = types.PublishFlowControl(
+        message_limit=1,
+        byte_limit=10000,
+        limit_exceeded_behavior=types.LimitExceededBehavior.ERROR,
+    )
+    flow_controller = AsyncFlowController(settings)
+
+    await flow_controller.add(grpc_types.PubsubMessage(data=b"foo"))
+    with pytest.raises(exceptions.FlowControlLimitError) as error:
+        await flow_controller.add(grpc_types.PubsubMessage(data=b"bar"))
+
+    assert "messages: 2 / 1" in str(error.value)
+
+
+@pytest.mark.asyncio
+async def test_async_ignore_does_not_track_load():
+    settings = types.PublishFlowControl(
+        message_limit=1,
+        byte_limit=1,
+        limit_exceeded_behavior=types.LimitExceededBehavior.IGNORE,
+    )
+    flow_controller = AsyncFlowController(settings)
+    msg = grpc_types.PubsubMessage(data=b"foo")
+
+    await flow_controller.add(msg)
+    await flow_controller.add(msg)
+    flow_controller.release(msg)
+
+    assert flow_controller._message_count == 0
+    assert flow_controller._total_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_async_blocking_admits_waiters_in_fifo_order():
+    msg_large = grpc_types.PubsubMessage(data=b"x" * 100)  # 102 bytes
+    msg_small = grpc_types.PubsubMessage(data=b"y")  # 3 bytes
+    settings = types.PublishFlowControl(
+        message_limit=10,
+        byte_limit=150,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = AsyncFlowController(settings)
+    admitted = []
+
+    async def add(name, msg):
+        await flow_controller.add(msg)
+        admitted.append(name)
+
+    await flow_controller.add(msg_large)
+
+    waiting_large = asyncio.ensure_future(add("large", msg_large))
+    await asyncio.sleep(0)
+    # The small message would fit, but it must not overtake the large one.
+    waiting_small = asyncio.ensure_future(add("small", msg_small))
+    await asyncio.sleep(0)
+    assert admitted == []
+
+    flow_controller.release(msg_large)
+    await asyncio.gather(waiting_large, waiting_small)
+
+    assert admitted == ["large", "small"]
+    assert flow_controller._message_count == 2
+    assert flow_controller._total_bytes == 105
+
+
+@pytest.mark.asyncio
+async def test_async_blocking_error_if_message_exceeds_limits():
+    settings = types.PublishFlowControl(
+        message_limit=1,
+        byte_limit=2,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = AsyncFlowController(settings)
+
+    with pytest.raises(exceptions.FlowControlLimitError) as error:
+        await flow_controller.add(grpc_types.PubsubMessage(data=b"foo"))
+
+    assert "would block forever" in str(error.value)
+
+
+@pytest.mark.asyncio
+async def test_async_cancelled_waiter_leaves_queue():
+    msg = grpc_types.PubsubMessage(data=b"foo")
+    settings = types.PublishFlowControl(
+        message_limit=1,
+        byte_limit=100,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = AsyncFlowController(settings)
+
+    await flow_controller.add(msg)
+    cancelled = asyncio.ensure_future(flow_controller.add(msg))
+    waiting = asyncio.ensure_future(flow_controller.add(msg))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+    flow_controller.release(msg)
+    await asyncio.wait_for(waiting, timeout=1)
+
+    assert not flow_controller._waiting
+    assert flow_controller._message_count == 1
+
+
+@pytest.mark.asyncio
+async def test_async_release_warns_on_incorrect_stats():
+    settings = types.PublishFlowControl(
+        message_limit=1,
+        byte_limit=100,
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+    )
+    flow_controller = AsyncFlowController(settings)
+
+    with warnings.catch_warnings(record=True) as warned:
+        flow_controller.release(grpc_types.PubsubMessage(data=b"foo"))
+
+    assert len(warned) == 1
+    assert issubclass(warned[0].category, RuntimeWarning)
+    assert flow_controller._message_count == 0
+    assert flow_controller._total_bytes == 0
+
+
+@pytest.mark.asyncio
+async def test_async_rate_limit_error():
+    settings = types.PublishFlowControl(
+        limit_exceeded_behavior=types.LimitExceededBehavior.ERROR,
+        messages_per_second=10,
+        message_burst=1,
+    )
+    flow_controller = AsyncFlowController(settings)
+    msg = grpc_types.PubsubMessage(data=b"foo")
+
+    await flow_controller.add(msg)
+    with pytest.raises(exceptions.FlowControlLimitError) as error:
+        await flow_controller.add(msg)
+    assert "rate limits would be exceeded" in str(error.value)
+    assert flow_controller._message_count == 1
+
+
+@pytest.mark.asyncio
+async def test_async_rate_limit_blocks_in_fifo_order():
+    settings = types.PublishFlowControl(
+        limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK,
+        messages_per_second=20,
+        message_burst=1,
+    )
+    flow_controller = AsyncFlowController(settings)
+    admitted = []
+
+    async def add(name):
+        await flow_controller.add(grpc_types.PubsubMessage(data=b"foo"))
+        admitted.append(name)
+
+    start = time.monotonic()
+    await asyncio.gather(add("first"), add("second"), add("third"))
+    elapsed = time.monotonic() - start
+
+    assert admitted == ["first", "second", "third"]
+    assert elapsed >= 0.09
+    assert flow_controller._message_count == 3
+    assert flow_controller._rate_timer is None
@@ -14,8 +14,10 @@
 
 from __future__ import absolute_import
 
+import mock
 import pytest
 
+from google.cloud.pubsub_v1.publisher import exceptions
 from google.cloud.pubsub_v1.publisher import futures
 
 
@@ -30,3 +32,112 @@ class TestFuture(object):
         future.set_exception(RuntimeError("Something bad happened."))
         with pytest.raises(RuntimeError):
             future.result()
+
+
+class TestMessageFuture(object):
+    def test_result_on_success(self):
+        outcome = futures._BatchOutcome()
+        first = futures.MessageFuture(outcome, 0)
+        second = futures.MessageFuture(outcome, 1)
+        assert not first.done()
+        assert second.running()
+
+        outcome.set_result(["a", "b"])
+        assert first.done()
+        assert first.result() == "a"
+        assert second.result() == "b"
+        assert second.exception() is None
+
+    def test_result_on_failure(self):
+        outcome = futures._BatchOutcome()
+        future = futures.MessageFuture(outcome, 0)
+        outcome.set_exception(RuntimeError("Something bad happened."))
+
+        with pytest.raises(RuntimeError):
+            future.result()
+
+    def test_result_timeout(self):
+        future = futures.MessageFuture(futures._BatchOutcome(), 0)
+        with pytest.raises(exceptions.TimeoutError):
+            future.result(timeout=0.01)
+
+    def test_cancel(self):
+        future = futures.MessageFuture(futures._BatchOutcome(), 0)
+        assert future.cancel() is False
+        assert future.cancelled() is False
+
+    def test_done_callbacks(self):
+        outcome = futures._BatchOutcome()
+        first = futures.MessageFuture(outcome, 0)
+        second = futures.MessageFuture(outcome, 1)
+        callback = mock.Mock()
+        first.add_done_callback(callback)
+        second.add_done_callback(callback)
+        callback.assert_not_called()
+
+        outcome.set_result(["a", "b"])
+        assert callback.call_args_list == [mock.call(first), mock.call(second)]
+
+        # Callbacks added after completion are invoked right away.
+        callback.reset_mock()
+        first.add_done_callback(callback)
+        callback.assert_called_once_with(first)
+
+    def test_compact(self):
+        future = futures.MessageFuture(futures._BatchOutcome(), 0)
+        assert isinstance(future, futures.Future)
+        # The state of the base class is not allocated.
+        assert vars(future) == {}
+
+    def test_set_result_not_supported(self):
+        future = futures.MessageFuture(futures._BatchOutcome(), 0)
+        with pytest.raises(RuntimeError):
+            future.set_result("a")
+        with pytest.raises(RuntimeError):
+            future.set_exception(RuntimeError("Something bad happened."))
+
+    def test_failed_message_future(self):
+        error = RuntimeError("Something bad happened.")
+        future = futures._failed_message_future(error)
+
+        assert isinstance(future, futures.MessageFuture)
+        assert future.done()
+        assert future.exception() is error
+
+    def test_outcome_completes_once(self):
+        outcome = futures._BatchOutcome()
+        outcome.set_result(["a"])
+        with pytest.raises(RuntimeError):
+            outcome.set_exception(RuntimeError("Something bad happened."))
+
+
+class TestBulkFuture(object):
+    def test_result_on_success(self):
+        future = futures.BulkFuture(3)
+        future._set_chunk_result(2, ["c"])
+        assert not future.done()
+        assert future.message_ids == [None, None, "c"]
+
+        future._set_chunk_result(0, ["a", "b"])
+        assert future.result() == ["a", "b", "c"]
+
+    def test_result_on_failure(self):
+        future = futures.BulkFuture(3)
+        future._set_chunk_result(0, ["a"])
+        future._set_chunk_exception(1, 2, RuntimeError("Something bad happened."))
+
+        with pytest.raises(RuntimeError):
+            future.result()
+        assert future.message_ids == ["a", None, None]
+
+    def test_first_exception_wins(self):
+        future = futures.BulkFuture(2)
+        first = RuntimeError("first")
+        future._set_chunk_exception(1, 1, first)
+        future._set_chunk_exception(0, 1, RuntimeError("second"))
+
+        assert future.exception() is first
+
+    def test_no_messages(self):
+        future = futures.BulkFuture(0)
+        assert future.result() == []
@@ -0,0 +1,345 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from google.auth import credentials
+import mock
+import pytest
+
+from google.api_core import exceptions as core_exceptions
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher._hedging import _HedgedRequest
+from google.cloud.pubsub_v1.publisher._hedging import PublishHedger
+from google.pubsub_v1 import types as gapic_types
+
+
+_raw_publish_response = gapic_types.PublishResponse.pb()
+
+
+def create_client(batch_settings=None, **options):
+    creds = mock.Mock(spec=credentials.Credentials)
+    if batch_settings is None:
+        batch_settings = types.BatchSettings(max_latency=0)
+    publisher_options = types.PublisherOptions(
+        hedging=types.HedgingSettings(max_hedge_ratio=1), **options
+    )
+    return publisher.Client(
+        batch_settings=batch_settings,
+        credentials=creds,
+        publisher_options=publisher_options,
+    )
+
+
+def create_hedger(max_outstanding_hedges=4, **settings):
+    client = mock.Mock(spec=["_publish_serialized"])
+    return PublishHedger(
+        client, types.HedgingSettings(**settings), max_outstanding_hedges
+    )
+
+
+def test_hedged_request_first_success_wins():
+    callback = mock.Mock()
+    hedged_request = _HedgedRequest(callback)
+    assert hedged_request.add_attempt()
+
+    hedged_request.attempt(lambda: "hedge")
+    hedged_request.attempt(lambda: "original")
+
+    callback.assert_called_once_with("hedge", None)
+    assert hedged_request.done
+    assert not hedged_request.add_attempt()
+
+
+def test_hedged_request_error_waits_for_other_attempt():
+    callback = mock.Mock()
+    hedged_request = _HedgedRequest(callback)
+    assert hedged_request.add_attempt()
+    error = core_exceptions.ServiceUnavailable("down")
+
+    def fail():
+        raise error
+
+    hedged_request.attempt(fail)
+    callback.assert_not_called()
+
+    hedged_request.attempt(lambda: "hedge")
+    callback.assert_called_once_with("hedge", None)
+
+
+def test_hedged_request_all_attempts_fail():
+    callback = mock.Mock()
+    hedged_request = _HedgedRequest(callback)
+    assert hedged_request.add_attempt()
+    errors = [core_exceptions.ServiceUnavailable("1"), core_exceptions.Aborted("2")]
+
+    for error in errors:
+        hedged_request.attempt(mock.Mock(side_effect=error))
+
+    callback.assert_called_once_with(None, errors[1])
+
+
+def test_hedged_request_cancelled_attempt():
+    callback = mock.Mock()
+    hedged_request = _HedgedRequest(callback)
+    assert hedged_request.add_attempt()
+    error = core_exceptions.ServiceUnavailable("down")
+
+    hedged_request.attempt(mock.Mock(side_effect=error))
+    hedged_request.cancel_attempt()
+
+    callback.assert_called_once_with(None, error)
+
+
+def test_hedged_request_unexpected_error():
+    callback = mock.Mock()
+    hedged_request = _HedgedRequest(callback)
+    error = ValueError("Unexpected.")
+
+    hedged_request.attempt(mock.Mock(side_effect=error))
+
+    callback.assert_called_once_with(None, error)
+    assert hedged_request.done
+
+
+def test_invalid_settings():
+    for settings in (
+        {"latency_percentile": 0},
+        {"latency_percentile": 101},
+        {"max_hedge_ratio": -0.1},
+        {"max_hedge_ratio": 1.5},
+        {"min_delay": -1},
+    ):
+        with pytest.raises(ValueError):
+            create_hedger(**settings)
+
+
+def test_delay_from_latency_percentile():
+    hedger = create_hedger(latency_percentile=90)
+
+    for latency in range(19):
+        hedger.record_latency(latency / 100)
+    assert hedger.delay is None
+
+    hedger.record_latency(0.19)
+    assert hedger.delay == 0.18
+
+    # The delay is only updated once enough new latencies were observed.
+    for _ in range(49):
+        hedger.record_latency(1.0)
+    assert hedger.delay == 0.18
+    hedger.record_latency(1.0)
+    assert hedger.delay == 1.0
+
+
+def test_min_delay():
+    hedger = create_hedger(min_delay=0.5)
+
+    for _ in range(20):
+        hedger.record_latency(0.01)
+
+    assert hedger.delay == 0.5
+
+
+def test_no_hedge_until_delay_known():
+    hedger = create_hedger()
+    hedger._client._publish_serialized.return_value = "response"
+    callback = mock.Mock()
+
+    hedger.publish("topic", b"request", None, callback)
+
+    assert hedger._timer is None
+    hedger._client._publish_serialized.assert_called_once_with(
+        "topic", b"request", retry=None
+    )
+    callback.assert_called_once_with("response", None)
+
+
+def test_hedges_capped_by_ratio():
+    hedger = create_hedger(max_hedge_ratio=0.25)
+    for _ in range(8):
+        hedger.publish("topic", b"request", None, mock.Mock())
+
+    with mock.patch.object(hedger, "_executor") as executor:
+        for _ in range(3):
+            hedger._hedge(mock.Mock(), _HedgedRequest(mock.Mock()))
+
+    assert executor.submit.call_count == 2
+    assert hedger._outstanding_hedges == 2
+
+
+def test_hedges_capped_by_outstanding_hedges():
+    hedger = create_hedger(max_outstanding_hedges=1, max_hedge_ratio=1)
+    for _ in range(3):
+        hedger.publish("topic", b"request", None, mock.Mock())
+
+    with mock.patch.object(hedger, "_executor") as executor:
+        for _ in range(2):
+            hedger._hedge(mock.Mock(), _HedgedRequest(mock.Mock()))
+        assert executor.submit.call_count == 1
+
+        hedger._on_hedge_done()
+        hedger._hedge(mock.Mock(), _HedgedRequest(mock.Mock()))
+        assert executor.submit.call_count == 2
+
+
+def test_hedge_skipped_once_request_done():
+    hedger = create_hedger(max_hedge_ratio=1)
+    hedger._delay = 60
+    hedger._client._publish_serialized.return_value = "response"
+
+    hedger.publish("topic", b"request", None, mock.Mock())
+    ((_, _, hedge),) = hedger._timer._heap
+    with mock.patch.object(hedger, "_executor") as executor:
+        hedge()
+
+    executor.submit.assert_not_called()
+    assert hedger._credits == 1
+    hedger.stop()
+
+
+def test_hedge_after_stop():
+    hedger = create_hedger(max_hedge_ratio=1)
+    hedger._credits = 1
+    callback = mock.Mock()
+    hedged_request = _HedgedRequest(callback)
+    hedger.stop()
+
+    hedger._hedge(mock.Mock(), hedged_request)
+
+    assert hedger._outstanding_hedges == 0
+    hedged_request.attempt(lambda: "response")
+    callback.assert_called_once_with("response", None)
+
+
+def test_requests_in_progress_hedged_after_stop():
+    hedger = create_hedger(max_hedge_ratio=1)
+    hedger._delay = 0.01
+    unblock = threading.Event()
+    responses = iter(["original", "hedge"])
+
+    def publish_serialized(topic, request, retry=None):
+        response = next(responses)
+        if response == "original":
+            unblock.wait(timeout=5)
+        return response
+
+    hedger._client._publish_serialized.side_effect = publish_serialized
+    done = threading.Event()
+    callback = mock.Mock(side_effect=lambda *args: done.set())
+    publisher_thread = threading.Thread(
+        target=hedger.publish, args=("topic", b"request", None, callback)
+    )
+    publisher_thread.start()
+    hedger.stop()
+
+    try:
+        assert done.wait(timeout=5)
+        callback.assert_called_once_with("hedge", None)
+        assert hedger._timer is not None
+    finally:
+        unblock.set()
+        publisher_thread.join(timeout=5)
+
+    assert hedger._timer is None
+    assert hedger._executor is None
+
+
+def test_hedged_response_completes_batch():
+    client = create_client()
+    client._hedger._delay = 0.01
+    unblock = threading.Event()
+    calls = []
+
+    def publish_rpc(request, topic, retry=None, pinned=False, compression=None):
+        calls.append(pinned)
+        if len(calls) == 1:
+            # The original request is slow.
+            unblock.wait(timeout=5)
+            return _raw_publish_response(message_ids=["original"])
+        return _raw_publish_response(message_ids=["hedge"])
+
+    client._serialized_publish_rpc = publish_rpc
+
+    future = client.publish("topic", b"foo")
+
+    assert future.result(timeout=5) == "hedge"
+    assert calls == [False, False]
+    unblock.set()
+    client.stop()
+
+
+def test_batch_committed_on_stop_hedged():
+    client = create_client(batch_settings=types.BatchSettings(max_latency=float("inf")))
+    client._hedger._delay = 0.01
+    unblock = threading.Event()
+    calls = []
+
+    def publish_rpc(request, topic, retry=None, pinned=False, compression=None):
+        calls.append(pinned)
+        if len(calls) == 1:
+            unblock.wait(timeout=5)
+            return _raw_publish_response(message_ids=["original"])
+        return _raw_publish_response(message_ids=["hedge"])
+
+    client._serialized_publish_rpc = publish_rpc
+
+    future = client.publish("topic", b"foo")
+    client.stop()
+
+    try:
+        assert future.result(timeout=5) == "hedge"
+    finally:
+        unblock.set()
+
+
+def test_ordered_batches_not_hedged():
+    client = create_client(
+        batch_settings=types.BatchSettings(max_latency=float("inf")),
+        enable_message_ordering=True,
+    )
+
+    client.publish("topic", b"foo", ordering_key="key")
+    client.publish("topic", b"foo")
+
+    ordered = client._sequencers[("topic", "key")]._ordered_batches[0]
+    unordered = client._sequencers[("topic", "")]._current_batch
+    assert not ordered._hedged
+    assert unordered._hedged
+
+
+def test_publish_many_batches_hedged():
+    client = create_client()
+
+    def hedged_publish(topic, request, retry, callback):
+        callback(_raw_publish_response(message_ids=["1"]), None)
+
+    with mock.patch.object(
+        client._hedger, "publish", side_effect=hedged_publish
+    ) as publish:
+        client.publish_many("topic", [(b"foo", {})]).result(timeout=5)
+
+    publish.assert_called_once()
+
+
+def test_latency_recorded():
+    client = create_client()
+    client._serialized_publish_rpc = mock.Mock(
+        return_value=_raw_publish_response(message_ids=["1"])
+    )
+
+    client.publish("topic", b"foo").result(timeout=5)
+
+    assert len(client._hedger._latencies) == 1
@@ -0,0 +1,525 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import errno
+import os
+import threading
+
+from google.auth import credentials
+import mock
+import pytest
+
+from google.api_core import exceptions as core_exceptions
+from google.api_core import retry as retries
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher import futures
+from google.cloud.pubsub_v1.publisher import _outbox
+from google.cloud.pubsub_v1.publisher._outbox import Outbox
+from google.cloud.pubsub_v1.publisher._outbox import SegmentLog
+from google.pubsub_v1 import types as gapic_types
+
+
+_raw_publish_request = gapic_types.PublishRequest.pb()
+_raw_publish_response = gapic_types.PublishResponse.pb()
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".outbox"))
+
+
+def read_all(log):
+    entries = []
+    while True:
+        entry = log.read(log.appended)
+        if entry is None:
+            return entries
+        entries.append(entry)
+
+
+def create_outbox(directory, **settings):
+    client = mock.Mock(spec=["_publish_from_outbox", "_is_permanent_publish_error"])
+    client._publish_from_outbox.side_effect = lambda *args: futures.Future()
+    client._is_permanent_publish_error.side_effect = lambda exc: isinstance(
+        exc, core_exceptions.InvalidArgument
+    )
+    return Outbox(client, types.OutboxSettings(str(directory), **settings))
+
+
+def wait_for(predicate):
+    for _ in range(500):
+        if predicate():
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("Timed out.")
+
+
+def create_client(directory, **options):
+    creds = mock.Mock(spec=credentials.Credentials)
+    publisher_options = types.PublisherOptions(
+        outbox=types.OutboxSettings(str(directory)), **options
+    )
+    client = publisher.Client(
+        batch_settings=types.BatchSettings(max_latency=0),
+        credentials=creds,
+        publisher_options=publisher_options,
+    )
+    return client
+
+
+def fake_publish_rpc(published):
+    def publish_rpc(request, topic, retry=None, pinned=False, compression=None):
+        request = _raw_publish_request.FromString(request)
+        message_ids = []
+        for message in request.messages:
+            published.append(message.data)
+            message_ids.append(str(len(published)))
+        return _raw_publish_response(message_ids=message_ids)
+
+    return publish_rpc
+
+
+def test_log_append_and_read(tmp_path):
+    log = SegmentLog(str(tmp_path), 1024)
+
+    assert log.append("topic", "", [b"one", b"two"]) == range(0, 2)
+    assert log.append("tópic", "key", [b"three"]) == range(2, 3)
+
+    entries = read_all(log)
+    assert [(e.sequence, e.topic, e.ordering_key, e.message) for e in entries] == [
+        (0, "topic", "", b"one"),
+        (1, "topic", "", b"two"),
+        (2, "tópic", "key", b"three"),
+    ]
+    assert log.read(log.appended) is None
+
+
+def test_log_read_limit(tmp_path):
+    log = SegmentLog(str(tmp_path), 1024)
+    log.append("topic", "", [b"one", b"two"])
+
+    assert log.read(1).message == b"one"
+    assert log.read(1) is None
+    assert log.read(2).message == b"two"
+
+
+def test_log_segments_deleted_once_acked(tmp_path):
+    log = SegmentLog(str(tmp_path), 64)
+    for index in range(4):
+        log.append("topic", "", [b"x" * 30])
+    entries = read_all(log)
+    assert len(segment_files(tmp_path)) == 4
+
+    for entry in entries[:2]:
+        log.ack(entry)
+    assert len(segment_files(tmp_path)) == 2
+
+    # The segment still appended to is kept.
+    for entry in entries[2:]:
+        log.ack(entry)
+    assert segment_files(tmp_path) == ["00000000000000000003.outbox"]
+
+
+def test_log_large_record_gets_own_segment(tmp_path):
+    log = SegmentLog(str(tmp_path), 64)
+    log.append("topic", "", [b"small", b"x" * 1000])
+
+    assert len(segment_files(tmp_path)) == 2
+    assert [entry.message for entry in read_all(log)] == [b"small", b"x" * 1000]
+
+
+def test_log_max_bytes(tmp_path):
+    log = SegmentLog(str(tmp_path), 64)
+    log.append("topic", "", [b"x" * 30], max_bytes=128)
+
+    # None of the messages are appended if they do not all fit.
+    with pytest.raises(exceptions.FlowControlLimitError):
+        log.append("topic", "", [b"x" * 20, b"x" * 30, b"x" * 30], max_bytes=128)
+    assert log.appended == 1
+
+    log.append("topic", "", [b"x" * 20], max_bytes=128)
+    assert log.appended == 2
+
+
+def test_log_replay(tmp_path):
+    log = SegmentLog(str(tmp_path), 64)
+    log.append("topic", "key", [b"x" * 30, b"y" * 30, b"z"])
+    entries = read_all(log)
+    log.ack(entries[0])
+    log.close()
+
+    replayed = SegmentLog(str(tmp_path), 64)
+
+    assert replayed.appended == 2
+    assert [entry.message for entry in read_all(replayed)] == [b"y" * 30, b"z"]
+    replayed.append("topic", "", [b"new"])
+    assert read_all(replayed)[0].message == b"new"
+    assert segment_files(tmp_path)[-1] == "00000000000000000003.outbox"
+
+
+def test_log_replay_skips_acked_records(tmp_path):
+    log = SegmentLog(str(tmp_path), 1024)
+    log.append("topic", "", [b"one", b"two", b"three"])
+    entries = read_all(log)
+    # Only the records published in order are skipped by the replay.
+    log.ack(entries[0])
+    log.ack(entries[2])
+    log.close()
+
+    replayed = SegmentLog(str(tmp_path), 1024)
+
+    assert replayed.appended == 2
+    entries = read_all(replayed)
+    assert [entry.message for entry in entries] == [b"two", b"three"]
+    replayed.ack(entries[0])
+    replayed.close()
+
+    assert [entry.message for entry in read_all(SegmentLog(str(tmp_path), 1024))] == [
+        b"three"
+    ]
+
+
+def test_log_preallocates_segments(tmp_path):
+    unsupported = OSError(errno.EOPNOTSUPP, "Not supported.")
+    with mock.patch.object(
+        _outbox.os, "posix_fallocate", side_effect=unsupported, create=True
+    ):
+        log = SegmentLog(str(tmp_path), 100000)
+        log.append("topic", "", [b"one"])
+
+    (name,) = segment_files(tmp_path)
+    assert os.path.getsize(os.path.join(str(tmp_path), name)) == 100000
+    assert [entry.message for entry in read_all(log)] == [b"one"]
+
+
+def test_log_append_fails_without_space(tmp_path):
+    log = SegmentLog(str(tmp_path), 64)
+    log.append("topic", "", [b"x" * 30])
+    preallocate = _outbox._preallocate
+    calls = []
+
+    def preallocate_until_full(fd, size):
+        calls.append(size)
+        if len(calls) > 1:
+            raise OSError(errno.ENOSPC, "No space left on device.")
+        preallocate(fd, size)
+
+    with mock.patch.object(_outbox, "_preallocate", preallocate_until_full):
+        with pytest.raises(OSError):
+            log.append("topic", "", [b"x" * 30, b"x" * 30])
+
+    # None of the records are appended, and the new segments are removed.
+    assert log.appended == 1
+    assert len(segment_files(tmp_path)) == 1
+    log.append("topic", "", [b"x" * 30])
+    assert [entry.message for entry in read_all(log)] == [b"x" * 30] * 2
+
+
+def test_log_replay_stops_at_corrupt_record(tmp_path):
+    log = SegmentLog(str(tmp_path), 1024)
+    log.append("topic", "", [b"one", b"two", b"three"])
+    log.close()
+
+    # Corrupt the payload of the second record.
+    (name,) = segment_files(tmp_path)
+    with open(os.path.join(str(tmp_path), name), "r+b") as segment_file:
+        data = segment_file.read()
+        segment_file.seek(data.index(b"two"))
+        segment_file.write(b"TWO")
+
+    replayed = SegmentLog(str(tmp_path), 1024)
+    assert [entry.message for entry in read_all(replayed)] == [b"one"]
+
+
+def test_log_replay_deletes_empty_segments(tmp_path):
+    SegmentLog(str(tmp_path), 1024).append("topic", "", [])
+    open(os.path.join(str(tmp_path), "00000000000000000007.outbox"), "wb").close()
+
+    log = SegmentLog(str(tmp_path), 1024)
+
+    assert log.appended == 0
+    assert segment_files(tmp_path) == []
+    log.append("topic", "", [b"one"])
+    assert segment_files(tmp_path) == ["00000000000000000008.outbox"]
+
+
+def test_invalid_settings(tmp_path):
+    with pytest.raises(ValueError):
+        create_outbox(tmp_path, segment_bytes=0)
+    with pytest.raises(ValueError):
+        create_outbox(tmp_path, byte_limit=0)
+
+
+def test_outbox_group_commit(tmp_path):
+    outbox = create_outbox(tmp_path)
+    flushed = threading.Event()
+    flushes = []
+
+    def flush(segment, start, end):
+        flushes.append((start, end))
+        flushed.wait(timeout=5)
+
+    with mock.patch(
+        "google.cloud.pubsub_v1.publisher._outbox._Segment.flush",
+        autospec=True,
+        side_effect=flush,
+    ):
+        first = threading.Thread(
+            target=outbox.append, args=("topic", "", [b"one"], [None])
+        )
+        first.start()
+        wait_for(lambda: flushes)
+
+        # Appended while the first record is flushed, both later records are
+        # flushed together.
+        others = [
+            threading.Thread(
+                target=outbox.append, args=("topic", "", [message], [None])
+            )
+            for message in (b"two", b"three")
+        ]
+        for thread in others:
+            thread.start()
+        wait_for(lambda: outbox._log.appended == 3)
+        flushed.set()
+
+        for thread in [first] + others:
+            thread.join(timeout=5)
+
+    assert len(flushes) == 2
+    assert flushes[1][0] == flushes[0][1]
+    assert outbox._durable == 3
+    outbox.stop()
+
+
+def test_outbox_drains_within_byte_limit(tmp_path):
+    outbox = create_outbox(tmp_path, byte_limit=10)
+    publish = outbox._client._publish_from_outbox
+    publish_futures = []
+
+    def publish_from_outbox(topic, message, ordering_key):
+        publish_futures.append(futures.Future())
+        return publish_futures[-1]
+
+    publish.side_effect = publish_from_outbox
+    callbacks = [mock.Mock() for _ in range(3)]
+
+    outbox.append("topic", "key", [b"x" * 6, b"y" * 6, b"z" * 6], callbacks)
+
+    wait_for(lambda: publish.call_count == 2)
+    threading.Event().wait(0.05)
+    assert publish.call_count == 2
+    publish.assert_called_with("topic", b"y" * 6, "key")
+
+    publish_futures[0].set_result("1")
+    wait_for(lambda: publish.call_count == 3)
+    callbacks[0].assert_called_once_with("1", None)
+
+    error = core_exceptions.InvalidArgument("bad")
+    publish_futures[1].set_exception(error)
+    publish_futures[2].set_result("3")
+    callbacks[1].assert_called_once_with(None, error)
+    callbacks[2].assert_called_once_with("3", None)
+
+    # The messages that failed are removed from the outbox as well.
+    outbox.append("topic", "", [b"last"], [None])
+    wait_for(lambda: publish.call_count == 4)
+    assert len(segment_files(tmp_path)) == 1
+    outbox.stop()
+
+
+def test_outbox_keeps_messages_failing_temporarily(tmp_path):
+    outbox = create_outbox(tmp_path)
+    publish = outbox._client._publish_from_outbox
+    publish_futures = []
+
+    def publish_from_outbox(topic, message, ordering_key):
+        publish_futures.append(futures.Future())
+        return publish_futures[-1]
+
+    publish.side_effect = publish_from_outbox
+    callback = mock.Mock()
+
+    outbox.append("topic", "key", [b"cancelled"], [callback])
+    wait_for(lambda: publish.call_count == 1)
+    error = RuntimeError("Batch cancelled.")
+    publish_futures[0].set_exception(error)
+
+    callback.assert_called_once_with(None, error)
+    wait_for(lambda: not outbox._in_flight_count)
+    outbox.stop()
+    log = SegmentLog(str(tmp_path), 1024)
+    assert [entry.message for entry in read_all(log)] == [b"cancelled"]
+    log.close()
+
+
+def test_outbox_stop_keeps_messages(tmp_path):
+    outbox = create_outbox(tmp_path, byte_limit=1)
+    publish = outbox._client._publish_from_outbox
+    callbacks = [mock.Mock() for _ in range(2)]
+
+    outbox.append("topic", "", [b"one", b"two"], callbacks)
+    wait_for(lambda: publish.call_count == 1)
+    outbox.stop()
+
+    callbacks[0].assert_not_called()
+    ((_, exception),) = [call.args for call in callbacks[1].mock_calls]
+    assert isinstance(exception, RuntimeError)
+    with pytest.raises(RuntimeError):
+        outbox.append("topic", "", [b"three"], [None])
+
+    replayed = create_outbox(tmp_path)
+    wait_for(lambda: replayed._client._publish_from_outbox.call_count == 2)
+    replayed.stop()
+
+
+def test_outbox_without_sync(tmp_path):
+    outbox = create_outbox(tmp_path, sync=False)
+
+    with mock.patch(
+        "google.cloud.pubsub_v1.publisher._outbox._Segment.flush", autospec=True
+    ) as flush:
+        outbox.append("topic", "", [b"one"], [None])
+
+    flush.assert_not_called()
+    wait_for(lambda: outbox._client._publish_from_outbox.call_count == 1)
+    outbox.stop()
+
+
+def test_client_publishes_through_outbox(tmp_path):
+    client = create_client(tmp_path)
+    published = []
+    client._serialized_publish_rpc = fake_publish_rpc(published)
+
+    future = client.publish("topic", b"foo", attr="value")
+    raw_future = client.publish_raw(
+        "topic", gapic_types.PubsubMessage.serialize(types.PubsubMessage(data=b"raw"))
+    )
+    bulk_future = client.publish_many("topic", [(b"bar", {}), (b"baz", {})])
+
+    assert future.result(timeout=5) == "1"
+    assert raw_future.result(timeout=5) == "2"
+    assert bulk_future.result(timeout=5) == ["3", "4"]
+    assert published == [b"foo", b"raw", b"bar", b"baz"]
+    assert isinstance(future, futures.MessageFuture)
+    assert isinstance(raw_future, futures.MessageFuture)
+    client.stop()
+
+
+def test_client_replays_outbox(tmp_path):
+    log = SegmentLog(str(tmp_path), 1024)
+    log.append(
+        "topic", "", [types.PubsubMessage.pb()(data=b"left").SerializeToString()]
+    )
+    log.close()
+
+    published = []
+    with mock.patch(
+        "google.cloud.pubsub_v1.publisher.client._raw_rpc.RawUnaryRpc",
+        return_value=fake_publish_rpc(published),
+    ):
+        client = create_client(tmp_path)
+
+    wait_for(lambda: not segment_files(tmp_path))
+    assert published == [b"left"]
+    client.stop()
+
+
+def test_client_stop_keeps_cancelled_ordered_messages(tmp_path):
+    client = create_client(tmp_path, enable_message_ordering=True)
+    unblock = threading.Event()
+    published = []
+    publish = fake_publish_rpc(published)
+
+    def blocking_publish_rpc(*args, **kwargs):
+        unblock.wait(timeout=5)
+        return publish(*args, **kwargs)
+
+    client._serialized_publish_rpc = blocking_publish_rpc
+    first = client.publish("topic", b"a", ordering_key="k")
+    wait_for(lambda: client._commit_executor._num_workers)
+    second = client.publish("topic", b"b", ordering_key="k")
+    # Both messages are handed over to the client before it is stopped.
+    wait_for(lambda: client._outbox._in_flight_count == 2)
+
+    client.stop()
+    unblock.set()
+
+    assert first.result(timeout=5) == "1"
+    assert isinstance(second.exception(timeout=5), RuntimeError)
+    assert published == [b"a"]
+    wait_for(lambda: not client._outbox._in_flight_count)
+    log = SegmentLog(str(tmp_path), 1024)
+    entries = read_all(log)
+    assert len(entries) == 1
+    assert types.PubsubMessage.pb().FromString(entries[0].message).data == b"b"
+    log.close()
+
+
+def test_client_is_permanent_publish_error(tmp_path):
+    client = create_client(tmp_path)
+
+    assert client._is_permanent_publish_error(core_exceptions.InvalidArgument("x"))
+    assert not client._is_permanent_publish_error(
+        core_exceptions.ServiceUnavailable("x")
+    )
+    assert not client._is_permanent_publish_error(
+        exceptions.CircuitBreakerOpenError("x")
+    )
+    assert not client._is_permanent_publish_error(RuntimeError("Cancelled."))
+    assert not client._is_permanent_publish_error(
+        exceptions.PublishToPausedOrderingKeyException("k")
+    )
+    client.stop()
+
+
+def test_client_outbox_full(tmp_path):
+    creds = mock.Mock(spec=credentials.Credentials)
+    options = types.PublisherOptions(
+        outbox=types.OutboxSettings(str(tmp_path), segment_bytes=64, max_bytes=64)
+    )
+    client = publisher.Client(credentials=creds, publisher_options=options)
+
+    future = client.publish("topic", b"x" * 100)
+    bulk_future = client.publish_many("topic", [(b"x" * 100, {})])
+
+    assert isinstance(future, futures.MessageFuture)
+    assert isinstance(future.exception(), exceptions.FlowControlLimitError)
+    assert isinstance(bulk_future.exception(), exceptions.FlowControlLimitError)
+    client.stop()
+
+
+def test_client_outbox_rejects_custom_retry(tmp_path):
+    client = create_client(tmp_path)
+
+    with pytest.raises(ValueError):
+        client.publish("topic", b"foo", retry=retries.Retry())
+    with pytest.raises(ValueError):
+        client.publish_many("topic", [(b"foo", {})], retry=None)
+    client.stop()
+
+
+def test_client_outbox_with_fire_and_forget(tmp_path):
+    with pytest.raises(ValueError):
+        create_client(tmp_path, fire_and_forget=types.FireAndForgetSettings())
+
+
+def test_client_outbox_infinite_retry(tmp_path):
+    client = create_client(tmp_path)
+
+    retry = client._get_commit_retry(retries.Retry(deadline=60))
+
+    assert retry._deadline == 2.0**32
+    client.stop()
@@ -0,0 +1,394 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+
+import asyncio
+import threading
+
+import mock
+import pytest
+
+from google.api_core import exceptions as core_exceptions
+from google.api_core import gapic_v1
+from google.api_core import retry_async
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import async_client
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher._batch import aio
+from google.pubsub_v1 import types as gapic_types
+
+TOPIC = "projects/projectID/topics/topicID"
+
+
+def create_client(creds, ordering=False, **batch_settings):
+    options = types.PublisherOptions(enable_message_ordering=ordering)
+    batch_settings.setdefault("max_latency", 0.01)
+    return publisher.AsyncClient(
+        credentials=creds,
+        batch_settings=types.BatchSettings(**batch_settings),
+        publisher_options=options,
+    )
+
+
+def patch_publish_rpc(client, side_effect=None):
+    """Mock the publish RPC, echoing the message data as the message IDs."""
+
+    async def publish(topic, messages, retry=gapic_v1.method.DEFAULT):
+        return gapic_types.PublishResponse(
+            message_ids=[message.data.decode() for message in messages]
+        )
+
+    return mock.patch.object(client, "_publish_rpc", side_effect=side_effect or publish)
+
+
+def test_init(creds):
+    client = publisher.AsyncClient(credentials=creds)
+
+    assert isinstance(
+        client.api, async_client.publisher_async_client.PublisherAsyncClient
+    )
+    assert client.target == "pubsub.googleapis.com:443"
+    assert client.batch_settings == types.BatchSettings()
+    assert client._batch_class is aio.Batch
+
+
+def test_init_fire_and_forget_not_supported(creds):
+    options = types.PublisherOptions(fire_and_forget=types.FireAndForgetSettings())
+    with pytest.raises(ValueError):
+        publisher.AsyncClient(credentials=creds, publisher_options=options)
+
+
+def test_init_payload_compression_not_supported(creds):
+    options = types.PublisherOptions(
+        payload_compression=types.PayloadCompressionSettings()
+    )
+    with pytest.raises(ValueError):
+        publisher.AsyncClient(credentials=creds, publisher_options=options)
+
+
+def test_init_envelope_packing_not_supported(creds):
+    options = types.PublisherOptions(envelope_packing=types.EnvelopePackingSettings())
+    with pytest.raises(ValueError):
+        publisher.AsyncClient(credentials=creds, publisher_options=options)
+
+
+def test_init_topic_settings_not_supported(creds):
+    options = types.PublisherOptions(
+        topic_settings={"topic": types.TopicSettings(types.BatchSettings())}
+    )
+    with pytest.raises(ValueError):
+        publisher.AsyncClient(credentials=creds, publisher_options=options)
+
+
+def test_init_retry_control_not_supported(creds):
+    for options in (
+        types.PublisherOptions(retry_budget=types.RetryBudgetSettings()),
+        types.PublisherOptions(circuit_breaker=types.CircuitBreakerSettings()),
+    ):
+        with pytest.raises(ValueError):
+            publisher.AsyncClient(credentials=creds, publisher_options=options)
+
+
+def test_init_hedging_not_supported(creds):
+    options = types.PublisherOptions(hedging=types.HedgingSettings())
+    with pytest.raises(ValueError):
+        publisher.AsyncClient(credentials=creds, publisher_options=options)
+
+
+def test_init_outbox_not_supported(creds, tmp_path):
+    options = types.PublisherOptions(outbox=types.OutboxSettings(str(tmp_path)))
+    with pytest.raises(ValueError):
+        publisher.AsyncClient(credentials=creds, publisher_options=options)
+
+
+def test_init_spill_not_supported(creds, tmp_path):
+    options = types.PublisherOptions(spill=types.SpillSettings(str(tmp_path)))
+    with pytest.raises(ValueError):
+        publisher.AsyncClient(credentials=creds, publisher_options=options)
+
+
+def test_gapic_instance_method(creds):
+    client = publisher.AsyncClient(credentials=creds)
+    assert client.topic_path("foo", "bar") == "projects/foo/topics/bar"
+    assert client.get_topic.__name__ == "get_topic"
+
+
+@pytest.mark.asyncio
+async def test_publish(creds):
+    client = create_client(creds)
+
+    with patch_publish_rpc(client) as publish_rpc:
+        future1 = await client.publish(TOPIC, b"1")
+        future2 = await client.publish(TOPIC, b"2", foo="bar", baz=b"quux")
+
+        assert isinstance(future1, asyncio.Future)
+        assert await asyncio.gather(future1, future2) == ["1", "2"]
+
+    publish_rpc.assert_called_once()
+    topic, messages = publish_rpc.call_args[0]
+    assert topic == TOPIC
+    assert messages[1].attributes == {"foo": "bar", "baz": "quux"}
+
+
+@pytest.mark.asyncio
+async def test_publish_commits_full_batches(creds):
+    client = create_client(creds, max_messages=1, max_latency=float("inf"))
+
+    with patch_publish_rpc(client) as publish_rpc:
+        futures = [await client.publish(TOPIC, str(i).encode()) for i in range(3)]
+        assert await asyncio.gather(*futures) == ["0", "1", "2"]
+
+    assert publish_rpc.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_publish_does_not_start_threads(creds):
+    client = create_client(creds)
+    threads_before = threading.active_count()
+
+    with patch_publish_rpc(client):
+        future = await client.publish(TOPIC, b"1")
+        await future
+
+    assert threading.active_count() == threads_before
+
+
+@pytest.mark.asyncio
+async def test_publish_data_not_bytestring_error(creds):
+    client = create_client(creds)
+
+    with pytest.raises(TypeError):
+        await client.publish(TOPIC, "This is a text string.")
+
+    with pytest.raises(TypeError):
+        await client.publish(TOPIC, b"foo", bad=42)
+
+
+@pytest.mark.asyncio
+async def test_publish_with_ordering_key_when_disabled(creds):
+    client = create_client(creds)
+
+    with pytest.raises(ValueError):
+        await client.publish(TOPIC, b"foo", ordering_key="key")
+
+
+@pytest.mark.asyncio
+async def test_publish_error_fails_future(creds):
+    client = create_client(creds)
+    error = core_exceptions.PermissionDenied("Nope.")
+
+    with patch_publish_rpc(client, side_effect=error):
+        future = await client.publish(TOPIC, b"1")
+        with pytest.raises(core_exceptions.PermissionDenied):
+            await future
+
+
+@pytest.mark.asyncio
+async def test_publish_releases_flow_control(creds):
+    client = create_client(creds)
+
+    with patch_publish_rpc(client):
+        with mock.patch.object(client._flow_controller, "release") as release:
+            future = await client.publish(TOPIC, b"1")
+            await future
+            await asyncio.sleep(0)
+
+    release.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_publish_flow_control_error(creds):
+    client = create_client(creds)
+    error = exceptions.FlowControlLimitError("Too much.")
+
+    with mock.patch.object(client._flow_controller, "add", side_effect=error):
+        future = await client.publish(TOPIC, b"1")
+
+    assert future.exception() is error
+
+
+@pytest.mark.asyncio
+async def test_publish_ordered_messages(creds):
+    client = create_client(creds, ordering=True)
+    in_flight = set()
+
+    async def publish(topic, messages, retry=gapic_v1.method.DEFAULT):
+        key = messages[0].ordering_key
+        # Only one batch per ordering key is published at any time.
+        assert key not in in_flight
+        in_flight.add(key)
+        await asyncio.sleep(0.01)
+        in_flight.discard(key)
+        return gapic_types.PublishResponse(
+            message_ids=[message.data.decode() for message in messages]
+        )
+
+    with patch_publish_rpc(client, side_effect=publish) as publish_rpc:
+        futures = []
+        for i in range(6):
+            key = "key{}".format(i % 2)
+            futures.append(await client.publish(TOPIC, str(i).encode(), key))
+            await asyncio.sleep(0.005)
+
+        assert await asyncio.gather(*futures) == [str(i) for i in range(6)]
+
+    for call in publish_rpc.call_args_list:
+        # The retry deadline is infinite with message ordering.
+        assert call[1]["retry"]._deadline == 2.0**32
+
+
+@pytest.mark.asyncio
+async def test_publish_paused_ordering_key(creds):
+    client = create_client(creds, ordering=True)
+    error = core_exceptions.PermissionDenied("Nope.")
+
+    with patch_publish_rpc(client, side_effect=error):
+        future = await client.publish(TOPIC, b"1", ordering_key="key")
+        with pytest.raises(core_exceptions.PermissionDenied):
+            await future
+
+    future = await client.publish(TOPIC, b"2", ordering_key="key")
+    assert isinstance(future, asyncio.Future)
+    with pytest.raises(exceptions.PublishToPausedOrderingKeyException):
+        await future
+
+    client.resume_publish(TOPIC, "key")
+    with patch_publish_rpc(client):
+        future = await client.publish(TOPIC, b"3", ordering_key="key")
+        assert await future == "3"
+
+
+@pytest.mark.asyncio
+async def test_finished_sequencer_cleaned_up(creds):
+    client = create_client(creds, ordering=True)
+
+    with patch_publish_rpc(client):
+        future = await client.publish(TOPIC, b"1", ordering_key="key")
+        await future
+
+    await asyncio.sleep(0.05)
+    assert not client._sequencers
+
+
+def test_resume_publish_errors(creds):
+    client = create_client(creds)
+
+    with pytest.raises(ValueError):
+        client.resume_publish(TOPIC, "key")
+
+
+@pytest.mark.asyncio
+async def test_max_outstanding_rpcs(creds):
+    options = types.PublisherOptions(
+        concurrency_control=types.PublishConcurrencyControl(max_outstanding_rpcs=1)
+    )
+    client = publisher.AsyncClient(
+        credentials=creds,
+        batch_settings=types.BatchSettings(max_messages=1),
+        publisher_options=options,
+    )
+    running = []
+    max_running = []
+
+    async def publish(*args, **kwargs):
+        running.append(1)
+        max_running.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return gapic_types.PublishResponse(message_ids=["id"])
+
+    with mock.patch.object(client.api, "publish", side_effect=publish):
+        futures = [await client.publish(TOPIC, b"x") for _ in range(3)]
+        await asyncio.gather(*futures)
+
+    assert max(max_running) == 1
+
+
+@pytest.mark.asyncio
+async def test_publish_rpc_error_releases_rpc_limits(creds):
+    options = types.PublisherOptions(
+        concurrency_control=types.PublishConcurrencyControl(
+            max_outstanding_rpcs=1, max_outstanding_rpcs_per_topic=1
+        )
+    )
+    client = publisher.AsyncClient(credentials=creds, publisher_options=options)
+    client._bind_to_running_loop()
+    error = core_exceptions.InternalServerError("boom")
+
+    with mock.patch.object(client.api, "publish", side_effect=error):
+        for _ in range(2):
+            with pytest.raises(core_exceptions.InternalServerError):
+                await client._publish_rpc(TOPIC, [], retry=None)
+
+    assert not client._rpc_semaphore.locked()
+    assert not client._topic_rpc_semaphores[TOPIC].locked()
+
+
+@pytest.mark.asyncio
+async def test_publish_rpc_default_retry(creds):
+    client = create_client(creds)
+    client._bind_to_running_loop()
+    response = gapic_types.PublishResponse(message_ids=["1"])
+
+    with mock.patch.object(client.api, "publish", return_value=response) as publish:
+        assert await client._publish_rpc(TOPIC, []) is response
+
+    publish.assert_called_once_with(
+        topic=TOPIC, messages=[], retry=client._default_publish_retry
+    )
+
+    # The GAPIC default retry settings, as an asyncio retry.
+    transport = client.api._client._transport
+    gapic_retry = transport._wrapped_methods[transport.publish]._retry
+    default_retry = client._default_publish_retry
+    assert isinstance(default_retry, retry_async.AsyncRetry)
+    assert default_retry._predicate is gapic_retry._predicate
+    assert default_retry._deadline == gapic_retry._deadline
+
+
+@pytest.mark.asyncio
+async def test_stop(creds):
+    client = create_client(creds, max_latency=float("inf"))
+
+    with patch_publish_rpc(client):
+        future = await client.publish(TOPIC, b"1")
+        await client.stop()
+
+        # Stopping waits until the outstanding messages are published.
+        assert future.done()
+        assert future.result() == "1"
+
+    with pytest.raises(RuntimeError):
+        await client.publish(TOPIC, b"2")
+
+    with pytest.raises(RuntimeError):
+        await client.stop()
+
+    with pytest.raises(RuntimeError):
+        client.resume_publish(TOPIC, "key")
+
+
+def test_used_on_different_loops(creds):
+    client = create_client(creds)
+
+    async def publish():
+        with patch_publish_rpc(client):
+            await (await client.publish(TOPIC, b"1"))
+
+    asyncio.new_event_loop().run_until_complete(publish())
+
+    with pytest.raises(RuntimeError):
+        asyncio.new_event_loop().run_until_complete(publish())
@@ -15,21 +15,30 @@
 from __future__ import absolute_import
 from __future__ import division
 
+import gc
 import inspect
 
 import grpc
 
 import mock
 import pytest
+import threading
 import time
+import weakref
 
+from google.api_core import exceptions as core_exceptions
 from google.api_core import gapic_v1
 from google.api_core import retry as retries
 from google.api_core.gapic_v1.client_info import METRICS_METADATA_KEY
+from google.cloud.pubsub_v1 import _channel_pool
+from google.cloud.pubsub_v1 import codecs
 from google.cloud.pubsub_v1 import publisher
 from google.cloud.pubsub_v1 import types
 
 from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher import futures
+from google.cloud.pubsub_v1.publisher._batch import base
+from google.cloud.pubsub_v1.publisher._batch import thread
 from google.cloud.pubsub_v1.publisher._sequencer import ordered_sequencer
 
 from google.pubsub_v1 import types as gapic_types
@@ -50,6 +59,11 @@ def _assert_retries_equal(retry, retry2):
     assert inspect.getclosurevars(pred) == inspect.getclosurevars(pred2)
 
 
+def _encoded_message(**fields):
+    # The client hands the messages over to the batches already encoded.
+    return gapic_types.PubsubMessage.serialize(gapic_types.PubsubMessage(**fields))
+
+
 def test_init(creds):
     client = publisher.Client(credentials=creds)
 
@@ -189,10 +203,8 @@ def test_publish(creds):
     # Check mock.
     batch.publish.assert_has_calls(
         [
-            mock.call(gapic_types.PubsubMessage(data=b"spam")),
-            mock.call(
-                gapic_types.PubsubMessage(data=b"foo", attributes={"bar": "baz"})
-            ),
+            mock.call(_encoded_message(data=b"spam")),
+            mock.call(_encoded_message(data=b"foo", attributes={"bar": "baz"})),
         ]
     )
 
@@ -215,10 +227,20 @@ def test_publish_error_exceeding_flow_control_limits(creds):
     future2 = client.publish(topic, b"b" * 100)
 
     future1.result()  # no error, still within flow control limits
+    assert isinstance(future2, futures.MessageFuture)
     with pytest.raises(exceptions.FlowControlLimitError):
         future2.result()
 
 
+def test_publish_returns_publisher_future(creds):
+    client = publisher.Client(credentials=creds)
+
+    future = client.publish("topic/path", b"spam")
+
+    assert isinstance(future, futures.Future)
+    client.stop()
+
+
 def test_publish_data_not_bytestring_error(creds):
     client = publisher.Client(credentials=creds)
     topic = "topic/path"
@@ -283,6 +305,155 @@ def test_publish_with_ordering_key_uses_extended_retry_deadline(creds):
     _assert_retries_equal(batch_commit_retry, expected_retry)
 
 
+def test_publish_serialized(creds):
+    client = publisher.Client(credentials=creds)
+    transport = client.api._transport
+
+    response = gapic_types.PublishResponse(message_ids=["1"])
+    channel = mock.Mock(spec=["unary_unary"])
+    stub = channel.unary_unary.return_value
+    stub.return_value = response
+
+    request = gapic_types.PublishRequest(
+        topic="topic", messages=[gapic_types.PubsubMessage(data=b"foo")]
+    )._pb.SerializeToString()
+
+    with mock.patch.object(transport, "_grpc_channel", channel):
+        assert client._publish_serialized("topic", request) is response
+        assert client._publish_serialized("topic", request) is response
+
+    # The stub is created only once, it sends the request bytes as they are,
+    # and returns the raw protobuf response.
+    channel.unary_unary.assert_called_once_with(
+        "/google.pubsub.v1.Publisher/Publish",
+        request_serializer=None,
+        response_deserializer=gapic_types.PublishResponse.pb().FromString,
+    )
+    assert stub.call_count == 2
+    args, kwargs = stub.call_args
+    assert args == (request,)
+
+    # The metadata is built only once for each topic.
+    assert stub.call_args_list[0][1]["metadata"] is kwargs["metadata"]
+
+    # The same metadata as with the GAPIC client is sent, including the
+    # routing header.
+    metadata = kwargs["metadata"]
+    assert ("x-goog-request-params", "topic=topic") in metadata
+    assert any(key == METRICS_METADATA_KEY for key, _ in metadata)
+
+    # The default publish timeout is used.
+    gapic_rpc = transport._wrapped_methods[transport.publish]
+    assert kwargs["timeout"] == gapic_rpc._timeout
+
+
+def test_init_w_channel_pool(creds):
+    client_info = mock.Mock(spec=gapic_v1.client_info.ClientInfo)
+    client_info.to_grpc_metadata.return_value = ("x-goog-api-client", "info")
+    client = publisher.Client(
+        credentials=creds, channel_pool_size=3, client_info=client_info
+    )
+
+    channel = client.api._transport.grpc_channel
+    assert isinstance(channel, _channel_pool.ChannelPool)
+    assert len(channel.channels) == 3
+    assert client.target == publisher_client.PublisherClient.SERVICE_ADDRESS
+
+    # The pooled transport still sends the custom client info.
+    gapic_rpc = client.api._transport._wrapped_methods[client.api._transport.publish]
+    assert ("x-goog-api-client", "info") in gapic_rpc._metadata
+
+
+@pytest.mark.parametrize("pool_size", [0, -1])
+def test_init_w_invalid_channel_pool_size(creds, pool_size):
+    with pytest.raises(ValueError):
+        publisher.Client(credentials=creds, channel_pool_size=pool_size)
+
+
+def test_init_w_channel_pool_and_custom_transport(creds):
+    transport = PublisherGrpcTransport(credentials=creds)
+    with pytest.raises(ValueError):
+        publisher.Client(transport=transport, channel_pool_size=2)
+
+
+def test_publish_serialized_pinned(creds):
+    client = publisher.Client(credentials=creds, channel_pool_size=2)
+    channel = mock.create_autospec(_channel_pool.ChannelPool, instance=True)
+    stub = channel.unary_unary.return_value
+
+    with mock.patch.object(client.api._transport, "_grpc_channel", channel):
+        client._publish_serialized("topic", b"", pinned=True)
+        client._publish_serialized("topic", b"")
+
+    pinned_metadata = stub.call_args_list[0][1]["metadata"]
+    assert pinned_metadata[-1] == (_channel_pool.AFFINITY_METADATA_KEY, "topic")
+    metadata = stub.call_args_list[1][1]["metadata"]
+    assert all(key != _channel_pool.AFFINITY_METADATA_KEY for key, _ in metadata)
+
+
+def test_publish_serialized_pinned_without_channel_pool(creds):
+    client = publisher.Client(credentials=creds)
+    channel = mock.Mock(spec=["unary_unary"])
+    stub = channel.unary_unary.return_value
+
+    with mock.patch.object(client.api._transport, "_grpc_channel", channel):
+        client._publish_serialized("topic", b"", pinned=True)
+
+    metadata = stub.call_args[1]["metadata"]
+    assert all(key != _channel_pool.AFFINITY_METADATA_KEY for key, _ in metadata)
+
+
+def test_publish_serialized_compression(creds):
+    compression_settings = types.CompressionSettings(
+        publish=grpc.Compression.Gzip, min_request_bytes=10
+    )
+    client = publisher.Client(
+        credentials=creds, compression_settings=compression_settings
+    )
+    channel = mock.Mock(spec=["unary_unary"])
+    stub = channel.unary_unary.return_value
+
+    with mock.patch.object(client.api._transport, "_grpc_channel", channel):
+        client._publish_serialized("topic", b"x" * 10)
+        client._publish_serialized("topic", b"x" * 9)
+
+    assert stub.call_args_list[0][1]["compression"] == grpc.Compression.Gzip
+    assert "compression" not in stub.call_args_list[1][1]
+
+
+def test_publish_serialized_not_compressed_by_default(creds):
+    client = publisher.Client(credentials=creds)
+    channel = mock.Mock(spec=["unary_unary"])
+    stub = channel.unary_unary.return_value
+
+    with mock.patch.object(client.api._transport, "_grpc_channel", channel):
+        client._publish_serialized("topic", b"x" * 10000)
+
+    assert "compression" not in stub.call_args[1]
+
+
+def test_publish_serialized_custom_retry(creds):
+    client = publisher.Client(credentials=creds)
+    transport = client.api._transport
+
+    channel = mock.Mock(spec=["unary_unary"])
+    stub = channel.unary_unary.return_value
+    stub.side_effect = [
+        core_exceptions.ServiceUnavailable("try again"),
+        gapic_types.PublishResponse(message_ids=["1"]),
+    ]
+    retry = retries.Retry(
+        initial=0,
+        predicate=retries.if_exception_type(core_exceptions.ServiceUnavailable),
+    )
+
+    with mock.patch.object(transport, "_grpc_channel", channel):
+        response = client._publish_serialized("topic", b"", retry=retry)
+
+    assert response.message_ids == ["1"]
+    assert stub.call_count == 2
+
+
 def test_publish_attrs_bytestring(creds):
     client = publisher.Client(credentials=creds)
 
@@ -300,10 +471,62 @@ def test_publish_attrs_bytestring(creds):
 
     # The attributes should have been sent as text.
     batch.publish.assert_called_once_with(
-        gapic_types.PubsubMessage(data=b"foo", attributes={"bar": "baz"})
+        _encoded_message(data=b"foo", attributes={"bar": "baz"})
     )
 
 
+def test_publish_high_priority_commits_batch(creds):
+    client = publisher.Client(
+        credentials=creds,
+        batch_settings=types.BatchSettings(max_latency=float("inf")),
+    )
+    topic = "topic/path"
+
+    client.publish(topic, b"bulk")
+    batch = client._get_or_create_sequencer(topic, "")._current_batch
+    with mock.patch.object(batch, "commit") as commit:
+        client.publish(topic, b"urgent", priority=types.PublishPriority.HIGH)
+
+    commit.assert_called_once()
+    messages = [gapic_types.PubsubMessage.deserialize(m) for m in batch.messages]
+    assert [message.data for message in messages] == [b"bulk", b"urgent"]
+    assert client._get_or_create_sequencer(topic, "")._current_batch is None
+
+
+def test_publish_high_priority_skips_flow_control_waiters(creds):
+    flow_control = types.PublishFlowControl(
+        message_limit=1, limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK
+    )
+    client = publisher.Client(
+        credentials=creds,
+        publisher_options=types.PublisherOptions(flow_control=flow_control),
+    )
+
+    with mock.patch.object(client._flow_controller, "_add_many") as add_many:
+        client.publish("topic/path", b"urgent", priority=types.PublishPriority.HIGH)
+        client.publish("topic/path", b"bulk")
+
+    assert add_many.call_args_list == [
+        mock.call(1, mock.ANY, priority=True),
+        mock.call(1, mock.ANY, priority=False),
+    ]
+
+
+def test_publish_priority_attribute(creds):
+    client = publisher.Client(credentials=creds)
+    batch = mock.Mock(spec=client._batch_class)
+    topic = "topic/path"
+    client._set_batch(topic, batch)
+
+    # A priority that is not a PublishPriority is an attribute.
+    client.publish(topic, b"foo", priority="high")
+
+    batch.publish.assert_called_once_with(
+        _encoded_message(data=b"foo", attributes={"priority": "high"})
+    )
+    batch.commit.assert_not_called()
+
+
 def test_publish_new_batch_needed(creds):
     client = publisher.Client(credentials=creds)
 
@@ -338,7 +561,7 @@ def test_publish_new_batch_needed(creds):
         commit_when_full=True,
         commit_retry=gapic_v1.method.DEFAULT,
     )
-    message_pb = gapic_types.PubsubMessage(data=b"foo", attributes={"bar": "baz"})
+    message_pb = _encoded_message(data=b"foo", attributes={"bar": "baz"})
     batch1.publish.assert_called_once_with(message_pb)
     batch2.publish.assert_called_once_with(message_pb)
 
@@ -350,6 +573,374 @@ def test_publish_attrs_type_error(creds):
         client.publish(topic, b"foo", answer=42)
 
 
+def test_publish_reserved_attribute_error(creds):
+    client = publisher.Client(credentials=creds)
+    attrs = {codecs.ENCODING_ATTRIBUTE: "zlib"}
+    with pytest.raises(ValueError):
+        client.publish("topic/path", b"foo", **attrs)
+    with pytest.raises(ValueError):
+        client.publish_many("topic/path", [(b"foo", attrs)])
+    with pytest.raises(ValueError):
+        client.publish_many(
+            "topic/path", [gapic_types.PubsubMessage(data=b"foo", attributes=attrs)]
+        )
+
+
+def test_init_payload_compression(creds):
+    publisher_options = types.PublisherOptions(
+        payload_compression=types.PayloadCompressionSettings(codec="lzma", min_bytes=10)
+    )
+    client = publisher.Client(credentials=creds, publisher_options=publisher_options)
+
+    assert client._payload_codec is codecs.get_codec("lzma")
+    assert client._payload_min_bytes == 10
+
+
+def test_init_payload_compression_unknown_codec(creds):
+    publisher_options = types.PublisherOptions(
+        payload_compression=types.PayloadCompressionSettings(codec="unknown")
+    )
+    with pytest.raises(ValueError):
+        publisher.Client(credentials=creds, publisher_options=publisher_options)
+
+
+def _fake_publish_serialized(requests):
+    """Return a fake of Client._publish_serialized() that records the
+    published messages, and returns their data as message IDs."""
+
+    def publish_serialized(topic, request, retry=None, pinned=False, ordered=False):
+        messages = gapic_types.PublishRequest.deserialize(request).messages
+        requests.append([message.data for message in messages])
+        message_ids = [message.data.decode("utf-8") for message in messages]
+        return gapic_types.PublishResponse(message_ids=message_ids)
+
+    return publish_serialized
+
+
+def test_publish_raw(creds):
+    client = publisher.Client(credentials=creds)
+    requests = []
+
+    message = gapic_types.PubsubMessage(data=b"a", attributes={"foo": "bar"})
+    encoded = gapic_types.PubsubMessage.serialize(message)
+    with mock.patch.object(
+        client, "_publish_serialized", side_effect=_fake_publish_serialized(requests)
+    ):
+        future = client.publish_raw("topic/path", encoded)
+        assert future.result(timeout=5) == "a"
+
+    assert requests == [[b"a"]]
+
+
+def test_publish_raw_memoryview(creds):
+    client = publisher.Client(credentials=creds)
+
+    encoded = gapic_types.PubsubMessage.serialize(gapic_types.PubsubMessage(data=b"a"))
+    # A view of anything but bytes is cast to a view of bytes.
+    view = memoryview(encoded + b"\0").cast("H")
+    batch = mock.Mock(spec=client._batch_class)
+    client._set_batch("topic/path", batch)
+
+    client.publish_raw("topic/path", view)
+
+    published = batch.publish.call_args[0][0]
+    assert published.tobytes() == encoded + b"\0"
+    assert len(published) == len(encoded) + 1
+
+
+def test_publish_raw_flow_control(creds):
+    publisher_options = types.PublisherOptions(
+        flow_control=types.PublishFlowControl(
+            limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK
+        )
+    )
+    client = publisher.Client(credentials=creds, publisher_options=publisher_options)
+    batch = mock.Mock(spec=client._batch_class)
+    future = futures.Future()
+    batch.publish.return_value = future
+    client._set_batch("topic/path", batch)
+
+    client.publish_raw("topic/path", b"x" * 10)
+    assert client._flow_controller._message_count == 1
+    assert client._flow_controller._total_bytes == 10
+
+    future.set_result("a")
+    assert client._flow_controller._message_count == 0
+    assert client._flow_controller._total_bytes == 0
+
+
+def test_publish_raw_type_error(creds):
+    client = publisher.Client(credentials=creds)
+    with pytest.raises(TypeError):
+        client.publish_raw("topic/path", "text")
+
+
+def test_publish_raw_message_ordering_not_enabled_error(creds):
+    client = publisher.Client(credentials=creds)
+    with pytest.raises(ValueError):
+        client.publish_raw("topic/path", b"", ordering_key="ABC")
+
+
+def test_publish_many(creds):
+    batch_settings = types.BatchSettings(max_messages=2)
+    client = publisher.Client(credentials=creds, batch_settings=batch_settings)
+    requests = []
+
+    messages = [(b"a", {"foo": "bar"}), (b"b", {}), (b"c", None), (b"d", {})]
+    with mock.patch.object(
+        client, "_publish_serialized", side_effect=_fake_publish_serialized(requests)
+    ):
+        future = client.publish_many("topic/path", messages)
+        assert future.result(timeout=5) == ["a", "b", "c", "d"]
+
+    assert sorted(requests) == [[b"a", b"b"], [b"c", b"d"]]
+
+    # The flow control reservations are released.
+    assert client._flow_controller._message_count == 0
+    assert client._flow_controller._total_bytes == 0
+
+
+def test_publish_many_messages(creds):
+    client = publisher.Client(credentials=creds)
+    bulk_batch = mock.Mock(spec=thread.BulkBatch)
+    bulk_batch.fill.return_value = 3
+    bulk_batch._message_bytes = 0
+
+    messages = [
+        (b"foo", {"bar": b"baz"}),
+        gapic_types.PubsubMessage(data=b"spam"),
+        gapic_types.PubsubMessage(data=b"eggs")._pb,
+    ]
+    with mock.patch.object(thread, "BulkBatch", return_value=bulk_batch):
+        client.publish_many("topic/path", messages)
+
+    raw_messages = bulk_batch.fill.call_args[0][0]
+    assert raw_messages == [
+        gapic_types.PubsubMessage(data=b"foo", attributes={"bar": "baz"})._pb,
+        gapic_types.PubsubMessage(data=b"spam")._pb,
+        gapic_types.PubsubMessage(data=b"eggs")._pb,
+    ]
+    bulk_batch.commit.assert_called_once_with()
+
+
+def test_publish_many_type_errors(creds):
+    client = publisher.Client(credentials=creds)
+    with pytest.raises(TypeError):
+        client.publish_many("topic/path", [(u"foo", {})])
+    with pytest.raises(TypeError):
+        client.publish_many("topic/path", [(b"foo", {"answer": 42})])
+    # Every value is checked, also after a value that needs decoding.
+    with pytest.raises(TypeError, match="text strings"):
+        client.publish_many("topic/path", [(b"foo", {"a": b"1", "b": 2})])
+
+
+def test_publish_many_ordering_key_mismatch(creds):
+    publisher_options = types.PublisherOptions(enable_message_ordering=True)
+    client = publisher.Client(credentials=creds, publisher_options=publisher_options)
+    message = gapic_types.PubsubMessage(data=b"foo", ordering_key="other")
+
+    with pytest.raises(ValueError):
+        client.publish_many("topic/path", [message], ordering_key="key")
+
+
+def test_publish_many_message_ordering_not_enabled_error(creds):
+    client = publisher.Client(credentials=creds)
+    with pytest.raises(ValueError):
+        client.publish_many("topic/path", [(b"foo", {})], ordering_key="key")
+
+
+def test_publish_many_with_ordering_key(creds):
+    publisher_options = types.PublisherOptions(enable_message_ordering=True)
+    batch_settings = types.BatchSettings(max_messages=2, max_latency=float("inf"))
+    client = publisher.Client(
+        credentials=creds,
+        publisher_options=publisher_options,
+        batch_settings=batch_settings,
+    )
+    requests = []
+
+    with mock.patch.object(
+        client, "_publish_serialized", side_effect=_fake_publish_serialized(requests)
+    ):
+        future1 = client.publish("topic/path", b"a", ordering_key="key")
+        future2 = client.publish_many(
+            "topic/path", [(b"b", {}), (b"c", {}), (b"d", {})], ordering_key="key"
+        )
+        assert future2.result(timeout=5) == ["b", "c", "d"]
+        assert future1.result(timeout=5) == "a"
+
+    # The single message is published first, even though its batch was not
+    # full, and its max latency is infinite.
+    assert requests == [[b"a"], [b"b", b"c"], [b"d"]]
+
+
+def test_publish_many_error_exceeding_flow_control_limits(creds):
+    publisher_options = types.PublisherOptions(
+        flow_control=types.PublishFlowControl(
+            message_limit=2,
+            byte_limit=10000,
+            limit_exceeded_behavior=types.LimitExceededBehavior.ERROR,
+        )
+    )
+    client = publisher.Client(credentials=creds, publisher_options=publisher_options)
+    client._flow_controller._add_many(1, 10)
+    requests = []
+
+    with mock.patch.object(
+        client, "_publish_serialized", side_effect=_fake_publish_serialized(requests)
+    ):
+        future = client.publish_many("topic/path", [(b"a", {}), (b"b", {})])
+        with pytest.raises(exceptions.FlowControlLimitError):
+            future.result(timeout=5)
+
+    assert future.message_ids == [None, None]
+    assert requests == []
+
+
+def test_publish_many_message_too_large(creds):
+    client = publisher.Client(credentials=creds)
+    requests = []
+
+    data = b"x" * base.SERVER_PUBLISH_MAX_BYTES
+    messages = [(b"a", {}), (data, {}), (b"c", {})]
+    with mock.patch.object(
+        client, "_publish_serialized", side_effect=_fake_publish_serialized(requests)
+    ):
+        future = client.publish_many("topic/path", messages)
+        with pytest.raises(exceptions.MessageTooLargeError):
+            future.result(timeout=5)
+
+    assert future.message_ids == ["a", None, None]
+
+
+def test_publish_many_after_stop(creds):
+    client = publisher.Client(credentials=creds)
+    client.stop()
+
+    with pytest.raises(RuntimeError):
+        client.publish_many("topic/path", [(b"foo", {})])
+
+
+def _fire_and_forget_client(creds, error_callback=None, **publisher_options):
+    publisher_options = types.PublisherOptions(
+        fire_and_forget=types.FireAndForgetSettings(error_callback=error_callback),
+        flow_control=types.PublishFlowControl(
+            limit_exceeded_behavior=types.LimitExceededBehavior.BLOCK
+        ),
+        **publisher_options
+    )
+    return publisher.Client(credentials=creds, publisher_options=publisher_options)
+
+
+def _wait_for_publish_counts(client, message_count):
+    """Wait for the outcome of the given number of messages, stop() does not
+    block."""
+    deadline = time.monotonic() + 5
+    while sum(client.get_publish_counts()) < message_count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_publish_fire_and_forget(creds):
+    client = _fire_and_forget_client(creds)
+    requests = []
+
+    with mock.patch.object(
+        client, "_publish_serialized", side_effect=_fake_publish_serialized(requests)
+    ):
+        assert client.publish("topic/path", b"a") is None
+        assert client.publish("topic/path", b"b") is None
+        assert client._flow_controller._message_count == 2
+        client.stop()
+        _wait_for_publish_counts(client, 2)
+
+    assert requests == [[b"a", b"b"]]
+    assert client.get_publish_counts() == (2, 0)
+    assert client._flow_controller._message_count == 0
+    assert client._flow_controller._total_bytes == 0
+
+
+def test_publish_fire_and_forget_error(creds):
+    error_callback = mock.Mock()
+    client = _fire_and_forget_client(creds, error_callback=error_callback)
+    error = core_exceptions.InternalServerError("uh oh")
+
+    with mock.patch.object(client, "_publish_serialized", side_effect=error):
+        client.publish("topic/path", b"a")
+        client.publish("topic/path", b"b")
+        client.stop()
+        _wait_for_publish_counts(client, 2)
+
+    error_callback.assert_called_once_with("topic/path", error, 2)
+    assert client.get_publish_counts() == (0, 2)
+    assert client._flow_controller._message_count == 0
+
+
+def test_publish_fire_and_forget_error_callback_raises(creds):
+    error_callback = mock.Mock(side_effect=ValueError("oops"))
+    client = _fire_and_forget_client(creds, error_callback=error_callback)
+    error = core_exceptions.InternalServerError("uh oh")
+
+    with mock.patch.object(client, "_publish_serialized", side_effect=error):
+        client.publish("topic/path", b"a")
+        client.stop()
+        _wait_for_publish_counts(client, 1)
+
+    assert error_callback.called
+    assert client.get_publish_counts() == (0, 1)
+
+
+def test_publish_fire_and_forget_exceeding_flow_control_limits(creds):
+    error_callback = mock.Mock()
+    publisher_options = types.PublisherOptions(
+        fire_and_forget=types.FireAndForgetSettings(error_callback=error_callback),
+        flow_control=types.PublishFlowControl(
+            message_limit=1, limit_exceeded_behavior=types.LimitExceededBehavior.ERROR
+        ),
+    )
+    client = publisher.Client(credentials=creds, publisher_options=publisher_options)
+    client._flow_controller._add_many(1, 10)
+
+    assert client.publish("topic/path", b"a") is None
+
+    error_callback.assert_called_once_with("topic/path", mock.ANY, 1)
+    exc = error_callback.call_args[0][1]
+    assert isinstance(exc, exceptions.FlowControlLimitError)
+    assert client.get_publish_counts() == (0, 1)
+    assert client._flow_controller._message_count == 1
+
+
+def test_publish_fire_and_forget_paused_ordering_key(creds):
+    error_callback = mock.Mock()
+    client = _fire_and_forget_client(
+        creds, error_callback=error_callback, enable_message_ordering=True
+    )
+    sequencer = client._get_or_create_sequencer("topic/path", "key")
+    sequencer._state = ordered_sequencer._OrderedSequencerStatus.PAUSED
+
+    assert client.publish("topic/path", b"a", ordering_key="key") is None
+
+    exc = error_callback.call_args[0][1]
+    assert isinstance(exc, exceptions.PublishToPausedOrderingKeyException)
+    assert client.get_publish_counts() == (0, 1)
+    assert client._flow_controller._message_count == 0
+    assert client._flow_controller._total_bytes == 0
+
+
+def test_publish_counts_without_fire_and_forget(creds):
+    client = publisher.Client(credentials=creds)
+    assert client.get_publish_counts() == publisher.client.PublishCounts(0, 0)
+
+
+def test_ensure_cleanup_and_commit_timer_runs_deprecated(creds):
+    client = publisher.Client(credentials=creds)
+
+    with pytest.warns(DeprecationWarning):
+        client.ensure_cleanup_and_commit_timer_runs()
+
+    assert client._commit_timer._thread is None
+
+
 def test_stop(creds):
     client = publisher.Client(credentials=creds)
 
@@ -371,6 +962,64 @@ def test_stop(creds):
         client.stop()
 
 
+def test_get_batch_settings_static(creds):
+    batch_settings = types.BatchSettings(max_messages=10)
+    client = publisher.Client(credentials=creds, batch_settings=batch_settings)
+
+    assert client._batch_sizer is None
+    assert client.get_batch_settings("topic/path") is client.batch_settings
+
+
+def test_adaptive_batch_settings(creds):
+    publisher_options = types.PublisherOptions(
+        adaptive_batch_settings=types.AdaptiveBatchSettings()
+    )
+    client = publisher.Client(credentials=creds, publisher_options=publisher_options)
+    batch = mock.Mock(spec=client._batch_class)
+    future = mock.Mock(spec=["add_done_callback"])
+    batch.publish.return_value = future
+    client._set_batch("topic/path", batch)
+
+    with mock.patch.object(client._batch_sizer, "record_arrivals") as record:
+        client.publish("topic/path", b"foo")
+    record.assert_called_once_with("topic/path")
+
+    with mock.patch.object(
+        client._batch_sizer, "record_publish_latency"
+    ) as record_latency:
+        client._record_publish_latency("topic/path", 0.02)
+    record_latency.assert_called_once_with("topic/path", 0.02)
+
+    with mock.patch.object(
+        client._batch_sizer, "get_settings", return_value=mock.sentinel.settings
+    ) as get_settings:
+        assert client.get_batch_settings("topic/path") is mock.sentinel.settings
+    get_settings.assert_called_once_with("topic/path", client.batch_settings)
+
+
+def test_adaptive_batch_settings_applied_to_new_batches(creds):
+    publisher_options = types.PublisherOptions(
+        adaptive_batch_settings=types.AdaptiveBatchSettings()
+    )
+    client = publisher.Client(
+        credentials=creds,
+        publisher_options=publisher_options,
+        batch_settings=types.BatchSettings(max_latency=float("inf")),
+    )
+    settings = types.BatchSettings(max_latency=0.0, max_messages=1)
+
+    with mock.patch.object(client, "_publish_serialized") as publish_serialized:
+        publish_serialized.return_value = gapic_types.PublishResponse(message_ids=["1"])
+        with mock.patch.object(
+            client._batch_sizer, "get_settings", return_value=settings
+        ):
+            future = client.publish("topic/path", b"foo")
+
+        # The batch is full with a single message and is sent right away,
+        # despite the infinite max latency of the client.
+        assert future.result(timeout=5) == "1"
+
+
 def test_gapic_instance_method(creds):
     client = publisher.Client(credentials=creds)
 
@@ -413,76 +1062,86 @@ def test_gapic_class_method_on_instance(creds):
     assert answer == "projects/foo/topics/bar"
 
 
-def test_commit_thread_created_on_publish(creds):
-    # Max latency is not infinite so a commit thread is created.
+def test_commit_scheduled_on_publish(creds):
     batch_settings = types.BatchSettings(max_latency=600)
     client = publisher.Client(batch_settings=batch_settings, credentials=creds)
 
-    with mock.patch.object(
-        client, "_start_commit_thread", autospec=True
-    ) as _start_commit_thread:
-        # First publish should create a commit thread.
+    with mock.patch.object(client._commit_timer, "schedule") as schedule:
+        # First publish opens a new batch, which schedules its commit.
         assert client.publish("topic", b"bytestring body", ordering_key="") is not None
-        _start_commit_thread.assert_called_once()
+        schedule.assert_called_once()
+        delay, callback = schedule.call_args[0]
+        assert delay == 600
 
-        # Since _start_commit_thread is a mock, no actual thread has been
-        # created, so let's put a sentinel there to mimic real behavior.
-        client._commit_thread = mock.Mock()
-
-        # Second publish should not create a commit thread since one (the mock)
-        # already exists.
+        # Second publish goes into the same batch, nothing new is scheduled.
         assert client.publish("topic", b"bytestring body", ordering_key="") is not None
-        # Call count should remain 1.
-        _start_commit_thread.assert_called_once()
+        schedule.assert_called_once()
+
+    # The scheduled callback commits the batch that was opened.
+    batch = client._sequencers[("topic", "")]._current_batch
+    with mock.patch.object(batch, "commit") as commit:
+        callback()
+    commit.assert_called_once_with()
 
 
-def test_commit_thread_not_created_on_publish_if_max_latency_is_inf(creds):
-    # Max latency is infinite so a commit thread is not created.
+def test_commit_timer_does_not_keep_committed_batch_alive(creds):
+    batch_settings = types.BatchSettings(max_messages=1, max_latency=600)
+    client = publisher.Client(batch_settings=batch_settings, credentials=creds)
+    client._serialized_publish_rpc = mock.Mock(
+        return_value=gapic_types.PublishResponse.pb()(message_ids=["1"])
+    )
+
+    future = client.publish("topic", b"bytestring body")
+    batch_ref = weakref.ref(client._sequencers[("topic", "")]._current_batch)
+    assert future.result(timeout=5) == "1"
+    # The next message opens a new batch.
+    client.publish("topic", b"bytestring body").result(timeout=5)
+    gc.collect()
+
+    # The full batches were committed right away, their commits are still due.
+    assert len(client._commit_timer) == 2
+    assert batch_ref() is None
+    client.stop()
+
+
+def test_commit_timer_not_started_on_publish_if_max_latency_is_inf(creds):
+    # Max latency is infinite so a commit timer thread is not created.
     batch_settings = types.BatchSettings(max_latency=float("inf"))
     client = publisher.Client(batch_settings=batch_settings, credentials=creds)
 
     assert client.publish("topic", b"bytestring body", ordering_key="") is not None
-    assert client._commit_thread is None
+    assert client._commit_timer._thread is None
+    assert len(client._commit_timer) == 0
 
 
-def test_wait_and_commit_sequencers(creds):
-    # Max latency is infinite so a commit thread is not created.
-    # We don't want a commit thread to interfere with this test.
-    batch_settings = types.BatchSettings(max_latency=float("inf"))
+def test_batch_committed_after_max_latency(creds):
+    batch_settings = types.BatchSettings(max_latency=0.05)
     client = publisher.Client(batch_settings=batch_settings, credentials=creds)
 
-    # Mock out time so no sleep is actually done.
-    with mock.patch.object(time, "sleep"):
-        with mock.patch.object(client, "_commit_sequencers") as _commit_sequencers:
-            assert (
-                client.publish("topic", b"bytestring body", ordering_key="") is not None
-            )
-            # Call _wait_and_commit_sequencers to simulate what would happen if a
-            # commit thread actually ran.
-            client._wait_and_commit_sequencers()
-            assert _commit_sequencers.call_count == 1
-
-
-def test_stopped_client_does_not_commit_sequencers(creds):
-    # Max latency is infinite so a commit thread is not created.
-    # We don't want a commit thread to interfere with this test.
-    batch_settings = types.BatchSettings(max_latency=float("inf"))
+    committed = threading.Event()
+    with mock.patch.object(client._batch_class, "commit", autospec=True) as commit:
+        commit.side_effect = lambda batch: committed.set()
+        start = time.monotonic()
+        client.publish("topic", b"bytestring body")
+
+        assert committed.wait(timeout=5.0)
+
+    assert time.monotonic() - start >= 0.05
+    commit.assert_called_once()
+
+
+def test_stopped_client_stops_commit_timer(creds):
+    batch_settings = types.BatchSettings(max_latency=600)
     client = publisher.Client(batch_settings=batch_settings, credentials=creds)
 
-    # Mock out time so no sleep is actually done.
-    with mock.patch.object(time, "sleep"):
-        with mock.patch.object(client, "_commit_sequencers") as _commit_sequencers:
-            assert (
-                client.publish("topic", b"bytestring body", ordering_key="") is not None
-            )
+    assert client.publish("topic", b"bytestring body", ordering_key="") is not None
+    assert len(client._commit_timer) == 1
 
-            client.stop()
+    client.stop()
 
-            # Call _wait_and_commit_sequencers to simulate what would happen if a
-            # commit thread actually ran after the client was stopped.
-            client._wait_and_commit_sequencers()
-            # Should not be called since Client is stopped.
-            assert _commit_sequencers.call_count == 0
+    # The batch was committed on stop, the timer has nothing more to do.
+    assert client._commit_timer._stopped
+    assert len(client._commit_timer) == 0
 
 
 def test_publish_with_ordering_key(creds):
@@ -514,9 +1173,9 @@ def test_publish_with_ordering_key(creds):
     # Check mock.
     batch.publish.assert_has_calls(
         [
-            mock.call(gapic_types.PubsubMessage(data=b"spam", ordering_key="k1")),
+            mock.call(_encoded_message(data=b"spam", ordering_key="k1")),
             mock.call(
-                gapic_types.PubsubMessage(
+                _encoded_message(
                     data=b"foo", attributes={"bar": "baz"}, ordering_key="k1"
                 )
             ),
@@ -525,8 +1184,8 @@ def test_publish_with_ordering_key(creds):
 
 
 def test_ordered_sequencer_cleaned_up(creds):
-    # Max latency is infinite so a commit thread is not created.
-    # We don't want a commit thread to interfere with this test.
+    # Max latency is infinite so a commit timer is not created.
+    # We don't want a commit timer to interfere with this test.
     batch_settings = types.BatchSettings(max_latency=float("inf"))
     publisher_options = types.PublisherOptions(enable_message_ordering=True)
     client = publisher.Client(
@@ -543,12 +1202,38 @@ def test_ordered_sequencer_cleaned_up(creds):
 
     assert len(client._sequencers) == 1
     # 'sequencer' is not finished yet so don't remove it.
-    client._commit_sequencers()
+    client._remove_sequencer_if_finished(topic, ordering_key)
     assert len(client._sequencers) == 1
 
     sequencer.is_finished.return_value = True
     # 'sequencer' is finished so remove it.
-    client._commit_sequencers()
+    client._remove_sequencer_if_finished(topic, ordering_key)
+    assert len(client._sequencers) == 0
+
+    # Removing an unknown sequencer is a no-op.
+    client._remove_sequencer_if_finished(topic, ordering_key)
+
+
+def test_sequencer_cleanup_scheduled(creds):
+    batch_settings = types.BatchSettings(max_latency=5)
+    publisher_options = types.PublisherOptions(enable_message_ordering=True)
+    client = publisher.Client(
+        batch_settings=batch_settings,
+        publisher_options=publisher_options,
+        credentials=creds,
+    )
+
+    with mock.patch.object(client._commit_timer, "schedule") as schedule:
+        client._schedule_sequencer_cleanup("topic", "ord_key")
+
+    delay, callback = schedule.call_args[0]
+    assert delay == 5
+
+    sequencer = mock.Mock(spec=ordered_sequencer.OrderedSequencer)
+    sequencer.is_finished.return_value = True
+    client._set_sequencer(topic="topic", sequencer=sequencer, ordering_key="ord_key")
+
+    callback()
     assert len(client._sequencers) == 0
 
 
@@ -0,0 +1,458 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+from google.auth import credentials
+import mock
+import pytest
+
+from google.api_core import exceptions as core_exceptions
+from google.api_core import gapic_v1
+from google.api_core import retry as retries
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher._retry_control import CircuitBreaker
+from google.cloud.pubsub_v1.publisher._retry_control import RetryBudget
+from google.cloud.pubsub_v1.publisher._retry_control import RetryController
+from google.pubsub_v1 import types as gapic_types
+
+
+State = types.CircuitBreakerState
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_breaker(clock=None, **settings):
+    return CircuitBreaker(
+        types.CircuitBreakerSettings(**settings), clock=clock or FakeClock()
+    )
+
+
+def fast_retry():
+    return retries.Retry(
+        predicate=retries.if_exception_type(core_exceptions.ServiceUnavailable),
+        initial=0.001,
+        maximum=0.001,
+        deadline=60,
+    )
+
+
+def failing_send(error, successes_after=None):
+    attempts = []
+
+    def send(retry):
+        def attempt():
+            attempts.append(True)
+            if successes_after is not None and len(attempts) > successes_after:
+                return "response"
+            raise error
+
+        if retry is None:
+            return attempt()
+        return retry(attempt)()
+
+    send.attempts = attempts
+    return send
+
+
+def test_retry_budget_ratio():
+    clock = FakeClock()
+    budget = RetryBudget(
+        types.RetryBudgetSettings(retry_ratio=0.5, min_retries_per_second=0),
+        clock=clock,
+    )
+
+    assert not budget.try_retry()
+    for _ in range(4):
+        budget.record_request()
+    assert [budget.try_retry() for _ in range(3)] == [True, True, False]
+
+
+def test_retry_budget_min_retries_per_second():
+    clock = FakeClock()
+    budget = RetryBudget(
+        types.RetryBudgetSettings(retry_ratio=0, min_retries_per_second=0.2),
+        clock=clock,
+    )
+
+    # The minimum retries are spread over the 10 seconds window.
+    assert [budget.try_retry() for _ in range(3)] == [True, True, False]
+
+
+def test_retry_budget_window_slides():
+    clock = FakeClock()
+    budget = RetryBudget(
+        types.RetryBudgetSettings(retry_ratio=1, min_retries_per_second=0),
+        clock=clock,
+    )
+    budget.record_request()
+    assert budget.try_retry()
+    assert not budget.try_retry()
+
+    clock.now += 5
+    budget.record_request()
+    assert budget.try_retry()
+    assert not budget.try_retry()
+
+    # The first request and retry leave the window.
+    clock.now += 5
+    budget.record_request()
+    assert budget.try_retry()
+    assert not budget.try_retry()
+
+    # Nothing is left in the window.
+    clock.now += 10
+    assert not budget.try_retry()
+
+
+def test_retry_budget_invalid_settings():
+    with pytest.raises(ValueError):
+        RetryBudget(types.RetryBudgetSettings(retry_ratio=-1))
+    with pytest.raises(ValueError):
+        RetryBudget(types.RetryBudgetSettings(min_retries_per_second=-1))
+
+
+def test_circuit_breaker_invalid_settings():
+    with pytest.raises(ValueError):
+        create_breaker(failure_threshold=0)
+    with pytest.raises(ValueError):
+        create_breaker(half_open_probes=0)
+
+
+def test_circuit_breaker_opens_after_consecutive_failures():
+    callback = mock.Mock()
+    breaker = create_breaker(failure_threshold=3, state_callback=callback)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == State.CLOSED
+    assert breaker.acquire() is False
+
+    breaker.record_failure()
+    assert breaker.state == State.OPEN
+    callback.assert_called_once_with(State.OPEN)
+    with pytest.raises(exceptions.CircuitBreakerOpenError):
+        breaker.acquire()
+
+
+def test_circuit_breaker_half_open_probes():
+    clock = FakeClock()
+    callback = mock.Mock()
+    breaker = create_breaker(
+        clock,
+        failure_threshold=1,
+        reset_timeout=30,
+        half_open_probes=2,
+        state_callback=callback,
+    )
+    breaker.record_failure()
+
+    clock.now += 29
+    with pytest.raises(exceptions.CircuitBreakerOpenError):
+        breaker.acquire()
+
+    clock.now += 1
+    assert breaker.acquire() is True
+    assert breaker.state == State.HALF_OPEN
+    assert breaker.acquire() is True
+    with pytest.raises(exceptions.CircuitBreakerOpenError):
+        breaker.acquire()
+
+    # A completed probe makes room for another one.
+    breaker.release(True)
+    assert breaker.acquire() is True
+
+    breaker.record_success()
+    assert breaker.state == State.CLOSED
+    assert breaker.acquire() is False
+    assert callback.mock_calls == [
+        mock.call(State.OPEN),
+        mock.call(State.HALF_OPEN),
+        mock.call(State.CLOSED),
+    ]
+
+
+def test_circuit_breaker_failed_probe_reopens():
+    clock = FakeClock()
+    breaker = create_breaker(clock, failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.acquire() is True
+
+    clock.now += 10
+    breaker.record_failure()
+    breaker.release(True)
+
+    assert breaker.state == State.OPEN
+    clock.now += 29
+    with pytest.raises(exceptions.CircuitBreakerOpenError):
+        breaker.acquire()
+    clock.now += 1
+    assert breaker.acquire() is True
+
+
+def test_circuit_breaker_holds_requests():
+    breaker = create_breaker(
+        time.monotonic, failure_threshold=1, reset_timeout=0.05, hold_batches=True
+    )
+    breaker.record_failure()
+    assert breaker.state == State.OPEN
+
+    probes = []
+    threads = [
+        threading.Thread(target=lambda: probes.append(breaker.acquire()))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+
+    # A single probe is let through once the reset timeout expires, the other
+    # requests are held until it succeeds.
+    for _ in range(500):
+        if probes:
+            break
+        threading.Event().wait(0.01)
+    threading.Event().wait(0.05)
+    assert probes == [True]
+
+    breaker.record_success()
+    breaker.release(True)
+    for thread in threads:
+        thread.join(timeout=5)
+    assert probes == [True, False, False]
+
+
+def test_callback_error_logged():
+    callback = mock.Mock(side_effect=RuntimeError("boom"))
+    breaker = create_breaker(failure_threshold=1, state_callback=callback)
+
+    with mock.patch(
+        "google.cloud.pubsub_v1.publisher._retry_control._LOGGER"
+    ) as logger:
+        breaker.record_failure()
+
+    assert breaker.state == State.OPEN
+    logger.exception.assert_called_once()
+
+
+def test_controller_retries_within_budget():
+    budget = RetryBudget(
+        types.RetryBudgetSettings(retry_ratio=0, min_retries_per_second=0.3)
+    )
+    controller = RetryController(budget, None, None)
+    send = failing_send(core_exceptions.ServiceUnavailable("down"))
+
+    with pytest.raises(core_exceptions.ServiceUnavailable):
+        controller.call(send, fast_retry())
+
+    # The first attempt, and the 3 retries of the budget.
+    assert len(send.attempts) == 4
+
+
+def test_controller_default_retry():
+    controller = RetryController(None, create_breaker(), fast_retry())
+    send = failing_send(core_exceptions.ServiceUnavailable("down"), 2)
+
+    assert controller.call(send, gapic_v1.method.DEFAULT) == "response"
+    assert len(send.attempts) == 3
+
+
+def test_controller_open_breaker_stops_retries():
+    breaker = create_breaker(failure_threshold=3)
+    controller = RetryController(None, breaker, None)
+    send = failing_send(core_exceptions.ServiceUnavailable("down"))
+
+    with pytest.raises(core_exceptions.ServiceUnavailable):
+        controller.call(send, fast_retry())
+
+    assert len(send.attempts) == 3
+    assert breaker.state == State.OPEN
+    with pytest.raises(exceptions.CircuitBreakerOpenError):
+        controller.call(send, fast_retry())
+    assert len(send.attempts) == 3
+
+
+def test_controller_holds_ordered_requests():
+    breaker = create_breaker(time.monotonic, failure_threshold=1, reset_timeout=0.05)
+    controller = RetryController(None, breaker, None)
+    send = failing_send(core_exceptions.ServiceUnavailable("down"), 2)
+
+    assert controller.call(send, fast_retry(), ordered=True) == "response"
+
+    # The breaker opened after the first attempt, but the retries waited for
+    # it to be half-open instead of failing the batch.
+    assert len(send.attempts) == 3
+    assert breaker.state == State.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == State.OPEN
+    start = time.time()
+    assert controller.call(failing_send(None, 0), None, ordered=True) == "response"
+    assert time.time() - start >= 0.04
+    assert breaker.state == State.CLOSED
+
+
+def test_controller_ordered_requests_ignore_budget():
+    budget = RetryBudget(
+        types.RetryBudgetSettings(retry_ratio=0, min_retries_per_second=0.1)
+    )
+    controller = RetryController(budget, None, None)
+    send = failing_send(core_exceptions.ServiceUnavailable("down"), 5)
+
+    assert controller.call(send, fast_retry(), ordered=True) == "response"
+    assert len(send.attempts) == 6
+
+    # The ordered request stops retrying on a permanent error.
+    send = failing_send(core_exceptions.InvalidArgument("bad"))
+    with pytest.raises(core_exceptions.InvalidArgument):
+        controller.call(send, fast_retry(), ordered=True)
+    assert len(send.attempts) == 1
+
+
+def test_controller_request_errors_do_not_open_breaker():
+    breaker = create_breaker(failure_threshold=1)
+    controller = RetryController(None, breaker, None)
+    send = failing_send(core_exceptions.InvalidArgument("bad"))
+
+    with pytest.raises(core_exceptions.InvalidArgument):
+        controller.call(send, fast_retry())
+    with pytest.raises(core_exceptions.InvalidArgument):
+        controller.call(send, None)
+
+    assert breaker.state == State.CLOSED
+
+
+def test_controller_without_retry():
+    breaker = create_breaker(failure_threshold=1)
+    controller = RetryController(None, breaker, None)
+
+    with pytest.raises(core_exceptions.InternalServerError):
+        controller.call(failing_send(core_exceptions.InternalServerError("x")), None)
+
+    assert breaker.state == State.OPEN
+
+
+def test_controller_releases_probe():
+    clock = FakeClock()
+    breaker = create_breaker(clock, failure_threshold=1)
+    breaker.record_failure()
+    clock.now += 30
+    controller = RetryController(None, breaker, None)
+
+    with pytest.raises(core_exceptions.InvalidArgument):
+        controller.call(failing_send(core_exceptions.InvalidArgument("bad")), None)
+
+    assert breaker.state == State.HALF_OPEN
+    assert breaker._probes == 0
+    assert controller.call(failing_send(None, 0), None) == "response"
+    assert breaker.state == State.CLOSED
+
+
+def test_client_fails_batches_fast_once_open():
+    creds = mock.Mock(spec=credentials.Credentials)
+    states = []
+    options = types.PublisherOptions(
+        circuit_breaker=types.CircuitBreakerSettings(
+            failure_threshold=2, state_callback=states.append
+        ),
+        retry_budget=types.RetryBudgetSettings(),
+    )
+    client = publisher.Client(
+        batch_settings=types.BatchSettings(max_messages=1),
+        credentials=creds,
+        publisher_options=options,
+    )
+    assert client.get_circuit_breaker_state() == State.CLOSED
+
+    rpc = mock.Mock(side_effect=core_exceptions.ServiceUnavailable("down"))
+    client._serialized_publish_rpc = rpc
+
+    for topic in ("topic1", "topic2"):
+        future = client.publish(topic, b"foo", retry=None)
+        assert isinstance(
+            future.exception(timeout=5), core_exceptions.ServiceUnavailable
+        )
+
+    assert client.get_circuit_breaker_state() == State.OPEN
+    assert states == [State.OPEN]
+    future = client.publish("topic3", b"foo")
+    assert isinstance(future.exception(timeout=5), exceptions.CircuitBreakerOpenError)
+    assert rpc.call_count == 2
+
+    # The request arguments are passed through.
+    _, kwargs = rpc.call_args
+    assert kwargs["retry"] is None
+    assert kwargs["pinned"] is False
+
+
+def test_client_without_circuit_breaker():
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = publisher.Client(credentials=creds)
+    client._serialized_publish_rpc = mock.Mock(
+        return_value=gapic_types.PublishResponse.pb()(message_ids=["1"])
+    )
+
+    assert client.get_circuit_breaker_state() is None
+    assert client._retry_controller is None
+    assert client.publish("topic", b"foo").result(timeout=5) == "1"
+
+
+def test_client_holds_ordered_batches():
+    creds = mock.Mock(spec=credentials.Credentials)
+    options = types.PublisherOptions(
+        enable_message_ordering=True,
+        circuit_breaker=types.CircuitBreakerSettings(
+            failure_threshold=1, reset_timeout=0.05
+        ),
+        retry_budget=types.RetryBudgetSettings(
+            retry_ratio=0, min_retries_per_second=0.1
+        ),
+    )
+    client = publisher.Client(
+        batch_settings=types.BatchSettings(max_messages=1),
+        credentials=creds,
+        publisher_options=options,
+    )
+    response = gapic_types.PublishResponse.pb()(message_ids=["1"])
+    attempts = []
+
+    def rpc(request, topic, retry=None, **kwargs):
+        def attempt():
+            attempts.append(True)
+            if len(attempts) < 4:
+                raise core_exceptions.ServiceUnavailable("down")
+            return response
+
+        return retry(attempt)()
+
+    client._serialized_publish_rpc = rpc
+
+    future = client.publish("topic", b"foo", ordering_key="key", retry=fast_retry())
+
+    assert future.result(timeout=5) == "1"
+    assert len(attempts) == 4
+    assert client.get_circuit_breaker_state() == State.CLOSED
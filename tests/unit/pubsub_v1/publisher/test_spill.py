@@ -0,0 +1,169 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import threading
+
+from google.auth import credentials
+import mock
+import pytest
+
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher._spill import BatchSpiller
+from google.pubsub_v1 import types as gapic_types
+
+
+_raw_publish_request = gapic_types.PublishRequest.pb()
+_raw_publish_response = gapic_types.PublishResponse.pb()
+
+
+def create_spiller(directory, **settings):
+    return BatchSpiller(types.SpillSettings(str(directory), **settings))
+
+
+def spill_files(spiller):
+    return sorted(os.listdir(spiller._directory))
+
+
+def test_invalid_settings(tmp_path):
+    with pytest.raises(ValueError):
+        create_spiller(tmp_path, memory_bytes=-1)
+    with pytest.raises(ValueError):
+        create_spiller(tmp_path, segment_bytes=0)
+
+
+def test_store_within_memory_budget(tmp_path):
+    spiller = create_spiller(tmp_path, memory_bytes=10)
+    encode = mock.Mock()
+
+    assert spiller.store(6, encode) is None
+    assert spiller.store(4, encode) is None
+
+    encode.assert_not_called()
+    assert spiller.memory_bytes == 10
+    spiller.release(6)
+    assert spiller.memory_bytes == 4
+
+
+def test_store_spills_beyond_memory_budget(tmp_path):
+    spiller = create_spiller(tmp_path, memory_bytes=10)
+    spiller.store(8, mock.Mock())
+
+    record = spiller.store(8, lambda: bytearray(b"request"))
+
+    assert record is not None
+    assert spiller.memory_bytes == 8
+    assert spiller.disk_bytes == 8
+    assert spiller.load(record) == b"request"
+    assert spiller.disk_bytes == 0
+    # The current file is reused.
+    assert spill_files(spiller) == ["00000000000000000000.spill"]
+    assert (
+        os.path.getsize(os.path.join(spiller._directory, spill_files(spiller)[0])) == 0
+    )
+
+
+def test_spilled_segments_deleted_once_loaded(tmp_path):
+    spiller = create_spiller(tmp_path, memory_bytes=0, segment_bytes=10)
+    records = [
+        spiller.store(len(data), lambda data=data: data)
+        for data in (b"first", b"second", b"third")
+    ]
+    assert len(spill_files(spiller)) == 2
+
+    assert spiller.load(records[1]) == b"second"
+    assert len(spill_files(spiller)) == 2
+    assert spiller.load(records[0]) == b"first"
+    assert spill_files(spiller) == ["00000000000000000001.spill"]
+    assert spiller.load(records[2]) == b"third"
+
+
+def test_memory_used_once_disk_full(tmp_path):
+    spiller = create_spiller(tmp_path, memory_bytes=5, max_bytes=10)
+    spiller.store(5, mock.Mock())
+    record = spiller.store(6, lambda: b"x" * 6)
+    assert record is not None
+
+    # Does not fit on disk anymore.
+    assert spiller.store(6, mock.Mock()) is None
+    assert spiller.memory_bytes == 11
+
+    waiting = threading.Thread(target=spiller.wait_for_capacity)
+    waiting.start()
+    waiting.join(timeout=0.05)
+    assert waiting.is_alive()
+
+    spiller.release(6)
+    waiting.join(timeout=5)
+    assert not waiting.is_alive()
+
+
+def test_failed_spill_kept_in_memory(tmp_path):
+    spiller = create_spiller(tmp_path, memory_bytes=0)
+
+    record = spiller.store(6, mock.Mock(side_effect=OSError("disk full")))
+
+    assert record is None
+    assert spiller.memory_bytes == 6
+    assert spiller.disk_bytes == 0
+
+
+def test_stop_removes_directory_once_loaded(tmp_path):
+    spiller = create_spiller(tmp_path, memory_bytes=0)
+    record = spiller.store(7, lambda: b"request")
+
+    spiller.stop()
+    assert os.path.isdir(spiller._directory)
+
+    assert spiller.load(record) == b"request"
+    assert not os.path.exists(spiller._directory)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_client_publishes_spilled_batches(tmp_path):
+    creds = mock.Mock(spec=credentials.Credentials)
+    options = types.PublisherOptions(
+        concurrency_control=types.PublishConcurrencyControl(max_outstanding_rpcs=1),
+        spill=types.SpillSettings(str(tmp_path), memory_bytes=0),
+    )
+    client = publisher.Client(
+        batch_settings=types.BatchSettings(max_messages=1),
+        credentials=creds,
+        publisher_options=options,
+    )
+    unblock = threading.Event()
+    published = []
+
+    def publish_rpc(request, topic, retry=None, pinned=False, compression=None):
+        unblock.wait(timeout=5)
+        request = _raw_publish_request.FromString(request)
+        published.extend(message.data for message in request.messages)
+        return _raw_publish_response(message_ids=[str(len(published))])
+
+    client._serialized_publish_rpc = publish_rpc
+
+    publish_futures = [
+        client.publish("topic", data) for data in (b"one", b"two", b"three")
+    ]
+    assert client._batch_spiller.disk_bytes > 0
+    assert client._batch_spiller.memory_bytes == 0
+
+    unblock.set()
+    assert [future.result(timeout=5) for future in publish_futures] == ["1", "2", "3"]
+    assert published == [b"one", b"two", b"three"]
+    assert client._batch_spiller.disk_bytes == 0
+
+    client.stop()
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,204 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from google.auth import credentials
+import mock
+
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import types
+from google.cloud.pubsub_v1.publisher import exceptions
+from google.cloud.pubsub_v1.publisher._topic_settings import TopicSettingsResolver
+from google.cloud.pubsub_v1.publisher.flow_controller import FlowController
+from google.cloud.pubsub_v1.publisher.flow_controller import FlowControllerChain
+from google.pubsub_v1 import types as gapic_types
+
+
+_raw_publish_request = gapic_types.PublishRequest.pb()
+_raw_publish_response = gapic_types.PublishResponse.pb()
+
+BULK_BATCH_SETTINGS = types.BatchSettings(
+    max_bytes=5 * 1024 * 1024, max_latency=1.0, max_messages=1000
+)
+LOW_LATENCY_BATCH_SETTINGS = types.BatchSettings(max_latency=0)
+
+
+def error_flow_control(message_limit, byte_limit=10**6):
+    return types.PublishFlowControl(
+        message_limit=message_limit,
+        byte_limit=byte_limit,
+        limit_exceeded_behavior=types.LimitExceededBehavior.ERROR,
+    )
+
+
+def create_resolver(topic_settings, flow_control=types.PublishFlowControl()):
+    return TopicSettingsResolver(
+        types.BatchSettings(),
+        flow_control,
+        FlowController(flow_control),
+        topic_settings,
+    )
+
+
+def create_client(topic_settings, flow_control=types.PublishFlowControl()):
+    creds = mock.Mock(spec=credentials.Credentials)
+    options = types.PublisherOptions(
+        flow_control=flow_control, topic_settings=topic_settings
+    )
+    return publisher.Client(
+        credentials=creds,
+        # The batches are not committed while the test inspects them.
+        batch_settings=types.BatchSettings(max_latency=float("inf")),
+        publisher_options=options,
+    )
+
+
+def test_default_settings():
+    resolver = create_resolver(None)
+
+    config = resolver.get("projects/p/topics/t")
+
+    assert config.batch_settings == types.BatchSettings()
+    assert config.bulk_batch_settings == types.BatchSettings()
+    assert isinstance(config.flow_controller, FlowController)
+    assert resolver.get("projects/p/topics/other") is config
+
+
+def test_exact_topic_takes_precedence_over_patterns():
+    resolver = create_resolver(
+        {
+            "projects/p/topics/bulk-*": types.TopicSettings(BULK_BATCH_SETTINGS),
+            "projects/p/topics/*": types.TopicSettings(LOW_LATENCY_BATCH_SETTINGS),
+            "projects/p/topics/bulk-fast": types.TopicSettings(
+                LOW_LATENCY_BATCH_SETTINGS
+            ),
+        }
+    )
+
+    def batch_settings(topic):
+        return resolver.get(topic).batch_settings
+
+    assert batch_settings("projects/p/topics/bulk-events") == BULK_BATCH_SETTINGS
+    assert batch_settings("projects/p/topics/bulk-fast") == LOW_LATENCY_BATCH_SETTINGS
+    assert batch_settings("projects/p/topics/orders") == LOW_LATENCY_BATCH_SETTINGS
+    assert batch_settings("projects/other/topics/orders") == types.BatchSettings()
+
+
+def test_resolved_settings_are_cached():
+    resolver = create_resolver(
+        {"projects/p/topics/*": types.TopicSettings(BULK_BATCH_SETTINGS)}
+    )
+    topic = "projects/p/topics/t"
+
+    config = resolver.get(topic)
+    with mock.patch.object(resolver, "_resolve") as resolve:
+        assert resolver.get(topic) is config
+    resolve.assert_not_called()
+
+
+def test_pattern_budget_shared_by_its_topics():
+    global_flow_control = error_flow_control(100)
+    resolver = create_resolver(
+        {"bulk-*": types.TopicSettings(flow_control=error_flow_control(2))},
+        flow_control=global_flow_control,
+    )
+
+    first = resolver.get("bulk-1")
+    second = resolver.get("bulk-2")
+    assert isinstance(first.flow_controller, FlowControllerChain)
+    assert first.flow_controller is second.flow_controller
+    # Only the flow control applies, the client's batch settings are used.
+    assert first.batch_settings == types.BatchSettings()
+    assert resolver.get("other").flow_controller is resolver._default.flow_controller
+
+
+def test_bulk_batch_settings_fit_all_flow_control_limits():
+    resolver = create_resolver(
+        {
+            "topic": types.TopicSettings(
+                BULK_BATCH_SETTINGS, error_flow_control(50, byte_limit=10**7)
+            )
+        },
+        flow_control=error_flow_control(500, byte_limit=10**6),
+    )
+
+    config = resolver.get("topic")
+
+    assert config.batch_settings == BULK_BATCH_SETTINGS
+    assert config.bulk_batch_settings == BULK_BATCH_SETTINGS._replace(
+        max_messages=50, max_bytes=10**6
+    )
+
+
+def test_client_batch_settings_per_topic():
+    client = create_client({"bulk": types.TopicSettings(BULK_BATCH_SETTINGS)})
+
+    assert client.get_batch_settings("bulk") == BULK_BATCH_SETTINGS
+    assert client.get_batch_settings("other") == client.batch_settings
+
+    client.publish("bulk", b"foo")
+    batch = client._get_or_create_sequencer("bulk", "")._current_batch
+    assert batch.settings == BULK_BATCH_SETTINGS
+
+
+def test_topic_budget_does_not_starve_other_topics():
+    client = create_client(
+        {"bulk": types.TopicSettings(flow_control=error_flow_control(2))},
+        flow_control=error_flow_control(10),
+    )
+
+    futures = [client.publish("bulk", b"x") for _ in range(3)]
+    assert not futures[1].done()
+    assert isinstance(futures[2].exception(), exceptions.FlowControlLimitError)
+
+    # The other topics only share the global cap.
+    for _ in range(8):
+        assert not client.publish("orders", b"x").done()
+    future = client.publish("orders", b"x")
+    assert isinstance(future.exception(), exceptions.FlowControlLimitError)
+    assert client._flow_controller._message_count == 10
+
+
+def test_global_cap_rejection_releases_topic_budget():
+    client = create_client(
+        {"bulk": types.TopicSettings(flow_control=error_flow_control(5))},
+        flow_control=error_flow_control(1),
+    )
+    client.publish("orders", b"x")
+
+    future = client.publish("bulk", b"x")
+
+    assert isinstance(future.exception(), exceptions.FlowControlLimitError)
+    topic_flow_controller = client._get_topic_settings("bulk").flow_controller
+    assert topic_flow_controller._flow_controllers[0]._message_count == 0
+
+
+def test_publish_many_chunks_fit_topic_budget():
+    client = create_client(
+        {"bulk": types.TopicSettings(flow_control=error_flow_control(2))}
+    )
+    published = []
+
+    def publish_serialized(topic, request, retry=None, pinned=False, ordered=False):
+        messages = _raw_publish_request.FromString(request).messages
+        published.append(len(messages))
+        return _raw_publish_response(message_ids=["1"] * len(messages))
+
+    client._publish_serialized = publish_serialized
+
+    future = client.publish_many("bulk", [(b"x", {})] * 5)
+
+    # The first chunk fits the topic's budget, the others are rejected while
+    # it is in flight.
+    assert isinstance(future.exception(timeout=5), exceptions.FlowControlLimitError)
+    assert published == [2]
@@ -15,11 +15,15 @@
 import datetime
 import queue
 import time
+import zlib
 
 import mock
+import pytest
 import pytz
 
 from google.api_core import datetime_helpers
+from google.cloud.pubsub_v1 import _envelopes
+from google.cloud.pubsub_v1 import codecs
 from google.cloud.pubsub_v1.subscriber import message
 from google.cloud.pubsub_v1.subscriber._protocol import requests
 from google.protobuf import timestamp_pb2
@@ -66,6 +70,27 @@ def test_data():
     assert msg.data == b"foo"
 
 
+def test_compressed_data():
+    attrs = {"spam": "eggs", codecs.ENCODING_ATTRIBUTE: "test"}
+    msg = create_message(zlib.compress(b"foo" * 100), **attrs)
+
+    # The marker attribute is hidden, and the data is decompressed lazily.
+    assert msg.attributes == {"spam": "eggs"}
+    decompress = mock.Mock(wraps=zlib.decompress)
+    codec = codecs.Codec("test", zlib.compress, decompress)
+    with mock.patch.dict(codecs._codecs, {"test": codec}):
+        decompress.assert_not_called()
+        assert msg.data == b"foo" * 100
+        assert msg.data == b"foo" * 100
+    decompress.assert_called_once()
+
+
+def test_compressed_data_unknown_codec():
+    msg = create_message(b"foo", **{codecs.ENCODING_ATTRIBUTE: "unknown"})
+    with pytest.raises(ValueError):
+        msg.data
+
+
 def test_size():
     msg = create_message(b"foo")
     assert msg.size == 30  # payload + protobuf overhead
@@ -182,3 +207,109 @@ def test_repr():
         )
     )
     assert repr(msg) == expected_repr
+
+
+def create_envelope(records, **attrs):
+    data = _envelopes.encode(
+        [
+            gapic_types.PubsubMessage(data=data, attributes=record_attrs)._pb
+            for data, record_attrs in records
+        ]
+    )
+    attrs[_envelopes.ENVELOPE_ATTRIBUTE] = _envelopes.FORMAT_VERSION
+    msg = create_message(data, ordering_key="key", delivery_attempt=3, **attrs)
+    return message.Envelope(msg._message, msg.ack_id, 3, msg._request_queue)
+
+
+def test_envelope_unpack():
+    envelope = create_envelope([(b"foo", {"spam": "eggs"}), (b"bar", {})])
+
+    records = envelope.unpack()
+
+    assert [record.data for record in records] == [b"foo", b"bar"]
+    assert [dict(record.attributes) for record in records] == [{"spam": "eggs"}, {}]
+    assert [record.message_id for record in records] == [
+        "message_id-0",
+        "message_id-1",
+    ]
+    for record in records:
+        assert isinstance(record, message.Record)
+        assert record.ack_id == "ACKID"
+        assert record.ordering_key == "key"
+        assert record.delivery_attempt == 3
+        assert record.publish_time == PUBLISHED
+
+
+def test_envelope_unpack_compressed():
+    records = [gapic_types.PubsubMessage(data=b"foo" * 100)._pb]
+    attrs = {
+        codecs.ENCODING_ATTRIBUTE: "zlib",
+        _envelopes.ENVELOPE_ATTRIBUTE: _envelopes.FORMAT_VERSION,
+    }
+    msg = create_message(zlib.compress(_envelopes.encode(records)), **attrs)
+    envelope = message.Envelope(msg._message, "ACKID", 0, msg._request_queue)
+
+    assert [record.data for record in envelope.unpack()] == [b"foo" * 100]
+
+
+def test_envelope_unpack_errors():
+    envelope = create_envelope([(b"foo", {})])
+    envelope._attributes[_envelopes.ENVELOPE_ATTRIBUTE] = "2"
+    with pytest.raises(ValueError, match="Unknown envelope format"):
+        envelope.unpack()
+
+    msg = create_message(b"\xff\xff", **{_envelopes.ENVELOPE_ATTRIBUTE: "1"})
+    envelope = message.Envelope(msg._message, "ACKID", 0, msg._request_queue)
+    with pytest.raises(ValueError, match="Malformed envelope"):
+        envelope.unpack()
+
+
+def test_empty_envelope_acked():
+    envelope = create_envelope([])
+    with mock.patch.object(envelope._request_queue, "put") as put:
+        assert envelope.unpack() == []
+        check_call_types(put, requests.AckRequest)
+
+
+def test_envelope_acked_once_all_records_acked():
+    envelope = create_envelope([(b"foo", {}), (b"bar", {})])
+    first, second = envelope.unpack()
+
+    with mock.patch.object(envelope._request_queue, "put") as put:
+        first.ack()
+        first.ack()
+        put.assert_not_called()
+
+        second.ack()
+        put.assert_called_once()
+        check_call_types(put, requests.AckRequest)
+        assert put.call_args[0][0].ack_id == "ACKID"
+        assert put.call_args[0][0].byte_size == envelope.size
+
+
+@pytest.mark.parametrize(
+    "outcomes,request_type",
+    [
+        (("ack", "nack", "drop"), requests.NackRequest),
+        (("drop", "ack", "ack"), requests.DropRequest),
+        (("nack", "drop", "ack"), requests.NackRequest),
+    ],
+)
+def test_envelope_settled_by_worst_record_outcome(outcomes, request_type):
+    envelope = create_envelope([(b"foo", {}), (b"bar", {}), (b"baz", {})])
+    records = envelope.unpack()
+
+    with mock.patch.object(envelope._request_queue, "put") as put:
+        for record, outcome in zip(records, outcomes):
+            getattr(record, outcome)()
+        put.assert_called_once()
+        check_call_types(put, request_type)
+
+
+def test_record_modify_ack_deadline():
+    envelope = create_envelope([(b"foo", {})])
+    (record,) = envelope.unpack()
+
+    with mock.patch.object(envelope._request_queue, "put") as put:
+        record.modify_ack_deadline(60)
+        put.assert_called_once_with(requests.ModAckRequest(ack_id="ACKID", seconds=60))
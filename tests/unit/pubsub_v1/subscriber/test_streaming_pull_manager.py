@@ -23,6 +23,7 @@ import pytest
 
 from google.api_core import bidi
 from google.api_core import exceptions
+from google.cloud.pubsub_v1 import _envelopes
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.subscriber import client
 from google.cloud.pubsub_v1.subscriber import message
@@ -382,22 +383,14 @@ def test_send_unary():
         )
     )
 
-    manager._client.acknowledge.assert_called_once_with(
-        subscription=manager._subscription, ack_ids=["ack_id1", "ack_id2"]
+    manager._client._acknowledge.assert_called_once_with(
+        manager._subscription, ["ack_id1", "ack_id2"]
     )
 
-    manager._client.modify_ack_deadline.assert_has_calls(
+    manager._client._modify_ack_deadline.assert_has_calls(
         [
-            mock.call(
-                subscription=manager._subscription,
-                ack_ids=["ack_id3"],
-                ack_deadline_seconds=10,
-            ),
-            mock.call(
-                subscription=manager._subscription,
-                ack_ids=["ack_id4", "ack_id5"],
-                ack_deadline_seconds=20,
-            ),
+            mock.call(manager._subscription, ["ack_id3"], 10),
+            mock.call(manager._subscription, ["ack_id4", "ack_id5"], 20),
         ],
         any_order=True,
     )
@@ -408,8 +401,8 @@ def test_send_unary_empty():
 
     manager.send(gapic_types.StreamingPullRequest())
 
-    manager._client.acknowledge.assert_not_called()
-    manager._client.modify_ack_deadline.assert_not_called()
+    manager._client._acknowledge.assert_not_called()
+    manager._client._modify_ack_deadline.assert_not_called()
 
 
 def test_send_unary_api_call_error(caplog):
@@ -418,7 +411,7 @@ def test_send_unary_api_call_error(caplog):
     manager = make_manager()
 
     error = exceptions.GoogleAPICallError("The front fell off")
-    manager._client.acknowledge.side_effect = error
+    manager._client._acknowledge.side_effect = error
 
     manager.send(gapic_types.StreamingPullRequest(ack_ids=["ack_id1", "ack_id2"]))
 
@@ -433,7 +426,7 @@ def test_send_unary_retry_error(caplog):
     error = exceptions.RetryError(
         "Too long a transient error", cause=Exception("Out of time!")
     )
-    manager._client.acknowledge.side_effect = error
+    manager._client._acknowledge.side_effect = error
 
     with pytest.raises(exceptions.RetryError):
         manager.send(gapic_types.StreamingPullRequest(ack_ids=["ack_id1", "ack_id2"]))
@@ -495,11 +488,12 @@ def test_open(heartbeater, dispatcher, leaser, background_consumer, resumable_bi
     assert manager._consumer == background_consumer.return_value
 
     resumable_bidi_rpc.assert_called_once_with(
-        start_rpc=manager._client.api.streaming_pull,
+        start_rpc=manager._client._streaming_pull,
         initial_request=mock.ANY,
         should_recover=manager._should_recover,
         should_terminate=manager._should_terminate,
         throttle_reopen=True,
+        metadata=manager._client._get_stream_metadata.return_value,
     )
     initial_request_arg = resumable_bidi_rpc.call_args.kwargs["initial_request"]
     assert initial_request_arg.func == manager._get_initial_request
@@ -968,6 +962,99 @@ def test__on_response_with_ordering_keys():
     assert manager._messages_on_hold.get() is None
 
 
+def make_envelope_response(records, **envelope_fields):
+    data = _envelopes.encode(
+        [gapic_types.PubsubMessage(data=record)._pb for record in records]
+    )
+    envelope = gapic_types.PubsubMessage(
+        data=data,
+        message_id="1",
+        attributes={_envelopes.ENVELOPE_ATTRIBUTE: _envelopes.FORMAT_VERSION},
+        **envelope_fields
+    )
+    return gapic_types.StreamingPullResponse(
+        received_messages=[
+            gapic_types.ReceivedMessage(ack_id="fack", message=envelope),
+            gapic_types.ReceivedMessage(
+                ack_id="back",
+                message=gapic_types.PubsubMessage(data=b"plain", message_id="2"),
+            ),
+        ]
+    )
+
+
+def test__on_response_envelopes_not_unpacked_by_default():
+    manager, _, _, leaser, _, scheduler = make_running_manager()
+    manager._callback = mock.sentinel.callback
+    fake_leaser_add(leaser, init_msg_count=0, assumed_msg_size=10)
+
+    manager._on_response(make_envelope_response([b"foo", b"bar"]))
+
+    schedule_calls = scheduler.schedule.mock_calls
+    assert len(schedule_calls) == 2
+    for call in schedule_calls:
+        assert call[1][0] == mock.sentinel.callback
+        assert not isinstance(call[1][1], message.Envelope)
+
+
+def test__on_response_unpack_envelopes():
+    manager, _, dispatcher, leaser, _, scheduler = make_running_manager(
+        unpack_envelopes=True
+    )
+    manager._callback = mock.sentinel.callback
+    fake_leaser_add(leaser, init_msg_count=0, assumed_msg_size=10)
+
+    manager._on_response(make_envelope_response([b"foo", b"bar"]))
+
+    # The envelope is leased as a whole.
+    dispatcher.modify_ack_deadline.assert_called_once_with(
+        [requests.ModAckRequest("fack", 10), requests.ModAckRequest("back", 10)]
+    )
+    assert leaser.message_count == 2
+
+    schedule_calls = scheduler.schedule.mock_calls
+    assert len(schedule_calls) == 2
+    assert schedule_calls[0][1][0] == manager._dispatch_envelope
+    assert isinstance(schedule_calls[0][1][1], message.Envelope)
+    assert schedule_calls[1][1][0] == mock.sentinel.callback
+    assert not isinstance(schedule_calls[1][1][1], message.Envelope)
+
+
+def test__dispatch_envelope():
+    manager, _, _, leaser, _, scheduler = make_running_manager(unpack_envelopes=True)
+    received = []
+    manager._callback = received.append
+    fake_leaser_add(leaser, init_msg_count=0, assumed_msg_size=10)
+
+    manager._on_response(make_envelope_response([b"foo", b"bar", b"baz"]))
+    envelope = scheduler.schedule.mock_calls[0][1][1]
+    manager._dispatch_envelope(envelope)
+
+    # The records are passed to the callback in order.
+    assert [record.data for record in received] == [b"foo", b"bar", b"baz"]
+    assert [record.message_id for record in received] == ["1-0", "1-1", "1-2"]
+    for record in received:
+        assert isinstance(record, message.Record)
+        assert record.ack_id == "fack"
+
+
+def test__dispatch_envelope_malformed(caplog):
+    caplog.set_level(logging.ERROR)
+    manager, _, _, leaser, _, scheduler = make_running_manager(unpack_envelopes=True)
+    received = []
+    manager._callback = received.append
+    fake_leaser_add(leaser, init_msg_count=0, assumed_msg_size=10)
+
+    response = make_envelope_response([])
+    response.received_messages[0].message.data = b"\xff\xff"
+    manager._on_response(response)
+    envelope = scheduler.schedule.mock_calls[0][1][1]
+    manager._dispatch_envelope(envelope)
+
+    assert received == [envelope]
+    assert "Cannot unpack envelope 1" in caplog.text
+
+
 def test__should_recover_true():
     manager = make_manager()
 
@@ -18,10 +18,14 @@ import grpc
 import mock
 import pytest
 
+from google.api_core import exceptions as core_exceptions
 from google.api_core.gapic_v1.client_info import METRICS_METADATA_KEY
+from google.cloud.pubsub_v1 import _channel_pool
 from google.cloud.pubsub_v1 import subscriber
 from google.cloud.pubsub_v1 import types
 from google.cloud.pubsub_v1.subscriber import futures
+from google.protobuf import empty_pb2
+from google.pubsub_v1 import types as gapic_types
 from google.pubsub_v1.services.subscriber import client as subscriber_client
 from google.pubsub_v1.services.subscriber.transports.grpc import SubscriberGrpcTransport
 
@@ -115,6 +119,33 @@ def test_init_emulator(monkeypatch):
     assert channel.target().decode("utf8") == "/baz/bacon:123"
 
 
+def test_init_w_channel_pool(creds):
+    client = subscriber.Client(credentials=creds, channel_pool_size=3)
+
+    channel = client.api._transport.grpc_channel
+    assert isinstance(channel, _channel_pool.ChannelPool)
+    assert len(channel.channels) == 3
+    assert client._acknowledge_rpc._transport is client.api._transport
+
+    # The streaming pulls are assigned to the channels in turn.
+    assert client._get_stream_metadata() == _channel_pool.affinity_metadata("0")
+    assert client._get_stream_metadata() == _channel_pool.affinity_metadata("1")
+
+
+def test_init_w_channel_pool_errors(creds):
+    with pytest.raises(ValueError):
+        subscriber.Client(credentials=creds, channel_pool_size=0)
+
+    transport = SubscriberGrpcTransport(credentials=creds)
+    with pytest.raises(ValueError):
+        subscriber.Client(transport=transport, channel_pool_size=2)
+
+
+def test_stream_metadata_without_channel_pool(creds):
+    client = subscriber.Client(credentials=creds)
+    assert client._get_stream_metadata() is None
+
+
 def test_class_method_factory():
     patch = mock.patch(
         "google.oauth2.service_account.Credentials.from_service_account_file"
@@ -161,6 +192,7 @@ def test_subscribe_options(manager_open, creds):
         flow_control=flow_control,
         scheduler=scheduler,
         await_callbacks_on_shutdown=mock.sentinel.await_callbacks,
+        unpack_envelopes=True,
     )
     assert isinstance(future, futures.StreamingPullFuture)
 
@@ -168,6 +200,7 @@ def test_subscribe_options(manager_open, creds):
     assert future._manager.flow_control == flow_control
     assert future._manager._scheduler == scheduler
     assert future._manager._await_callbacks_on_shutdown is mock.sentinel.await_callbacks
+    assert future._manager._unpack_envelopes is True
     manager_open.assert_called_once_with(
         mock.ANY,
         callback=mock.sentinel.callback,
@@ -175,6 +208,126 @@ def test_subscribe_options(manager_open, creds):
     )
 
 
+def test_acknowledge_raw(creds):
+    client = subscriber.Client(credentials=creds)
+    transport = client.api._transport
+
+    channel = mock.Mock(spec=["unary_unary"])
+    stub = channel.unary_unary.return_value
+
+    with mock.patch.object(transport, "_grpc_channel", channel):
+        client._acknowledge("sub", ["ack_id1", "ack_id2"])
+        client._acknowledge("sub", ["ack_id3"])
+
+    # The stub is created only once, and sends raw protobuf requests.
+    channel.unary_unary.assert_called_once_with(
+        "/google.pubsub.v1.Subscriber/Acknowledge",
+        request_serializer=gapic_types.AcknowledgeRequest.pb().SerializeToString,
+        response_deserializer=empty_pb2.Empty.FromString,
+    )
+    assert stub.call_count == 2
+    args, kwargs = stub.call_args
+    assert args == (
+        gapic_types.AcknowledgeRequest(subscription="sub", ack_ids=["ack_id3"])._pb,
+    )
+
+    # The same metadata as with the GAPIC client is sent, including the
+    # routing header, and it is built only once for each subscription.
+    metadata = kwargs["metadata"]
+    assert ("x-goog-request-params", "subscription=sub") in metadata
+    assert any(key == METRICS_METADATA_KEY for key, _ in metadata)
+    assert stub.call_args_list[0][1]["metadata"] is metadata
+
+    # The default timeout is used.
+    gapic_rpc = transport._wrapped_methods[transport.acknowledge]
+    assert kwargs["timeout"] == gapic_rpc._timeout
+
+
+def test_modify_ack_deadline_raw(creds):
+    client = subscriber.Client(credentials=creds)
+    transport = client.api._transport
+
+    channel = mock.Mock(spec=["unary_unary"])
+    stub = channel.unary_unary.return_value
+    stub.side_effect = [core_exceptions.ServiceUnavailable("try again"), None]
+
+    with mock.patch.object(transport, "_grpc_channel", channel), mock.patch(
+        "time.sleep"
+    ):
+        client._modify_ack_deadline("sub", ["ack_id1"], 10)
+
+    channel.unary_unary.assert_called_once_with(
+        "/google.pubsub.v1.Subscriber/ModifyAckDeadline",
+        request_serializer=(
+            gapic_types.ModifyAckDeadlineRequest.pb().SerializeToString
+        ),
+        response_deserializer=empty_pb2.Empty.FromString,
+    )
+    # The default retry settings apply.
+    assert stub.call_count == 2
+    args, kwargs = stub.call_args
+    assert args == (
+        gapic_types.ModifyAckDeadlineRequest(
+            subscription="sub", ack_ids=["ack_id1"], ack_deadline_seconds=10
+        )._pb,
+    )
+    assert ("x-goog-request-params", "subscription=sub") in kwargs["metadata"]
+
+
+def test_acknowledge_compression(creds):
+    compression_settings = types.CompressionSettings(
+        acknowledge=grpc.Compression.Deflate, min_request_bytes=100
+    )
+    client = subscriber.Client(
+        credentials=creds, compression_settings=compression_settings
+    )
+    channel = mock.Mock(spec=["unary_unary"])
+    stub = channel.unary_unary.return_value
+
+    with mock.patch.object(client.api._transport, "_grpc_channel", channel):
+        client._acknowledge("sub", ["ack_id"] * 20)
+        client._acknowledge("sub", ["ack_id"])
+        client._modify_ack_deadline("sub", ["ack_id"] * 20, 60)
+
+    compressions = [kwargs.get("compression") for _, kwargs in stub.call_args_list]
+    assert compressions == [grpc.Compression.Deflate, None, grpc.Compression.Deflate]
+
+
+def test_streaming_pull_compression(creds):
+    compression_settings = types.CompressionSettings(
+        streaming_pull=grpc.Compression.Gzip
+    )
+    client = subscriber.Client(
+        credentials=creds, compression_settings=compression_settings
+    )
+    transport = client.api._transport
+    rpc = mock.Mock()
+    requests = iter([])
+
+    with mock.patch.dict(transport._wrapped_methods, {transport.streaming_pull: rpc}):
+        response = client._streaming_pull(requests, metadata=[("key", "value")])
+
+    assert response is rpc.return_value
+    rpc.assert_called_once_with(
+        requests,
+        timeout=None,
+        metadata=[("key", "value")],
+        compression=grpc.Compression.Gzip,
+    )
+    assert not transport.streaming_pull._prefetch_first_result_
+
+
+def test_streaming_pull_not_compressed_by_default(creds):
+    client = subscriber.Client(credentials=creds)
+    requests = iter([])
+
+    with mock.patch.object(client.api, "streaming_pull") as streaming_pull:
+        response = client._streaming_pull(requests, metadata=None)
+
+    assert response is streaming_pull.return_value
+    streaming_pull.assert_called_once_with(requests, metadata=None)
+
+
 def test_close(creds):
     client = subscriber.Client(credentials=creds)
     patcher = mock.patch.object(client.api._transport.grpc_channel, "close")
@@ -0,0 +1,223 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent import futures
+
+import grpc
+import mock
+import pytest
+
+from google.cloud.pubsub_v1 import _channel_pool
+
+
+def create_pool(size=3):
+    channels = [mock.Mock(spec=grpc.Channel) for _ in range(size)]
+    return _channel_pool.ChannelPool(channels)
+
+
+def stub_of(pool, index, method_name="unary_unary"):
+    return getattr(pool.channels[index], method_name).return_value
+
+
+def start_future(multi_callable):
+    """Start a call that stays in progress, and return the callback that
+    completes it."""
+    multi_callable.future(b"request")
+    calls = [
+        stub.future.return_value
+        for stub in multi_callable._stubs
+        if stub.future.call_count
+    ]
+    return calls[-1].add_callback.call_args[0][0]
+
+
+def test_stubs_created_on_each_channel():
+    pool = create_pool()
+    multi_callable = pool.unary_unary(
+        "/Service/Method", request_serializer=None, response_deserializer=None
+    )
+
+    assert isinstance(multi_callable, grpc.UnaryUnaryMultiCallable)
+    for channel in pool.channels:
+        channel.unary_unary.assert_called_once_with(
+            "/Service/Method", request_serializer=None, response_deserializer=None
+        )
+
+
+def test_round_robin_when_equally_loaded():
+    pool = create_pool()
+    multi_callable = pool.unary_unary("/Service/Method")
+
+    for _ in range(6):
+        multi_callable(b"request", metadata=[("key", "value")])
+
+    for index in range(3):
+        stub = stub_of(pool, index)
+        assert stub.call_count == 2
+        stub.assert_called_with(b"request", metadata=[("key", "value")])
+    assert pool._in_progress == [0, 0, 0]
+
+
+def test_least_loaded_channel_picked():
+    pool = create_pool()
+    multi_callable = pool.unary_unary("/Service/Method")
+
+    # Three calls in progress, one on each channel.
+    completions = [start_future(multi_callable) for _ in range(3)]
+    assert pool._in_progress == [1, 1, 1]
+
+    # Once the call on the second channel completes, it is the least loaded.
+    completions[1]()
+    assert pool._in_progress == [1, 0, 1]
+    multi_callable(b"request")
+    assert stub_of(pool, 1).call_count == 1
+    assert stub_of(pool, 0).call_count == 0
+    assert stub_of(pool, 2).call_count == 0
+
+
+def test_call_released_once():
+    pool = create_pool(size=1)
+    multi_callable = pool.unary_unary("/Service/Method")
+
+    complete = start_future(multi_callable)
+    assert pool._in_progress == [1]
+    complete()
+    complete()
+    assert pool._in_progress == [0]
+
+
+def test_terminated_call_released_right_away():
+    pool = create_pool(size=1)
+    multi_callable = pool.unary_stream("/Service/Method")
+    stub_of(pool, 0, "unary_stream").return_value.add_callback.return_value = False
+
+    call = multi_callable(b"request")
+
+    assert call is stub_of(pool, 0, "unary_stream").return_value
+    assert pool._in_progress == [0]
+
+
+def test_failed_call_released():
+    pool = create_pool(size=1)
+    multi_callable = pool.stream_stream("/Service/Method")
+    stub_of(pool, 0, "stream_stream").side_effect = ValueError("boom")
+
+    with pytest.raises(ValueError):
+        multi_callable(iter(()))
+
+    assert pool._in_progress == [0]
+
+    multi_callable = pool.unary_unary("/Service/Method")
+    stub_of(pool, 0).side_effect = ValueError("boom")
+
+    with pytest.raises(ValueError):
+        multi_callable(b"request")
+
+    assert pool._in_progress == [0]
+
+
+def test_affinity_key_pins_channel():
+    pool = create_pool()
+    multi_callable = pool.unary_unary("/Service/Method")
+    metadata = (("key", "value"),) + _channel_pool.affinity_metadata("topic")
+
+    for _ in range(4):
+        multi_callable(b"request", metadata=metadata)
+
+    stubs = [stub_of(pool, index) for index in range(3)]
+    assert sorted(stub.call_count for stub in stubs) == [0, 0, 4]
+
+    # The affinity key is not sent to the backend.
+    for stub in stubs:
+        for _, kwargs in stub.call_args_list:
+            assert kwargs["metadata"] == [("key", "value")]
+
+
+def test_numeric_affinity_keys_assigned_in_turn():
+    pool = create_pool()
+    multi_callable = pool.stream_stream("/Service/Method")
+
+    for key in range(6):
+        multi_callable(iter(()), metadata=_channel_pool.affinity_metadata(str(key)))
+
+    for index in range(3):
+        assert stub_of(pool, index, "stream_stream").call_count == 2
+
+
+def test_close():
+    pool = create_pool()
+
+    with pool:
+        pass
+
+    for channel in pool.channels:
+        channel.close.assert_called_once_with()
+
+
+def test_connectivity_of_first_channel():
+    pool = create_pool()
+
+    pool.subscribe(mock.sentinel.callback, try_to_connect=True)
+    pool.unsubscribe(mock.sentinel.callback)
+
+    channel = pool.channels[0]
+    channel.subscribe.assert_called_once_with(
+        mock.sentinel.callback, try_to_connect=True
+    )
+    channel.unsubscribe.assert_called_once_with(mock.sentinel.callback)
+
+
+@pytest.fixture
+def server():
+    def peer(request, context):
+        return context.peer().encode()
+
+    def metadata_keys(request, context):
+        return ",".join(key for key, _ in context.invocation_metadata()).encode()
+
+    handler = grpc.method_handlers_generic_handler(
+        "test.Pool",
+        {
+            "Peer": grpc.unary_unary_rpc_method_handler(peer),
+            "MetadataKeys": grpc.unary_unary_rpc_method_handler(metadata_keys),
+        },
+    )
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    server.add_generic_rpc_handlers((handler,))
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    yield "localhost:{}".format(port)
+    server.stop(None)
+
+
+def test_channels_use_separate_connections(server):
+    options = [_channel_pool._LOCAL_SUBCHANNEL_POOL_OPTION]
+    channels = [grpc.insecure_channel(server, options=options) for _ in range(3)]
+
+    with _channel_pool.ChannelPool(channels) as pool:
+        peer = pool.unary_unary("/test.Pool/Peer")
+        peers = {
+            peer(b"", metadata=_channel_pool.affinity_metadata(str(key)), timeout=10)
+            for key in range(3)
+        }
+        assert len(peers) == 3
+
+        metadata_keys = pool.unary_unary("/test.Pool/MetadataKeys")
+        keys = metadata_keys(
+            b"",
+            metadata=(("x-key", "value"),) + _channel_pool.affinity_metadata("0"),
+            timeout=10,
+        )
+        assert b"x-key" in keys.split(b",")
+        assert _channel_pool.AFFINITY_METADATA_KEY.encode() not in keys
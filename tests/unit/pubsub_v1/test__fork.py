@@ -0,0 +1,217 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import os
+import weakref
+
+from google.auth import credentials
+import mock
+import pytest
+
+from google.cloud.pubsub_v1 import _fork
+from google.cloud.pubsub_v1 import publisher
+from google.cloud.pubsub_v1 import subscriber
+from google.cloud.pubsub_v1 import types
+from google.pubsub_v1 import types as gapic_types
+from google.pubsub_v1.services.publisher.transports.grpc import PublisherGrpcTransport
+from google.pubsub_v1.services.subscriber.transports.grpc import (
+    SubscriberGrpcTransport,
+)
+
+
+_raw_publish_request = gapic_types.PublishRequest.pb()
+_raw_publish_response = gapic_types.PublishResponse.pb()
+
+
+def create_publisher(**options):
+    creds = mock.Mock(spec=credentials.Credentials)
+    return publisher.Client(
+        # Only commit the batches when asked to.
+        batch_settings=types.BatchSettings(max_latency=float("inf")),
+        credentials=creds,
+        publisher_options=types.PublisherOptions(**options),
+    )
+
+
+def fake_publish_rpc(published):
+    def publish_rpc(request, topic, retry=None, pinned=False, compression=None):
+        request = _raw_publish_request.FromString(request)
+        published.extend(message.data for message in request.messages)
+        return _raw_publish_response(
+            message_ids=[str(len(published))] * len(request.messages)
+        )
+
+    return publish_rpc
+
+
+@pytest.fixture
+def registered():
+    with mock.patch.object(_fork, "_clients", weakref.WeakSet()) as clients:
+        yield clients
+
+
+def test_after_fork_in_child_rebuilds_registered_clients(registered):
+    client = mock.Mock(spec=["_after_fork"])
+    failing = mock.Mock(spec=["_after_fork"])
+    failing._after_fork.side_effect = RuntimeError("boom")
+    _fork.register(failing)
+    _fork.register(client)
+
+    _fork._after_fork_in_child()
+
+    client._after_fork.assert_called_once_with()
+    failing._after_fork.assert_called_once_with()
+
+
+def test_registered_clients_not_kept_alive(registered):
+    client = mock.Mock(spec=["_after_fork"])
+    _fork.register(client)
+    assert len(registered) == 1
+
+    del client
+    gc.collect()
+
+    assert len(registered) == 0
+
+
+def test_can_create_transport():
+    assert _fork.can_create_transport({})
+    assert _fork.can_create_transport({"transport": None})
+    assert _fork.can_create_transport({"transport": "grpc"})
+    assert not _fork.can_create_transport({"transport": mock.sentinel.transport})
+
+
+def test_publisher_registered(registered):
+    client = create_publisher()
+    assert client in registered
+
+
+def test_publisher_after_fork_drops_unsent_messages():
+    client = create_publisher()
+    parent_published = []
+    client._serialized_publish_rpc = fake_publish_rpc(parent_published)
+    parent_future = client.publish("topic", b"parent")
+    parent_api = client.api
+    parent_lock = client._batch_lock
+    parent_executor = client._commit_executor
+    parent_timer = client._commit_timer
+    assert client._sequencers
+
+    client._after_fork()
+
+    assert client.api is not parent_api
+    assert client._batch_lock is not parent_lock
+    assert client._commit_executor is not parent_executor
+    assert client._commit_timer is not parent_timer
+    assert client._sequencers == {}
+
+    published = []
+    client._serialized_publish_rpc = fake_publish_rpc(published)
+    future = client.publish("topic", b"child")
+    client.stop()
+
+    assert future.result(timeout=5) == "1"
+    assert published == [b"child"]
+    assert parent_published == []
+    assert not parent_future.done()
+
+
+def test_publisher_with_custom_transport_after_fork():
+    transport = mock.create_autospec(PublisherGrpcTransport, instance=True)
+    transport._host = "pubsub.googleapis.com:443"
+    transport._wrapped_methods = {transport.publish: mock.Mock()}
+    client = publisher.Client(transport=transport)
+    parent_api = client.api
+    parent_lock = client._batch_lock
+
+    with mock.patch.object(publisher.client, "_LOGGER") as logger:
+        client._after_fork()
+
+    logger.warning.assert_called_once()
+    assert client.api is parent_api
+    assert client._batch_lock is not parent_lock
+
+
+def test_publisher_with_outbox_after_fork(tmp_path):
+    client = create_publisher(outbox=types.OutboxSettings(str(tmp_path)))
+    client.publish("topic", b"parent")
+    # The drainer thread of the parent does not exist in the child process.
+    client._outbox.stop()
+
+    client._after_fork()
+
+    # The child closes its copies of the segment files.
+    assert client._outbox._log._segments == []
+
+    with pytest.raises(RuntimeError, match="parent process"):
+        client.publish("topic", b"child")
+    client.stop()
+
+
+def test_subscriber_after_fork(registered):
+    creds = mock.Mock(spec=credentials.Credentials)
+    client = subscriber.Client(credentials=creds)
+    assert client in registered
+    parent_api = client.api
+    parent_acknowledge_rpc = client._acknowledge_rpc
+    next(client._stream_counter)
+
+    client._after_fork()
+
+    assert client.api is not parent_api
+    assert client._acknowledge_rpc is not parent_acknowledge_rpc
+    assert client._target == client.api._transport._host
+    assert next(client._stream_counter) == 0
+
+
+def test_subscriber_with_custom_transport_after_fork():
+    transport = mock.create_autospec(SubscriberGrpcTransport, instance=True)
+    transport._host = "pubsub.googleapis.com:443"
+    client = subscriber.Client(transport=transport)
+    parent_api = client.api
+
+    with mock.patch.object(subscriber.client, "_LOGGER") as logger:
+        client._after_fork()
+
+    logger.warning.assert_called_once()
+    assert client.api is parent_api
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "register_at_fork"), reason="Requires os.register_at_fork."
+)
+def test_publisher_in_forked_child():
+    client = create_publisher()
+    client._serialized_publish_rpc = fake_publish_rpc([])
+    client.publish("topic", b"parent")
+
+    pid = os.fork()
+    if not pid:
+        # The child must not return into the test runner.
+        status = 1
+        try:
+            published = []
+            client._serialized_publish_rpc = fake_publish_rpc(published)
+            future = client.publish("topic", b"child")
+            client.stop()
+            if future.result(timeout=5) == "1" and published == [b"child"]:
+                status = 0
+        finally:
+            os._exit(status)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status)
+    assert os.WEXITSTATUS(status) == 0
+    client.stop()
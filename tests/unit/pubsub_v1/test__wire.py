@@ -0,0 +1,43 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from google.cloud.pubsub_v1 import _wire
+from google.pubsub_v1 import types as gapic_types
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        (0, b"\x00"),
+        (1, b"\x01"),
+        (127, b"\x7f"),
+        (128, b"\x80\x01"),
+        (300, b"\xac\x02"),
+        (16384, b"\x80\x80\x01"),
+        (10 * 1000 * 1000, b"\x80\xad\xe2\x04"),
+    ],
+)
+def test_encode_varint(value, expected):
+    assert _wire.encode_varint(value) == expected
+
+
+@pytest.mark.parametrize("data_size", [0, 10, 200, 20000])
+def test_framed_message_size(data_size):
+    message = gapic_types.PubsubMessage(data=b"x" * data_size)._pb
+    message_size = message.ByteSize()
+    request = gapic_types.PublishRequest.pb()(messages=[message])
+
+    assert _wire.framed_message_size(message_size) == request.ByteSize()
@@ -0,0 +1,67 @@
+# Copyright 2021, Google LLC All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import mock
+import pytest
+
+from google.cloud.pubsub_v1 import codecs
+
+
+@pytest.mark.parametrize("name", ["zlib", "lzma"])
+def test_builtin_codecs_round_trip(name):
+    codec = codecs.get_codec(name)
+    data = b"The rain in Wales falls mainly on the snails." * 10
+
+    compressed = codec.compress(data)
+
+    assert codec.name == name
+    assert len(compressed) < len(data)
+    assert codec.decompress(compressed) == data
+
+
+def test_get_unknown_codec():
+    with pytest.raises(ValueError):
+        codecs.get_codec("unknown")
+
+
+def test_register_codec():
+    codec = codecs.Codec("reversed", lambda data: data[::-1], lambda data: data[::-1])
+
+    with mock.patch.dict(codecs._codecs):
+        codecs.register_codec(codec)
+        assert codecs.get_codec("reversed") is codec
+
+    with pytest.raises(ValueError):
+        codecs.get_codec("reversed")
+
+
+def test_zstd_codec():
+    zstandard = mock.Mock(spec=["ZstdCompressor", "ZstdDecompressor"])
+    compressor = zstandard.ZstdCompressor.return_value
+    decompressor = zstandard.ZstdDecompressor.return_value
+
+    with mock.patch.object(codecs, "zstandard", zstandard):
+        codec = codecs._create_zstd_codec()
+        assert codec.name == "zstd"
+
+        assert codec.compress(b"foo") is compressor.compress.return_value
+        assert codec.compress(b"bar") is compressor.compress.return_value
+        assert codec.decompress(b"baz") is decompressor.decompress.return_value
+        assert codec.decompress(b"baz") is decompressor.decompress.return_value
+
+    # The thread reuses its compressor and decompressor.
+    zstandard.ZstdCompressor.assert_called_once_with()
+    zstandard.ZstdDecompressor.assert_called_once_with()
+    compressor.compress.assert_called_with(b"bar")
+    decompressor.decompress.assert_called_with(b"baz")